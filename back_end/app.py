@@ -1,7 +1,11 @@
-from fastapi import FastAPI, File, UploadFile, Form, Query, Depends, HTTPException, status, Header
+import time
+# 模块导入起点，用于启动耗时报告
+_APP_IMPORT_STARTED = time.perf_counter()
+from fastapi import FastAPI, File, UploadFile, Form, Query, Depends, HTTPException, status, Header, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any, Union
 import uvicorn
@@ -18,11 +22,14 @@ import cv2
 import redis
 import random
 import base64
-import dlib
 from scipy.spatial import distance as dist
 import math
-import time
 import sys
+import io
+import csv
+import json
+import asyncio
+import zipfile
 # 获取当前脚本的绝对路径
 current_file = os.path.abspath(__file__)
 # 获取项目根目录（back_end目录）
@@ -31,36 +38,17 @@ project_root = os.path.dirname(current_file)
 sys.path.insert(0, project_root)  # 使用insert确保优先级最高
 
 
-# 导入模型
-try:
-    from SlientFaceAntiSpoofing.detect import SilentFaceModel
-    print("成功导入SilentFaceModel")
-except ImportError as e:
-    print(f"导入SilentFaceModel失败: {e}")
-    # 检查模块搜索路径
-    import importlib.util
-    spec = importlib.util.find_spec('SlientFaceAntiSpoofing.detect')
-    # print(f"SlientFaceAntiSpoofing.detect模块规范: {spec}")
-    sys.exit(1)
-# 导入自定义模块
+# 导入自定义模块（各模型的依赖在模型注册表的工厂函数中按需导入）
 from database import AttendanceDB
-from face_sdk.arc_face_sdk import ArcFaceSDK
-from face_model1.deepface_model import DeepFaceAttendanceModel
-from face_model2.silence import SilentFaceRecognitionModel
-from face_model3.face_utils import FaceProcessor
-# from SlientFaceAntiSpoofing.detect import SilentFaceModel
+from face_gallery import FaceGallery, FeatureStore, create_index, index_path_for, store_path_for, parse_encodings
+from pipeline import FrameContext, EmbeddingBatcher, ExecutorRegistry, ModelProcessPool, ModelRegistry, parse_frame_size, synthetic_face_frame, default_intra_op_threads, parse_quantization, FrameGate, KioskTracker, largest_face_box, LatestFrameSlot, StreamStats
+from bulk_enroll import get_student_info_from_filename, parse_register_archive, mark_duplicate_students
 from anti.four_anti import detect_blink, detect_mouth, detect_nod, detect_shake, LivenessSession, check_reflection
-import torch
 
 
 # Redis配置
 redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=False)
 
-# dlib模型加载
-predictor_path = 'D:/dasanxia/content_s/lab5/face/face/shape_predictor_68_face_landmarks.dat'
-detector = dlib.get_frontal_face_detector()
-predictor = dlib.shape_predictor(predictor_path)
-
 # 活体检测步骤定义
 LIVENESS_STEPS = [
     {"name": "blink", "text": "请眨眼"},
@@ -188,30 +176,396 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 # OAuth2认证
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
-# 初始化数据库
-db = AttendanceDB()
-
-# 初始化虹软SDK
-try:
-    arc_face = ArcFaceSDK()
-    print("虹软SDK初始化成功")
-except Exception as e:
-    print(f"虹软SDK初始化失败: {str(e)}")
-    arc_face = None
-
-# 初始化DeepFace模型
-deepface_model = DeepFaceAttendanceModel(detector_backend='mtcnn', model_name='ArcFace')
-
-# 初始化SilentFaceRecognitionModel（静默活体检测模型）
-try:
-    silence_model = SilentFaceRecognitionModel(device='cuda' if torch.cuda.is_available() else 'cpu')
-    print("静默活体检测模型初始化成功")
-except Exception as e:
-    print(f"静默活体检测模型初始化失败: {str(e)}")
-    silence_model = None
+# 初始化数据库（长连接池 + WAL模式，DB_POOL_SIZE=0时每次调用新建连接）
+db = AttendanceDB(pool_size=int(os.environ.get("DB_POOL_SIZE", "8")))
+# 学生信息与已解析人脸模板的进程内缓存（注册/删除学生时自动失效）
+db.enable_student_cache(
+    max_entries=int(os.environ.get("STUDENT_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.environ.get("STUDENT_CACHE_TTL", "600"))
+)
 
-# 初始化4：
-face_processor = FaceProcessor()
+#------------------------ 模型注册表 ------------------------#
+# 各模型后端在首次使用时才导入依赖并加载，导入本模块不加载任何模型
+# MODEL_BACKENDS指定启用的后端（逗号分隔）：arcsoft,insightface,silence,silence_liveness,dlib,deepface
+# 默认启用接口实际使用的前五种（deepface仅保留注册），只使用InsightFace方案时设置 MODEL_BACKENDS=insightface，其余后端永不加载
+
+# 虹软SDK引擎句柄数（每次调用借出一个，支持多线程并发）
+ARCSOFT_ENGINES = int(os.environ.get("ARCSOFT_ENGINES", "2"))
+DLIB_PREDICTOR_PATH = os.environ.get("DLIB_PREDICTOR_PATH", 'D:/dasanxia/content_s/lab5/face/face/shape_predictor_68_face_landmarks.dat')
+SILENT_ANTISPOOF_MODEL_DIR = os.environ.get("SILENT_ANTISPOOF_MODEL_DIR", "D:\\dasanxia\\content_s\\lab6\\back_end\\SlientFaceAntiSpoofing\\resources\\anti_spoof_models")
+
+# CPU优化推理（ORT_OPTIMIZED=1）：InsightFace各onnxruntime会话按并发推理线程数均分CPU核设置算子内线程数，
+# 静默活体方案的FaceNet/MiniFASNetV2导出为ONNX后用图优化的onnxruntime会话推理；ORT_INTRA_OP_THREADS可显式指定线程数
+ORT_OPTIMIZED = os.environ.get("ORT_OPTIMIZED", "0") == "1"
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", "0"))
+# INT8量化模型（按后端选择，"后端:模式"逗号分隔，模式为dynamic/static，如 MODEL_QUANTIZATION=insightface:static,silence:static，默认不启用）：
+# insightface量化识别模型，silence量化FaceNet与MiniFASNetV2（隐含ORT_OPTIMIZED的ONNX推理）；static用QUANT_CALIBRATION_DIR下的图片校准
+MODEL_QUANTIZATION = parse_quantization(os.environ.get("MODEL_QUANTIZATION", ""))
+QUANT_CALIBRATION_DIR = os.environ.get("QUANT_CALIBRATION_DIR", str(UPLOAD_DIR))
+for unknown_backend in set(MODEL_QUANTIZATION) - {"insightface", "silence"}:
+    print(f"MODEL_QUANTIZATION中的后端不支持量化: {unknown_backend}")
+
+def ort_model_options(backend, concurrency):
+    """ORT_OPTIMIZED或MODEL_QUANTIZATION时传给模型构造函数的参数，concurrency为同时推理该模型的线程/进程数"""
+    quantization = MODEL_QUANTIZATION.get(backend)
+    if not ORT_OPTIMIZED and not quantization:
+        return {}
+    threads = ORT_INTRA_OP_THREADS or default_intra_op_threads(concurrency)
+    options = {}
+    if backend == "insightface":
+        options = {"intra_op_threads": threads}
+    elif backend == "silence":
+        options = {"backend": "onnx", "intra_op_threads": threads}
+    if quantization and options:
+        options.update(quantization=quantization, calibration_dir=QUANT_CALIBRATION_DIR)
+    return options
+
+def create_arcsoft_model():
+    from face_sdk.arc_face_sdk import ArcFaceSDK
+    return ArcFaceSDK(pool_size=ARCSOFT_ENGINES)
+
+def create_insightface_model():
+    from face_model3.face_utils import FaceProcessor
+    return FaceProcessor(**ort_model_options("insightface", executors.get("insightface").max_workers))
+
+def create_silence_model():
+    import torch
+    from face_model2.silence import SilentFaceRecognitionModel
+    return SilentFaceRecognitionModel(device='cuda' if torch.cuda.is_available() else 'cpu',
+                                      **ort_model_options("silence", executors.get("silence").max_workers))
+
+def create_silence_liveness_model():
+    from SlientFaceAntiSpoofing.detect import SilentFaceModel
+    return SilentFaceModel(model_dir=SILENT_ANTISPOOF_MODEL_DIR, device_id=0)
+
+def create_dlib_model():
+    import dlib
+    return dlib.get_frontal_face_detector(), dlib.shape_predictor(DLIB_PREDICTOR_PATH)
+
+def create_deepface_model():
+    from face_model1.deepface_model import DeepFaceAttendanceModel
+    return DeepFaceAttendanceModel(detector_backend='mtcnn', model_name='ArcFace')
+
+def warmup_silence_liveness_model(model, frame):
+    """SilentFaceModel只接受图片路径，预热时写入临时文件"""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "warmup.jpg")
+        cv2.imwrite(path, frame)
+        model.detect_liveness(path)
+
+def warmup_dlib_model(dlib_model, frame):
+    """整帧人脸检测，关键点模型在画面中央区域推理"""
+    import dlib
+    detector, predictor = dlib_model
+    detector(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 0)
+    height, width = frame.shape[:2]
+    size = min(height, width) // 2
+    predictor(frame, dlib.rectangle((width - size) // 2, (height - size) // 2, (width + size) // 2, (height + size) // 2))
+
+MODEL_BACKENDS = [item.strip() for item in os.environ.get("MODEL_BACKENDS", "arcsoft,insightface,silence,silence_liveness,dlib").split(",") if item.strip()]
+models = ModelRegistry(enabled=MODEL_BACKENDS or None)
+models.register("arcsoft", create_arcsoft_model, "虹软SDK")
+models.register("insightface", create_insightface_model, "InsightFace模型")
+models.register("silence", create_silence_model, "静默活体特征模型")
+models.register("silence_liveness", create_silence_liveness_model, "静默活体检测模型", warmup=warmup_silence_liveness_model)
+models.register("dlib", create_dlib_model, "dlib人脸关键点模型", warmup=warmup_dlib_model)
+models.register("deepface", create_deepface_model, "DeepFace模型")
+for unknown_backend in models.check_enabled():
+    print(f"MODEL_BACKENDS中的未知模型后端: {unknown_backend}")
+
+async def load_model(name):
+    """
+    获取模型实例，首次使用时在线程池中加载，不阻塞事件循环
+
+    Returns:
+        模型实例；后端未启用或加载失败时返回None
+    """
+    if models.is_loaded(name) or not models.is_enabled(name):
+        return models.get(name)
+    return await asyncio.get_running_loop().run_in_executor(None, models.get, name)
+
+# 模型预热：服务启动后在后台加载已启用的模型，并在WARMUP_FRAME_SIZE分辨率（默认与前端摄像头一致）的合成帧上
+# 各推理WARMUP_RUNS次，预热完成前/api/system/ready返回503；MODEL_WARMUP=0时不预热，模型仍在首次使用时加载
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "1") == "1"
+WARMUP_FRAME_SIZE = parse_frame_size(os.environ.get("WARMUP_FRAME_SIZE", "640x480"))
+WARMUP_RUNS = int(os.environ.get("WARMUP_RUNS", "3"))
+warmup_status = {"state": "pending" if MODEL_WARMUP else "disabled"}
+
+# 阻塞调用线程池：按模型族划分，接口协程await执行结果，避免单帧推理阻塞事件循环
+# 虹软SDK线程数默认等于引擎句柄数；torch模型、dlib检测器非线程安全，默认单线程；sqlite从连接池借出长连接（WAL模式下读可并发、写由busy_timeout排队），
+# 线程数不宜超过连接池空闲连接数（DB_POOL_SIZE），否则多出的并发调用每次新建连接、归还时关闭
+executors = ExecutorRegistry({
+    "arcsoft": int(os.environ.get("ARCSOFT_WORKERS", str(ARCSOFT_ENGINES))),
+    "insightface": int(os.environ.get("INSIGHTFACE_WORKERS", "2")),
+    "silence": int(os.environ.get("SILENCE_WORKERS", "1")),
+    "dlib": int(os.environ.get("DLIB_WORKERS", "1")),
+    "db": int(os.environ.get("DB_WORKERS", "4"))
+})
+
+async def run_db(fn, *args, **kwargs):
+    """在数据库线程池中执行"""
+    return await executors.run("db", fn, *args, **kwargs)
+
+async def run_arcsoft(fn, *args, **kwargs):
+    """在虹软SDK线程池中执行"""
+    return await executors.run("arcsoft", fn, *args, **kwargs)
+
+# 磁盘特征存储（FACE_FEATURE_STORE=1）：特征库导出为与数据库同目录的矩阵文件+学号索引，启动时直接映射，
+# 多个服务进程共享同一份页缓存；注册/删除学生后延迟重建，其他进程检索时发现文件更新后重新映射
+# FACE_FEATURE_STORE_DTYPE: float32(默认，零拷贝映射) / float16(文件减半，加载时转换为float32)
+FACE_FEATURE_STORE = os.environ.get("FACE_FEATURE_STORE", "0") == "1"
+feature_store = None
+if FACE_FEATURE_STORE:
+    feature_store = FeatureStore(
+        store_path_for(db.db_path, "deepface"),
+        dim=512,
+        feature_type="deepface",
+        dtype=os.environ.get("FACE_FEATURE_STORE_DTYPE", "float32")
+    )
+    feature_store.attach(db)
+
+# 初始化1:N人脸特征库（InsightFace特征，注册/删除学生时自动增量同步）
+# FACE_GALLERY_INDEX: exact(默认，精确检索) / ivf(纯NumPy倒排索引) / hnsw(需安装hnswlib)
+# FACE_GALLERY_ENCODING按特征方案选择模板编码（"方案:编码"逗号分隔）：float32(默认) / float16(内存减半) /
+# pq(乘积量化，每条模板FACE_GALLERY_PQ_M字节，默认64)，如 FACE_GALLERY_ENCODING=deepface:pq；压缩编码只用于精确检索
+GALLERY_INDEX = os.environ.get("FACE_GALLERY_INDEX", "exact")
+GALLERY_ENCODINGS = parse_encodings(os.environ.get("FACE_GALLERY_ENCODING", ""))
+GALLERY_PQ_M = int(os.environ.get("FACE_GALLERY_PQ_M", "64"))
+
+def gallery_encoding_options(feature_type):
+    """特征方案对应的模板编码参数"""
+    encoding = GALLERY_ENCODINGS.get(feature_type, "float32")
+    return {"encoding": encoding, "codec_options": {"m": GALLERY_PQ_M} if encoding == "pq" else None}
+
+if GALLERY_INDEX == "exact":
+    face_gallery = FaceGallery(dim=512, feature_type="deepface", store=feature_store, **gallery_encoding_options("deepface"))
+else:
+    if gallery_encoding_options("deepface")["encoding"] != "float32":
+        # ANN索引自带原始特征副本，压缩模板不能节省内存，FaceGallery也不接受该组合
+        print(f"警告: FACE_GALLERY_ENCODING的压缩编码只用于精确检索，FACE_GALLERY_INDEX={GALLERY_INDEX}时忽略并使用float32模板")
+    face_gallery = FaceGallery(
+        dim=512,
+        feature_type="deepface",
+        index=create_index(GALLERY_INDEX, dim=512),
+        index_path=index_path_for(db.db_path, GALLERY_INDEX),
+        store=feature_store
+    )
+face_gallery.load(db)
+face_gallery.attach(db)
+
+# 实时识别跟踪：请求携带kiosk_id时按考勤机维护人脸轨迹，后续帧只做虹软人脸检测并按IoU关联轨迹、复用识别结果，
+# 仅在新轨迹、轨迹丢失后重现或到达复核时间时重新执行活体检测与特征提取；FACE_TRACKING=0 时关闭，逐帧完整识别
+FACE_TRACKING = os.environ.get("FACE_TRACKING", "1") == "1"
+kiosk_tracker = KioskTracker(
+    iou_threshold=float(os.environ.get("TRACK_IOU_THRESHOLD", "0.3")),
+    reverify_seconds=float(os.environ.get("TRACK_REVERIFY_SECONDS", "5")),
+    retry_seconds=float(os.environ.get("TRACK_RETRY_SECONDS", "1")),
+    max_missed=int(os.environ.get("TRACK_MAX_MISSED", "2"))
+) if FACE_TRACKING else None
+
+# 推理前帧门控：请求携带kiosk_id时，新帧缩放为80x60灰度图与该考勤机上一次完整识别时的画面比较，
+# 画面基本未变（平均绝对差<GATE_DUPLICATE_THRESHOLD）或没有人脸尺度的运动（最大变化区域<GATE_MIN_MOTION_AREA）时直接返回上次结果，
+# 连续复用不超过GATE_MAX_SKIP_SECONDS秒；FRAME_GATE=0 时关闭
+FRAME_GATE = os.environ.get("FRAME_GATE", "1") == "1"
+frame_gate = FrameGate(
+    duplicate_threshold=float(os.environ.get("GATE_DUPLICATE_THRESHOLD", "2.0")),
+    min_motion_area=float(os.environ.get("GATE_MIN_MOTION_AREA", "0.01")),
+    max_skip_seconds=float(os.environ.get("GATE_MAX_SKIP_SECONDS", "5"))
+) if FRAME_GATE else None
+
+# InsightFace特征提取微批处理：并发请求在FACE_BATCH_WAIT_MS窗口内合并为一批推理
+# FACE_BATCHING=0 时关闭，逐请求推理
+FACE_BATCHING = os.environ.get("FACE_BATCHING", "1") == "1"
+embedding_batcher = EmbeddingBatcher(
+    lambda: models.get("insightface"),
+    max_batch_size=int(os.environ.get("FACE_BATCH_SIZE", "16")),
+    max_wait_ms=float(os.environ.get("FACE_BATCH_WAIT_MS", "5")),
+    executor=executors.get("insightface")
+) if FACE_BATCHING else None
+
+# 多进程模型工作池（可选）：MODEL_WORKER_PROCESSES>0 时推理在独立工作进程中执行，
+# 每个进程独占一套模型实例，图像经共享内存传递；MODEL_WORKER_BACKENDS指定交给工作进程的模型
+# 工作池在startup事件中创建，避免spawn子进程重新导入本模块时重复创建
+MODEL_WORKER_PROCESSES = int(os.environ.get("MODEL_WORKER_PROCESSES", "0"))
+MODEL_WORKER_BACKENDS = [item.strip() for item in os.environ.get("MODEL_WORKER_BACKENDS", "arcsoft,insightface").split(",") if item.strip()]
+model_workers = None
+
+@app.on_event("startup")
+async def start_model_workers():
+    """启动多进程模型工作池并预热"""
+    global model_workers
+    if MODEL_WORKER_PROCESSES <= 0:
+        return
+    model_workers = ModelProcessPool(
+        MODEL_WORKER_PROCESSES,
+        backends=MODEL_WORKER_BACKENDS,
+        warmup_frame_size=WARMUP_FRAME_SIZE if MODEL_WARMUP else None,
+        model_options={backend: ort_model_options(backend, MODEL_WORKER_PROCESSES) for backend in MODEL_WORKER_BACKENDS}
+    )
+    pids = await model_workers.start()
+    print(f"模型工作进程已启动: {MODEL_WORKER_PROCESSES}个, 后端: {MODEL_WORKER_BACKENDS}, 响应进程: {pids}")
+
+# 启动耗时：从导入本模块到startup事件完成（模型按需加载，不计入启动耗时）
+startup_timing = {}
+
+@app.on_event("startup")
+async def report_startup_timing():
+    """打印启动耗时报告和各模型后端状态"""
+    startup_timing["startup_ms"] = round((time.perf_counter() - _APP_IMPORT_STARTED) * 1000, 1)
+    report = models.report()
+    print(f"服务启动耗时: {startup_timing['startup_ms']:.0f}ms, 启用模型: {report['enabled']}（首次使用时加载）")
+    for name, entry in report["backends"].items():
+        load_ms = f", 加载耗时{entry['load_ms']:.0f}ms" if "load_ms" in entry else ""
+        print(f"  - {name}（{entry['description']}）: {entry['state']}{load_ms}")
+
+def use_model_workers(backend):
+    """指定模型后端是否交给多进程工作池执行"""
+    return model_workers is not None and backend in model_workers.backends
+
+# 各模型后端预热时使用的线程池（与推理使用同一线程池），未列出的在默认线程池中预热
+MODEL_EXECUTORS = {"arcsoft": "arcsoft", "insightface": "insightface", "silence": "silence",
+                   "silence_liveness": "silence", "dlib": "dlib"}
+_warmup_task = None
+
+async def warm_up_backend(name, frame):
+    pool = MODEL_EXECUTORS.get(name)
+    if pool is None:
+        return await asyncio.get_running_loop().run_in_executor(None, models.warm_up, name, frame, WARMUP_RUNS)
+    return await executors.run(pool, models.warm_up, name, frame, WARMUP_RUNS)
+
+async def warm_up_models():
+    """加载并预热所有已启用的本进程模型（交给多进程工作池的后端已在工作进程启动时预热）"""
+    started = time.perf_counter()
+    warmup_status["state"] = "warming"
+    frame = synthetic_face_frame(*WARMUP_FRAME_SIZE)
+    backends = [name for name in models.enabled_backends() if not use_model_workers(name)]
+    results = await asyncio.gather(*(warm_up_backend(name, frame) for name in backends), return_exceptions=True)
+    failed = [name for name, result in zip(backends, results) if result is not True]
+    warmup_status.update({
+        "state": "done",
+        "frame_size": list(WARMUP_FRAME_SIZE),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "failed": failed
+    })
+    print(f"模型预热完成: 耗时{warmup_status['elapsed_ms']:.0f}ms, 失败: {failed or '无'}")
+
+@app.on_event("startup")
+async def start_model_warmup():
+    """在后台启动模型预热，不阻塞服务启动"""
+    global _warmup_task
+    if MODEL_WARMUP:
+        _warmup_task = asyncio.get_running_loop().create_task(warm_up_models())
+
+async def analyze_arcsoft(img, frame_ctx, extract_feature=True, require_live=True):
+    """
+    虹软活体检测与特征提取，两个阶段共享同一次人脸检测
+
+    Args:
+        img: BGR格式的图像数组
+        frame_ctx: 单帧分析上下文
+        extract_feature: 是否提取特征
+        require_live: 为True时活体检测未通过则不再提取特征
+
+    Returns:
+        (活体检测结果, 特征提取结果或None)
+    """
+    if use_model_workers("arcsoft"):
+        result = await model_workers.run("arcsoft_analyze", img, extract_feature=extract_feature, require_live=require_live)
+        frame_ctx.stages.extend(result["stages"])
+        return result["liveness"], result["feature"]
+    arc_face = await load_model("arcsoft")
+    if arc_face is None:
+        failed = {"success": False, "message": "虹软SDK未启用或加载失败"}
+        return failed, (failed if extract_feature else None)
+    liveness_result = await run_arcsoft(arc_face.detect_liveness_from_numpy, img, context=frame_ctx)
+    feature_result = None
+    if extract_feature and (not require_live or (liveness_result["success"] and liveness_result.get("is_live", False))):
+        feature_result = await run_arcsoft(arc_face.extract_feature_from_numpy, img, context=frame_ctx)
+    return liveness_result, feature_result
+
+async def detect_arcsoft_faces(img, frame_ctx):
+    """虹软人脸检测（不做活体检测与特征提取），结果缓存在单帧上下文中，同一帧随后的活体检测直接复用"""
+    if use_model_workers("arcsoft"):
+        start = time.perf_counter()
+        result = await model_workers.run("arcsoft_detect", img)
+        frame_ctx.record("track", "arcsoft_detect", (time.perf_counter() - start) * 1000, worker_process=True)
+        return result
+    arc_face = await load_model("arcsoft")
+    if arc_face is None:
+        return {"success": False, "message": "虹软SDK未启用或加载失败"}
+    return await run_arcsoft(frame_ctx.get_or_compute, "arcsoft_detect", "track", lambda: arc_face.detect_faces_from_numpy(img))
+
+async def compare_arcsoft(feature1, feature2):
+    """虹软特征比对"""
+    if use_model_workers("arcsoft"):
+        return await model_workers.run("arcsoft_compare", feature1=feature1, feature2=feature2)
+    arc_face = await load_model("arcsoft")
+    if arc_face is None:
+        return {"success": False, "message": "虹软SDK未启用或加载失败"}
+    return await run_arcsoft(arc_face.compare_features, feature1, feature2)
+
+async def extract_insightface_feature(img, frame_ctx):
+    """InsightFace人脸检测与特征提取，开启微批处理时经批处理队列执行"""
+    if use_model_workers("insightface"):
+        start = time.perf_counter()
+        result = await model_workers.run("insightface_detect", img)
+        frame_ctx.record("embedding", "insightface_faces", (time.perf_counter() - start) * 1000, worker_process=True)
+        return result
+    face_processor = await load_model("insightface")
+    if face_processor is None:
+        return {"success": False, "message": "InsightFace模型未启用或加载失败"}
+    if embedding_batcher is not None:
+        return await embedding_batcher.detect_faces(img, context=frame_ctx)
+    return await executors.run("insightface", face_processor.detect_faces_from_numpy, img, context=frame_ctx)
+
+async def extract_arcsoft_feature(img, frame_ctx):
+    """虹软特征提取（不做活体检测，用于注册）"""
+    if use_model_workers("arcsoft"):
+        _, feature_result = await analyze_arcsoft(img, frame_ctx, require_live=False)
+        return feature_result
+    arc_face = await load_model("arcsoft")
+    if arc_face is None:
+        return {"success": False, "message": "虹软SDK未启用或加载失败"}
+    return await run_arcsoft(arc_face.extract_feature_from_numpy, img, context=frame_ctx)
+
+async def extract_silence_feature(img):
+    """静默活体方案特征提取"""
+    if use_model_workers("silence"):
+        return await model_workers.run("silence_feature", img)
+    silence_model = await load_model("silence")
+    if silence_model is None:
+        return {"success": False, "message": "静默活体特征模型未启用或加载失败"}
+    return await executors.run("silence", silence_model.extract_feature_from_numpy, img)
+
+@app.on_event("shutdown")
+def save_gallery_index():
+    """服务关闭时将增量更新后的ANN索引和待重建的特征存储写回磁盘，并关闭线程池和数据库连接"""
+    face_gallery.save_index()
+    if feature_store is not None:
+        feature_store.flush()
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+    if embedding_batcher is not None:
+        embedding_batcher.shutdown()
+    if model_workers is not None:
+        model_workers.shutdown()
+    executors.shutdown()
+    models.release()
+    db.close()
+
+# 当前考勤班级缓存（实时识别每500ms一帧，避免每帧查询考勤规则）
+ACTIVE_CLASS_CACHE_SECONDS = 30
+_active_class_cache = {"expire": 0.0, "data": []}
+
+async def get_active_class_scope():
+    """获取当前时段有激活考勤规则的班级列表，查询失败时返回空列表（即全库检索）"""
+    now = time.time()
+    if now >= _active_class_cache["expire"]:
+        result = await run_db(db.get_active_classes)
+        _active_class_cache["data"] = result["data"] if result["success"] else []
+        _active_class_cache["expire"] = now + ACTIVE_CLASS_CACHE_SECONDS
+    return _active_class_cache["data"]
 
 # 保存上传的图片
 def save_upload_file(upload_file: UploadFile, directory: Path = UPLOAD_DIR) -> str:
@@ -226,6 +580,36 @@ def save_upload_file(upload_file: UploadFile, directory: Path = UPLOAD_DIR) -> s
     
     return str(file_path)
 
+# 考勤图片审计：开启后将上传原图保留在uploads目录（默认不落盘，全程内存处理）
+AUDIT_UPLOADS = os.environ.get("AUDIT_UPLOADS", "0") == "1"
+
+def decode_image_bytes(img_bytes: bytes) -> Optional[np.ndarray]:
+    """将上传的图片字节解码为BGR格式的numpy数组，解码失败返回None"""
+    if not img_bytes:
+        return None
+    image = np.frombuffer(img_bytes, np.uint8)
+    return cv2.imdecode(image, cv2.IMREAD_COLOR)
+
+async def read_upload_image(upload_file: UploadFile):
+    """
+    读取并解码上传图片（每个请求只解码一次，后续各阶段共享同一数组）
+    
+    Returns:
+        tuple: (图片字节, BGR图像数组或None)
+    """
+    img_bytes = await upload_file.read()
+    return img_bytes, decode_image_bytes(img_bytes)
+
+def audit_upload(img_bytes: bytes, filename: Optional[str], directory: Path = UPLOAD_DIR) -> Optional[str]:
+    """开启审计时保存上传原图，返回保存路径"""
+    if not AUDIT_UPLOADS:
+        return None
+    file_ext = os.path.splitext(filename or "")[1] or ".jpg"
+    file_path = directory / f"{uuid.uuid4()}{file_ext}"
+    with open(file_path, "wb") as f:
+        f.write(img_bytes)
+    return str(file_path)
+
 # 创建访问令牌
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -278,13 +662,18 @@ async def check_student_role(token_data: TokenData = Depends(verify_token)):
         )
     return token_data
 
-# 获取学生ID
-async def get_student_id(token_data: TokenData = Depends(check_student_role)):
+# 单行查询（在数据库线程池中执行）
+def query_one(sql: str, params: tuple):
     conn = db.get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT student_id FROM students WHERE user_id = ?", (token_data.user_id,))
+    cursor.execute(sql, params)
     result = cursor.fetchone()
     conn.close()
+    return result
+
+# 获取学生ID
+async def get_student_id(token_data: TokenData = Depends(check_student_role)):
+    result = await run_db(query_one, "SELECT student_id FROM students WHERE user_id = ?", (token_data.user_id,))
     
     if not result:
         raise HTTPException(
@@ -296,11 +685,7 @@ async def get_student_id(token_data: TokenData = Depends(check_student_role)):
 
 # 获取教师ID
 async def get_teacher_id(token_data: TokenData = Depends(check_teacher_role)):
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM teachers WHERE user_id = ?", (token_data.user_id,))
-    result = cursor.fetchone()
-    conn.close()
+    result = await run_db(query_one, "SELECT id FROM teachers WHERE user_id = ?", (token_data.user_id,))
     
     if not result:
         raise HTTPException(
@@ -316,7 +701,7 @@ async def get_teacher_id(token_data: TokenData = Depends(check_teacher_role)):
 @app.post("/api/auth/login", response_model=Token, tags=["认证管理"])
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """用户登录并获取访问令牌"""
-    login_result = db.login(form_data.username, form_data.password)
+    login_result = await run_db(db.login, form_data.username, form_data.password)
     
     if not login_result["success"]:
         raise HTTPException(
@@ -355,7 +740,8 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 async def register_student_with_account(student: StudentCreate):
     """注册学生账号"""
     # 创建用户
-    user_result = db.create_user(
+    user_result = await run_db(
+        db.create_user,
         password=student.password,
         role="student",
         real_name=student.real_name,
@@ -370,7 +756,8 @@ async def register_student_with_account(student: StudentCreate):
         )
     
     # 注册学生信息
-    result = db.register_student(
+    result = await run_db(
+        db.register_student,
         student_id=student.student_id,
         name=student.real_name,
         class_name=""  # Default to empty string since class_name was removed from model
@@ -378,14 +765,14 @@ async def register_student_with_account(student: StudentCreate):
     
     # 如果学生信息注册失败，需要删除刚才创建的用户账号
     if not result["success"]:
-        db.delete_user(user_result["user_id"])
+        await run_db(db.delete_user, user_result["user_id"])
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST,
             content=result
         )
     
     # 关联用户ID到学生表
-    db.link_student_user(student.student_id, user_result["user_id"])
+    await run_db(db.link_student_user, student.student_id, user_result["user_id"])
     
     return JSONResponse(
         status_code=status.HTTP_201_CREATED,
@@ -402,7 +789,8 @@ async def register_teacher(
 ):
     """注册教师账号"""
     # 创建用户
-    user_result = db.create_user(
+    user_result = await run_db(
+        db.create_user,
         password=teacher.password,
         role="teacher",
         real_name=teacher.real_name,
@@ -415,38 +803,42 @@ async def register_teacher(
             content=user_result
         )
     
-    # 创建教师记录
-    conn = db.get_connection()
-    cursor = conn.cursor()
+    def create_teacher_record():
+        """创建教师记录（在数据库线程池中执行）"""
+        # 创建教师记录
+        conn = db.get_connection()
+        cursor = conn.cursor()
     
-    try:
-        cursor.execute(
-            "INSERT INTO teachers (teacher_id, name, department, position, user_id) VALUES (?, ?, ?, ?, ?)",
-            (teacher.teacher_id, teacher.real_name, "", "", user_result["user_id"])
-        )
-        conn.commit()
+        try:
+            cursor.execute(
+                "INSERT INTO teachers (teacher_id, name, department, position, user_id) VALUES (?, ?, ?, ?, ?)",
+                (teacher.teacher_id, teacher.real_name, "", "", user_result["user_id"])
+            )
+            conn.commit()
         
-        return JSONResponse(
-            status_code=status.HTTP_201_CREATED,
-            content={
-                "success": True,
-                "message": f"教师 {teacher.real_name} 注册成功"
-            }
-        )
-    except Exception as e:
-        # 用户创建成功但教师记录创建失败，需要回滚
-        cursor.execute("DELETE FROM users WHERE id = ?", (user_result["user_id"],))
-        conn.commit()
+            return JSONResponse(
+                status_code=status.HTTP_201_CREATED,
+                content={
+                    "success": True,
+                    "message": f"教师 {teacher.real_name} 注册成功"
+                }
+            )
+        except Exception as e:
+            # 用户创建成功但教师记录创建失败，需要回滚
+            cursor.execute("DELETE FROM users WHERE id = ?", (user_result["user_id"],))
+            conn.commit()
         
-        return JSONResponse(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            content={
-                "success": False,
-                "message": f"教师记录创建失败: {str(e)}"
-            }
-        )
-    finally:
-        conn.close()
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={
+                    "success": False,
+                    "message": f"教师记录创建失败: {str(e)}"
+                }
+            )
+        finally:
+            conn.close()
+
+    return await run_db(create_teacher_record)
 
 # 修改密码
 @app.post("/api/auth/password", tags=["认证管理"])
@@ -455,58 +847,62 @@ async def change_password(
     token_data: TokenData = Depends(get_current_user)
 ):
     """修改用户密码"""
-    conn = db.get_connection()
-    cursor = conn.cursor()
+    def update_password():
+        """校验旧密码并更新（在数据库线程池中执行）"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
     
-    try:
-        # 获取用户信息
-        cursor.execute("SELECT password FROM users WHERE id = ?", (token_data.user_id,))
-        user = cursor.fetchone()
+        try:
+            # 获取用户信息
+            cursor.execute("SELECT password FROM users WHERE id = ?", (token_data.user_id,))
+            user = cursor.fetchone()
         
-        if not user:
-            return JSONResponse(
-                status_code=status.HTTP_404_NOT_FOUND,
-                content={
-                    "success": False,
-                    "message": "用户不存在"
-                }
+            if not user:
+                return JSONResponse(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    content={
+                        "success": False,
+                        "message": "用户不存在"
+                    }
+                )
+        
+            # 验证旧密码
+            if not db.verify_password(user["password"], password_data.old_password):
+                return JSONResponse(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    content={
+                        "success": False,
+                        "message": "旧密码不正确"
+                    }
+                )
+        
+            # 生成新密码哈希
+            new_password_hash = db.hash_password(password_data.new_password)
+        
+            # 更新密码
+            cursor.execute(
+                "UPDATE users SET password = ? WHERE id = ?",
+                (new_password_hash, token_data.user_id)
             )
+            conn.commit()
         
-        # 验证旧密码
-        if not db.verify_password(user["password"], password_data.old_password):
+            return {
+                "success": True,
+                "message": "密码修改成功"
+            }
+        except Exception as e:
+            conn.rollback()
             return JSONResponse(
-                status_code=status.HTTP_400_BAD_REQUEST,
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 content={
                     "success": False,
-                    "message": "旧密码不正确"
+                    "message": f"密码修改失败: {str(e)}"
                 }
             )
-        
-        # 生成新密码哈希
-        new_password_hash = db.hash_password(password_data.new_password)
-        
-        # 更新密码
-        cursor.execute(
-            "UPDATE users SET password = ? WHERE id = ?",
-            (new_password_hash, token_data.user_id)
-        )
-        conn.commit()
-        
-        return {
-            "success": True,
-            "message": "密码修改成功"
-        }
-    except Exception as e:
-        conn.rollback()
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={
-                "success": False,
-                "message": f"密码修改失败: {str(e)}"
-            }
-        )
-    finally:
-        conn.close()
+        finally:
+            conn.close()
+
+    return await run_db(update_password)
 
 #------------------------ 学生管理API ------------------------#
 
@@ -517,7 +913,7 @@ async def get_students(
     token_data: TokenData = Depends(check_teacher_role)
 ):
     """获取学生列表"""
-    result = db.get_all_students(class_name)
+    result = await run_db(db.get_all_students, class_name)
     return result
 
 # 获取学生详情（教师权限）
@@ -527,7 +923,7 @@ async def get_student_detail(
     token_data: TokenData = Depends(check_teacher_role)
 ):
     """获取学生详细信息"""
-    result = db.get_student(student_id)
+    result = await run_db(db.get_student, student_id)
     if not result["success"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -577,7 +973,7 @@ async def get_student_detail(
 @app.get("/api/admin/classes", tags=["教师管理"])
 async def get_classes(token_data: TokenData = Depends(check_teacher_role)):
     """获取所有班级列表"""
-    result = db.get_all_classes()
+    result = await run_db(db.get_all_classes)
     return result
 
 # 创建班级（教师权限）
@@ -592,7 +988,8 @@ async def create_class(
     teacher_id = await get_teacher_id(token_data)
     
     # 创建班级
-    result = db.create_class(
+    result = await run_db(
+        db.create_class,
         class_name=class_name,
         description=description,
         teacher_id=teacher_id,
@@ -611,7 +1008,8 @@ async def create_attendance_rule(
 ):
     print(f"Received rule: {rule}")
     """创建或更新班级考勤规则"""
-    result = db.create_attendance_rule(
+    result = await run_db(
+        db.create_attendance_rule,
         class_id=rule.class_id,
         start_time=rule.start_time,
         end_time=rule.end_time,
@@ -630,7 +1028,7 @@ async def get_attendance_rules(
     token_data: TokenData = Depends(check_teacher_role)
 ):
     """获取班级考勤规则"""
-    result = db.get_attendance_rules(class_id)
+    result = await run_db(db.get_attendance_rules, class_id)
     return result
 
 #------------------------ 考勤申诉API ------------------------#
@@ -648,11 +1046,12 @@ async def register_student_face(
     image_path = save_upload_file(face_image)
     # 1. ArcSoft特征
     arcsoft_feature = None
+    arc_face = await load_model("arcsoft")
     if arc_face is not None:
-        arcsoft_result = arc_face.extract_feature(image_path)
+        arcsoft_result = await run_arcsoft(arc_face.extract_feature, image_path)
         if arcsoft_result['success']:
             arcsoft_feature = arcsoft_result['feature_data'] if isinstance(arcsoft_result['feature_data'], bytes) else arcsoft_result['feature_data'].tobytes()
-    print(f"ArcSoft特征: {arcsoft_result['success'], arcsoft_result['message']}")
+        print(f"ArcSoft特征: {arcsoft_result['success'], arcsoft_result['message']}")
     # 2. DeepFace特征
     # deepface_feature = None
     # deepface_result = deepface_model.extract_feature(image_path)
@@ -662,7 +1061,11 @@ async def register_student_face(
     #         os.remove(image_path)
     #         return {"success": False, "message": f"DeepFace特征维度错误，实际为{feature.shape[0]}，应为512"}
     #     deepface_feature = feature.tobytes()
-    detect_result = face_processor.detect_faces(image_path)
+    face_processor = await load_model("insightface")
+    if face_processor is None:
+        os.remove(image_path)
+        return {"success": False, "message": "InsightFace模型未启用或加载失败"}
+    detect_result = await executors.run("insightface", face_processor.detect_faces, image_path)
     
     if not detect_result["success"]:
         return {"success": False, "message": detect_result["message"]}
@@ -675,13 +1078,15 @@ async def register_student_face(
 
     # 3. 静默活体特征
     silence_feature = None
+    silence_model = await load_model("silence")
     if silence_model is not None:
-        silence_result = silence_model.extract_feature(image_path)
+        silence_result = await executors.run("silence", silence_model.extract_feature, image_path)
         if silence_result['success']:
             silence_feature = np.asarray(silence_result['feature_data'], dtype=np.float32).reshape(-1).tobytes()
     os.remove(image_path)
     # 注册学生信息，存3种特征
-    result = db.register_student(
+    result = await run_db(
+        db.register_student,
         student_id=student_id,
         name=name,
         face_feature=arcsoft_feature,
@@ -691,6 +1096,140 @@ async def register_student_face(
     )
     return result
 
+# 批量注册单次请求最多包含的学生数与上传大小
+BATCH_REGISTER_MAX_ITEMS = int(os.environ.get("BATCH_REGISTER_MAX_ITEMS", "200"))
+BATCH_REGISTER_MAX_BYTES = int(os.environ.get("BATCH_REGISTER_MAX_BYTES", str(200 * 1024 * 1024)))
+
+async def extract_registration_features(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    对单个注册条目解码并提取三种方案特征（与/api/register-student一致，InsightFace特征为必需）
+
+    Returns:
+        dict: 条目结果，成功时包含student（写库字段）
+    """
+    result = {"student_id": item["student_id"], "name": item["name"], "filename": item["filename"], "success": False}
+    if not item["student_id"] or not item["name"]:
+        result["message"] = "缺少学号或姓名（文件名应为: 学号-姓名.jpg）"
+        return result
+    if not item["image_bytes"]:
+        result["message"] = "未找到图片"
+        return result
+    img = await asyncio.get_running_loop().run_in_executor(None, decode_image_bytes, item["image_bytes"])
+    item["image_bytes"] = None
+    if img is None:
+        result["message"] = "无法读取图片"
+        return result
+
+    frame_ctx = FrameContext(img)
+    arcsoft_task = extract_arcsoft_feature(img, frame_ctx) if use_model_workers("arcsoft") or await load_model("arcsoft") is not None else None
+    silence_task = extract_silence_feature(img) if use_model_workers("silence") or await load_model("silence") is not None else None
+    tasks = [extract_insightface_feature(img, frame_ctx)] + [task for task in (arcsoft_task, silence_task) if task is not None]
+    outputs = await asyncio.gather(*tasks, return_exceptions=True)
+    insightface_result = outputs[0]
+    arcsoft_result = outputs[1] if arcsoft_task is not None else None
+    silence_result = outputs[-1] if silence_task is not None else None
+
+    if isinstance(insightface_result, Exception) or not insightface_result["success"]:
+        result["message"] = str(insightface_result) if isinstance(insightface_result, Exception) else insightface_result["message"]
+        return result
+    student = {
+        "student_id": item["student_id"],
+        "name": item["name"],
+        "class_name": item["class_name"],
+        "face_feature": None,
+        "face_feature_2": np.asarray(insightface_result["feature"], dtype=np.float32).tobytes(),
+        "face_feature_3": None
+    }
+    if isinstance(arcsoft_result, dict) and arcsoft_result["success"]:
+        feature = arcsoft_result["feature_data"]
+        student["face_feature"] = feature if isinstance(feature, bytes) else feature.tobytes()
+    if isinstance(silence_result, dict) and silence_result["success"]:
+        student["face_feature_3"] = np.asarray(silence_result["feature_data"], dtype=np.float32).reshape(-1).tobytes()
+    result.update({
+        "success": True,
+        "message": "特征提取成功",
+        "features": {"arcsoft": student["face_feature"] is not None, "deepface": True,
+                     "silence": student["face_feature_3"] is not None},
+        "student": student
+    })
+    return result
+
+# 批量注册学生（教师权限）
+@app.post("/api/register-students/batch", tags=["学生管理"])
+async def register_students_batch(
+    archive: Optional[UploadFile] = File(None),
+    images: Optional[List[UploadFile]] = File(None),
+    student_ids: Optional[List[str]] = Form(None),
+    names: Optional[List[str]] = Form(None),
+    class_names: Optional[List[str]] = Form(None),
+    class_name: Optional[str] = Form(None),
+    token_data: TokenData = Depends(check_teacher_role)
+):
+    """
+    批量注册学生人脸
+    - archive: zip压缩包，图片命名为"学号-姓名.jpg"，或附带manifest.csv（student_id,name,class_name,image）
+    - images: 多个图片文件，可按顺序附带student_ids/names/class_names，未附带时按文件名解析
+    - class_name: 未单独指定班级的学生统一使用的班级
+    全部条目并发提取特征（InsightFace特征经微批处理合并推理），成功的条目在一个数据库事务中写入
+    """
+    try:
+        if archive is not None:
+            archive_bytes = await archive.read()
+            if len(archive_bytes) > BATCH_REGISTER_MAX_BYTES:
+                raise ValueError("压缩包超过大小限制")
+            # 解压最大可达BATCH_REGISTER_MAX_BYTES，在线程池中进行，不阻塞事件循环
+            items = await asyncio.get_running_loop().run_in_executor(None, parse_register_archive, archive_bytes, class_name, BATCH_REGISTER_MAX_BYTES)
+        elif images:
+            items = []
+            for i, upload in enumerate(images):
+                parsed_id, parsed_name = get_student_info_from_filename(upload.filename or "")
+                items.append({
+                    "student_id": student_ids[i] if student_ids and i < len(student_ids) else (parsed_id or ""),
+                    "name": names[i] if names and i < len(names) else (parsed_name or ""),
+                    "class_name": (class_names[i] if class_names and i < len(class_names) else None) or class_name,
+                    "filename": upload.filename,
+                    "image_bytes": await upload.read()
+                })
+        else:
+            raise ValueError("请上传zip压缩包或图片文件")
+    except (ValueError, zipfile.BadZipFile) as e:
+        return JSONResponse(status_code=400, content={"success": False, "message": f"批量注册数据无效: {str(e)}"})
+    if not items:
+        return JSONResponse(status_code=400, content={"success": False, "message": "未找到可注册的图片"})
+    if len(items) > BATCH_REGISTER_MAX_ITEMS:
+        return JSONResponse(status_code=400, content={"success": False, "message": f"单次最多注册{BATCH_REGISTER_MAX_ITEMS}名学生"})
+
+    results = await asyncio.gather(*(extract_registration_features(item) for item in items))
+
+    # 同一批次中重复的学号只保留第一条提取成功的条目
+    mark_duplicate_students(results)
+
+    students = [result.pop("student") for result in results if result["success"]]
+    if students:
+        db_result = await run_db(db.register_students_batch, students)
+        if not db_result["success"]:
+            for result in results:
+                if result["success"]:
+                    result.update({"success": False, "message": db_result["message"]})
+            return JSONResponse(status_code=500, content={"success": False, "message": db_result["message"], "data": {"items": results}})
+        for result in results:
+            if result["success"]:
+                result["message"] = "学生信息注册/更新成功"
+    for result in results:
+        result.pop("student", None)
+
+    registered = len(students)
+    return {
+        "success": registered > 0,
+        "message": f"成功注册{registered}/{len(results)}名学生",
+        "data": {
+            "total": len(results),
+            "registered": registered,
+            "failed": len(results) - registered,
+            "items": results
+        }
+    }
+
 # 考勤记录接口
 #TODO: 新增剩下两种方案的考勤方法的后端api设计
 @app.post("/api/attendance", tags=["考勤管理"])
@@ -700,14 +1239,19 @@ async def record_attendance(
     student_id: Optional[str] = Form(None)
 ):
     """记录学生考勤"""
-    if arc_face is None:
+    if not use_model_workers("arcsoft") and await load_model("arcsoft") is None:
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": "虹软SDK未正确初始化"}
         )
-    image_path = save_upload_file(image)
-    # 1. 活体检测
-    liveness_result = arc_face.detect_liveness(image_path)
+    img_bytes, img = await read_upload_image(image)
+    if img is None:
+        return JSONResponse(status_code=400, content={"success": False, "message": "无法读取图片"})
+    audit_upload(img_bytes, image.filename)
+    # 同一帧的人脸检测结果在活体检测与特征提取之间共享
+    frame_ctx = FrameContext(img)
+    # 1. 活体检测（通过后复用同一次人脸检测提取特征）
+    liveness_result, feature_result = await analyze_arcsoft(img, frame_ctx)
     print(f"活体检测结果: {liveness_result}")
     if "liveness_list" in liveness_result and liveness_result["liveness_list"]:
         for item in liveness_result["liveness_list"]:
@@ -716,7 +1260,6 @@ async def record_attendance(
                 score = item["is_live"]
                 
     if not liveness_result["success"] or not liveness_result.get("is_live", False):
-        os.remove(image_path)
         return JSONResponse(
             status_code=400,
             content={
@@ -725,9 +1268,7 @@ async def record_attendance(
                 
             }
         )
-    feature_result = arc_face.extract_feature(image_path)
     if not feature_result["success"]:
-        os.remove(image_path)
         return JSONResponse(
             status_code=400,
             content={
@@ -736,12 +1277,11 @@ async def record_attendance(
                 
             }
         )
-    os.remove(image_path)
     current_feature = feature_result["feature_data"]
     similarity_threshold = 0.8
 
     if student_id:
-        feature_result = db.get_student_face_feature(student_id,"arcsoft")
+        feature_result = await run_db(db.get_student_face_feature, student_id, "arcsoft")
         if not feature_result["success"]:
             
             return JSONResponse(
@@ -751,7 +1291,7 @@ async def record_attendance(
                     "message": "该学生未注册人脸特征，无法考勤"
                 }
             )
-        compare_result = arc_face.compare_features(current_feature, feature_result["feature"])
+        compare_result = await compare_arcsoft(current_feature, feature_result["feature"])
         if not compare_result["success"] or compare_result["similarity"] < similarity_threshold:
             
             return JSONResponse(
@@ -768,13 +1308,15 @@ async def record_attendance(
             score = liveness_result["liveness_list"][0].get("is_live")
             if isinstance(score, float) and not np.isnan(score) and not np.isinf(score):
                 liveness_score = score
-        attendance_result = db.record_attendance(
+        attendance_result = await run_db(
+            db.record_attendance,
             student_id=student_id,
             liveness_score=liveness_score,
             detection_method=method,
             similarity=similarity,
             status=None
         )
+        attendance_result["pipeline"] = frame_ctx.report()
         
         return attendance_result
 
@@ -785,42 +1327,43 @@ async def record_attendance_silence(
     student_id: str = Form(...)
 ):
     """基于静默活体检测方案的考勤打卡"""
-    if silence_model is None:
+    silence_model = await load_model("silence")
+    liveness_model = await load_model("silence_liveness")
+    if silence_model is None or liveness_model is None:
         return {"success": False, "message": "静默活体检测模型未正确初始化"}
     image_path = save_upload_file(image)
     # 1. 活体检测
     # liveness_result = silence_model.detect_liveness(image_path)
     # print(f"活体检测结果: {liveness_result}")
 
-    model = SilentFaceModel(model_dir="D:\\dasanxia\\content_s\\lab6\\back_end\\SlientFaceAntiSpoofing\\resources\\anti_spoof_models", device_id=0)
-    liveness_result = model.detect_liveness(image_path)
+    liveness_result = await executors.run("silence", liveness_model.detect_liveness, image_path)
     print(f"活体检测结果: {liveness_result}")
     if not liveness_result['success'] or not liveness_result['is_live']:
         os.remove(image_path)
         return {"success": False, "message": '活体检测未通过'}
     # 2. 特征提取
-    feature_result = silence_model.extract_feature(image_path)
+    feature_result = await executors.run("silence", silence_model.extract_feature, image_path)
     os.remove(image_path)
     if not feature_result['success']:
         return {"success": False, "message": feature_result.get('message', '特征提取失败')}
     # 3. 获取学生静默特征（face_feature_3）
-    student = db.get_student(student_id)
-    if not student['success'] or not student['data'].get('face_feature_3'):
+    student = await run_db(db.get_student, student_id)
+    template = await run_db(db.get_student_template, student_id, "silence")
+    if not student['success'] or not template['success']:
         return {"success": False, "message": '未注册静默人脸特征（face_feature_3）'}
-    db_feature_bytes = student['data']['face_feature_3']
-    try:
-        db_feature = np.frombuffer(db_feature_bytes, dtype=np.float32)
-    except Exception as e:
-        return {"success": False, "message": f"特征转换失败: {str(e)}"}
+    db_feature = template['feature']
     # 4. 比对
-    compare_result = silence_model.compare_features(
+    compare_result = await executors.run(
+        "silence",
+        silence_model.compare_features,
         feature_result['feature_data'],
         db_feature
     )
     if not compare_result['success'] or not compare_result['is_match']:
         return {"success": False, "message": '人脸比对失败或不匹配', "similarity": compare_result.get('similarity', 0.0)}
     # 5. 记录考勤
-    db.record_attendance(
+    await run_db(
+        db.record_attendance,
         student_id=student_id,
         liveness_score=liveness_result.get('liveness_score', 0),
         detection_method='silence',
@@ -837,11 +1380,15 @@ async def record_attendance_deepface(
 ):
     """基于InsightFace的考勤打卡（含活体检测、特征提取、比对）"""
     try:
-        # 保存上传的图片到临时路径
-        image_path = save_upload_file(image)  
+        # 读取并解码上传图片（仅解码一次，各阶段共享，不落盘）
+        img_bytes, img = await read_upload_image(image)
+        if img is None:
+            return JSONResponse(status_code=400, content={"success": False, "message": "无法读取图片"})
+        audit_upload(img_bytes, image.filename)
+        frame_ctx = FrameContext(img)
         
         # ====================== 1. 活体检测 ======================
-        liveness_result = arc_face.detect_liveness(image_path)
+        liveness_result, _ = await analyze_arcsoft(img, frame_ctx, extract_feature=False)
         print(f"活体检测结果: {liveness_result}")
         if "liveness_list" in liveness_result and liveness_result["liveness_list"]:
             for item in liveness_result["liveness_list"]:
@@ -850,7 +1397,6 @@ async def record_attendance_deepface(
                     score = item["is_live"]
                     
         if not liveness_result["success"] or not liveness_result.get("is_live", False):
-            os.remove(image_path)
             return JSONResponse(
                 status_code=400,
                 content={
@@ -862,8 +1408,7 @@ async def record_attendance_deepface(
   
         
         # ====================== 2. 人脸检测与特征提取 ======================
-        detect_result = face_processor.detect_faces(image_path)
-        os.remove(image_path)  # 及时删除临时文件
+        detect_result = await extract_insightface_feature(img, frame_ctx)
         if not detect_result["success"]:
             return {"success": False, "message": detect_result["message"]}
         
@@ -871,24 +1416,22 @@ async def record_attendance_deepface(
         live_feature = np.array(detect_result["feature"], dtype=np.float32)
         
         # ====================== 3. 从数据库获取学生注册特征 ======================
-        student = db.get_student(student_id)
+        student = await run_db(db.get_student, student_id)
         if not student["success"]:
             return {"success": False, "message": "学生信息查询失败"}
-        if not student["data"].get("face_feature_2"):  
+        # 已解析的特征向量（缓存命中时不查库、不重复解析）
+        template = await run_db(db.get_student_template, student_id, "deepface")
+        if not template["success"]:
             return {"success": False, "message": "未注册人脸特征"}
-        
-        # 解析数据库中的特征字节流
-        db_feature_bytes = student["data"]["face_feature_2"]
-        try:
-            db_feature = np.frombuffer(db_feature_bytes, dtype=np.float32)
-        except Exception as e:
-            return {"success": False, "message": f"特征解析失败: {str(e)}"}
+        db_feature = template["feature"]
         
         # 验证特征维度
         if db_feature.shape[0] != 512 or live_feature.shape[0] != 512:
             return {"success": False, "message": "特征维度错误，必须为512维"}
         
         # ====================== 4. 人脸特征比对 ======================
+        # compare_features为静态方法，只做余弦相似度计算（多进程模式下本进程可能未加载InsightFace模型）
+        from face_model3.face_utils import FaceProcessor
         compare_result = FaceProcessor.compare_features(live_feature, db_feature)
         print(f"insightface比对结果: {compare_result}")
         if not compare_result["success"]:
@@ -905,7 +1448,8 @@ async def record_attendance_deepface(
             if isinstance(score, float) and not np.isnan(score) and not np.isinf(score):
                 liveness_score = score
 
-        attendance_record = db.record_attendance(
+        attendance_record = await run_db(
+            db.record_attendance,
             student_id=student_id,
             liveness_score=liveness_score,
             similarity=compare_result["similarity"],
@@ -920,28 +1464,82 @@ async def record_attendance_deepface(
         return {
             "success": True,
             "message": "打卡成功",
-            "student": {"student_id": student_id, "name": student['data']['name']}
+            "student": {"student_id": student_id, "name": student['data']['name']},
+            "pipeline": frame_ctx.report()
         }
     
     except Exception as e:
-        # 清理可能存在的临时文件
-        if "image_path" in locals() and os.path.exists(image_path):
-            os.remove(image_path)
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
     
 
 
 # 获取考勤记录
+ATTENDANCE_EXPORT_FIELDS = ["id", "student_id", "name", "class_name", "check_time", "status",
+                            "liveness_score", "detection_method", "similarity", "remark"]
+ATTENDANCE_STREAM_BATCH = 500
+
+def encode_attendance_batch(records, fmt):
+    """将一批考勤记录编码为NDJSON或CSV文本"""
+    if fmt == "ndjson":
+        return "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=ATTENDANCE_EXPORT_FIELDS, extrasaction="ignore")
+    writer.writerows(records)
+    return buffer.getvalue()
+
+def stream_attendance_records(fmt, first, batches):
+    """逐批编码考勤记录（由StreamingResponse在线程池中迭代，不阻塞事件循环）"""
+    try:
+        if fmt == "csv":
+            # 带BOM便于Excel识别UTF-8中文
+            yield "\ufeff" + ",".join(ATTENDANCE_EXPORT_FIELDS) + "\r\n"
+        if first:
+            yield encode_attendance_batch(first, fmt)
+        for records in batches:
+            yield encode_attendance_batch(records, fmt)
+    finally:
+        # 客户端中途断开时同样归还数据库连接
+        batches.close()
+
 @app.get("/api/attendance", tags=["考勤管理"])
 async def get_attendance(
     student_id: Optional[str] = None,
     start_date: Optional[str] = None,  
     end_date: Optional[str] = None,    
     method: Optional[str] = None,
-    class_name: Optional[str] = None
+    class_name: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: Optional[str] = None
 ):
-    """获取考勤记录"""
-    result = db.get_attendance_records(student_id, start_date, end_date, method, class_name)
+    """
+    获取考勤记录
+    - 指定limit时按(考勤时间, id)游标分页，返回next_cursor供下一页使用
+    - format为ndjson或csv时流式导出全部匹配记录（可配合cursor从指定位置继续）
+    - 均未指定时一次返回全部记录
+    """
+    try:
+        db.validate_date_range(start_date, end_date)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "message": str(e)})
+    if format in ("ndjson", "csv"):
+        try:
+            batches = db.iter_attendance_records(student_id, start_date, end_date, method, class_name,
+                                                 cursor=cursor, batch_size=ATTENDANCE_STREAM_BATCH)
+            # 预先取出首批，查询参数错误时返回JSON错误而不是中断的流
+            first = await run_db(next, batches, [])
+        except Exception as e:
+            print(f"导出考勤记录异常: {str(e)}")
+            return JSONResponse(status_code=400, content={"success": False, "message": f"导出考勤记录异常: {str(e)}"})
+        media_type = "application/x-ndjson" if format == "ndjson" else "text/csv; charset=utf-8"
+        headers = {"Content-Disposition": "attachment; filename=attendance.csv"} if format == "csv" else None
+        return StreamingResponse(stream_attendance_records(format, first, batches), media_type=media_type, headers=headers)
+    if format not in (None, "json"):
+        return JSONResponse(status_code=400, content={"success": False, "message": f"不支持的导出格式: {format}"})
+    if limit is not None or cursor:
+        return await run_db(db.get_attendance_records_page, student_id, start_date, end_date, method, class_name,
+                            limit or 100, cursor)
+    result = await run_db(db.get_attendance_records, student_id, start_date, end_date, method, class_name)
     return result
 
 # 获取考勤统计
@@ -952,20 +1550,25 @@ async def get_attendance_statistics(
     class_name: Optional[str] = None
 ):
     """获取考勤统计数据"""
-    result = db.get_attendance_statistics(start_date, end_date, class_name)
+    try:
+        db.validate_date_range(start_date, end_date)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "message": str(e)})
+    result = await run_db(db.get_attendance_statistics, start_date, end_date, class_name)
     return result
 
 # 获取SDK版本信息
 @app.get("/api/system/sdk-info", tags=["系统管理"])
 async def get_sdk_info(token_data: TokenData = Depends(check_teacher_role)):
     """获取SDK版本信息"""
+    arc_face = await load_model("arcsoft")
     if arc_face is None:
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": "虹软SDK未正确初始化"}
         )
     
-    version_info = arc_face.get_version()
+    version_info = await run_arcsoft(arc_face.get_version)
     return {
         "success": True,
         "data": {
@@ -974,85 +1577,333 @@ async def get_sdk_info(token_data: TokenData = Depends(check_teacher_role)):
         }
     }
 
-# 实时识别API
-def read_imagefile(file) -> np.ndarray:
-    image = np.frombuffer(file, np.uint8)
-    img = cv2.imdecode(image, cv2.IMREAD_COLOR)
-    return img
+# 就绪检查（供负载均衡/容器编排探测，无需认证）
+@app.get("/api/system/ready", tags=["系统管理"])
+async def get_system_ready():
+    """模型预热完成后返回200，预热中或有已启用的模型加载/预热失败时返回503；给出各模型的预热状态与预热后的单次推理耗时"""
+    report = models.report()
+    readiness = models.readiness(warmup_status)
+    ready = readiness["ready"]
+    data = {
+        "ready": ready,
+        "warmup": warmup_status,
+        "models": {name: dict(report["backends"][name], worker_processes=use_model_workers(name))
+                   for name in report["enabled"]},
+        "model_workers": model_workers.warm if model_workers is not None else None,
+        "failed": readiness["failed"]
+    }
+    content = {"success": ready, "message": readiness["message"], "data": data}
+    if not ready:
+        return JSONResponse(status_code=503, content=content)
+    return content
+
+# 运行指标
+@app.get("/api/system/metrics", tags=["系统管理"])
+async def get_system_metrics(token_data: TokenData = Depends(check_teacher_role)):
+    """获取推理流水线运行指标（模型加载状态、微批处理队列深度、批大小、各线程池饱和度、学生缓存命中率、人脸特征库、数据库连接池等）"""
+    arc_face = models.get("arcsoft") if models.is_loaded("arcsoft") else None
+    return {
+        "success": True,
+        "data": {
+            "startup": startup_timing,
+            "models": models.report(),
+            "batching": embedding_batcher.metrics() if embedding_batcher is not None else {"enabled": False},
+            "executors": executors.metrics(),
+            "arcsoft_engines": arc_face.engines.metrics() if arc_face is not None else {"enabled": False},
+            "student_cache": db.student_cache.stats(),
+            "face_gallery": face_gallery.stats(),
+            "frame_gate": frame_gate.metrics() if frame_gate is not None else {"enabled": False},
+            "tracking": kiosk_tracker.metrics() if kiosk_tracker is not None else {"enabled": False},
+            "streams": {conn_id: {"kiosk_id": conn["kiosk_id"], **conn["stats"].snapshot()}
+                        for conn_id, conn in stream_connections.items()},
+            "db_pool": db.pool.stats() if db.pool is not None else {"enabled": False},
+            "model_workers": model_workers.metrics() if model_workers is not None else {"enabled": False}
+        }
+    }
 
+# 1:N识别范围：auto(先班级分区后全库) / class(只在班级分区) / global(全库)
+RECOGNIZE_SCOPES = ("auto", "class", "global")
+
+def invalid_scope_message(scope):
+    """识别范围不受支持时返回错误信息，否则返回None"""
+    if scope in RECOGNIZE_SCOPES:
+        return None
+    return f"不支持的识别范围: {scope}，可选: {', '.join(RECOGNIZE_SCOPES)}"
+
+# 实时识别API
 @app.post("/api/face-recognize", tags=["实时识别"])
 async def face_recognize_api(
     image: UploadFile = File(...),
-    student_id: str = Form(None)
+    student_id: str = Form(None),
+    class_name: str = Form(None),
+    scope: str = Form("auto"),
+    kiosk_id: str = Form(None)
 ):
-    img_bytes = await image.read()
-    img = read_imagefile(img_bytes)
+    """
+    实时人脸识别
+    - 传入student_id时进行1:1比对
+    - 否则1:N识别：scope=auto时优先在当前考勤时段班级（或指定class_name）的分区内检索，
+      未匹配再回退全库；scope=class时只在班级分区内检索；scope=global时直接全库检索
+    - 传入kiosk_id时启用帧门控与跟踪模式：画面与上次识别时相比没有人脸尺度的变化时直接返回上次结果
+      （返回中的gate.state为duplicate/static，gate.skipped为该考勤机累计跳过的帧数）；
+      同一考勤机前持续出现的人脸只做人脸检测并复用上次识别结果，
+      返回中的tracking给出轨迹状态（new/reverify/retry表示本帧做了完整识别，tracked表示复用）
+    """
+    scope = scope or "auto"
+    scope_error = invalid_scope_message(scope)
+    if scope_error:
+        return JSONResponse(status_code=400, content={"success": False, "message": scope_error})
+    img_bytes, img = await read_upload_image(image)
     if img is None:
         return JSONResponse(status_code=400, content={"success": False, "message": "无法读取图片"})
-    # 活体检测
-    liveness_result = arc_face.detect_liveness_from_numpy(img)
+    frame_ctx = FrameContext(img)
+    if kiosk_id:
+        return await recognize_kiosk_frame(img, frame_ctx, kiosk_id, student_id, class_name, scope)
+    return await recognize_frame(img, frame_ctx, student_id, class_name, scope)
+
+async def recognize_kiosk_frame(img, frame_ctx, kiosk_id, student_id, class_name, scope):
+    """
+    考勤机连续帧识别：先经帧门控跳过画面未变化的帧，再经人脸跟踪决定是否完整识别
+
+    Returns:
+        dict: 与recognize_frame相同的返回，附加gate、tracking字段
+    """
+    key = (student_id, class_name, scope)
+    decision = None
+    if frame_gate is not None:
+        start = time.perf_counter()
+        decision = frame_gate.check(kiosk_id, img, key=key)
+        frame_ctx.record("gate", decision["state"], (time.perf_counter() - start) * 1000)
+        if decision["skip"]:
+            result = dict(decision["cached"])
+            result["gate"] = frame_gate.describe(decision)
+            result["pipeline"] = frame_ctx.report()
+            return result
+    if kiosk_tracker is not None:
+        result = await recognize_tracked_frame(img, frame_ctx, kiosk_id, student_id, class_name, scope)
+    else:
+        result = await recognize_frame(img, frame_ctx, student_id, class_name, scope)
+    if decision is not None:
+        frame_gate.update(kiosk_id, decision, result, key=key)
+        result["gate"] = frame_gate.describe(decision)
+    return result
+
+async def recognize_tracked_frame(img, frame_ctx, kiosk_id, student_id, class_name, scope):
+    """
+    跟踪模式的实时识别：人脸检测后关联考勤机轨迹，轨迹有效时直接返回缓存的识别结果
+
+    Returns:
+        dict: 与recognize_frame相同的返回，附加tracking字段
+    """
+    detection = await detect_arcsoft_faces(img, frame_ctx)
+    if not detection["success"]:
+        # 虹软SDK不可用时无法跟踪，退回逐帧完整识别
+        return await recognize_frame(img, frame_ctx, student_id, class_name, scope)
+    box = largest_face_box(detection.get("faces"))
+    track, reason = kiosk_tracker.associate(kiosk_id, box, key=(student_id, class_name, scope))
+    if track is None:
+        return {"success": False, "message": "未检测到人脸", "tracking": {"state": reason}, "pipeline": frame_ctx.report()}
+    if reason is None:
+        result = dict(track.result)
+    else:
+        result = await recognize_frame(img, frame_ctx, student_id, class_name, scope)
+        kiosk_tracker.update(kiosk_id, track, result)
+    result["tracking"] = kiosk_tracker.describe(track, reason)
+    result["pipeline"] = frame_ctx.report()
+    return result
+
+async def recognize_frame(img, frame_ctx, student_id, class_name, scope):
+    """单帧完整识别：活体检测，1:1比对或在特征库中1:N检索"""
+    # 活体检测（1:1比对时同时提取虹软特征，复用同一次人脸检测）
+    liveness_result, feature_result = await analyze_arcsoft(
+        img, frame_ctx, extract_feature=bool(student_id), require_live=False
+    )
     liveness_score = liveness_result.get("is_live")
     
-    # 特征提取
-    feature_result = arc_face.extract_feature_from_numpy(img)
-    if not feature_result["success"]:
-        return {"success": False, "message": feature_result.get("message", "特征提取失败")}
-    current_feature = feature_result["feature_data"]
-    similarity_threshold = 0.8
     # 1. 指定student_id精确比对
     if student_id:
-        db_feature_result = db.get_student_face_feature(student_id, "arcsoft")
+        if not feature_result["success"]:
+            return {"success": False, "message": feature_result.get("message", "特征提取失败")}
+        current_feature = feature_result["feature_data"]
+        similarity_threshold = 0.8
+        db_feature_result = await run_db(db.get_student_face_feature, student_id, "arcsoft")
         if not db_feature_result["success"]:
             return {
                 "success": False,
                 "message": "该学生未注册人脸特征，无法识别"
             }
-        compare_result = arc_face.compare_features(current_feature, db_feature_result["feature"])
+        compare_result = await compare_arcsoft(current_feature, db_feature_result["feature"])
         if not compare_result["success"] or compare_result["similarity"] < similarity_threshold:
             return {
                 "success": False,
                 "message": "人脸比对失败或不匹配",
                 "similarity": compare_result.get("similarity", 0.0)
             }
-        student_info = db.get_student(student_id)
+        student_info = await run_db(db.get_student, student_id)
         return {
             "success": True,
             "name": student_info["data"]["name"] if student_info["success"] else None,
             "student_id": student_id,
             "liveness_score": liveness_score,
-            "similarity": compare_result["similarity"]
+            "similarity": compare_result["similarity"],
+            "pipeline": frame_ctx.report()
         }
-    # # 2. 全库比对，返回最相似学生
-    # best_match = None
-    # best_similarity = 0
-    # best_student = None
-    # all_students = db.get_all_students()
-    # for stu in all_students.get("data", []):
-    #     stu_id = stu.get("student_id")
-    #     if not stu_id:
-    #         continue
-    #     db_feature_result = db.get_student_face_feature(stu_id, "arcsoft")
-    #     if not db_feature_result["success"]:
-    #         continue
-    #     compare_result = arc_face.compare_features(current_feature, db_feature_result["feature"])
-    #     if compare_result["success"] and compare_result["similarity"] > best_similarity:
-    #         best_similarity = compare_result["similarity"]
-    #         best_match = stu_id
-    #         best_student = stu
-    # if best_match and best_similarity > similarity_threshold:
-    #     return {
-    #         "success": True,
-    #         "name": best_student.get("name"),
-    #         "student_id": best_match,
-    #         "liveness_score": liveness_score,
-    #         "similarity": best_similarity
-    #     }
-    # else:
-    #     return {
-    #         "success": False,
-    #         "message": "未找到匹配学生",
-    #         "liveness_score": liveness_score
-    #     }
+    # 2. 全库比对：InsightFace特征在常驻特征库中一次矩阵运算检索最相似学生
+    detect_result = await extract_insightface_feature(img, frame_ctx)
+    if not detect_result["success"]:
+        return {"success": False, "message": detect_result["message"], "liveness_score": liveness_score}
+    class_names = None
+    if scope != "global":
+        class_names = [class_name] if class_name else await get_active_class_scope()
+        if scope == "class" and not class_names:
+            return {"success": False, "message": "当前时段没有需要考勤的班级", "liveness_score": liveness_score}
+    match, best = await executors.run(
+        "insightface",
+        face_gallery.identify,
+        detect_result["feature"],
+        class_names=class_names or None,
+        fallback=scope != "class"
+    )
+    if match is None:
+        return {
+            "success": False,
+            "message": "未找到匹配学生",
+            "liveness_score": liveness_score,
+            "similarity": best["similarity"] if best else 0.0
+        }
+    return {
+        "success": True,
+        "name": match["name"],
+        "student_id": match["student_id"],
+        "class_name": match["class_name"],
+        "liveness_score": liveness_score,
+        "similarity": match["similarity"],
+        "scope": match.get("scope", "global"),
+        "pipeline": frame_ctx.report()
+    }
+
+# 实时识别帧流：考勤机通过WebSocket持续发送二进制JPEG帧，每个连接一个处理协程，识别完成后取最新一帧继续处理，
+# 处理期间到达的旧帧被覆盖丢弃（latest-frame-wins），结果异步推送；单帧大小上限STREAM_MAX_FRAME_BYTES（默认2MB）
+STREAM_MAX_FRAME_BYTES = int(os.environ.get("STREAM_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+STREAM_OPTIONS = ("student_id", "class_name", "scope")
+stream_connections = {}
+
+async def send_stream_message(websocket: WebSocket, message: dict) -> bool:
+    """推送一条消息，连接已断开时返回False"""
+    try:
+        await websocket.send_json(jsonable_encoder(message))
+        return True
+    except (WebSocketDisconnect, RuntimeError):
+        return False
+
+async def process_stream_frames(websocket: WebSocket, slot: LatestFrameSlot, stats: StreamStats, kiosk_id: str, options: dict):
+    """帧流处理协程：循环取最新一帧，解码并识别后推送结果"""
+    loop = asyncio.get_running_loop()
+    while True:
+        frame = await slot.get()
+        if frame is None:
+            return
+        seq, img_bytes, received_at = frame
+        started = time.monotonic()
+        img = await loop.run_in_executor(None, decode_image_bytes, img_bytes)
+        if img is None:
+            stats.on_failed()
+            if not await send_stream_message(websocket, {"type": "error", "seq": seq, "message": "无法读取图片"}):
+                return
+            continue
+        frame_ctx = FrameContext(img)
+        try:
+            result = await recognize_kiosk_frame(img, frame_ctx, kiosk_id, **options)
+        except Exception as e:
+            print(f"帧流识别异常: {str(e)}")
+            result = {"success": False, "message": f"识别异常: {str(e)}"}
+        stats.on_processed(received_at, started, time.monotonic())
+        if not await send_stream_message(websocket, {"type": "result", "seq": seq, **result, "stream": stats.snapshot()}):
+            return
+
+@app.websocket("/api/ws/face-recognize")
+async def face_recognize_stream(
+    websocket: WebSocket,
+    kiosk_id: Optional[str] = None,
+    student_id: Optional[str] = None,
+    class_name: Optional[str] = None,
+    scope: str = "auto"
+):
+    """
+    实时识别帧流（WebSocket）
+    - 客户端发送二进制消息，每条为一帧JPEG图片；识别参数与/api/face-recognize相同，通过查询参数指定，
+      也可随时发送文本消息{"student_id": ..., "class_name": ..., "scope": ...}修改
+    - 服务端对每个处理完的帧推送{"type": "result", "seq": 帧序号, ...识别结果, "stream": 连接统计}，
+      识别期间到达的帧只保留最新一帧，其余丢弃（stream.dropped计数）
+    - 连接始终启用帧门控与跟踪模式，未指定kiosk_id时以连接为单位
+    - scope不受支持时：查询参数推送错误后以1008关闭连接，文本消息推送错误且该条配置不生效
+    """
+    await websocket.accept()
+    scope = scope or "auto"
+    scope_error = invalid_scope_message(scope)
+    if scope_error:
+        await send_stream_message(websocket, {"type": "error", "message": scope_error})
+        await websocket.close(code=1008)
+        return
+    conn_id = uuid.uuid4().hex[:12]
+    kiosk_id = kiosk_id or f"ws-{conn_id}"
+    options = {"student_id": student_id, "class_name": class_name, "scope": scope}
+    slot = LatestFrameSlot()
+    stats = StreamStats()
+    stream_connections[conn_id] = {"kiosk_id": kiosk_id, "stats": stats}
+    processor = asyncio.get_running_loop().create_task(process_stream_frames(websocket, slot, stats, kiosk_id, options))
+    seq = 0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                seq += 1
+                stats.on_received()
+                if len(message["bytes"]) > STREAM_MAX_FRAME_BYTES:
+                    stats.on_failed()
+                    await send_stream_message(websocket, {"type": "error", "seq": seq, "message": "图片过大"})
+                    continue
+                if slot.put((seq, message["bytes"], time.monotonic())):
+                    stats.on_dropped()
+            elif message.get("text"):
+                try:
+                    update = json.loads(message["text"])
+                except ValueError:
+                    await send_stream_message(websocket, {"type": "error", "message": "无法解析的文本消息"})
+                    continue
+                if isinstance(update, dict):
+                    update = {key: update[key] for key in STREAM_OPTIONS if key in update}
+                    if "scope" in update:
+                        update["scope"] = update["scope"] or "auto"
+                        scope_error = invalid_scope_message(update["scope"])
+                        if scope_error:
+                            # 整条配置不生效，保持原有参数
+                            await send_stream_message(websocket, {"type": "error", "message": scope_error})
+                            continue
+                    options.update(update)
+                    await send_stream_message(websocket, {"type": "config", "kiosk_id": kiosk_id, **options})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        slot.close()
+        processor.cancel()
+        await asyncio.gather(processor, return_exceptions=True)
+        stream_connections.pop(conn_id, None)
+        if kiosk_tracker is not None:
+            kiosk_tracker.reset(kiosk_id)
+        if frame_gate is not None:
+            frame_gate.reset(kiosk_id)
+
+# dlib人脸检测与68点关键点（在dlib线程池中执行）
+def detect_dlib_landmarks(frame, dlib_model):
+    detector, predictor = dlib_model
+    img_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    faces = detector(img_gray, 0)
+    if len(faces) != 1:
+        return len(faces), None
+    return 1, np.array([[p.x, p.y] for p in predictor(frame, faces[0]).parts()])
 
 # 交互式活体检测API
 @app.post("/api/interactive-liveness", tags=["活体检测"])
@@ -1105,15 +1956,16 @@ async def interactive_liveness(
     compare_point = session.get("compare_point")
 
     # dlib人脸检测
-    img_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = detector(img_gray, 0)
+    dlib_model = await load_model("dlib")
+    if dlib_model is None:
+        return JSONResponse(status_code=500, content={"success": False, "message": "dlib人脸关键点模型未启用或加载失败"})
+    face_count, landmarks = await executors.run("dlib", detect_dlib_landmarks, frame, dlib_model)
     step_name = steps[current]["name"]
     step_text = steps[current]["text"]
     passed = False
     msg = ""
 
-    if len(faces) == 1:
-        landmarks = np.array([[p.x, p.y] for p in predictor(frame, faces[0]).parts()])
+    if face_count == 1:
         size = frame.shape
         # 眨眼
         if step_name == "blink":
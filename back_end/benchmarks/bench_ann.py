@@ -0,0 +1,122 @@
+"""
+ANN索引召回率-延迟基准测试
+对比精确检索（矩阵-向量乘法）与IVF/HNSW近似检索的recall@k和单次查询延迟
+
+用法:
+    python benchmarks/bench_ann.py --size 50000 --queries 200
+    python benchmarks/bench_ann.py --db face_attendance.db   # 使用已注册的真实特征
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_gallery.ann import IVFIndex, HNSWIndex, hnswlib, _normalize
+
+
+def synthetic_gallery(size, dim, n_identities_per_cluster=50, seed=0):
+    """生成带聚类结构的合成特征，近似真实人脸特征在超球面上的分布"""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, size // n_identities_per_cluster)
+    centers = _normalize(rng.standard_normal((n_clusters, dim)))
+    labels = rng.integers(0, n_clusters, size)
+    vectors = _normalize(centers[labels] + 1.2 * rng.standard_normal((size, dim)) / np.sqrt(dim))
+    return vectors.astype(np.float32)
+
+
+def gallery_from_db(db_path, dim):
+    """从数据库读取face_feature_2构建测试集"""
+    from database import AttendanceDB
+    result = AttendanceDB(db_path).get_all_face_features("deepface")
+    vectors = [np.frombuffer(row["feature"], dtype=np.float32) for row in result.get("data", [])]
+    vectors = [v for v in vectors if v.shape[0] == dim]
+    if not vectors:
+        raise SystemExit("数据库中没有可用的512维特征")
+    return _normalize(np.vstack(vectors))
+
+
+def make_queries(gallery, n_queries, noise, seed=1):
+    """在库内特征上叠加噪声作为查询，模拟同一人的不同抓拍"""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, gallery.shape[0], n_queries)
+    noisy = gallery[picks] + noise * rng.standard_normal((n_queries, gallery.shape[1])) / np.sqrt(gallery.shape[1])
+    return _normalize(noisy).astype(np.float32)
+
+
+def exact_search(gallery, queries, k):
+    """精确检索，返回每个查询的top-k下标及平均延迟"""
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        scores = gallery @ q
+        idx = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+        results.append(set(idx[np.argsort(-scores[idx])].tolist()))
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return results, elapsed
+
+
+def ann_search(index, queries, k, **kwargs):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        results.append({item_id for item_id, _ in index.search(q, k, **kwargs)})
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return results, elapsed
+
+
+def recall(truth, found, k):
+    return float(np.mean([len(t & f) / min(k, len(t)) for t, f in zip(truth, found)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN索引召回率-延迟基准测试")
+    parser.add_argument("--db", help="使用数据库中的真实特征（默认使用合成特征）")
+    parser.add_argument("--size", type=int, default=50000, help="合成特征库规模")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.5, help="查询噪声强度")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    gallery = gallery_from_db(args.db, args.dim) if args.db else synthetic_gallery(args.size, args.dim)
+    queries = make_queries(gallery, args.queries, args.noise)
+    ids = list(range(gallery.shape[0]))
+    k = min(args.k, gallery.shape[0])
+    print(f"特征库规模: {gallery.shape[0]}, 维度: {gallery.shape[1]}, 查询数: {len(queries)}, k={k}")
+
+    truth, exact_latency = exact_search(gallery, queries, k)
+    truth_top1 = [{max(t, key=lambda i: float(gallery[i] @ q))} for t, q in zip(truth, queries)]
+    print(f"{'方法':<20}{'recall@1':>10}{'recall@k':>10}{'延迟(ms)':>12}{'加速比':>10}")
+    print(f"{'exact':<20}{1.0:>10.3f}{1.0:>10.3f}{exact_latency * 1000:>12.3f}{1.0:>10.2f}")
+
+    start = time.perf_counter()
+    ivf = IVFIndex(dim=args.dim)
+    ivf.build(ids, gallery)
+    print(f"IVF构建耗时: {time.perf_counter() - start:.2f}s, 倒排表数: {ivf.centroids.shape[0]}")
+    for nprobe in args.nprobe:
+        found, latency = ann_search(ivf, queries, k, nprobe=nprobe)
+        found1, _ = ann_search(ivf, queries, 1, nprobe=nprobe)
+        print(f"{'ivf nprobe=' + str(nprobe):<20}{recall(truth_top1, found1, 1):>10.3f}"
+              f"{recall(truth, found, k):>10.3f}{latency * 1000:>12.3f}{exact_latency / latency:>10.2f}")
+
+    if hnswlib is not None:
+        start = time.perf_counter()
+        hnsw = HNSWIndex(dim=args.dim)
+        hnsw.build(ids, gallery)
+        print(f"HNSW构建耗时: {time.perf_counter() - start:.2f}s")
+        for ef in (16, 32, 64, 128):
+            hnsw._index.set_ef(max(ef, k))
+            found, latency = ann_search(hnsw, queries, k)
+            found1, _ = ann_search(hnsw, queries, 1)
+            print(f"{'hnsw ef=' + str(ef):<20}{recall(truth_top1, found1, 1):>10.3f}"
+                  f"{recall(truth, found, k):>10.3f}{latency * 1000:>12.3f}{exact_latency / latency:>10.2f}")
+    else:
+        print("未安装hnswlib，跳过HNSW测试")
+
+
+if __name__ == "__main__":
+    main()
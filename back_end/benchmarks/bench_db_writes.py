@@ -0,0 +1,70 @@
+"""
+考勤写入吞吐量基准测试
+对比每次调用新建连接（旧实现，rollback日志模式）与连接池长连接（WAL模式）下
+record_attendance每秒写入次数
+
+用法:
+    python benchmarks/bench_db_writes.py --checkins 2000 --threads 1 4
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AttendanceDB
+
+
+def seed(db, students):
+    """创建班级、考勤规则和学生"""
+    class_id = db.create_class("bench_class", description="benchmark")["class_id"]
+    db.create_attendance_rule(class_id, "08:00", "09:40", weekdays="1,2,3,4,5,6,7")
+    ids = [f"B{i:05d}" for i in range(students)]
+    for student_id in ids:
+        db.register_student(student_id, f"学生{student_id}", class_name="bench_class")
+    return ids
+
+
+def run_checkins(db, student_ids, checkins, threads):
+    """并发执行打卡写入，返回(每秒写入数, 失败次数)"""
+    def checkin(i):
+        result = db.record_attendance(student_ids[i % len(student_ids)], liveness_score=0.9,
+                                      detection_method="bench", similarity=0.95)
+        return result["success"]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(checkin, range(checkins)))
+    elapsed = time.perf_counter() - start
+    return checkins / elapsed, results.count(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="考勤写入吞吐量基准测试")
+    parser.add_argument("--checkins", type=int, default=2000)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--student-cache", action="store_true", help="连接池模式下同时启用学生信息缓存")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{'模式':<24}{'线程数':<8}{'写入/秒':>10}{'失败':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, pool_size in (("每次新建连接", 0), ("连接池+WAL", 8)):
+            for threads in args.threads:
+                db_path = os.path.join(tmp, f"bench_{pool_size}_{threads}.db")
+                db = AttendanceDB(db_path, pool_size=pool_size)
+                if pool_size and args.student_cache:
+                    db.enable_student_cache()
+                student_ids = seed(db, args.students)
+                rate, failures = run_checkins(db, student_ids, args.checkins, threads)
+                print(f"{label:<24}{threads:<8}{rate:>10.1f}{failures:>8}")
+                db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+CPU推理模式基准测试：PyTorch eager / 默认onnxruntime会话 vs 优化的onnxruntime会话
+每种配置在独立的spawn子进程中加载模型，统计：
+- 模型加载耗时、加载后常驻内存增量、进程峰值内存
+- 单帧各阶段延迟（平均/P50/P95）：完整单帧流程，以及识别/活体模型单独推理
+- 以--concurrency个线程并发推理时的吞吐量（多个线程共用同一模型实例，对应INSIGHTFACE_WORKERS等线程池）
+
+用法:
+    python benchmarks/bench_onnx_runtime.py --images uploads/ --iterations 100
+    python benchmarks/bench_onnx_runtime.py --configs silence-torch silence-onnx --concurrency 1
+    python benchmarks/bench_onnx_runtime.py --configs insightface-default insightface-tuned --concurrency 2
+未指定--images时使用合成帧（检测不到人脸，完整流程只包含检测阶段，识别/活体模型阶段不受影响）
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CONFIGS = ("silence-torch", "silence-onnx", "insightface-default", "insightface-tuned")
+
+
+def rss_mb():
+    """当前常驻内存（MB），无法获取时返回None"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        return None
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存（MB），无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 / 1024
+        except (ImportError, AttributeError):
+            return None
+
+
+def load_frames(image_dir, count, size):
+    frames = []
+    if image_dir:
+        paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")) + glob.glob(os.path.join(image_dir, "*.png")))
+        for path in paths[:count]:
+            img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is not None:
+                frames.append(img)
+    if not frames:
+        from pipeline.warmup import synthetic_face_frame
+        frames = [synthetic_face_frame(*size, seed=i) for i in range(max(1, count))]
+    return frames
+
+
+def create_stages(config, threads, onnx_dir):
+    """创建模型并返回[(阶段名称, fn(frame))]"""
+    rng = np.random.default_rng(0)
+    if config.startswith("silence"):
+        import torch
+        from face_model2.silence import SilentFaceRecognitionModel
+        options = {"backend": "onnx", "onnx_dir": onnx_dir, "intra_op_threads": threads} if config == "silence-onnx" else {}
+        model = SilentFaceRecognitionModel(device="cpu", **options)
+        face = torch.from_numpy(rng.standard_normal((1, 3, 160, 160)).astype(np.float32))
+        patch = torch.from_numpy(rng.standard_normal((1, 3, 80, 80)).astype(np.float32))
+        return [
+            ("单帧(特征+活体)", lambda frame: (model.extract_feature_from_numpy(frame), model.detect_liveness_from_numpy(frame))),
+            ("FaceNet", lambda frame: model._facenet_embeddings(face)),
+            ("MiniFASNetV2", lambda frame: model._liveness_probs(patch))
+        ]
+    from face_model3.face_utils import FaceProcessor
+    from pipeline.onnx_runtime import default_intra_op_threads
+    options = {"intra_op_threads": threads or default_intra_op_threads(2)} if config == "insightface-tuned" else {}
+    model = FaceProcessor(**options)
+    rec_model = model.face_app.models["recognition"]
+    crop = rng.integers(0, 256, (rec_model.input_size[0], rec_model.input_size[0], 3), dtype=np.uint8)
+    return [
+        ("单帧(检测+识别)", model.detect_faces_from_numpy),
+        ("识别模型", lambda frame: rec_model.get_feat([crop]))
+    ]
+
+
+def bench_config(config, frames, iterations, concurrency, threads, onnx_dir):
+    """子进程中运行：加载模型并测量延迟、内存和吞吐量"""
+    base = rss_mb()
+    started = time.perf_counter()
+    stages = create_stages(config, threads, onnx_dir)
+    load_ms = (time.perf_counter() - started) * 1000
+    loaded = rss_mb()
+
+    result = {"config": config, "load_ms": load_ms, "stages": {},
+              "rss_mb": loaded - base if base is not None and loaded is not None else None}
+    for name, fn in stages:
+        for frame in frames[:3]:
+            fn(frame)
+        latencies = []
+        for i in range(iterations):
+            frame = frames[i % len(frames)]
+            begin = time.perf_counter()
+            fn(frame)
+            latencies.append((time.perf_counter() - begin) * 1000)
+        result["stages"][name] = {
+            "mean": float(np.mean(latencies)),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95))
+        }
+
+    frame_fn = stages[0][1]
+    work = [frames[i % len(frames)] for i in range(iterations)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        begin = time.perf_counter()
+        list(pool.map(frame_fn, work))
+        result["throughput"] = len(work) / (time.perf_counter() - begin)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def fmt_mb(value):
+    return f"{value:.0f}MB" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU推理模式延迟与内存基准测试")
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=CONFIGS)
+    parser.add_argument("--images", default=None, help="测试图像目录（含人脸时测量完整流程）")
+    parser.add_argument("--frames", type=int, default=20, help="使用的帧数")
+    parser.add_argument("--size", default="640x480", help="合成帧分辨率")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1, help="吞吐量测试的并发线程数")
+    parser.add_argument("--threads", type=int, default=None, help="onnxruntime算子内线程数（默认按并发线程数均分CPU核）")
+    parser.add_argument("--onnx-dir", default=None, help="静默活体ONNX模型目录（缺少时自动导出）")
+    args = parser.parse_args()
+
+    from pipeline.warmup import parse_frame_size
+    frames = load_frames(args.images, args.frames, parse_frame_size(args.size))
+    threads = args.threads
+    if threads is None:
+        from pipeline.onnx_runtime import default_intra_op_threads
+        threads = default_intra_op_threads(args.concurrency)
+    print(f"帧数: {len(frames)}, 分辨率: {frames[0].shape[1]}x{frames[0].shape[0]}, 迭代: {args.iterations}, "
+          f"并发线程: {args.concurrency}, onnxruntime算子内线程: {threads}")
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for config in args.configs:
+        with ctx.Pool(1) as pool:
+            try:
+                results.append(pool.apply(bench_config, (config, frames, args.iterations, args.concurrency,
+                                                         threads, args.onnx_dir)))
+            except Exception as e:
+                print(f"{config}: 运行失败 - {str(e)}")
+
+    print(f"\n{'配置':<22}{'加载耗时':>10}{'常驻内存':>10}{'峰值内存':>10}{'吞吐量':>12}")
+    for result in results:
+        print(f"{result['config']:<22}{result['load_ms']:>8.0f}ms{fmt_mb(result['rss_mb']):>10}"
+              f"{fmt_mb(result['peak_rss_mb']):>10}{result['throughput']:>9.1f}帧/秒")
+    print(f"\n{'配置':<22}{'阶段':<18}{'平均':>10}{'P50':>10}{'P95':>10}")
+    for result in results:
+        for stage, stats in result["stages"].items():
+            print(f"{result['config']:<22}{stage:<18}{stats['mean']:>8.2f}ms{stats['p50']:>8.2f}ms{stats['p95']:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
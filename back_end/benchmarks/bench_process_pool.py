@@ -0,0 +1,79 @@
+"""
+多进程模型工作池吞吐量基准测试
+以不同工作进程数并发提交同一批帧，统计每秒处理帧数和相对单进程的扩展效率
+
+用法:
+    python benchmarks/bench_process_pool.py --task insightface_detect --images uploads/ --workers 1 2 4 8
+    python benchmarks/bench_process_pool.py --task ping   # 只测共享内存传帧开销，无需模型
+"""
+import os
+import sys
+import glob
+import time
+import asyncio
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline.process_pool import ModelProcessPool
+
+TASK_BACKENDS = {
+    "ping": (),
+    "arcsoft_analyze": ("arcsoft",),
+    "insightface_detect": ("insightface",),
+    "silence_feature": ("silence",)
+}
+
+
+def load_frames(image_dir, count, size):
+    """读取目录中的图片作为测试帧，没有图片时生成随机帧"""
+    frames = []
+    if image_dir:
+        for path in sorted(glob.glob(os.path.join(image_dir, "*")))[:count]:
+            img = cv2.imread(path)
+            if img is not None:
+                frames.append(img)
+    if not frames:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8) for _ in range(min(count, 16))]
+    return frames
+
+
+async def measure(workers, task, frames, total):
+    pool = ModelProcessPool(workers, backends=TASK_BACKENDS[task])
+    try:
+        await pool.start()
+        # 预热：每个进程至少处理一帧，排除模型首帧开销
+        await asyncio.gather(*[pool.run(task, frames[i % len(frames)]) for i in range(workers * 2)])
+        start = time.perf_counter()
+        await asyncio.gather(*[pool.run(task, frames[i % len(frames)]) for i in range(total)])
+        elapsed = time.perf_counter() - start
+        return total / elapsed, pool.metrics()
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程模型工作池吞吐量基准测试")
+    parser.add_argument("--task", default="insightface_detect", choices=sorted(TASK_BACKENDS))
+    parser.add_argument("--images", help="测试图片目录（默认使用随机帧）")
+    parser.add_argument("--frames", type=int, default=200, help="每轮提交的帧数")
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 480], help="随机帧宽高")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.frames, args.size)
+    print(f"任务: {args.task}, 测试帧: {len(frames)}张, 每轮{args.frames}帧, CPU核数: {os.cpu_count()}")
+    print(f"{'进程数':<8}{'帧/秒':>10}{'扩展效率':>10}{'单帧耗时(ms)':>14}{'槽位等待(ms)':>14}")
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        fps, metrics = asyncio.run(measure(workers, args.task, frames, args.frames))
+        baseline = baseline or fps / workers
+        print(f"{workers:<8}{fps:>10.1f}{fps / (baseline * workers):>10.2f}"
+              f"{metrics['avg_run_ms']:>14.2f}{metrics['avg_slot_wait_ms']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
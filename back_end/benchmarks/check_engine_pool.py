@@ -0,0 +1,123 @@
+"""
+虹软引擎句柄池检查
+使用face_sdk/stub下的桩库（无需真实SDK），多线程并发调用ArcFaceSDK：
+1. 不经句柄池直接并发调用同一句柄，确认桩库能检测到冲突
+2. 经句柄池并发执行活体检测/特征提取/比对，结果与单线程逐一一致且无句柄冲突
+3. 不同句柄数下的吞吐量
+4. release后全部引擎句柄被释放
+
+用法:
+    python benchmarks/check_engine_pool.py --threads 8 --pool-sizes 1 2 4 8
+    python benchmarks/check_engine_pool.py --lib /path/to/libarcsoft_face_engine.so
+"""
+import os
+import sys
+import time
+import ctypes
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_sdk.arc_face_sdk import ArcFaceSDK, ASF_MultiFaceInfo, ASVL_PAF_RGB24_B8G8R8
+
+STUB_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "face_sdk", "stub", "arcsoft_stub.c")
+
+
+def build_stub(output_dir):
+    """编译桩库"""
+    lib_path = os.path.join(output_dir, "libarcsoft_face_engine.so")
+    subprocess.run(["cc", "-shared", "-fPIC", "-O2", "-o", lib_path, STUB_SOURCE], check=True)
+    return lib_path
+
+
+def make_frames(count, seed=0):
+    """生成测试帧：中心像素决定是否有人脸/是否真人，其余像素随机"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        img = rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+        img[120, 160, 0] = (0, 60, 200)[i % 3]  # 无人脸 / 非真人 / 真人
+        frames.append(img)
+    return frames
+
+
+def analyze(sdk, img, reference):
+    """单帧完整流程：活体检测 -> 特征提取 -> 与参考特征比对"""
+    liveness = sdk.detect_liveness_from_numpy(img)
+    feature = sdk.extract_feature_from_numpy(img)
+    similarity = None
+    if feature["success"]:
+        similarity = sdk.compare_features(feature["feature_data"], reference)["similarity"]
+    return (liveness.get("success"), liveness.get("is_live"), feature.get("success"),
+            feature.get("feature_data"), similarity)
+
+
+def check_raw_conflicts(sdk, frame, threads):
+    """绕过句柄池，多线程直接使用同一句柄，桩库应记录到冲突"""
+    sdk.lib.StubResetConflicts()
+    height, width = frame.shape[:2]
+    data = frame.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte))
+
+    def call(_):
+        for _ in range(20):
+            sdk.ASFDetectFaces(sdk.handle, width, height, ASVL_PAF_RGB24_B8G8R8, data,
+                               ctypes.pointer(ASF_MultiFaceInfo()))
+
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(call, range(threads)))
+    return sdk.lib.StubGetConflicts()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="虹软引擎句柄池检查")
+    parser.add_argument("--lib", help="已编译的桩库路径（默认从face_sdk/stub编译）")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lib_path = args.lib or build_stub(tmp)
+        frames = make_frames(args.frames)
+
+        # 单线程基准结果
+        single = ArcFaceSDK(lib_path=lib_path, pool_size=1)
+        single.lib.StubGetConflicts.restype = ctypes.c_long
+        single.lib.StubGetEngineCount.restype = ctypes.c_long
+        reference = single.extract_feature_from_numpy(frames[2])["feature_data"]
+        expected = [analyze(single, img, reference) for img in frames]
+        print(f"桩库: {lib_path}, 版本: {single.get_version()['version']}")
+        print(f"不经句柄池并发调用同一句柄的冲突次数: {check_raw_conflicts(single, frames[2], args.threads)}")
+        single.release()
+
+        failures = 0
+        print(f"{'句柄数':<8}{'线程数':<8}{'帧/秒':>10}{'结果不一致':>12}{'句柄冲突':>10}{'平均等待(ms)':>14}")
+        for pool_size in args.pool_sizes:
+            sdk = ArcFaceSDK(lib_path=lib_path, pool_size=pool_size)
+            sdk.lib.StubResetConflicts()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.threads) as executor:
+                results = list(executor.map(lambda img: analyze(sdk, img, reference), frames))
+            fps = len(frames) / (time.perf_counter() - start)
+            mismatches = sum(1 for got, want in zip(results, expected) if got != want)
+            conflicts = sdk.lib.StubGetConflicts()
+            metrics = sdk.engines.metrics()
+            print(f"{pool_size:<8}{args.threads:<8}{fps:>10.1f}{mismatches:>12}{conflicts:>10}{metrics['avg_wait_ms']:>14.2f}")
+            failures += mismatches + conflicts
+            sdk.release()
+
+        remaining = single.lib.StubGetEngineCount()
+        print(f"释放后剩余引擎句柄: {remaining}")
+        failures += remaining
+    print("检查通过" if failures == 0 else "检查失败")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
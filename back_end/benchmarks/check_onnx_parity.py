@@ -0,0 +1,146 @@
+"""
+ONNX Runtime推理数值一致性检查
+1. FaceNet / MiniFASNetV2：导出的ONNX模型（图优化+IO绑定）与PyTorch eager推理的输出对比（batch=1和batch=4）
+2. 静默活体方案完整流程：backend='onnx'与backend='torch'对同一批图像的特征余弦相似度、活体分数差
+3. InsightFace：调优线程数/图优化的会话与默认会话的识别特征对比
+超出容差时返回非0退出码
+
+用法:
+    python benchmarks/check_onnx_parity.py
+    python benchmarks/check_onnx_parity.py --images uploads/ --liveness-model /path/to/2.7_80x80_MiniFASNetV2.pth
+    python benchmarks/check_onnx_parity.py --skip-insightface
+"""
+import os
+import sys
+import glob
+import argparse
+import tempfile
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline.onnx_runtime import OrtRunner, default_intra_op_threads
+
+# 容差：特征取余弦相似度下限，logits/概率取最大绝对误差上限
+MIN_COSINE = 0.9999
+MAX_LOGIT_DIFF = 1e-3
+MAX_PROB_DIFF = 1e-4
+
+
+def cosine(a, b):
+    """逐行余弦相似度"""
+    a = np.atleast_2d(np.asarray(a, dtype=np.float64))
+    b = np.atleast_2d(np.asarray(b, dtype=np.float64))
+    return np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+
+
+def report(name, ok, detail):
+    print(f"[{'通过' if ok else '失败'}] {name}: {detail}")
+    return ok
+
+
+def load_images(image_dir, limit):
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")) + glob.glob(os.path.join(image_dir, "*.png")))
+    images = []
+    for path in paths[:limit]:
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is not None:
+            images.append(img)
+    return images
+
+
+def check_silence(args, images):
+    import torch
+    from face_model2.silence import SilentFaceRecognitionModel
+
+    options = {"device": "cpu"}
+    if args.liveness_model:
+        options["liveness_model_path"] = args.liveness_model
+    torch_model = SilentFaceRecognitionModel(**options)
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = torch_model.export_onnx(tmp)
+        runners = {name: OrtRunner(path, intra_op_threads=args.threads) for name, path in paths.items()}
+        rng = np.random.default_rng(0)
+        for batch in (1, 4):
+            x = rng.standard_normal((batch, 3, 160, 160)).astype(np.float32)
+            with torch.no_grad():
+                expected = torch_model.facenet(torch.from_numpy(x)).numpy()
+            actual = runners["facenet"].run(x)[0].copy()
+            sims = cosine(expected, actual)
+            ok &= report(f"FaceNet batch={batch}", sims.min() >= MIN_COSINE,
+                         f"最小余弦相似度 {sims.min():.7f}, 最大绝对误差 {np.abs(expected - actual).max():.2e}")
+
+            x = rng.standard_normal((batch, 3, 80, 80)).astype(np.float32)
+            with torch.no_grad():
+                expected = torch_model.liveness_model(torch.from_numpy(x)).numpy()
+            actual = runners["minifasnet"].run(x)[0].copy()
+            diff = np.abs(expected - actual).max()
+            ok &= report(f"MiniFASNetV2 batch={batch}", diff <= MAX_LOGIT_DIFF, f"logits最大绝对误差 {diff:.2e}")
+
+        if images:
+            onnx_model = SilentFaceRecognitionModel(backend="onnx", onnx_dir=tmp, intra_op_threads=args.threads, **options)
+            compared = 0
+            for img in images:
+                expected, actual = torch_model.extract_feature_from_numpy(img), onnx_model.extract_feature_from_numpy(img)
+                if expected["success"] != actual["success"]:
+                    ok &= report("静默活体特征提取", False, "两种后端的人脸检测结果不一致")
+                    continue
+                live_expected, live_actual = torch_model.detect_liveness_from_numpy(img), onnx_model.detect_liveness_from_numpy(img)
+                if expected["success"]:
+                    sim = cosine(expected["feature_data"], actual["feature_data"])[0]
+                    ok &= report("静默活体特征提取", sim >= MIN_COSINE, f"余弦相似度 {sim:.7f}")
+                    compared += 1
+                if live_expected["success"] and live_actual["success"]:
+                    diff = abs(live_expected["liveness_score"] - live_actual["liveness_score"])
+                    ok &= report("静默活体检测", diff <= MAX_PROB_DIFF and live_expected["is_live"] == live_actual["is_live"],
+                                 f"活体分数差 {diff:.2e}")
+            print(f"静默活体完整流程: 对比{compared}/{len(images)}张图像")
+    return ok
+
+
+def check_insightface(args, images):
+    from face_model3.face_utils import FaceProcessor
+
+    default = FaceProcessor()
+    tuned = FaceProcessor(intra_op_threads=args.threads or default_intra_op_threads(2))
+    rng = np.random.default_rng(1)
+    rec_default, rec_tuned = default.face_app.models["recognition"], tuned.face_app.models["recognition"]
+    size = rec_default.input_size[0]
+    crops = [rng.integers(0, 256, (size, size, 3), dtype=np.uint8) for _ in range(4)]
+    sims = cosine(rec_default.get_feat(crops), rec_tuned.get_feat(crops))
+    ok = report("InsightFace识别模型", sims.min() >= MIN_COSINE, f"最小余弦相似度 {sims.min():.7f}")
+    for img in images:
+        expected, actual = default.detect_faces_from_numpy(img), tuned.detect_faces_from_numpy(img)
+        if expected["success"] != actual["success"]:
+            ok &= report("InsightFace检测+识别", False, "两种会话的人脸检测结果不一致")
+        elif expected["success"]:
+            sim = cosine(expected["feature"], actual["feature"])[0]
+            ok &= report("InsightFace检测+识别", sim >= MIN_COSINE, f"余弦相似度 {sim:.7f}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX Runtime推理数值一致性检查")
+    parser.add_argument("--images", default=None, help="含人脸的测试图像目录（可选，用于完整流程对比）")
+    parser.add_argument("--limit", type=int, default=20, help="最多使用的图像数")
+    parser.add_argument("--liveness-model", default=None, help="MiniFASNetV2权重路径")
+    parser.add_argument("--threads", type=int, default=None, help="onnxruntime算子内线程数")
+    parser.add_argument("--skip-silence", action="store_true")
+    parser.add_argument("--skip-insightface", action="store_true")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit) if args.images else []
+    ok = True
+    if not args.skip_silence:
+        ok &= check_silence(args, images)
+    if not args.skip_insightface:
+        ok &= check_insightface(args, images)
+    print("全部通过" if ok else "存在超出容差的结果")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
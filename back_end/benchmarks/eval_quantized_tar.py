@@ -0,0 +1,177 @@
+"""
+INT8量化模型精度回归：在本地标注数据集上对比FP32与量化模型的1:1验证准确率（TAR@FAR）和特征提取延迟
+数据集目录每个子目录为一个人（子目录名为身份标签），子目录内为该人的人脸图片：
+    dataset/
+        2021001/ a.jpg b.jpg ...
+        2021002/ ...
+每种配置在独立的spawn子进程中加载模型并提取全部图片的特征，之后：
+- 同一身份的所有图片对为正样本对，不同身份的为负样本对，余弦相似度作为分数
+- 按负样本对分数确定FAR=1e-1/1e-2/1e-3的阈值，报告对应的TAR（负样本对数量不足1/FAR时不报告）
+- 量化模型与同一后端FP32模型在同一图片上的特征余弦相似度
+- 平均单张特征提取耗时
+silence的FP32配置同样使用ONNX Runtime推理，差异只来自量化
+
+用法:
+    python benchmarks/eval_quantized_tar.py --dataset /data/labelled_faces --calibration-dir uploads/
+    python benchmarks/eval_quantized_tar.py --dataset /data/labelled_faces --configs insightface-fp32 insightface-static --force
+校准集不应与评测数据集重叠，否则static量化的结果偏乐观
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CONFIGS = ("insightface-fp32", "insightface-dynamic", "insightface-static",
+           "silence-fp32", "silence-dynamic", "silence-static")
+FAR_LEVELS = (1e-1, 1e-2, 1e-3)
+
+
+def load_dataset(dataset_dir, per_identity=None):
+    """
+    读取标注数据集
+
+    Returns:
+        (图片路径列表, 身份标签列表)
+    """
+    paths, labels = [], []
+    for identity in sorted(os.listdir(dataset_dir)):
+        identity_dir = os.path.join(dataset_dir, identity)
+        if not os.path.isdir(identity_dir):
+            continue
+        images = sorted(path for path in glob.glob(os.path.join(identity_dir, "*"))
+                        if path.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+        for path in images[:per_identity]:
+            paths.append(path)
+            labels.append(identity)
+    return paths, labels
+
+
+def create_extractor(config, args):
+    """创建模型并返回fn(BGR图像) -> 特征向量或None"""
+    backend, precision = config.split("-")
+    quantization = None if precision == "fp32" else precision
+    options = {"quantization": quantization, "calibration_dir": args.calibration_dir, "force_quantize": args.force}
+    if backend == "insightface":
+        from face_model3.face_utils import FaceProcessor
+        model = FaceProcessor(intra_op_threads=args.threads, **options)
+
+        def extract(img):
+            result = model.detect_faces_from_numpy(img)
+            return result["feature"] if result["success"] else None
+        return extract
+
+    from face_model2.silence import SilentFaceRecognitionModel
+    model = SilentFaceRecognitionModel(device="cpu", backend="onnx", onnx_dir=args.onnx_dir,
+                                       intra_op_threads=args.threads, **options)
+
+    def extract(img):
+        result = model.extract_feature_from_numpy(img)
+        return result["feature_data"] if result["success"] else None
+    return extract
+
+
+def extract_config(config, paths, args):
+    """子进程中运行：提取全部图片的特征，未检测到人脸的图片对应行为NaN"""
+    extract = create_extractor(config, args)
+    embeddings, latencies = [], []
+    for path in paths:
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        begin = time.perf_counter()
+        feature = extract(img) if img is not None else None
+        latencies.append((time.perf_counter() - begin) * 1000)
+        embeddings.append(None if feature is None else np.asarray(feature, dtype=np.float32).ravel())
+    dim = next((len(e) for e in embeddings if e is not None), 1)
+    matrix = np.full((len(paths), dim), np.nan, dtype=np.float32)
+    for i, embedding in enumerate(embeddings):
+        if embedding is not None:
+            matrix[i] = embedding / (np.linalg.norm(embedding) + 1e-12)
+    return {"config": config, "embeddings": matrix, "latency_ms": float(np.mean(latencies[1:] or latencies))}
+
+
+def pair_scores(embeddings, labels):
+    """
+    计算所有有效图片对的余弦相似度
+
+    Returns:
+        (正样本对分数, 负样本对分数)
+    """
+    valid = ~np.isnan(embeddings).any(axis=1)
+    embeddings, labels = embeddings[valid], np.asarray(labels)[valid]
+    scores = embeddings @ embeddings.T
+    upper = np.triu(np.ones(scores.shape, dtype=bool), k=1)
+    same = labels[:, None] == labels[None, :]
+    return scores[upper & same], scores[upper & ~same]
+
+
+def tar_at_far(genuine, impostor, far):
+    """
+    给定FAR下的TAR：阈值取使负样本对误接受比例不超过far的最小分数
+
+    Returns:
+        (TAR, 阈值)，负样本对不足1/far或没有正样本对时返回(None, None)
+    """
+    if len(genuine) == 0 or len(impostor) < 1 / far:
+        return None, None
+    threshold = float(np.quantile(impostor, 1 - far, method="higher"))
+    return float(np.mean(genuine > threshold)), threshold
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8量化模型TAR@FAR精度回归")
+    parser.add_argument("--dataset", required=True, help="标注数据集目录（每个身份一个子目录）")
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=CONFIGS)
+    parser.add_argument("--calibration-dir", default=None, help="static量化校准图片目录（默认uploads）")
+    parser.add_argument("--per-identity", type=int, default=None, help="每个身份最多使用的图片数")
+    parser.add_argument("--threads", type=int, default=None, help="onnxruntime算子内线程数")
+    parser.add_argument("--onnx-dir", default=None, help="静默活体ONNX模型目录（缺少时自动导出）")
+    parser.add_argument("--force", action="store_true", help="忽略已缓存的量化模型，重新量化（更换校准集后使用）")
+    args = parser.parse_args()
+
+    args.calibration_dir = args.calibration_dir or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+    if os.path.abspath(args.calibration_dir) == os.path.abspath(args.dataset):
+        print("警告: 校准集与评测数据集相同，static量化的结果偏乐观")
+    paths, labels = load_dataset(args.dataset, args.per_identity)
+    if not paths:
+        print(f"数据集中没有图片: {args.dataset}")
+        return 1
+    print(f"身份数: {len(set(labels))}, 图片数: {len(paths)}")
+
+    ctx = mp.get_context("spawn")
+    results = {}
+    for config in args.configs:
+        with ctx.Pool(1) as pool:
+            try:
+                results[config] = pool.apply(extract_config, (config, paths, args))
+            except Exception as e:
+                print(f"{config}: 运行失败 - {str(e)}")
+
+    far_header = "".join(f"{'TAR@FAR=' + format(far, 'g'):>16}" for far in FAR_LEVELS)
+    print(f"\n{'配置':<22}{'有效图片':>8}{'正/负样本对':>16}{far_header}{'与FP32一致性':>14}{'单张耗时':>10}")
+    for config, result in results.items():
+        embeddings = result["embeddings"]
+        genuine, impostor = pair_scores(embeddings, labels)
+        row = f"{config:<22}{int((~np.isnan(embeddings).any(axis=1)).sum()):>8}{f'{len(genuine)}/{len(impostor)}':>16}"
+        for far in FAR_LEVELS:
+            tar, threshold = tar_at_far(genuine, impostor, far)
+            row += f"{f'{tar:.4f} (阈值{threshold:.3f})' if tar is not None else '-':>16}"
+        reference = results.get(config.split("-")[0] + "-fp32")
+        agreement = "-"
+        if reference is not None and reference is not result:
+            both = ~np.isnan(embeddings).any(axis=1) & ~np.isnan(reference["embeddings"]).any(axis=1)
+            if both.any():
+                sims = np.sum(embeddings[both] * reference["embeddings"][both], axis=1)
+                agreement = f"{sims.mean():.4f}/{sims.min():.4f}"
+        print(f"{row}{agreement:>14}{result['latency_ms']:>8.1f}ms")
+    print("\n与FP32一致性: 同一图片量化模型与FP32模型特征的余弦相似度（平均/最小）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
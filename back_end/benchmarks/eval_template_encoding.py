@@ -0,0 +1,143 @@
+"""
+特征库模板编码评估：对比float32/float16/pq编码的常驻内存与1:N识别准确率损失
+在已注册的特征上叠加噪声作为查询（模拟同一人的不同抓拍，--noise 0时为原模板），每种编码各建一个FaceGallery，统计：
+- 特征库内存（模板矩阵+PQ码本）、每条模板字节数、相对float32的压缩比
+- Rank-1识别率、按识别阈值接受且身份正确的比例、与float32的Top-1一致率
+- 真实身份得分相对float32精确内积的平均/最大绝对误差，单次检索延迟
+
+用法:
+    python benchmarks/eval_template_encoding.py --db face_attendance.db
+    python benchmarks/eval_template_encoding.py --db face_attendance.db --schemes deepface silence --noise 0.8
+    python benchmarks/eval_template_encoding.py --synthetic 50000 --pq-m 32 64
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_gallery import FaceGallery
+from face_gallery.feature_store import normalize_feature
+from face_gallery.gallery import DEFAULT_MATCH_THRESHOLD
+from bench_ann import synthetic_gallery
+
+
+def enrolled_vectors(db_path, feature_type, dim):
+    """读取已注册的某方案特征"""
+    from database import AttendanceDB
+    student_ids, vectors = [], []
+    for rows in AttendanceDB(db_path).iter_face_features(feature_type):
+        for student_id, _, _, feature in rows:
+            vec = normalize_feature(feature, dim)
+            if vec is not None:
+                student_ids.append(student_id)
+                vectors.append(vec)
+    return student_ids, (np.vstack(vectors) if vectors else np.zeros((0, dim), dtype=np.float32))
+
+
+def make_probes(vectors, n_queries, noise, seed=1):
+    """
+    Returns:
+        (查询特征, 对应的真实行号)
+    """
+    rng = np.random.default_rng(seed)
+    truth = rng.choice(vectors.shape[0], min(n_queries, vectors.shape[0]), replace=False)
+    if noise <= 0:
+        return vectors[truth], truth
+    rng_state = np.random.default_rng(seed + 1)
+    noisy = vectors[truth] + noise * rng_state.standard_normal((len(truth), vectors.shape[1])) / np.sqrt(vectors.shape[1])
+    return (noisy / np.linalg.norm(noisy, axis=1, keepdims=True)).astype(np.float32), truth
+
+
+def evaluate(label, encoding, codec_options, student_ids, vectors, probes, truth, exact_top1):
+    """用指定编码构建特征库并检索全部查询"""
+    gallery = FaceGallery(dim=vectors.shape[1], encoding=encoding, codec_options=codec_options)
+    started = time.perf_counter()
+    gallery.load_vectors(student_ids, [{"name": None, "class_name": None}] * len(student_ids), list(vectors))
+    build_ms = (time.perf_counter() - started) * 1000
+    stats = gallery.stats()
+
+    correct = accepted = agree = 0
+    errors, latencies = [], []
+    for probe, row, expected_top1 in zip(probes, truth, exact_top1):
+        begin = time.perf_counter()
+        hits = gallery.search(probe, top_k=1)
+        latencies.append((time.perf_counter() - begin) * 1000)
+        top = hits[0] if hits else None
+        if top is not None and top["student_id"] == student_ids[row]:
+            correct += 1
+            accepted += top["similarity"] >= DEFAULT_MATCH_THRESHOLD
+        agree += top is not None and top["student_id"] == student_ids[expected_top1]
+        # 真实身份得分：编码后的近似内积与原始内积之差
+        errors.append(abs(gallery.score(student_ids[row], probe) - float(vectors[row] @ probe)))
+    n = len(probes)
+    return {
+        "label": label,
+        "active": stats["active_encoding"],
+        "memory_bytes": stats["memory_bytes"],
+        "bytes_per_template": stats["bytes_per_template"],
+        "rank1": correct / n,
+        "accept": accepted / n,
+        "agree": agree / n,
+        "err_mean": float(np.mean(errors)),
+        "err_max": float(np.max(errors)),
+        "latency_ms": float(np.mean(latencies)),
+        "build_ms": build_ms
+    }
+
+
+def report(scheme, size, results):
+    base = results[0]["memory_bytes"]
+    print(f"\n方案 {scheme}（{size} 条模板）")
+    print(f"{'编码':<14}{'内存':>10}{'字节/条':>9}{'压缩比':>8}{'Rank-1':>9}{'阈值接受':>10}{'Top1一致':>10}"
+          f"{'得分误差(均/最大)':>20}{'检索':>10}{'构建':>10}")
+    for r in results:
+        # PQ样本不足未训练码本时特征库保持float32，标注实际使用的编码
+        label = r["label"] if r["active"] == r["label"].split("-")[0] else f"{r['label']}({r['active']})"
+        error = f"{r['err_mean']:.4f}/{r['err_max']:.4f}"
+        print(f"{label:<14}{r['memory_bytes'] / 1024 / 1024:>8.2f}MB{r['bytes_per_template']:>9}"
+              f"{base / max(1, r['memory_bytes']):>7.1f}x{r['rank1']:>9.4f}{r['accept']:>10.4f}{r['agree']:>10.4f}"
+              f"{error:>20}{r['latency_ms']:>8.3f}ms{r['build_ms']:>8.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="特征库模板编码内存与识别准确率评估")
+    parser.add_argument("--db", help="使用数据库中已注册的特征")
+    parser.add_argument("--schemes", nargs="+", default=["deepface"], choices=["deepface", "silence"])
+    parser.add_argument("--synthetic", type=int, default=0, help="未指定--db时的合成特征库规模")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=1000, help="查询数（不超过模板数）")
+    parser.add_argument("--noise", type=float, default=0.8, help="查询噪声强度，0表示直接用原模板查询")
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[64], help="PQ子空间数（每条模板字节数），可给多个")
+    parser.add_argument("--pq-ks", type=int, default=256, help="PQ每个子空间的码字数")
+    args = parser.parse_args()
+
+    if args.db:
+        datasets = [(scheme,) + enrolled_vectors(args.db, scheme, args.dim) for scheme in args.schemes]
+    else:
+        size = args.synthetic or 20000
+        vectors = synthetic_gallery(size, args.dim)
+        datasets = [("synthetic", [f"s{i}" for i in range(size)], vectors)]
+
+    for scheme, student_ids, vectors in datasets:
+        if vectors.shape[0] == 0:
+            print(f"\n方案 {scheme}: 没有已注册的{args.dim}维特征")
+            continue
+        probes, truth = make_probes(vectors, args.queries, args.noise)
+        exact_top1 = [int(np.argmax(vectors @ probe)) for probe in probes]
+        configs = [("float32", "float32", None), ("float16", "float16", None)]
+        for m in args.pq_m:
+            # 评估时不设训练样本下限，模板数少于码字数时缩小码字数
+            ks = min(args.pq_ks, vectors.shape[0])
+            configs.append((f"pq-m{m}", "pq", {"m": m, "ks": ks, "min_train_size": 0}))
+        results = [evaluate(label, encoding, options, student_ids, vectors, probes, truth, exact_top1)
+                   for label, encoding, options in configs]
+        report(scheme, vectors.shape[0], results)
+    print(f"\n阈值接受: 身份正确且相似度达到识别阈值{DEFAULT_MATCH_THRESHOLD}；Top1一致: 与float32原始特征精确检索的Top-1相同")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,407 @@
+"""
+学生人脸批量注册
+照片目录按流水线处理：扫描 → 解码 → 虹软特征 → InsightFace特征（批量推理）→ 静默活体特征 → 分块事务写库。
+各阶段有独立的工作线程池，阶段之间用有界队列衔接，不同照片在不同阶段上并行处理；
+写库按块用executemany在一个事务中完成，成功写入的文件记录到检查点文件，中断后重新执行会跳过已完成的照片。
+照片文件名格式: 学号-姓名.jpg
+
+用法:
+    python bulk_enroll.py --data-dir /path/to/photos
+    python bulk_enroll.py --data-dir /path/to/photos --backends arcsoft,insightface --insightface-batch 32
+    python bulk_enroll.py --data-dir /path/to/photos --report enroll_report.json
+"""
+import io
+import os
+import re
+import csv
+import json
+import time
+import argparse
+import zipfile
+import threading
+
+import cv2
+import numpy as np
+
+from database import AttendanceDB
+from pipeline import Stage, StagePipeline
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+BACKENDS = ("arcsoft", "insightface", "silence")
+
+
+def get_student_info_from_filename(filename):
+    """从文件名解析学号和姓名（学号-姓名.扩展名）"""
+    match = re.match(r'(\d+)-(.+?)\.', filename)
+    if match:
+        return match.group(1), match.group(2)
+    return None, None
+
+
+def zip_entry_name(info):
+    """Windows压缩的中文文件名通常为GBK编码且未标记UTF-8，zipfile按cp437解码，需还原"""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def parse_register_archive(archive_bytes, default_class=None, max_bytes=None):
+    """
+    解析批量注册压缩包
+    包含manifest.csv（列: student_id,name,class_name,image）时按清单读取，否则按图片文件名"学号-姓名.jpg"解析
+
+    Args:
+        archive_bytes: zip压缩包内容
+        default_class: 未单独指定班级的学生使用的班级
+        max_bytes: 解压后总大小上限，为None时不限制
+
+    Returns:
+        list: 注册条目 {student_id, name, class_name, filename, image_bytes}
+
+    Raises:
+        ValueError: 解压后超过大小限制
+        zipfile.BadZipFile: 不是有效的zip文件
+    """
+    items = []
+    with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+        entries = {zip_entry_name(info): info for info in archive.infolist() if not info.is_dir()}
+        if max_bytes is not None and sum(info.file_size for info in entries.values()) > max_bytes:
+            raise ValueError("压缩包解压后超过大小限制")
+        manifest = next((name for name in entries if os.path.basename(name).lower() == "manifest.csv"), None)
+        if manifest is not None:
+            text = archive.read(entries[manifest]).decode("utf-8-sig")
+            base = os.path.dirname(manifest)
+            for row in csv.DictReader(io.StringIO(text)):
+                image_name = (row.get("image") or "").strip()
+                path = f"{base}/{image_name}" if base else image_name
+                info = entries.get(path)
+                items.append({
+                    "student_id": (row.get("student_id") or "").strip(),
+                    "name": (row.get("name") or "").strip(),
+                    "class_name": (row.get("class_name") or "").strip() or default_class,
+                    "filename": image_name,
+                    "image_bytes": archive.read(info) if info is not None else None
+                })
+        else:
+            for name, info in entries.items():
+                filename = os.path.basename(name)
+                if not filename.lower().endswith(IMAGE_EXTENSIONS) or name.startswith("__MACOSX/"):
+                    continue
+                student_id, student_name = get_student_info_from_filename(filename)
+                items.append({
+                    "student_id": student_id or "",
+                    "name": student_name or "",
+                    "class_name": default_class,
+                    "filename": filename,
+                    "image_bytes": archive.read(info)
+                })
+    return items
+
+
+def mark_duplicate_students(results):
+    """
+    同一批次中重复的学号只保留第一条提取成功的条目，其余成功条目标记为失败
+    （前一条因无人脸、图片无法读取等失败时，后一条成功的同学号条目仍会注册）
+
+    Args:
+        results: 按提交顺序排列的条目结果，成功时包含student
+
+    Returns:
+        list: 原结果列表
+    """
+    seen = set()
+    for result in results:
+        if not result["success"]:
+            continue
+        if result["student_id"] in seen:
+            result.update({"success": False, "message": "批次内学号重复"})
+            result.pop("student", None)
+        else:
+            seen.add(result["student_id"])
+    return results
+
+
+def imread_unicode(path):
+    """读取图片（支持中文路径）"""
+    try:
+        return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except Exception as e:
+        print(f"imread_unicode error: {e}")
+        return None
+
+
+def pad_width_to_multiple_of_4(img):
+    """虹软SDK要求图像宽度为4的倍数，右侧补黑边"""
+    h, w = img.shape[:2]
+    if w % 4 != 0:
+        img = cv2.copyMakeBorder(img, 0, 0, 0, 4 - w % 4, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+    return img
+
+
+class EnrollCheckpoint:
+    """
+    断点续传检查点
+    每行记录一张已写库照片的文件名、大小和修改时间，照片被替换后会重新注册
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._done = {line.rstrip("\n") for line in f if line.strip()}
+
+    @staticmethod
+    def key(entry):
+        stat = entry.stat()
+        return f"{entry.name}\t{stat.st_size}\t{stat.st_mtime_ns}"
+
+    def __contains__(self, key):
+        return key in self._done
+
+    def __len__(self):
+        return len(self._done)
+
+    def mark(self, keys):
+        """追加记录并刷盘，写库事务提交后调用"""
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(key + "\n" for key in keys)
+                f.flush()
+                os.fsync(f.fileno())
+            self._done.update(keys)
+
+
+def create_models(backends, arcsoft_engines):
+    """按需加载模型，未启用的方案不导入对应依赖"""
+    models = {}
+    if "arcsoft" in backends:
+        from face_sdk.arc_face_sdk import ArcFaceSDK
+        models["arcsoft"] = ArcFaceSDK(pool_size=arcsoft_engines)
+    if "insightface" in backends:
+        from face_model3.face_utils import FaceProcessor
+        models["insightface"] = FaceProcessor()
+    if "silence" in backends:
+        import torch
+        from face_model2.silence import SilentFaceRecognitionModel
+        models["silence"] = SilentFaceRecognitionModel(device='cuda' if torch.cuda.is_available() else 'cpu')
+    return models
+
+
+class BulkEnroller:
+    """批量注册流水线"""
+    def __init__(self, db, models, decode_workers=4, insightface_batch=16, silence_workers=1,
+                 chunk_size=500, user_password=None, class_name=None, checkpoint=None, queue_size=64):
+        """
+        Args:
+            db: AttendanceDB实例
+            models: 方案名称到模型实例的映射（arcsoft/insightface/silence），缺少的方案不提取特征
+            decode_workers: 解码线程数
+            insightface_batch: InsightFace识别模型每批推理的人脸数
+            silence_workers: 静默活体模型线程数
+            chunk_size: 每个写库事务包含的学生数
+            user_password: 提供时为学生创建登录帐号（用户名为学号）
+            class_name: 统一设置的班级（为空时保留已有班级）
+            checkpoint: EnrollCheckpoint实例
+            queue_size: 阶段间队列容量（限制内存中同时存在的解码图像数）
+        """
+        self.db = db
+        self.models = models
+        self.user_password = user_password
+        self.class_name = class_name
+        self.checkpoint = checkpoint
+        self.failures = []
+        self.enrolled = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+        stages = [Stage("decode", self._decode, workers=decode_workers, queue_size=queue_size)]
+        if "arcsoft" in models:
+            stages.append(Stage("arcsoft", self._arcsoft, workers=models["arcsoft"].engines.size, queue_size=queue_size))
+        if "insightface" in models:
+            stages.append(Stage("insightface", self._insightface, batch_size=insightface_batch, queue_size=queue_size))
+        if "silence" in models:
+            stages.append(Stage("silence", self._silence, workers=silence_workers, queue_size=queue_size))
+        stages.append(Stage("write", self._write, batch_size=chunk_size, max_wait_ms=2000, queue_size=chunk_size * 2))
+        self.pipeline = StagePipeline(stages, on_error=self._stage_failed)
+
+    def _fail(self, fname, reason):
+        with self._lock:
+            self.failures.append((fname, reason))
+
+    def _stage_failed(self, stage, batch, error):
+        for item in batch:
+            self._fail(item["fname"], f"{stage}阶段异常: {str(error)}")
+
+    def scan(self, data_dir):
+        """扫描照片目录，逐个产出待注册任务（跳过检查点中已完成的照片）"""
+        with os.scandir(data_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                student_id, name = get_student_info_from_filename(entry.name)
+                if not student_id or not name:
+                    self._fail(entry.name, "无效文件名")
+                    continue
+                key = EnrollCheckpoint.key(entry)
+                if self.checkpoint is not None and key in self.checkpoint:
+                    self.skipped += 1
+                    continue
+                yield {"fname": entry.name, "path": entry.path, "key": key,
+                       "student_id": student_id, "name": name, "errors": {}}
+
+    def _decode(self, item):
+        img = imread_unicode(item["path"])
+        if img is None:
+            self._fail(item["fname"], "无法读取图片")
+            return None
+        item["img"] = pad_width_to_multiple_of_4(img)
+        return item
+
+    def _arcsoft(self, item):
+        result = self.models["arcsoft"].extract_feature_from_numpy(item["img"])
+        if result["success"]:
+            feature = result["feature_data"]
+            item["face_feature"] = feature if isinstance(feature, bytes) else feature.tobytes()
+        else:
+            item["errors"]["arcsoft"] = result.get("message", "未知错误")
+        return item
+
+    def _insightface(self, batch):
+        results = self.models["insightface"].detect_faces_batch([item["img"] for item in batch])
+        for item, result in zip(batch, results):
+            if result["success"]:
+                item["face_feature_2"] = np.asarray(result["feature"], dtype=np.float32).reshape(-1).tobytes()
+            else:
+                item["errors"]["insightface"] = result.get("message", "未知错误")
+        return batch
+
+    def _silence(self, item):
+        result = self.models["silence"].extract_feature_from_numpy(item["img"])
+        if result["success"]:
+            item["face_feature_3"] = np.asarray(result["feature_data"], dtype=np.float32).reshape(-1).tobytes()
+        else:
+            item["errors"]["silence"] = result.get("message", "未知错误")
+        return item
+
+    def _write(self, batch):
+        students = []
+        for item in batch:
+            item.pop("img", None)
+            if not any(item.get(column) for column in ("face_feature", "face_feature_2", "face_feature_3")):
+                self._fail(item["fname"], "所有方案均未提取到特征: " + "; ".join(f"{k}={v}" for k, v in item["errors"].items()))
+                continue
+            students.append(item)
+        if not students:
+            return []
+        result = self.db.register_students_batch([{
+            "student_id": item["student_id"],
+            "name": item["name"],
+            "class_name": self.class_name,
+            "face_feature": item.get("face_feature"),
+            "face_feature_2": item.get("face_feature_2"),
+            "face_feature_3": item.get("face_feature_3")
+        } for item in students], user_password=self.user_password)
+        if not result["success"]:
+            raise RuntimeError(result["message"])
+        if self.checkpoint is not None:
+            self.checkpoint.mark([item["key"] for item in students])
+        with self._lock:
+            self.enrolled += len(students)
+        return students
+
+    def run(self, data_dir):
+        """
+        执行批量注册
+
+        Returns:
+            dict: 吞吐量报告（各阶段指标与总体统计）
+        """
+        elapsed = self.pipeline.run(self.scan(data_dir))
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "enrolled": self.enrolled,
+            "skipped": self.skipped,
+            "failed": len(self.failures),
+            "photos_per_sec": round(self.enrolled / elapsed, 2) if elapsed > 0 else 0.0,
+            "stages": self.pipeline.metrics(),
+            "failures": [{"file": fname, "reason": reason} for fname, reason in self.failures]
+        }
+
+
+def print_report(report):
+    print(f"{'阶段':<14}{'线程':>6}{'平均批':>8}{'完成':>8}{'丢弃':>6}{'失败':>6}{'张/秒':>10}{'ms/张':>10}{'忙碌率':>8}")
+    for name, m in report["stages"].items():
+        print(f"{name:<14}{m['workers']:>6}{m['avg_batch_size']:>8}{m['processed']:>8}{m['dropped']:>6}{m['failed']:>6}"
+              f"{m['items_per_sec']:>10}{m['avg_ms_per_item']:>10}{m['utilization']:>8}")
+    print(f"注册 {report['enrolled']} 张，检查点跳过 {report['skipped']} 张，失败 {report['failed']} 张，"
+          f"耗时 {report['elapsed_s']} 秒（{report['photos_per_sec']} 张/秒）")
+    for failure in report["failures"][:20]:
+        print(f"  失败: {failure['file']}: {failure['reason']}")
+    if report["failed"] > 20:
+        print(f"  ……其余 {report['failed'] - 20} 条失败记录见 --report 输出")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="学生人脸批量注册")
+    parser.add_argument("--data-dir", required=True, help="照片目录（文件名: 学号-姓名.jpg）")
+    parser.add_argument("--db", help="数据库文件路径，默认为face_attendance.db")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="启用的特征方案，逗号分隔")
+    parser.add_argument("--checkpoint", help="检查点文件路径，默认为 <照片目录名>.enroll_checkpoint")
+    parser.add_argument("--no-resume", action="store_true", help="忽略已有检查点，全部重新注册")
+    parser.add_argument("--decode-workers", type=int, default=min(8, os.cpu_count() or 1))
+    parser.add_argument("--arcsoft-engines", type=int, default=2, help="虹软引擎句柄数（即虹软阶段线程数）")
+    parser.add_argument("--insightface-batch", type=int, default=16)
+    parser.add_argument("--silence-workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=500, help="每个写库事务包含的学生数")
+    parser.add_argument("--queue-size", type=int, default=64, help="阶段间队列容量")
+    parser.add_argument("--password", default="123", help="学生帐号初始密码（用户名为学号）")
+    parser.add_argument("--no-users", action="store_true", help="不创建学生登录帐号")
+    parser.add_argument("--class-name", help="统一设置班级")
+    parser.add_argument("--report", help="将吞吐量报告写入JSON文件")
+    args = parser.parse_args(argv)
+
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"未知的特征方案: {', '.join(sorted(unknown))}")
+
+    checkpoint_path = args.checkpoint or f"{os.path.basename(os.path.normpath(args.data_dir))}.enroll_checkpoint"
+    if args.no_resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = EnrollCheckpoint(checkpoint_path)
+    if len(checkpoint):
+        print(f"从检查点 {checkpoint_path} 继续，已完成 {len(checkpoint)} 张")
+
+    started = time.perf_counter()
+    models = create_models(backends, args.arcsoft_engines)
+    print(f"模型加载完成（{', '.join(models)}），耗时 {time.perf_counter() - started:.1f} 秒")
+
+    db = AttendanceDB(args.db)
+    enroller = BulkEnroller(
+        db, models,
+        decode_workers=args.decode_workers,
+        insightface_batch=args.insightface_batch,
+        silence_workers=args.silence_workers,
+        chunk_size=args.chunk_size,
+        user_password=None if args.no_users else args.password,
+        class_name=args.class_name,
+        checkpoint=checkpoint,
+        queue_size=args.queue_size
+    )
+    report = enroller.run(args.data_dir)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if "arcsoft" in models:
+        models["arcsoft"].release()
+    db.close()
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -8,20 +8,33 @@ import datetime
 import logging
 import hashlib
 import uuid
+import base64
+import numpy as np
+
+from db_pool import ConnectionPool
+from db_migrations import apply_migrations, backfill_attendance_daily
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("Database")
 
+# 特征方案与students表字段的对应关系
+FEATURE_COLUMNS = {
+    "arcsoft": "face_feature",      # 虹软sdk特征
+    "deepface": "face_feature_2",   # InsightFace 512维特征（历史命名沿用deepface）
+    "silence": "face_feature_3",    # 静默活体方案facenet特征
+}
+
 class AttendanceDB:
     """考勤系统数据库操作类"""
     
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, pool_size=8):
         """
         初始化数据库连接
         
         Args:
             db_path: 数据库文件路径，默认为当前目录下的face_attendance.db
+            pool_size: 连接池保留的空闲连接数，为0时每次调用新建连接（不启用WAL等参数）
         """
         if db_path is None:
             # 使用默认的数据库路径
@@ -29,17 +42,65 @@ class AttendanceDB:
             db_path = os.path.join(current_dir, 'face_attendance.db')
             
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, max_idle=pool_size) if pool_size > 0 else None
+        # 学生信息变更监听器（人脸特征库等常驻缓存据此保持同步）
+        self._student_listeners = []
+        # 学生信息与人脸模板缓存，调用enable_student_cache后启用
+        self.student_cache = None
         self.init_db()
     
     def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+        """获取数据库连接（启用连接池时借出长连接，close()即归还）"""
+        if self.pool is not None:
+            return self.pool.acquire()
+        # 流式读取时同一连接的各批次可能在不同线程中取出
+        conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
         # 启用外键约束
         conn.execute("PRAGMA foreign_keys = ON")
         # 行工厂设置，使查询结果作为字典返回
         conn.row_factory = sqlite3.Row
         return conn
     
+    def close(self):
+        """关闭连接池中的空闲连接"""
+        if self.pool is not None:
+            self.pool.close_all()
+    
+    def add_student_listener(self, callback):
+        """
+        注册学生信息变更监听器
+        
+        Args:
+            callback: 回调函数 callback(action, student_id, data)，
+                      action为"upsert"或"delete"，data为学生记录字典（删除时为None）
+        """
+        self._student_listeners.append(callback)
+    
+    def enable_student_cache(self, max_entries=4096, ttl_seconds=600):
+        """
+        启用学生信息与人脸模板缓存，get_student/get_student_face_feature/get_student_template
+        优先从缓存读取，注册/删除学生时自动失效
+        
+        Args:
+            max_entries: 最多缓存的学生数
+            ttl_seconds: 缓存有效期（秒）
+            
+        Returns:
+            StudentCache: 缓存实例
+        """
+        from student_cache import StudentCache
+        self.student_cache = StudentCache(self._load_student_row, FEATURE_COLUMNS, max_entries, ttl_seconds)
+        self.add_student_listener(self.student_cache.on_student_changed)
+        return self.student_cache
+    
+    def _notify_student_change(self, action, student_id, data=None):
+        """通知所有监听器学生信息已变更，单个监听器异常不影响主流程"""
+        for callback in self._student_listeners:
+            try:
+                callback(action, student_id, data)
+            except Exception as e:
+                logger.error(f"学生变更监听器执行异常: {str(e)}")
+    
     def init_db(self):
         """初始化数据库表结构"""
         conn = self.get_connection()
@@ -149,6 +210,8 @@ class AttendanceDB:
         ''')
         
         conn.commit()
+        # 执行结构迁移（索引等），已有数据库只补充执行新版本
+        apply_migrations(conn)
         conn.close()
         logger.info("数据库初始化完成")
     
@@ -641,6 +704,71 @@ class AttendanceDB:
     
   
     
+    def get_active_classes(self, check_time=None, lead_minutes=30):
+        """
+        获取当前时段处于考勤中的班级（用于按班级分区识别）
+        
+        Args:
+            check_time: 考勤时间，不指定则使用当前时间
+            lead_minutes: 上课前提前开放考勤的分钟数
+            
+        Returns:
+            dict: 当前时段有激活考勤规则的班级名称列表
+        """
+        try:
+            if not check_time:
+                check_time = datetime.datetime.now()
+            elif isinstance(check_time, str):
+                check_time = datetime.datetime.strptime(check_time, "%Y-%m-%d %H:%M:%S")
+            
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            # 节假日无需考勤
+            check_date = check_time.strftime("%Y-%m-%d")
+            cursor.execute("SELECT type FROM special_dates WHERE date_value = ?", (check_date,))
+            special_date = cursor.fetchone()
+            if special_date and special_date['type'] == 'holiday':
+                conn.close()
+                return {
+                    "success": True,
+                    "data": []
+                }
+            
+            cursor.execute(
+                """SELECT r.start_time, r.end_time, r.weekdays, c.class_name
+                   FROM attendance_rules r
+                   JOIN classes c ON r.class_id = c.id
+                   WHERE r.is_active = 1"""
+            )
+            rules = cursor.fetchall()
+            conn.close()
+            
+            weekday = str(check_time.weekday() + 1)  # 1-7 表示周一到周日
+            check_minutes = check_time.hour * 60 + check_time.minute
+            class_names = []
+            for rule in rules:
+                if weekday not in (rule['weekdays'] or '').split(','):
+                    continue
+                start_hour, start_minute = map(int, rule['start_time'].split(':'))
+                end_hour, end_minute = map(int, rule['end_time'].split(':'))
+                start_minutes = start_hour * 60 + start_minute - lead_minutes
+                end_minutes = end_hour * 60 + end_minute
+                if start_minutes <= check_minutes <= end_minutes and rule['class_name'] not in class_names:
+                    class_names.append(rule['class_name'])
+            
+            return {
+                "success": True,
+                "data": class_names
+            }
+            
+        except Exception as e:
+            logger.error(f"获取当前考勤班级异常: {str(e)}")
+            return {
+                "success": False,
+                "message": f"获取当前考勤班级异常: {str(e)}"
+            }
+    
     #------------------------ 现有方法保留和优化 ------------------------#
     def register_student(self, student_id, name, face_feature=None, class_name=None, user_id=None, face_feature_2=None, face_feature_3=None):
         """
@@ -675,10 +803,103 @@ class AttendanceDB:
             conn.commit()
             conn.close()
             # logger.info(face_feature_2)
+            self._notify_student_change("upsert", student_id, {
+                "student_id": student_id,
+                "name": name,
+                "class_name": class_name,
+                "face_feature": face_feature,
+                "face_feature_2": face_feature_2,
+                "face_feature_3": face_feature_3
+            })
             return {"success": True, "message": "学生信息注册/更新成功"}
         except Exception as e:
             return {"success": False, "message": str(e)}
     
+    def register_students_batch(self, students, user_password=None):
+        """
+        批量注册或更新学生信息，全部在一个事务中写入（任一条失败则整体回滚）
+
+        Args:
+            students: 学生信息字典列表，键同register_student的参数
+                      （student_id, name, class_name, face_feature, face_feature_2, face_feature_3）；
+                      未提供班级时保留已有学生的班级
+            user_password: 提供时为每个学生创建以学号为用户名的学生帐号（已存在的学生帐号沿用）并关联；
+                           学号与其他角色（如教师）的用户名冲突时不创建也不关联
+
+        Returns:
+            dict: 注册结果，count为写入的学生数
+        """
+        if not students:
+            return {"success": True, "message": "没有需要注册的学生", "count": 0}
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            register_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            user_ids = {}
+            if user_password is not None:
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO users (username, password, role, real_name, create_time) VALUES (?, ?, 'student', ?, ?)",
+                    [(s["student_id"], self.hash_password(user_password), s["name"], register_time) for s in students]
+                )
+                usernames = list({s["student_id"] for s in students})
+                # 分段查询，避免超出SQLite单条语句的参数个数限制；只关联学生角色的帐号
+                for i in range(0, len(usernames), 500):
+                    part = usernames[i:i + 500]
+                    cursor.execute(
+                        f"SELECT id, username FROM users WHERE role = 'student' AND username IN ({','.join('?' * len(part))})", part
+                    )
+                    user_ids.update({row["username"]: row["id"] for row in cursor.fetchall()})
+
+            rows = [(
+                s["student_id"], s["name"], s.get("face_feature"), s.get("face_feature_2"), s.get("face_feature_3"),
+                s.get("class_name"), s.get("user_id", user_ids.get(s["student_id"])), register_time
+            ) for s in students]
+            cursor.executemany("""
+                INSERT INTO students (student_id, name, face_feature, face_feature_2, face_feature_3, class_name, user_id, register_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (student_id) DO UPDATE SET
+                    name = excluded.name,
+                    face_feature = excluded.face_feature,
+                    face_feature_2 = excluded.face_feature_2,
+                    face_feature_3 = excluded.face_feature_3,
+                    class_name = COALESCE(excluded.class_name, students.class_name),
+                    user_id = COALESCE(excluded.user_id, students.user_id),
+                    register_time = excluded.register_time
+            """, rows)
+            # 未提供班级的学生沿用了库中已有班级，通知监听器时使用实际班级
+            kept = [s["student_id"] for s in students if not s.get("class_name")]
+            class_names = {}
+            for i in range(0, len(kept), 500):
+                part = kept[i:i + 500]
+                cursor.execute(
+                    f"SELECT student_id, class_name FROM students WHERE student_id IN ({','.join('?' * len(part))})", part
+                )
+                class_names.update({row["student_id"]: row["class_name"] for row in cursor.fetchall()})
+            conn.commit()
+            conn.close()
+
+            for s in students:
+                self._notify_student_change("upsert", s["student_id"], {
+                    "student_id": s["student_id"],
+                    "name": s["name"],
+                    "class_name": s.get("class_name") or class_names.get(s["student_id"]),
+                    "face_feature": s.get("face_feature"),
+                    "face_feature_2": s.get("face_feature_2"),
+                    "face_feature_3": s.get("face_feature_3")
+                })
+            return {
+                "success": True,
+                "message": f"批量注册学生{len(rows)}名",
+                "count": len(rows)
+            }
+        except Exception as e:
+            logger.error(f"批量注册学生异常: {str(e)}")
+            return {
+                "success": False,
+                "message": f"批量注册学生异常: {str(e)}"
+            }
+
     def record_attendance(self, student_id, liveness_score=None, detection_method=None, 
                           similarity=None, status=None, remark=None):
         """
@@ -731,6 +952,8 @@ class AttendanceDB:
             )
             
             attendance_id = cursor.lastrowid
+            # 同一事务内更新按日汇总
+            self._increment_attendance_daily(cursor, student_id, current_time, status)
             conn.commit()
             conn.close()
             
@@ -765,15 +988,13 @@ class AttendanceDB:
             dict: 学生信息
         """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM students WHERE student_id = ?", (student_id,))
-            student = cursor.fetchone()
-            conn.close()
+            if self.student_cache is not None:
+                student = self.student_cache.get_row(student_id)
+            else:
+                student = self._load_student_row(student_id)
             
             if student:
-                # 将Row对象转换为字典
-                student_dict = dict(student)
+                student_dict = student
                 # 移除人脸特征数据，避免数据过大
                 #TODO 这里可以考虑使用方案2和方案3的特征数据
                 if 'face_feature' in student_dict:
@@ -797,6 +1018,18 @@ class AttendanceDB:
                 "message": f"获取学生信息异常: {str(e)}"
             }
     
+    def _load_student_row(self, student_id):
+        """读取完整的学生记录（含全部特征字段），不存在时返回None"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM students WHERE student_id = ?", (student_id,))
+            student = cursor.fetchone()
+            # 将Row对象转换为字典
+            return dict(student) if student else None
+        finally:
+            conn.close()
+    
     def get_all_students(self, class_name=None):
         """
         获取所有学生列表
@@ -865,9 +1098,6 @@ class AttendanceDB:
             dict: 包含特征数据的字典
         """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
             # 根据特征类型选择相应的字段
             if face_feature_type == "arcsoft":
                 feature_column = "face_feature"  # 存储ArcSoft特征的字段
@@ -879,6 +1109,19 @@ class AttendanceDB:
                     "message": f"不支持的人脸特征类型: {face_feature_type}，请使用 'arcsoft' 或 'deepface'"
                 }
             
+            if self.student_cache is not None:
+                row = self.student_cache.get_row(student_id)
+                feature = row.get(feature_column) if row else None
+                if feature:
+                    return {"success": True, "feature": feature}
+                return {
+                    "success": False,
+                    "message": f"未找到学号为{student_id}的学生{face_feature_type}人脸特征"
+                }
+            
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
             # 查询相应的特征字段
             query = f"SELECT {feature_column} FROM students WHERE student_id = ? AND {feature_column} IS NOT NULL"
             cursor.execute(query, (student_id,))
@@ -903,6 +1146,288 @@ class AttendanceDB:
                 "message": f"获取学生人脸特征异常: {str(e)}"
             }
     
+    def get_student_template(self, student_id, face_feature_type):
+        """
+        获取已解析的学生人脸特征（启用缓存时每个学生每种方案只解析一次）
+        
+        Args:
+            student_id: 学生学号
+            face_feature_type: 人脸特征类型，可选值为 "arcsoft"、"deepface" 或 "silence"
+            
+        Returns:
+            dict: 虹软方案feature为bytes，其余方案为float32数组
+        """
+        try:
+            if face_feature_type not in FEATURE_COLUMNS:
+                return {"success": False, "message": f"不支持的人脸特征类型: {face_feature_type}"}
+            if self.student_cache is not None:
+                feature = self.student_cache.get_template(student_id, face_feature_type)
+            else:
+                from student_cache import TEMPLATE_DTYPES
+                row = self._load_student_row(student_id)
+                raw = row.get(FEATURE_COLUMNS[face_feature_type]) if row else None
+                dtype = TEMPLATE_DTYPES[face_feature_type]
+                feature = None if not raw else (bytes(raw) if dtype is None else np.frombuffer(raw, dtype=dtype))
+            if feature is None:
+                return {
+                    "success": False,
+                    "message": f"未找到学号为{student_id}的学生{face_feature_type}人脸特征"
+                }
+            return {"success": True, "feature": feature}
+        except Exception as e:
+            logger.error(f"获取学生人脸特征异常: {str(e)}")
+            return {
+                "success": False,
+                "message": f"获取学生人脸特征异常: {str(e)}"
+            }
+    
+    def get_all_face_features(self, face_feature_type="deepface"):
+        """
+        获取所有已注册指定方案人脸特征的学生（用于构建1:N特征库）
+        
+        Args:
+            face_feature_type: 人脸特征类型，可选值为 "arcsoft"、"deepface" 或 "silence"
+            
+        Returns:
+            dict: 包含学生学号、姓名、班级及二进制特征的列表
+        """
+        try:
+            feature_column = FEATURE_COLUMNS.get(face_feature_type)
+            if feature_column is None:
+                return {
+                    "success": False,
+                    "message": f"不支持的人脸特征类型: {face_feature_type}"
+                }
+            
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""SELECT student_id, name, class_name, {feature_column} AS feature
+                    FROM students
+                    WHERE {feature_column} IS NOT NULL AND LENGTH({feature_column}) > 0
+                    ORDER BY student_id"""
+            )
+            rows = [dict(row) for row in cursor.fetchall()]
+            conn.close()
+            
+            return {
+                "success": True,
+                "data": rows
+            }
+            
+        except Exception as e:
+            logger.error(f"获取人脸特征列表异常: {str(e)}")
+            return {
+                "success": False,
+                "message": f"获取人脸特征列表异常: {str(e)}"
+            }
+    
+    def iter_face_features(self, face_feature_type="deepface", batch_size=1000):
+        """
+        流式读取已注册指定方案人脸特征的学生，按批从数据库游标取出，不为每行构造字典
+        连接在生成器结束或被关闭时归还
+
+        Args:
+            face_feature_type: 人脸特征类型，可选值为 "arcsoft"、"deepface" 或 "silence"
+            batch_size: 每批记录数
+
+        Yields:
+            list: 一批(学号, 姓名, 班级, 二进制特征)元组，按学号排序
+
+        Raises:
+            ValueError: 不支持的人脸特征类型
+        """
+        feature_column = FEATURE_COLUMNS.get(face_feature_type)
+        if feature_column is None:
+            raise ValueError(f"不支持的人脸特征类型: {face_feature_type}")
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""SELECT student_id, name, class_name, {feature_column}
+                    FROM students
+                    WHERE {feature_column} IS NOT NULL AND LENGTH({feature_column}) > 0
+                    ORDER BY student_id"""
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [tuple(row) for row in rows]
+        finally:
+            conn.close()
+
+    def get_face_feature_fingerprint(self, face_feature_type="deepface"):
+        """
+        指定方案人脸特征的变更指纹（有特征的学生数+最近注册时间），用于判断派生的特征存储文件是否过期；
+        注册/更新学生都会刷新register_time，删除会改变学生数
+
+        Args:
+            face_feature_type: 人脸特征类型，可选值为 "arcsoft"、"deepface" 或 "silence"
+
+        Returns:
+            dict: data为指纹字符串
+        """
+        try:
+            feature_column = FEATURE_COLUMNS.get(face_feature_type)
+            if feature_column is None:
+                return {
+                    "success": False,
+                    "message": f"不支持的人脸特征类型: {face_feature_type}"
+                }
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""SELECT COUNT(*), MAX(register_time), MAX(id) FROM students
+                    WHERE {feature_column} IS NOT NULL AND LENGTH({feature_column}) > 0"""
+            )
+            count, last_time, last_id = cursor.fetchone()
+            conn.close()
+            return {"success": True, "data": f"{count}|{last_time or ''}|{last_id or 0}"}
+        except Exception as e:
+            logger.error(f"获取人脸特征指纹异常: {str(e)}")
+            return {
+                "success": False,
+                "message": f"获取人脸特征指纹异常: {str(e)}"
+            }
+
+    @staticmethod
+    def validate_date_range(start_date=None, end_date=None):
+        """
+        校验日期范围参数（YYYY-MM-DD），未指定的一端不校验
+
+        Returns:
+            tuple: (开始日期, 结束日期)，已解析为datetime，未指定的一端为None
+
+        Raises:
+            ValueError: 日期格式无效
+        """
+        bounds = []
+        for label, value in (("开始日期", start_date), ("结束日期", end_date)):
+            if not value:
+                bounds.append(None)
+                continue
+            try:
+                bounds.append(datetime.datetime.strptime(value, "%Y-%m-%d"))
+            except (TypeError, ValueError):
+                raise ValueError(f"{label}格式无效: {value}，应为YYYY-MM-DD")
+        return tuple(bounds)
+
+    @classmethod
+    def _date_range_bounds(cls, start_date=None, end_date=None):
+        """
+        将日期范围转换为check_time的半开区间 [开始日期 00:00:00, 结束日期次日 00:00:00)
+        直接比较check_time可以使用索引，date(check_time)形式的条件无法使用索引
+
+        Returns:
+            tuple: (下界, 上界)，未指定的一端为None
+
+        Raises:
+            ValueError: 日期格式无效
+        """
+        start, end = cls.validate_date_range(start_date, end_date)
+        lower = start.strftime("%Y-%m-%d 00:00:00") if start else None
+        upper = (end + datetime.timedelta(days=1)).strftime("%Y-%m-%d 00:00:00") if end else None
+        return lower, upper
+
+    @staticmethod
+    def encode_record_cursor(check_time, record_id):
+        """将一条考勤记录的(check_time, id)编码为分页游标"""
+        if isinstance(check_time, datetime.datetime):
+            check_time = check_time.strftime("%Y-%m-%d %H:%M:%S")
+        return base64.urlsafe_b64encode(f"{check_time}|{int(record_id)}".encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_record_cursor(cursor):
+        """
+        解析分页游标
+
+        Returns:
+            tuple: (check_time, id)
+
+        Raises:
+            ValueError: 游标格式无效
+        """
+        try:
+            check_time, record_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+            datetime.datetime.strptime(check_time, "%Y-%m-%d %H:%M:%S")
+            return check_time, int(record_id)
+        except Exception:
+            raise ValueError(f"无效的分页游标: {cursor}")
+
+    def _attendance_records_query(self, student_id=None, start_date=None, end_date=None, detection_method=None, class_name=None,
+                                  after=None, limit=None):
+        """
+        构造考勤记录查询语句，返回(sql, 参数列表)
+        结果按(check_time, id)倒序排列；after为上一页最后一条记录的(check_time, id)，用于游标分页
+        """
+        query = """
+        SELECT a.id, a.student_id, s.name, s.class_name, a.check_time, a.status,
+            a.liveness_score, a.detection_method, a.similarity, a.remark
+        FROM attendance a
+        LEFT JOIN students s ON a.student_id = s.student_id
+        WHERE 1=1
+        """
+        params = []
+
+        if student_id:
+            query += " AND a.student_id = ?"
+            params.append(student_id)
+
+        # 日期范围：支持只指定开始或结束日期
+        lower, upper = self._date_range_bounds(start_date, end_date)
+        if lower:
+            query += " AND a.check_time >= ?"
+            params.append(lower)
+        if upper:
+            query += " AND a.check_time < ?"
+            params.append(upper)
+
+        if detection_method:
+            query += " AND a.detection_method = ?"
+            params.append(detection_method)
+
+        if class_name:
+            query += " AND s.class_name = ?"
+            params.append(class_name)
+
+        if after:
+            query += " AND (a.check_time, a.id) < (?, ?)"
+            params.extend(after)
+
+        query += " ORDER BY a.check_time DESC, a.id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        return query, params
+
+    @staticmethod
+    def _increment_attendance_daily(cursor, student_id, check_time, status, delta=1):
+        """按日汇总中对应(日期, 学号, 状态)的次数加delta，由调用方在写考勤记录的同一事务中调用"""
+        cursor.execute(
+            """INSERT INTO attendance_daily (date, student_id, status, count) VALUES (?, ?, ?, ?)
+               ON CONFLICT (date, student_id, status) DO UPDATE SET count = count + excluded.count""",
+            (str(check_time)[:10], student_id, status or "present", delta)
+        )
+
+    def _attendance_statistics_query(self, start_date, end_date, class_name=None):
+        """构造考勤统计查询语句（读取按日汇总表，代价与学生数×天数成正比），返回(sql, 参数列表)"""
+        query = """
+        SELECT s.student_id, s.name, s.class_name,
+               COALESCE(SUM(CASE WHEN d.status = 'present' THEN d.count END), 0) AS present_count,
+               COALESCE(SUM(CASE WHEN d.status = 'late' THEN d.count END), 0) AS late_count,
+               COALESCE(SUM(CASE WHEN d.status = 'absent' THEN d.count END), 0) AS absent_count
+        FROM students s
+        LEFT JOIN attendance_daily d ON s.student_id = d.student_id
+                                    AND d.date >= ? AND d.date <= ?
+        """
+        params = [start_date, end_date]
+        if class_name:
+            query += " WHERE s.class_name = ?"
+            params.append(class_name)
+        query += " GROUP BY s.student_id, s.name, s.class_name ORDER BY s.student_id"
+        return query, params
+
     def get_attendance_records(self, student_id=None, start_date=None, end_date=None, detection_method=None, class_name=None):
         """
         获取考勤记录
@@ -921,40 +1446,8 @@ class AttendanceDB:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            query = """
-            SELECT a.id, a.student_id, s.name, s.class_name, a.check_time, a.status, 
-                a.liveness_score, a.detection_method, a.similarity, a.remark
-            FROM attendance a
-            LEFT JOIN students s ON a.student_id = s.student_id
-            WHERE 1=1
-            """
-            params = []
-            
-            if student_id:
-                query += " AND a.student_id = ?"
-                params.append(student_id)
-                
-            # 修改日期查询逻辑：支持日期范围
-            if start_date and end_date:
-                query += " AND a.check_time BETWEEN ? AND ?"
-                params.extend([f"{start_date} 00:00:00", f"{end_date} 23:59:59"])
-            elif start_date:
-                query += " AND a.check_time >= ?"
-                params.append(f"{start_date} 00:00:00")
-            elif end_date:
-                query += " AND a.check_time <= ?"
-                params.append(f"{end_date} 23:59:59")
-                
-            if detection_method:
-                query += " AND a.detection_method = ?"
-                params.append(detection_method)
-                
-            if class_name:
-                query += " AND s.class_name = ?"
-                params.append(class_name)
-                
-            query += " ORDER BY a.check_time DESC"
-            
+            query, params = self._attendance_records_query(student_id, start_date, end_date, detection_method, class_name)
+
             cursor.execute(query, params)
             records = [dict(row) for row in cursor.fetchall()]
             # logger.info(records)
@@ -972,6 +1465,88 @@ class AttendanceDB:
                 "message": f"获取考勤记录异常: {str(e)}"
             }
     
+    def get_attendance_records_page(self, student_id=None, start_date=None, end_date=None, detection_method=None, class_name=None,
+                                    limit=100, cursor=None):
+        """
+        游标分页获取考勤记录（按考勤时间倒序），翻页代价与页码无关
+
+        Args:
+            student_id, start_date, end_date, detection_method, class_name: 同get_attendance_records
+            limit: 每页记录数
+            cursor: 上一页返回的next_cursor，为空时从第一页开始
+
+        Returns:
+            dict: 本页记录和下一页游标（没有更多记录时为None）
+        """
+        try:
+            after = self.decode_record_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return {
+                "success": False,
+                "message": str(e)
+            }
+        try:
+            conn = self.get_connection()
+            cursor_obj = conn.cursor()
+
+            # 多取一条用于判断是否还有下一页
+            query, params = self._attendance_records_query(student_id, start_date, end_date, detection_method, class_name,
+                                                           after=after, limit=limit + 1)
+            cursor_obj.execute(query, params)
+            records = [dict(row) for row in cursor_obj.fetchall()]
+            conn.close()
+
+            next_cursor = None
+            if len(records) > limit:
+                records = records[:limit]
+                last = records[-1]
+                next_cursor = self.encode_record_cursor(last["check_time"], last["id"])
+
+            return {
+                "success": True,
+                "data": records,
+                "next_cursor": next_cursor
+            }
+
+        except Exception as e:
+            logger.error(f"分页获取考勤记录异常: {str(e)}")
+            return {
+                "success": False,
+                "message": f"分页获取考勤记录异常: {str(e)}"
+            }
+
+    def iter_attendance_records(self, student_id=None, start_date=None, end_date=None, detection_method=None, class_name=None,
+                                cursor=None, batch_size=500):
+        """
+        流式读取考勤记录，按批从数据库游标取出，内存占用与结果总数无关
+        连接在生成器结束或被关闭时归还；各批次可在不同线程中取出
+
+        Args:
+            student_id, start_date, end_date, detection_method, class_name: 同get_attendance_records
+            cursor: 分页游标，从该记录之后开始读取
+            batch_size: 每批记录数
+
+        Yields:
+            list: 一批考勤记录字典
+
+        Raises:
+            ValueError: 游标格式无效
+        """
+        after = self.decode_record_cursor(cursor) if cursor else None
+        query, params = self._attendance_records_query(student_id, start_date, end_date, detection_method, class_name,
+                                                       after=after)
+        conn = self.get_connection()
+        try:
+            cursor_obj = conn.cursor()
+            cursor_obj.execute(query, params)
+            while True:
+                rows = cursor_obj.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            conn.close()
+
     def get_attendance_statistics(self, start_date=None, end_date=None, class_name=None):
         """
         获取考勤统计数据
@@ -994,47 +1569,19 @@ class AttendanceDB:
             if not end_date:
                 end_date = datetime.datetime.now().strftime("%Y-%m-%d")
                 
-            query = """
-            SELECT s.student_id, s.name, s.class_name,
-                   COUNT(CASE WHEN a.status = 'present' THEN 1 END) AS present_count,
-                   COUNT(CASE WHEN a.status = 'late' THEN 1 END) AS late_count,
-                   COUNT(CASE WHEN a.status = 'absent' THEN 1 END) AS absent_count
-            FROM students s
-            LEFT JOIN attendance a ON s.student_id = a.student_id 
-                                  AND date(a.check_time) BETWEEN ? AND ?
-            """
-            params = [start_date, end_date]
-            
-            if class_name:
-                query += " WHERE s.class_name = ?"
-                params.append(class_name)
-                
-            query += " GROUP BY s.student_id, s.name, s.class_name ORDER BY s.student_id"
-            
+            query, params = self._attendance_statistics_query(start_date, end_date, class_name)
+
             cursor.execute(query, params)
             stats = [dict(row) for row in cursor.fetchall()]
-            
-            # 计算总统计数据
-            total_query = """
-            SELECT COUNT(DISTINCT s.student_id) AS student_count,
-                   COUNT(CASE WHEN a.status = 'present' THEN 1 END) AS total_present,
-                   COUNT(CASE WHEN a.status = 'late' THEN 1 END) AS total_late,
-                   COUNT(CASE WHEN a.status = 'absent' THEN 1 END) AS total_absent
-            FROM students s
-            LEFT JOIN attendance a ON s.student_id = a.student_id 
-                                  AND date(a.check_time) BETWEEN ? AND ?
-            """
-            
-            total_params = [start_date, end_date]
-            
-            if class_name:
-                total_query += " WHERE s.class_name = ?"
-                total_params.append(class_name)
-                
-            cursor.execute(total_query, total_params)
-            total_stats = dict(cursor.fetchone())
-            
             conn.close()
+
+            # 总统计数据由各学生统计累加，无需再次查询
+            total_stats = {
+                "student_count": len(stats),
+                "total_present": sum(row["present_count"] for row in stats),
+                "total_late": sum(row["late_count"] for row in stats),
+                "total_absent": sum(row["absent_count"] for row in stats)
+            }
             
             return {
                 "success": True,
@@ -1055,6 +1602,38 @@ class AttendanceDB:
                 "message": f"获取考勤统计异常: {str(e)}"
             }
     
+    def rebuild_attendance_rollup(self, start_date=None, end_date=None):
+        """
+        由考勤记录重建按日汇总（用于回填历史数据或修复汇总不一致）
+        
+        Args:
+            start_date: 开始日期YYYY-MM-DD，为空表示不限
+            end_date: 结束日期YYYY-MM-DD，为空表示不限
+            
+        Returns:
+            dict: 重建结果
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            rows = backfill_attendance_daily(cursor, start_date, end_date)
+            conn.commit()
+            conn.close()
+            
+            return {
+                "success": True,
+                "message": f"按日汇总重建完成，共{rows}行",
+                "rows": rows
+            }
+            
+        except Exception as e:
+            logger.error(f"重建按日汇总异常: {str(e)}")
+            return {
+                "success": False,
+                "message": f"重建按日汇总异常: {str(e)}"
+            }
+    
     def delete_student(self, student_id):
         """
         删除学生记录
@@ -1080,14 +1659,16 @@ class AttendanceDB:
                     "message": f"未找到学号为{student_id}的学生"
                 }
                 
-            # 删除考勤记录
+            # 删除考勤记录及其按日汇总
             cursor.execute("DELETE FROM attendance WHERE student_id = ?", (student_id,))
+            cursor.execute("DELETE FROM attendance_daily WHERE student_id = ?", (student_id,))
             
             # 删除学生记录
             cursor.execute("DELETE FROM students WHERE student_id = ?", (student_id,))
             
             conn.commit()
             conn.close()
+            self._notify_student_change("delete", student_id)
             
             return {
                 "success": True,
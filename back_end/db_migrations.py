@@ -0,0 +1,139 @@
+"""
+数据库结构迁移
+按版本号顺序执行，已执行的版本记录在schema_migrations表中；
+init_db建表后调用apply_migrations，已有数据库升级时只执行尚未执行过的版本
+"""
+import datetime
+import logging
+
+logger = logging.getLogger("Database")
+
+def backfill_attendance_daily(cursor, start_date=None, end_date=None):
+    """
+    由考勤记录重新汇总attendance_daily（先删除范围内的汇总行再重新统计）
+
+    Args:
+        cursor: 数据库游标（调用方负责事务）
+        start_date: 开始日期YYYY-MM-DD，为空表示不限
+        end_date: 结束日期YYYY-MM-DD，为空表示不限
+
+    Returns:
+        int: 写入的汇总行数
+    """
+    daily_where, attendance_where, params = [], [], []
+    if start_date:
+        daily_where.append("date >= ?")
+        attendance_where.append("check_time >= ?")
+        params.append(start_date)
+    if end_date:
+        daily_where.append("date <= ?")
+        attendance_where.append("check_time < ?")
+        params.append(end_date)
+    daily_clause = (" WHERE " + " AND ".join(daily_where)) if daily_where else ""
+    attendance_clause = (" WHERE " + " AND ".join(attendance_where)) if attendance_where else ""
+
+    # 考勤记录按check_time半开区间筛选：[开始日期 00:00:00, 结束日期次日 00:00:00)
+    attendance_params = []
+    if start_date:
+        attendance_params.append(f"{start_date} 00:00:00")
+    if end_date:
+        next_day = datetime.datetime.strptime(end_date, "%Y-%m-%d") + datetime.timedelta(days=1)
+        attendance_params.append(next_day.strftime("%Y-%m-%d 00:00:00"))
+
+    cursor.execute("DELETE FROM attendance_daily" + daily_clause, params)
+    cursor.execute(
+        """INSERT INTO attendance_daily (date, student_id, status, count)
+           SELECT substr(check_time, 1, 10), student_id, COALESCE(status, 'present'), COUNT(*)
+           FROM attendance""" + attendance_clause + """
+           GROUP BY substr(check_time, 1, 10), student_id, COALESCE(status, 'present')""",
+        attendance_params
+    )
+    return cursor.rowcount
+
+
+# 迁移列表：(版本号, 说明, 步骤列表)，步骤为SQL语句或接收cursor的函数；版本号只增不改
+MIGRATIONS = [
+    (1, "考勤热点查询索引", [
+        # 按学生查询考勤记录、统计时按学生关联考勤并限定时间范围
+        "CREATE INDEX IF NOT EXISTS idx_attendance_student_time ON attendance (student_id, check_time)",
+        # 按时间范围查询考勤记录并按时间倒序排列
+        "CREATE INDEX IF NOT EXISTS idx_attendance_check_time ON attendance (check_time)",
+        # 按检测方式筛选考勤记录
+        "CREATE INDEX IF NOT EXISTS idx_attendance_method_time ON attendance (detection_method, check_time)",
+        # 按班级筛选学生、统计（含学号，按班级汇总时无需回表）
+        "CREATE INDEX IF NOT EXISTS idx_students_class_name ON students (class_name, student_id)",
+        # 打卡时查询当日是否为特殊日期
+        "CREATE INDEX IF NOT EXISTS idx_special_dates_date ON special_dates (date_value)",
+        # 收集索引统计信息供查询规划器选择索引
+        "ANALYZE",
+    ]),
+    (2, "按日预汇总考勤统计表", [
+        # 每个学生每天各考勤状态的次数，打卡时增量维护，统计接口直接读取
+        """
+        CREATE TABLE IF NOT EXISTS attendance_daily (
+            date TEXT NOT NULL,                      -- 日期 YYYY-MM-DD
+            student_id TEXT NOT NULL,                -- 学生学号
+            status TEXT NOT NULL,                    -- 考勤状态
+            count INTEGER NOT NULL DEFAULT 0,        -- 次数
+            PRIMARY KEY (date, student_id, status)
+        ) WITHOUT ROWID
+        """,
+        # 统计时按学生关联并限定日期范围（覆盖索引，无需回表）
+        "CREATE INDEX IF NOT EXISTS idx_attendance_daily_student ON attendance_daily (student_id, date, status, count)",
+        # 由已有考勤记录回填
+        backfill_attendance_daily,
+        "ANALYZE attendance_daily",
+    ]),
+]
+
+
+def get_schema_version(cursor):
+    """获取已执行的最高迁移版本，未执行过任何迁移时返回0"""
+    cursor.execute("SELECT MAX(version) FROM schema_migrations")
+    row = cursor.fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    """
+    执行尚未执行的迁移，每个版本在一个事务中完成
+
+    Args:
+        conn: 数据库连接
+        migrations: 迁移列表
+
+    Returns:
+        int: 迁移后的版本号
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,             -- 迁移版本号
+        description TEXT,                        -- 迁移说明
+        applied_time TIMESTAMP                   -- 执行时间
+    )
+    ''')
+    conn.commit()
+
+    current = get_schema_version(cursor)
+    for version, description, steps in sorted(migrations, key=lambda item: item[0]):
+        if version <= current:
+            continue
+        try:
+            cursor.execute("BEGIN")
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description, applied_time) VALUES (?, ?, ?)",
+                (version, description, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+        logger.info(f"数据库迁移完成: v{version} {description}")
+    return current
@@ -0,0 +1,154 @@
+"""
+SQLite连接池
+长连接在创建时一次性设置WAL日志模式和缓存、内存映射等参数，用完归还复用；
+sqlite3模块按连接缓存预编译语句（cached_statements），长连接下同一SQL的预编译结果可跨调用复用
+"""
+import queue
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger("Database")
+
+# 连接参数：WAL模式下NORMAL同步级别在断电时最多丢失最后一个事务，不会损坏数据库
+DEFAULT_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", "-16000"),     # 约16MB页缓存
+    ("mmap_size", "268435456"),   # 256MB内存映射读
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", "5000"),     # 写锁冲突时等待5秒而不是立即报错
+    ("foreign_keys", "ON"),
+)
+
+
+class PooledConnection:
+    """
+    连接池中的连接代理
+    接口与sqlite3.Connection一致，close()时回滚未提交事务并归还连接池而不是真正关闭
+    """
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, conn, pool):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_pool", pool)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, "_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._pool._release(conn)
+
+    def __del__(self):
+        # 异常分支中未调用close()的连接：状态不确定，直接关闭不再复用
+        conn = getattr(self, "_conn", None)
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._pool._discard(conn)
+
+
+class ConnectionPool:
+    """
+    SQLite连接池
+    空闲连接放在有界队列中；池中无空闲连接时新建连接而不是阻塞等待
+    （嵌套调用如record_attendance -> check_attendance_status会同时持有多个连接），
+    归还时空闲队列已满则关闭多出的连接
+    """
+    def __init__(self, db_path, max_idle=8, pragmas=DEFAULT_PRAGMAS, cached_statements=256):
+        """
+        Args:
+            db_path: 数据库文件路径
+            max_idle: 最多保留的空闲连接数
+            pragmas: 新建连接时执行的PRAGMA参数
+            cached_statements: 每个连接缓存的预编译语句数量
+        """
+        self.db_path = db_path
+        self.max_idle = max(1, int(max_idle))
+        self.pragmas = pragmas
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=self.max_idle)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._reused = 0
+        self._discarded = 0
+        self._in_use = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,  # 连接在线程间借还，同一时刻只被一个线程使用
+            cached_statements=self.cached_statements
+        )
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        # 行工厂设置，使查询结果作为字典返回
+        conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._created += 1
+        return conn
+
+    def acquire(self):
+        """借出连接，返回PooledConnection代理"""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._reused += 1
+        except queue.Empty:
+            conn = self._connect()
+        with self._lock:
+            self._in_use += 1
+        return PooledConnection(conn, self)
+
+    def _release(self, conn):
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._in_use -= 1
+            self._discarded += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        """关闭全部空闲连接"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_idle": self.max_idle,
+                "idle": self._idle.qsize(),
+                "in_use": self._in_use,
+                "created": self._created,
+                "reused": self._reused,
+                "discarded": self._discarded
+            }
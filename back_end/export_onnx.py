@@ -0,0 +1,40 @@
+"""
+静默活体方案模型导出工具
+把FaceNet(InceptionResnetV1, vggface2)和MiniFASNetV2导出为ONNX模型（batch维为动态），
+供SilentFaceRecognitionModel(backend='onnx') / ORT_OPTIMIZED=1 使用；
+backend='onnx'首次加载时若模型不存在也会自动导出，本工具用于部署前预先导出。
+导出后可用 python benchmarks/check_onnx_parity.py 检查与PyTorch推理结果的一致性
+
+用法:
+    python export_onnx.py
+    python export_onnx.py --output-dir face_model2/onnx --liveness-model /path/to/2.7_80x80_MiniFASNetV2.pth
+"""
+import os
+import sys
+import argparse
+
+from face_model2.silence import SilentFaceRecognitionModel, ONNX_DIR
+from pipeline.onnx_runtime import OrtRunner
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出静默活体方案模型为ONNX")
+    parser.add_argument("--output-dir", default=ONNX_DIR, help="导出目录")
+    parser.add_argument("--liveness-model", default=None, help="MiniFASNetV2权重路径（默认使用模型类中的路径）")
+    args = parser.parse_args(argv)
+
+    options = {"device": "cpu"}
+    if args.liveness_model:
+        options["liveness_model_path"] = args.liveness_model
+    model = SilentFaceRecognitionModel(**options)
+    paths = model.export_onnx(args.output_dir)
+    for name, path in paths.items():
+        # 创建会话时生成图优化后的模型缓存（旧缓存比新导出的模型旧，会被重新生成）
+        runner = OrtRunner(path)
+        print(f"{name}: {path} ({os.path.getsize(path) / 1024 / 1024:.1f}MB), 输入: {runner.input_name}, "
+              f"输出: {[output for output, _ in runner.outputs]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
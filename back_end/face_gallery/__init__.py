@@ -0,0 +1,10 @@
+"""
+人脸特征库模块
+提供常驻内存的1:N人脸特征检索，用于无需学号的实时识别，可被多个进程共享映射的磁盘特征存储，以及float16/乘积量化模板编码
+"""
+from .gallery import FaceGallery
+from .ann import IVFIndex, HNSWIndex, create_index, index_path_for
+from .feature_store import FeatureStore, store_path_for
+from .encoding import ENCODINGS, create_codec, parse_encodings
+
+__all__ = ["FaceGallery", "IVFIndex", "HNSWIndex", "create_index", "index_path_for", "FeatureStore", "store_path_for", "ENCODINGS", "create_codec", "parse_encodings"]
@@ -0,0 +1,375 @@
+"""
+近似最近邻(ANN)索引
+为大规模特征库提供亚线性检索，所有索引实现统一接口：
+build / add / remove / search / save / load
+- IVFIndex: 纯NumPy实现的倒排文件索引（球面k-means粗量化 + nprobe个倒排表精确打分）
+- HNSWIndex: 基于可选依赖hnswlib的图索引，未安装时不可用
+"""
+import os
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger("FaceGallery")
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+def _normalize(vectors):
+    """行向量L2归一化"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    """返回scores中最大的k个下标（降序）"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.shape[0])
+    return idx[np.argsort(-scores[idx])]
+
+
+class IVFIndex:
+    """
+    倒排文件索引（内积/余弦相似度）
+    训练阶段用球面k-means得到nlist个聚类中心，检索时只对最近的nprobe个倒排表打分
+    """
+    kind = "ivf"
+
+    def __init__(self, dim=512, nlist=None, nprobe=16, n_iter=10, min_train_size=1024, seed=0):
+        """
+        Args:
+            dim: 特征维度
+            nlist: 聚类中心数，默认按 4*sqrt(N) 自动确定
+            nprobe: 检索时访问的倒排表数量
+            n_iter: k-means迭代次数
+            min_train_size: 样本少于该值时不训练，退化为单个倒排表（即精确检索）
+            seed: 随机种子
+        """
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.min_train_size = min_train_size
+        self.seed = seed
+        self._reset(np.zeros((1, dim), dtype=np.float32))
+
+    def _reset(self, centroids):
+        self.centroids = centroids.astype(np.float32)
+        n = self.centroids.shape[0]
+        self._list_ids = [[] for _ in range(n)]
+        self._list_vecs = [np.zeros((0, self.dim), dtype=np.float32) for _ in range(n)]
+        self._list_sizes = [0] * n
+        self._where = {}            # id -> (倒排表编号, 表内位置)
+        self.trained_size = 0
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, item_id):
+        return item_id in self._where
+
+    @property
+    def is_trained(self):
+        return self.centroids.shape[0] > 1
+
+    #------------------------ 训练与构建 ------------------------#
+
+    def _kmeans(self, data):
+        """球面k-means，返回归一化的聚类中心"""
+        rng = np.random.default_rng(self.seed)
+        nlist = self.nlist or int(4 * np.sqrt(data.shape[0]))
+        nlist = int(max(1, min(nlist, data.shape[0])))
+        # 训练样本上限，避免大库训练耗时过长
+        max_train = nlist * 64
+        if data.shape[0] > max_train:
+            data = data[rng.choice(data.shape[0], max_train, replace=False)]
+        centroids = data[rng.choice(data.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.n_iter):
+            assign = self._assign(data, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # 空簇重新随机取样，避免中心退化
+                sums[empty] = data[rng.choice(data.shape[0], int(empty.sum()), replace=False)]
+            centroids = _normalize(sums)
+        return centroids
+
+    @staticmethod
+    def _assign(data, centroids, chunk=8192):
+        """分块计算每个向量最近的聚类中心"""
+        assign = np.empty(data.shape[0], dtype=np.int64)
+        for start in range(0, data.shape[0], chunk):
+            assign[start:start + chunk] = np.argmax(data[start:start + chunk] @ centroids.T, axis=1)
+        return assign
+
+    def build(self, ids, vectors):
+        """
+        全量构建索引
+
+        Args:
+            ids: 特征对应的学号列表
+            vectors: 特征矩阵 (N, dim)
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        ids = list(ids)
+        if len(ids) >= self.min_train_size:
+            self._reset(self._kmeans(vectors))
+        else:
+            self._reset(np.zeros((1, self.dim), dtype=np.float32))
+        if not ids:
+            return
+        assign = self._assign(vectors, self.centroids) if self.is_trained else np.zeros(len(ids), dtype=np.int64)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(self.centroids.shape[0] + 1))
+        for list_no in range(self.centroids.shape[0]):
+            members = order[bounds[list_no]:bounds[list_no + 1]]
+            self._list_vecs[list_no] = vectors[members].copy()
+            self._list_ids[list_no] = [ids[i] for i in members]
+            self._list_sizes[list_no] = len(members)
+            for pos, i in enumerate(members):
+                self._where[ids[i]] = (list_no, pos)
+        self.trained_size = len(ids)
+        logger.info(f"IVF索引构建完成: {len(ids)} 条特征, {self.centroids.shape[0]} 个倒排表")
+
+    def needs_rebuild(self, growth=2.0):
+        """增量写入使库规模相对训练时增长过多（或小库已增长到可训练规模）时建议重建"""
+        size = len(self)
+        if not self.is_trained:
+            return size >= self.min_train_size
+        return size > self.trained_size * growth
+
+    #------------------------ 增量更新 ------------------------#
+
+    def add(self, item_id, vector):
+        """新增或更新单条特征"""
+        if item_id in self._where:
+            self.remove(item_id)
+        vec = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, self.dim))
+        list_no = int(np.argmax(vec @ self.centroids.T)) if self.is_trained else 0
+        size = self._list_sizes[list_no]
+        buf = self._list_vecs[list_no]
+        if size >= buf.shape[0]:
+            grown = np.zeros((max(8, buf.shape[0] * 2), self.dim), dtype=np.float32)
+            grown[:size] = buf[:size]
+            self._list_vecs[list_no] = buf = grown
+        buf[size] = vec[0]
+        self._list_ids[list_no].append(item_id)
+        self._list_sizes[list_no] = size + 1
+        self._where[item_id] = (list_no, size)
+
+    def remove(self, item_id):
+        """删除单条特征（与表尾交换）"""
+        loc = self._where.pop(item_id, None)
+        if loc is None:
+            return False
+        list_no, pos = loc
+        last = self._list_sizes[list_no] - 1
+        ids = self._list_ids[list_no]
+        if pos != last:
+            buf = self._list_vecs[list_no]
+            buf[pos] = buf[last]
+            ids[pos] = ids[last]
+            self._where[ids[pos]] = (list_no, pos)
+        ids.pop()
+        self._list_sizes[list_no] = last
+        return True
+
+    #------------------------ 检索 ------------------------#
+
+    def search(self, query, top_k=1, nprobe=None):
+        """
+        近似检索
+
+        Returns:
+            list: [(学号, 余弦相似度)]，按相似度降序
+        """
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(self.dim))
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        probe = _top_k(self.centroids @ query, nprobe) if self.is_trained else [0]
+        results = []
+        for list_no in probe:
+            size = self._list_sizes[list_no]
+            if size == 0:
+                continue
+            scores = self._list_vecs[list_no][:size] @ query
+            ids = self._list_ids[list_no]
+            for i in _top_k(scores, top_k):
+                results.append((ids[i], float(scores[i])))
+        results.sort(key=lambda item: -item[1])
+        return results[:top_k]
+
+    #------------------------ 持久化 ------------------------#
+
+    def save(self, path):
+        """保存索引到npz文件（先写临时文件再替换，避免写入中断损坏索引）"""
+        ids, lists, vecs = [], [], []
+        for list_no in range(self.centroids.shape[0]):
+            size = self._list_sizes[list_no]
+            ids.extend(self._list_ids[list_no])
+            lists.append(np.full(size, list_no, dtype=np.int32))
+            vecs.append(self._list_vecs[list_no][:size])
+        meta = {"kind": self.kind, "dim": self.dim, "nprobe": self.nprobe,
+                "trained_size": self.trained_size, "signature": getattr(self, "signature", None)}
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path,
+                 centroids=self.centroids,
+                 ids=np.array(ids, dtype=object).astype(str),
+                 lists=np.concatenate(lists) if lists else np.zeros(0, dtype=np.int32),
+                 vectors=np.vstack(vecs) if vecs else np.zeros((0, self.dim), dtype=np.float32),
+                 meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """从npz文件加载索引"""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            index = cls(dim=meta["dim"], nprobe=meta["nprobe"], **kwargs)
+            index._reset(data["centroids"])
+            ids, lists, vectors = data["ids"].tolist(), data["lists"], data["vectors"]
+        for list_no in range(index.centroids.shape[0]):
+            members = np.flatnonzero(lists == list_no)
+            index._list_vecs[list_no] = vectors[members].copy()
+            index._list_ids[list_no] = [ids[i] for i in members]
+            index._list_sizes[list_no] = len(members)
+            for pos, i in enumerate(members):
+                index._where[ids[i]] = (list_no, pos)
+        index.trained_size = meta["trained_size"]
+        index.signature = meta.get("signature")
+        return index
+
+
+class HNSWIndex:
+    """
+    基于hnswlib的HNSW图索引（可选依赖）
+    删除使用hnswlib的mark_deleted，被标记的位置在重建前不会回收
+    """
+    kind = "hnsw"
+
+    def __init__(self, dim=512, M=16, ef_construction=200, ef_search=64, max_elements=1024):
+        if hnswlib is None:
+            raise ImportError("未安装hnswlib，无法使用HNSW索引")
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._init_index(max_elements)
+
+    def _init_index(self, max_elements):
+        self._index = hnswlib.Index(space="ip", dim=self.dim)
+        self._index.init_index(max_elements=max(1, max_elements), M=self.M,
+                               ef_construction=self.ef_construction, allow_replace_deleted=True)
+        self._index.set_ef(self.ef_search)
+        self._labels = {}       # id -> label
+        self._ids = {}          # label -> id
+        self._next_label = 0
+
+    def __len__(self):
+        return len(self._labels)
+
+    def __contains__(self, item_id):
+        return item_id in self._labels
+
+    def build(self, ids, vectors):
+        ids = list(ids)
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        self._init_index(max(1024, len(ids) * 2))
+        if ids:
+            labels = np.arange(len(ids))
+            self._index.add_items(vectors, labels)
+            self._labels = {item_id: i for i, item_id in enumerate(ids)}
+            self._ids = {i: item_id for i, item_id in enumerate(ids)}
+            self._next_label = len(ids)
+
+    def needs_rebuild(self, growth=2.0):
+        return False
+
+    def add(self, item_id, vector):
+        if item_id in self._labels:
+            self.remove(item_id)
+        if self._index.get_current_count() >= self._index.get_max_elements():
+            self._index.resize_index(self._index.get_max_elements() * 2)
+        label = self._next_label
+        self._next_label += 1
+        self._index.add_items(_normalize(np.asarray(vector, dtype=np.float32).reshape(1, self.dim)),
+                              np.array([label]), replace_deleted=True)
+        self._labels[item_id] = label
+        self._ids[label] = item_id
+
+    def remove(self, item_id):
+        label = self._labels.pop(item_id, None)
+        if label is None:
+            return False
+        self._index.mark_deleted(label)
+        del self._ids[label]
+        return True
+
+    def search(self, query, top_k=1, nprobe=None):
+        if not self._labels:
+            return []
+        k = min(top_k, len(self._labels))
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(1, self.dim))
+        labels, distances = self._index.knn_query(query, k=k)
+        # 内积空间下hnswlib返回 1 - ip
+        return [(self._ids[int(l)], float(1 - d)) for l, d in zip(labels[0], distances[0])]
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        self._index.save_index(tmp_path)
+        os.replace(tmp_path, path)
+        meta = {"kind": self.kind, "dim": self.dim, "M": self.M, "ef_search": self.ef_search,
+                "labels": self._labels, "next_label": self._next_label,
+                "signature": getattr(self, "signature", None)}
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(dim=meta["dim"], M=meta["M"], ef_search=meta["ef_search"], **kwargs)
+        index._index.load_index(path, allow_replace_deleted=True)
+        index._index.set_ef(index.ef_search)
+        index._labels = meta["labels"]
+        index._ids = {label: item_id for item_id, label in index._labels.items()}
+        index._next_label = meta["next_label"]
+        index.signature = meta.get("signature")
+        return index
+
+
+# 索引后端注册表
+INDEX_BACKENDS = {
+    "ivf": IVFIndex,
+    "hnsw": HNSWIndex,
+}
+
+
+def create_index(kind, dim=512, **kwargs):
+    """
+    按名称创建ANN索引
+
+    Args:
+        kind: "ivf" 或 "hnsw"
+        dim: 特征维度
+    """
+    if kind not in INDEX_BACKENDS:
+        raise ValueError(f"不支持的索引类型: {kind}，可选: {', '.join(INDEX_BACKENDS)}")
+    return INDEX_BACKENDS[kind](dim=dim, **kwargs)
+
+
+def index_path_for(db_path, kind):
+    """索引文件默认与数据库文件放在同一目录，如 face_attendance.ivf.npz"""
+    base = os.path.splitext(db_path)[0]
+    return f"{base}.{kind}.npz" if kind == "ivf" else f"{base}.{kind}.bin"
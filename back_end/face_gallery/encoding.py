@@ -0,0 +1,213 @@
+"""
+特征库模板编码
+常驻特征库按编码后的形式保存模板，检索时由编码器直接对编码计算与查询特征的内积：
+- float32：原始特征，每条2KB（512维），精确
+- float16：每条1KB，分块转换为float32后做矩阵-向量乘法
+- pq：乘积量化，512维切分为m个子空间，每个子空间用256个中心的码本量化为1字节，每条m字节（默认64字节）；
+  检索使用非对称距离计算（ADC），查询特征不量化，先算出各子空间查询与全部码字的内积表，再按编码查表求和；
+  k-means重建会使模板范数变小、内积系统性偏低，得分除以重建向量的范数（各子空间码字范数平方查表求和）校正为余弦相似度
+float16在NumPy中没有向量化的矩阵乘法，检索时需逐块转换为float32，延迟明显高于float32，适合内存受限而库规模不大的场景
+"""
+import numpy as np
+
+ENCODINGS = ("float32", "float16", "pq")
+
+# 分块计算时每块的行数，限制float16转换/查表产生的临时数组大小（保持在CPU缓存内）
+SCORE_CHUNK = 1024
+
+
+def parse_encodings(value):
+    """
+    解析"方案:编码"列表，如"deepface:pq,silence:float16"
+
+    Returns:
+        dict: {特征方案: 编码}
+    """
+    result = {}
+    for item in str(value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        feature_type, _, encoding = item.partition(":")
+        encoding = encoding.strip() or "float32"
+        if encoding not in ENCODINGS:
+            raise ValueError(f"不支持的模板编码: {encoding}，可选: {', '.join(ENCODINGS)}")
+        result[feature_type.strip()] = encoding
+    return result
+
+
+class Float32Codec:
+    """不压缩"""
+    name = "float32"
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.width = dim
+        self.dtype = np.float32
+        self.is_trained = True
+        self.nbytes = 0
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+
+    def decode(self, codes):
+        return np.asarray(codes, dtype=np.float32)
+
+    def scores(self, codes, query):
+        return codes @ query
+
+
+class Float16Codec(Float32Codec):
+    """半精度存储，内积在float32下计算（NumPy的float16矩阵乘法没有向量化实现）"""
+    name = "float16"
+
+    def __init__(self, dim=512):
+        super().__init__(dim)
+        self.dtype = np.float16
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim).astype(np.float16)
+
+    def scores(self, codes, query):
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_CHUNK):
+            out[start:start + SCORE_CHUNK] = codes[start:start + SCORE_CHUNK].astype(np.float32) @ query
+        return out
+
+
+class PQCodec:
+    """
+    乘积量化编码
+    码本需要先用一批原始特征训练（每个子空间独立做k-means），未训练时不能编码
+    """
+    name = "pq"
+
+    def __init__(self, dim=512, m=64, ks=256, n_iter=20, min_train_size=1024, max_train=65536, seed=0):
+        """
+        Args:
+            dim: 特征维度
+            m: 子空间数（需整除dim），即每条模板的字节数
+            ks: 每个子空间的码字数（不超过256，编码为uint8）
+            n_iter: k-means迭代次数
+            min_train_size: 训练码本所需的最少特征数，不足时特征库保持原始特征
+            max_train: 训练样本上限，超出时随机抽样
+            seed: 随机种子
+        """
+        if dim % m != 0:
+            raise ValueError(f"PQ子空间数{m}不能整除特征维度{dim}")
+        if not 1 <= ks <= 256:
+            raise ValueError("PQ每个子空间的码字数应在1~256之间")
+        self.dim = dim
+        self.m = m
+        self.ks = ks
+        self.dsub = dim // m
+        self.n_iter = n_iter
+        self.min_train_size = max(ks, min_train_size)
+        self.max_train = max_train
+        self.seed = seed
+        self.width = m
+        self.dtype = np.uint8
+        self.centroids = None   # (m, ks, dsub)
+        self._centroid_sq = None  # 展平的码字范数平方(m*ks,)
+        self.trained_size = 0
+        # 查表时每个子空间在展平内积表中的偏移
+        self._offsets = np.arange(m, dtype=np.intp) * ks
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @property
+    def nbytes(self):
+        return int(self.centroids.nbytes) if self.centroids is not None else 0
+
+    def can_train(self, size):
+        return size >= self.min_train_size
+
+    def train(self, vectors):
+        """对每个子空间做k-means训练码本"""
+        rng = np.random.default_rng(self.seed)
+        data = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if data.shape[0] < self.ks:
+            raise ValueError(f"PQ训练样本数{data.shape[0]}少于码字数{self.ks}")
+        self.trained_size = data.shape[0]
+        if data.shape[0] > self.max_train:
+            data = data[rng.choice(data.shape[0], self.max_train, replace=False)]
+        centroids = np.empty((self.m, self.ks, self.dsub), dtype=np.float32)
+        for j in range(self.m):
+            sub = np.ascontiguousarray(data[:, j * self.dsub:(j + 1) * self.dsub])
+            center = sub[rng.choice(sub.shape[0], self.ks, replace=False)].copy()
+            for _ in range(self.n_iter):
+                assign = self._nearest(sub, center)
+                sums = np.stack([np.bincount(assign, weights=sub[:, d], minlength=self.ks)
+                                 for d in range(self.dsub)], axis=1)
+                counts = np.bincount(assign, minlength=self.ks)
+                empty = counts == 0
+                if empty.any():
+                    # 空簇重新随机取样，避免码字退化
+                    sums[empty] = sub[rng.choice(sub.shape[0], int(empty.sum()), replace=False)]
+                    counts[empty] = 1
+                center = (sums / counts[:, None]).astype(np.float32)
+            centroids[j] = center
+        self.centroids = centroids
+        self._centroid_sq = np.sum(centroids * centroids, axis=2).ravel()
+
+    @staticmethod
+    def _nearest(sub, center, chunk=8192):
+        """分块计算每个子向量最近的码字（欧氏距离）"""
+        assign = np.empty(sub.shape[0], dtype=np.int64)
+        center_sq = np.sum(center * center, axis=1)
+        for start in range(0, sub.shape[0], chunk):
+            block = sub[start:start + chunk]
+            assign[start:start + chunk] = np.argmin(center_sq - 2 * block @ center.T, axis=1)
+        return assign
+
+    def encode(self, vectors):
+        """
+        Returns:
+            (n, m)的uint8编码
+        """
+        if not self.is_trained:
+            raise RuntimeError("PQ码本尚未训练")
+        data = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        codes = np.empty((data.shape[0], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = self._nearest(data[:, j * self.dsub:(j + 1) * self.dsub], self.centroids[j])
+        return codes
+
+    def decode(self, codes):
+        """用码字重建近似特征"""
+        codes = np.asarray(codes, dtype=np.intp).reshape(-1, self.m)
+        return self.centroids[np.arange(self.m), codes].reshape(codes.shape[0], self.dim)
+
+    def lookup_table(self, query):
+        """查询特征与各子空间全部码字的内积表，展平为(m*ks,)"""
+        sub = np.asarray(query, dtype=np.float32).reshape(self.m, 1, self.dsub)
+        return np.sum(self.centroids * sub, axis=2).ravel()
+
+    def scores(self, codes, query):
+        """非对称距离计算：按编码查内积表求和，除以重建向量的范数，近似原始（归一化）特征与查询的余弦相似度"""
+        table = self.lookup_table(query)
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_CHUNK):
+            block = codes[start:start + SCORE_CHUNK].astype(np.intp) + self._offsets
+            norms = np.sqrt(np.maximum(self._centroid_sq[block].sum(axis=1), 1e-12))
+            out[start:start + SCORE_CHUNK] = table[block].sum(axis=1) / norms
+        return out
+
+
+def create_codec(encoding, dim=512, **kwargs):
+    """
+    按名称创建模板编码器
+
+    Args:
+        encoding: float32/float16/pq
+        dim: 特征维度
+    """
+    if encoding == "float32":
+        return Float32Codec(dim)
+    if encoding == "float16":
+        return Float16Codec(dim)
+    if encoding == "pq":
+        return PQCodec(dim, **kwargs)
+    raise ValueError(f"不支持的模板编码: {encoding}，可选: {', '.join(ENCODINGS)}")
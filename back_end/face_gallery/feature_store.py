@@ -0,0 +1,372 @@
+"""
+磁盘特征存储
+把students表中某一方案的人脸特征导出为定长步长的矩阵文件（float32或float16，每行一个L2归一化的特征），
+学号索引与班级、姓名写在清单文件中。读取方用np.memmap只读映射矩阵文件，多个进程共享同一份页缓存，
+按行读取不拷贝；学生注册/删除后延迟从数据库重建：
+- 每次重建写入新的矩阵文件（文件名带代号，不覆盖正在被映射的旧文件，Windows下被映射的文件无法替换），
+  写完并落盘后再原子替换清单文件，读取方总能看到一份完整的清单+矩阵
+- 旧的矩阵文件在下次重建时删除，清单当前指向的文件、最近写入的文件（其他进程可能正在重建）和仍被映射的文件跳过
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+import numpy as np
+from database import FEATURE_COLUMNS
+
+logger = logging.getLogger("FeatureStore")
+
+STORE_VERSION = 1
+STORE_DTYPES = {"float32": "f32", "float16": "f16"}
+# 修改时间在该秒数内的矩阵文件不删除：可能是其他进程正在写入、尚未替换清单的文件
+STALE_FILE_GRACE = 60.0
+
+
+def normalize_feature(feature, dim):
+    """将二进制或数组特征解析为L2归一化的float32向量，维度不符或范数无效时返回None"""
+    if feature is None:
+        return None
+    if isinstance(feature, (bytes, bytearray, memoryview)):
+        vec = np.frombuffer(feature, dtype=np.float32)
+    else:
+        vec = np.asarray(feature, dtype=np.float32).ravel()
+    if vec.shape[0] != dim:
+        return None
+    norm = np.linalg.norm(vec)
+    if norm <= 0 or not np.isfinite(norm):
+        return None
+    return vec / norm
+
+
+def feature_signature(student_ids, matrix):
+    """特征内容指纹：按学号排序后依次累积学号和float32特征字节"""
+    digest = hashlib.sha1()
+    for row in sorted(range(len(student_ids)), key=lambda i: student_ids[i]):
+        digest.update(str(student_ids[row]).encode("utf-8"))
+        digest.update(np.asarray(matrix[row], dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def store_path_for(db_path, feature_type):
+    """清单文件默认与数据库文件放在同一目录，如 face_attendance.deepface.features.json"""
+    return f"{os.path.splitext(db_path)[0]}.{feature_type}.features.json"
+
+
+class FeatureStore:
+    """
+    单个特征方案的磁盘特征存储
+    清单文件记录矩阵文件名、维度、数据类型、学号索引和数据库指纹，矩阵文件为count*dim个定长元素，无文件头
+    """
+    def __init__(self, path, dim=512, feature_type="deepface", dtype="float32", rebuild_delay=1.0):
+        """
+        Args:
+            path: 清单文件路径（矩阵文件写在同一目录）
+            dim: 特征维度
+            feature_type: 对应数据库中的特征方案（见database.FEATURE_COLUMNS）
+            dtype: 矩阵文件数据类型 float32/float16（float16文件和页缓存减半，读取方需转换为float32计算）
+            rebuild_delay: 学生变更后延迟重建的秒数，期间的多次变更合并为一次重建
+        """
+        if dtype not in STORE_DTYPES:
+            raise ValueError(f"不支持的特征存储数据类型: {dtype}，可选: {', '.join(STORE_DTYPES)}")
+        self.path = path
+        self.dim = dim
+        self.feature_type = feature_type
+        self.feature_column = FEATURE_COLUMNS[feature_type]
+        self.dtype = dtype
+        self.rebuild_delay = rebuild_delay
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._student_ids = []
+        self._infos = []
+        self._rows = {}
+        self._file_state = None
+        self.data_path = None
+        self.signature = None
+        self.db_fingerprint = None
+        self.built_at = None
+        self._db = None
+        self._timer = None
+        self._rebuild_lock = threading.Lock()
+        self.rebuilds = 0
+        self.last_rebuild_ms = None
+
+    def __len__(self):
+        return len(self._student_ids)
+
+    def __contains__(self, student_id):
+        return student_id in self._rows
+
+    @property
+    def matrix(self):
+        """只读映射的特征矩阵(count, dim)，未打开时为None"""
+        return self._matrix
+
+    @property
+    def student_ids(self):
+        """行号 -> 学号"""
+        return self._student_ids
+
+    @property
+    def infos(self):
+        """行号 -> {"name", "class_name"}"""
+        return self._infos
+
+    def snapshot(self):
+        """当前打开的一份完整内容（重建线程可能同时重新打开，读取方应使用快照而不是分别读取各属性）"""
+        with self._lock:
+            return {
+                "matrix": self._matrix,
+                "student_ids": self._student_ids,
+                "infos": self._infos,
+                "data_path": self.data_path,
+                "built_at": self.built_at
+            }
+
+    def get(self, student_id):
+        """按学号取特征行（float32存储时为映射内存的视图，不拷贝），不存在时返回None"""
+        row = self._rows.get(student_id)
+        return None if row is None else self._matrix[row]
+
+    #------------------------ 读取 ------------------------#
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def changed(self):
+        """清单文件是否在上次打开后被替换"""
+        return self._stat() != self._file_state
+
+    def open(self):
+        """
+        读取清单并只读映射矩阵文件
+
+        Returns:
+            bool: 是否成功打开（文件不存在、格式或维度不符时返回False）
+        """
+        state = self._stat()
+        if state is None:
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if (manifest.get("version") != STORE_VERSION or manifest.get("dim") != self.dim
+                    or manifest.get("feature_type") != self.feature_type or manifest.get("dtype") != self.dtype):
+                logger.info(f"特征存储格式与配置不一致，需要重建: {self.path}")
+                return False
+            student_ids = manifest["student_ids"]
+            data_path = os.path.join(os.path.dirname(os.path.abspath(self.path)), manifest["data_file"])
+            if student_ids:
+                matrix = np.memmap(data_path, dtype=np.dtype(manifest["dtype"]), mode="r",
+                                   shape=(len(student_ids), self.dim))
+            else:
+                matrix = np.zeros((0, self.dim), dtype=np.dtype(manifest["dtype"]))
+        except Exception as e:
+            logger.error(f"打开特征存储失败: {str(e)}")
+            return False
+        with self._lock:
+            self._matrix = matrix
+            self._student_ids = student_ids
+            self._infos = [{"name": name, "class_name": class_name}
+                           for name, class_name in zip(manifest["names"], manifest["class_names"])]
+            self._rows = {sid: i for i, sid in enumerate(student_ids)}
+            self.data_path = data_path
+            self.signature = manifest.get("signature")
+            self.db_fingerprint = manifest.get("db_fingerprint")
+            self.built_at = manifest.get("built_at")
+            self._file_state = state
+        return True
+
+    def refresh(self):
+        """
+        清单文件被替换（其他进程或本进程重建）时重新映射
+
+        Returns:
+            bool: 是否重新打开
+        """
+        if not self.changed():
+            return False
+        return self.open()
+
+    #------------------------ 写入 ------------------------#
+
+    def write(self, student_ids, matrix, infos, db_fingerprint=None, built_at=None):
+        """
+        写入新的矩阵文件并原子替换清单文件
+
+        Args:
+            student_ids: 行号 -> 学号
+            matrix: (count, dim)的归一化特征矩阵
+            infos: 行号 -> {"name", "class_name"}
+            db_fingerprint: 写入时的数据库指纹（见AttendanceDB.get_face_feature_fingerprint）
+            built_at: 内容读取开始的时间戳，之后发生的变更不一定包含在内
+
+        Returns:
+            str: 矩阵文件路径
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.basename(os.path.splitext(self.path)[0])
+        data_file = f"{base}.{time.time_ns()}-{os.getpid()}.{STORE_DTYPES[self.dtype]}"
+        data_path = os.path.join(directory, data_file)
+        matrix = np.ascontiguousarray(np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim).astype(self.dtype, copy=False))
+        with open(data_path, "wb") as f:
+            f.write(matrix.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        manifest = {
+            "version": STORE_VERSION,
+            "feature_type": self.feature_type,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "data_file": data_file,
+            "count": len(student_ids),
+            "signature": feature_signature(student_ids, matrix),
+            "db_fingerprint": db_fingerprint,
+            "built_at": built_at if built_at is not None else time.time(),
+            "student_ids": list(student_ids),
+            "names": [(info or {}).get("name") for info in infos],
+            "class_names": [(info or {}).get("class_name") for info in infos]
+        }
+        # 临时清单名随矩阵文件唯一，同一进程内并发重建也不会互相覆盖
+        tmp_path = f"{data_path}.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._remove_stale_files(data_file)
+        return data_path
+
+    def _remove_stale_files(self, current):
+        """
+        删除本存储的旧矩阵文件
+        多个进程可能同时重建：替换清单后重新读取清单，保留清单当前指向的文件（可能是其他进程刚写入的），
+        最近修改的文件可能是其他进程尚未替换清单的新文件，同样保留；仍被映射（Windows）时跳过，下次重建再删
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(os.path.splitext(self.path)[0]) + "."
+        suffixes = tuple(f".{ext}" for ext in STORE_DTYPES.values())
+        keep = {current, os.path.basename(self.data_path or "")}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                keep.add(json.load(f).get("data_file"))
+        except Exception:
+            # 清单读取失败时无法确认当前文件，本次不清理
+            return
+        now = time.time()
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith(suffixes) and name not in keep:
+                file_path = os.path.join(directory, name)
+                try:
+                    if now - os.path.getmtime(file_path) < STALE_FILE_GRACE:
+                        continue
+                    os.remove(file_path)
+                except OSError:
+                    pass
+
+    def rebuild_from_db(self, db):
+        """
+        从数据库流式读取特征重写存储文件并重新映射
+
+        Args:
+            db: AttendanceDB实例
+
+        Returns:
+            bool: 是否成功
+        """
+        with self._rebuild_lock:
+            started = time.perf_counter()
+            built_at = time.time()
+            try:
+                # 指纹在读取前获取：读取期间发生的变更会使指纹不一致，下次启动时重建
+                fingerprint = db.get_face_feature_fingerprint(self.feature_type)
+                matrix = np.zeros((1024, self.dim), dtype=np.float32)
+                student_ids, infos = [], []
+                for rows in db.iter_face_features(self.feature_type):
+                    for student_id, name, class_name, feature in rows:
+                        vec = normalize_feature(feature, self.dim)
+                        if vec is None:
+                            logger.warning(f"学生 {student_id} 的特征维度异常，已跳过")
+                            continue
+                        if len(student_ids) >= matrix.shape[0]:
+                            matrix = np.concatenate([matrix, np.zeros_like(matrix)])
+                        matrix[len(student_ids)] = vec
+                        student_ids.append(student_id)
+                        infos.append({"name": name, "class_name": class_name})
+                self.write(student_ids, matrix[:len(student_ids)], infos,
+                           fingerprint["data"] if fingerprint["success"] else None, built_at)
+            except Exception as e:
+                logger.error(f"重建特征存储异常: {str(e)}")
+                return False
+            self.rebuilds += 1
+            self.last_rebuild_ms = round((time.perf_counter() - started) * 1000, 1)
+            logger.info(f"特征存储已重建，共 {len(student_ids)} 条特征，耗时 {self.last_rebuild_ms}ms")
+            return self.open()
+
+    def sync_with_db(self, db):
+        """
+        打开存储文件，文件不存在或数据库指纹不一致（服务停止期间有变更）时先重建
+
+        Returns:
+            bool: 存储是否可用
+        """
+        fingerprint = db.get_face_feature_fingerprint(self.feature_type)
+        if self.open() and fingerprint["success"] and fingerprint["data"] == self.db_fingerprint:
+            return True
+        return self.rebuild_from_db(db)
+
+    #------------------------ 与数据库同步 ------------------------#
+
+    def attach(self, db):
+        """注册到数据库的学生变更监听器，注册/删除学生后延迟重建"""
+        self._db = db
+        db.add_student_listener(self.on_student_changed)
+
+    def on_student_changed(self, action, student_id, data=None):
+        """数据库学生变更回调（批量注册时逐个学生回调，合并为一次重建）"""
+        self.schedule_rebuild()
+
+    def schedule_rebuild(self):
+        """rebuild_delay秒内没有新的变更时重建"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.rebuild_delay, self._run_scheduled_rebuild)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run_scheduled_rebuild(self):
+        with self._lock:
+            self._timer = None
+        if self._db is not None:
+            self.rebuild_from_db(self._db)
+
+    def flush(self):
+        """立即执行尚未到期的重建（服务关闭时调用）"""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+            if self._db is not None:
+                self.rebuild_from_db(self._db)
+
+    def stats(self):
+        """特征存储统计信息"""
+        with self._lock:
+            matrix = self._matrix
+            return {
+                "path": self.path,
+                "data_file": os.path.basename(self.data_path) if self.data_path else None,
+                "dtype": self.dtype,
+                "size": len(self._student_ids),
+                "file_bytes": int(matrix.nbytes) if matrix is not None else 0,
+                "rebuilds": self.rebuilds,
+                "last_rebuild_ms": self.last_rebuild_ms,
+                "pending_rebuild": self._timer is not None
+            }
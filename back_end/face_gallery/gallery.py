@@ -0,0 +1,536 @@
+"""
+常驻内存的1:N人脸特征库
+将students表中的InsightFace 512维特征(face_feature_2)加载为一个连续的float32矩阵，
+一次矩阵-向量乘法即可完成全库检索，并通过数据库监听器与学生注册/删除保持同步；
+特征库按班级分区，上课时段可只在当前班级分区内检索；
+配置磁盘特征存储（见face_gallery.feature_store）时直接使用只读映射的矩阵文件，多个进程共享同一份页缓存，
+本进程修改时先拷贝为私有矩阵，存储文件被重建后重新映射；
+模板可按float16或乘积量化编码保存（见face_gallery.encoding），以少量精度换取数倍的内存节省
+"""
+import os
+import time
+import threading
+import logging
+import numpy as np
+from database import FEATURE_COLUMNS
+from .feature_store import normalize_feature, feature_signature
+from .encoding import Float32Codec, create_codec
+
+logger = logging.getLogger("FaceGallery")
+
+# 默认识别阈值（映射到[0,1]后的相似度，与FaceProcessor.compare_features口径一致）
+DEFAULT_MATCH_THRESHOLD = 0.7
+
+
+class FaceGallery:
+    """
+    1:N人脸特征库
+    特征在入库时统一L2归一化，检索时余弦相似度即为内积
+    """
+    def __init__(self, dim=512, feature_type="deepface", initial_capacity=1024, index=None, index_path=None,
+                 store=None, store_check_interval=1.0, encoding="float32", codec_options=None):
+        """
+        初始化特征库
+
+        Args:
+            dim: 特征维度
+            feature_type: 对应数据库中的特征方案（见database.FEATURE_COLUMNS）
+            initial_capacity: 特征矩阵初始容量，容量不足时按倍数扩展
+            index: 可选的ANN索引（见face_gallery.ann），为None时使用精确检索
+            index_path: ANN索引持久化文件路径，为None时不落盘
+            store: 可选的磁盘特征存储（FeatureStore），提供时从存储文件映射加载
+            store_check_interval: 检索时检查存储文件是否被重建的最小间隔（秒）
+            encoding: 模板编码 float32/float16/pq，压缩编码不能与ANN索引同时使用（索引自带原始特征副本）
+            codec_options: 编码器参数（如pq的m、min_train_size）
+        """
+        if index is not None and encoding != "float32":
+            raise ValueError("ANN索引保存原始特征，只能与float32模板编码同时使用")
+        self.dim = dim
+        self.feature_type = feature_type
+        self.feature_column = FEATURE_COLUMNS[feature_type]
+        self._lock = threading.RLock()
+        self.codec = create_codec(encoding, dim, **(codec_options or {}))
+        # 实际使用的编码：PQ码本训练前模板保持原始特征
+        self._storage = self.codec if self.codec.is_trained else Float32Codec(dim)
+        self._matrix = np.zeros((max(1, initial_capacity), self._storage.width), dtype=self._storage.dtype)
+        self._size = 0
+        self._student_ids = []      # 行号 -> 学号
+        self._infos = []            # 行号 -> {"name", "class_name"}
+        self._rows = {}             # 学号 -> 行号
+        self._partitions = {}       # 班级 -> {学号}
+        self._partition_rows = {}   # 班级 -> 行号数组缓存（行号因删除交换而变化时失效）
+        self.index = index
+        self.index_path = index_path
+        self._index_dirty = False
+        self.store = store
+        self.store_check_interval = store_check_interval
+        self._store_checked_at = 0.0
+        self._store_data_path = None     # 当前使用的存储矩阵文件
+        self._modified_at = 0.0          # 本进程最近一次增量修改的时间
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, student_id):
+        return student_id in self._rows
+
+    @property
+    def matrix(self):
+        """当前有效的模板矩阵视图（编码后的形式，只读使用）"""
+        return self._matrix[:self._size]
+
+    def _parse_feature(self, feature):
+        """将二进制或数组特征解析为归一化的float32向量，维度不符时返回None"""
+        return normalize_feature(feature, self.dim)
+
+    def _ensure_capacity(self, size):
+        capacity = self._matrix.shape[0]
+        if size <= capacity and self._matrix.flags.writeable:
+            return
+        # 映射的存储文件只读，首次修改时拷贝为私有矩阵
+        capacity = max(capacity, 1)
+        while capacity < size:
+            capacity *= 2
+        matrix = np.zeros((capacity, self._storage.width), dtype=self._storage.dtype)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+
+    def _encode_all(self, vectors):
+        """
+        全量加载时编码全部特征：PQ码本未训练或特征数已超过训练时的两倍时，先用这批特征（重新）训练码本
+
+        Returns:
+            编码后的矩阵
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        codec = self.codec
+        if (codec.name == "pq" and codec.can_train(vectors.shape[0])
+                and (not codec.is_trained or vectors.shape[0] > codec.trained_size * 2)):
+            codec.train(vectors)
+            logger.info(f"PQ码本训练完成，训练样本 {vectors.shape[0]} 条")
+        self._storage = codec if codec.is_trained else Float32Codec(self.dim)
+        return self._storage.encode(vectors)
+
+    def _maybe_train_codec(self):
+        """增量注册使特征数达到PQ训练要求时训练码本并重新编码全部模板（调用方需持有锁）"""
+        if self._storage is self.codec or not self.codec.can_train(self._size):
+            return
+        codes = self._encode_all(self._storage.decode(self._matrix[:self._size]))
+        self._matrix = np.zeros((max(1, self._size * 2), self._storage.width), dtype=self._storage.dtype)
+        self._matrix[:self._size] = codes
+
+    #------------------------ 加载与同步 ------------------------#
+
+    def load(self, db):
+        """
+        加载特征：配置了存储时打开（必要时先从数据库重建）存储文件并映射，否则从数据库全量加载
+
+        Returns:
+            int: 成功加载的特征数量
+        """
+        if self.store is not None:
+            if self.store.sync_with_db(db):
+                return self.load_from_store()
+            logger.error("特征存储不可用，改为从数据库加载")
+        return self.load_from_db(db)
+
+    def load_from_db(self, db):
+        """
+        从数据库全量加载特征
+
+        Args:
+            db: AttendanceDB实例
+
+        Returns:
+            int: 成功加载的特征数量
+        """
+        student_ids, infos, vectors = [], [], []
+        try:
+            for rows in db.iter_face_features(self.feature_type):
+                for student_id, name, class_name, feature in rows:
+                    vec = self._parse_feature(feature)
+                    if vec is None:
+                        logger.warning(f"学生 {student_id} 的特征维度异常，已跳过")
+                        continue
+                    student_ids.append(student_id)
+                    infos.append({"name": name, "class_name": class_name})
+                    vectors.append(vec)
+        except Exception as e:
+            logger.error(f"加载人脸特征库失败: {str(e)}")
+            return 0
+
+        return self.load_vectors(student_ids, infos, vectors)
+
+    def load_vectors(self, student_ids, infos, vectors):
+        """
+        用给定的归一化特征替换特征库内容
+
+        Args:
+            student_ids: 学号列表
+            infos: 与学号对应的{"name", "class_name"}列表
+            vectors: 与学号对应的归一化float32特征
+
+        Returns:
+            int: 特征数量
+        """
+        with self._lock:
+            codes = self._encode_all(np.vstack(vectors) if len(vectors) else np.zeros((0, self.dim), dtype=np.float32))
+            self._matrix = np.zeros((max(1, len(vectors) * 2), self._storage.width), dtype=self._storage.dtype)
+            self._matrix[:len(vectors)] = codes
+            self._size = len(vectors)
+            self._student_ids = student_ids
+            self._infos = infos
+            self._rows = {sid: i for i, sid in enumerate(student_ids)}
+            self._partitions = {}
+            self._partition_rows = {}
+            for sid, info in zip(student_ids, infos):
+                self._partitions.setdefault(info["class_name"], set()).add(sid)
+            if self.index is not None:
+                self._load_or_build_index()
+        logger.info(f"人脸特征库加载完成，共 {self._size} 条特征")
+        return self._size
+
+    def load_from_store(self):
+        """
+        从已打开的特征存储加载：float32存储直接使用映射的矩阵（不拷贝），float16存储转换为float32
+
+        Returns:
+            int: 加载的特征数量
+        """
+        with self._lock:
+            self._adopt_store()
+            if self.index is not None:
+                self._load_or_build_index()
+        logger.info(f"人脸特征库已从特征存储加载，共 {self._size} 条特征")
+        return self._size
+
+    def _adopt_store(self, update_index=False):
+        """
+        用特征存储的内容替换当前特征库（调用方需持有锁）
+
+        Args:
+            update_index: 是否把与当前内容的差异增量同步到ANN索引
+        """
+        snapshot = self.store.snapshot()
+        store_matrix = snapshot["matrix"]
+        if self.codec.name != "pq" and store_matrix.dtype == self.codec.dtype:
+            # 存储文件与模板编码的数据类型一致时直接使用映射的矩阵
+            self._storage = self.codec
+            matrix = store_matrix
+        else:
+            matrix = self._encode_all(np.asarray(store_matrix, dtype=np.float32))
+        student_ids = list(snapshot["student_ids"])
+        rows = {sid: i for i, sid in enumerate(student_ids)}
+        if update_index and self.index is not None:
+            for student_id in self._rows.keys() - rows.keys():
+                self.index.remove(student_id)
+            for student_id, row in rows.items():
+                old_row = self._rows.get(student_id)
+                if old_row is None or not np.array_equal(self._matrix[old_row], matrix[row]):
+                    self.index.add(student_id, matrix[row])
+                    self._index_dirty = True
+        self._matrix = matrix if len(student_ids) else np.zeros((1, self._storage.width), dtype=self._storage.dtype)
+        self._size = len(student_ids)
+        self._student_ids = student_ids
+        self._infos = [dict(info) for info in snapshot["infos"]]
+        self._rows = rows
+        self._store_data_path = snapshot["data_path"]
+        self._partitions = {}
+        self._partition_rows = {}
+        for sid, info in zip(student_ids, self._infos):
+            self._partitions.setdefault(info["class_name"], set()).add(sid)
+
+    def _maybe_refresh_store(self):
+        """
+        存储文件被重建（本进程或其他进程的注册/删除）后切换到新的映射；
+        本进程在重建读取数据库之后又有增量修改时保留私有矩阵，等待下一次重建
+        """
+        if self.store is None:
+            return
+        now = time.monotonic()
+        if now - self._store_checked_at < self.store_check_interval:
+            return
+        self._store_checked_at = now
+        self.store.refresh()
+        with self._lock:
+            snapshot = self.store.snapshot()
+            if (snapshot["data_path"] is not None and snapshot["data_path"] != self._store_data_path
+                    and (snapshot["built_at"] or 0) >= self._modified_at):
+                self._adopt_store(update_index=True)
+
+    #------------------------ ANN索引维护 ------------------------#
+
+    def signature(self):
+        """特征库内容指纹，用于校验磁盘上的索引是否与当前数据一致"""
+        with self._lock:
+            return feature_signature(self._student_ids, self._matrix[:self._size])
+
+    def _load_or_build_index(self):
+        """优先加载磁盘索引，指纹不一致或加载失败时重建（调用方需持有锁）"""
+        signature = self.signature()
+        if self.index_path and os.path.exists(self.index_path):
+            try:
+                loaded = type(self.index).load(self.index_path)
+                if loaded.signature == signature:
+                    self.index = loaded
+                    logger.info(f"已加载ANN索引: {self.index_path}")
+                    return
+                logger.info("ANN索引与数据库不一致，重新构建")
+            except Exception as e:
+                logger.error(f"加载ANN索引失败: {str(e)}")
+        self.rebuild_index(signature)
+
+    def rebuild_index(self, signature=None):
+        """根据当前特征矩阵全量重建ANN索引并落盘"""
+        if self.index is None:
+            return
+        with self._lock:
+            self.index.build(self._student_ids, self._matrix[:self._size])
+            self.index.signature = signature or self.signature()
+            self._index_dirty = True
+        self.save_index()
+
+    def save_index(self):
+        """将ANN索引写入磁盘（仅在有变更时写入）"""
+        if self.index is None or not self.index_path or not self._index_dirty:
+            return
+        with self._lock:
+            try:
+                self.index.signature = self.signature()
+                self.index.save(self.index_path)
+                self._index_dirty = False
+                logger.info(f"ANN索引已保存: {self.index_path}")
+            except Exception as e:
+                logger.error(f"保存ANN索引失败: {str(e)}")
+
+    def attach(self, db):
+        """注册到数据库的学生变更监听器，注册/删除学生时增量更新特征库"""
+        db.add_student_listener(self.on_student_changed)
+
+    def on_student_changed(self, action, student_id, data=None):
+        """数据库学生变更回调"""
+        if action == "delete":
+            self.remove(student_id)
+            return
+        feature = (data or {}).get(self.feature_column)
+        if feature:
+            self.upsert(student_id, feature, name=data.get("name"), class_name=data.get("class_name"))
+        else:
+            # register_student会覆盖特征字段，无特征时需从库中移除
+            self.remove(student_id)
+
+    def upsert(self, student_id, feature, name=None, class_name=None):
+        """
+        新增或更新单个学生的特征
+
+        Returns:
+            bool: 是否写入成功
+        """
+        vec = self._parse_feature(feature)
+        if vec is None:
+            logger.warning(f"学生 {student_id} 的特征无效，未写入特征库")
+            return False
+        with self._lock:
+            row = self._rows.get(student_id)
+            self._ensure_capacity(self._size + (1 if row is None else 0))
+            self._modified_at = time.time()
+            if row is None:
+                row = self._size
+                self._size += 1
+                self._student_ids.append(student_id)
+                self._infos.append(None)
+                self._rows[student_id] = row
+            old_info = self._infos[row]
+            if old_info is not None:
+                self._leave_partition(student_id, old_info["class_name"])
+            self._matrix[row] = self._storage.encode(vec)[0]
+            self._infos[row] = {"name": name, "class_name": class_name}
+            self._partitions.setdefault(class_name, set()).add(student_id)
+            self._partition_rows.pop(class_name, None)
+            self._maybe_train_codec()
+            if self.index is not None:
+                self.index.add(student_id, vec)
+                self._index_dirty = True
+                if self.index.needs_rebuild():
+                    self.rebuild_index()
+        return True
+
+    def remove(self, student_id):
+        """
+        移除单个学生的特征（与末行交换，保持矩阵连续）
+
+        Returns:
+            bool: 是否存在并被移除
+        """
+        with self._lock:
+            row = self._rows.pop(student_id, None)
+            if row is None:
+                return False
+            self._ensure_capacity(self._size)
+            self._modified_at = time.time()
+            self._leave_partition(student_id, self._infos[row]["class_name"])
+            # 末行被交换到新位置，所有分区的行号缓存均可能失效
+            self._partition_rows.clear()
+            last = self._size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                moved_id = self._student_ids[last]
+                self._student_ids[row] = moved_id
+                self._infos[row] = self._infos[last]
+                self._rows[moved_id] = row
+            self._student_ids.pop()
+            self._infos.pop()
+            self._size = last
+            if self.index is not None:
+                self.index.remove(student_id)
+                self._index_dirty = True
+        return True
+
+    #------------------------ 班级分区 ------------------------#
+
+    def _leave_partition(self, student_id, class_name):
+        """将学生移出班级分区（调用方需持有锁）"""
+        members = self._partitions.get(class_name)
+        if members is None:
+            return
+        members.discard(student_id)
+        if not members:
+            del self._partitions[class_name]
+        self._partition_rows.pop(class_name, None)
+
+    def _rows_for_classes(self, class_names):
+        """获取若干班级分区的行号数组（调用方需持有锁）"""
+        arrays = []
+        for class_name in class_names:
+            rows = self._partition_rows.get(class_name)
+            if rows is None:
+                members = self._partitions.get(class_name, ())
+                rows = np.fromiter((self._rows[sid] for sid in members), dtype=np.int64, count=len(members))
+                self._partition_rows[class_name] = rows
+            arrays.append(rows)
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(arrays) if len(arrays) > 1 else arrays[0]
+
+    def partition_sizes(self):
+        """各班级分区的特征数量"""
+        with self._lock:
+            return {class_name: len(members) for class_name, members in self._partitions.items()}
+
+    #------------------------ 检索 ------------------------#
+
+    def search(self, feature, top_k=1, exact=False, class_names=None):
+        """
+        1:N检索，返回相似度最高的top_k个学生
+
+        Args:
+            feature: 待检索特征（list/ndarray/bytes）
+            top_k: 返回结果数量
+            exact: 配置了ANN索引时是否强制精确检索
+            class_names: 仅在这些班级分区内检索（分区规模小，始终精确检索），为None时全库检索
+
+        Returns:
+            list: [{"student_id", "name", "class_name", "score", "similarity"}]，
+                  score为余弦相似度，similarity为映射到[0,1]后的相似度
+        """
+        query = self._parse_feature(feature)
+        if query is None:
+            return []
+        self._maybe_refresh_store()
+        with self._lock:
+            if self._size == 0:
+                return []
+            if class_names is not None:
+                rows = self._rows_for_classes(class_names)
+                return self._top_k(self._storage.scores(self._matrix[rows], query), rows, top_k)
+            if self.index is not None and not exact:
+                hits = self.index.search(query, top_k)
+                rows = np.array([self._rows[sid] for sid, _ in hits if sid in self._rows], dtype=np.int64)
+                scores = np.array([score for sid, score in hits if sid in self._rows], dtype=np.float32)
+                return self._top_k(scores, rows, top_k)
+            scores = self._storage.scores(self._matrix[:self._size], query)
+            return self._top_k(scores, np.arange(self._size), top_k)
+
+    def score(self, student_id, feature):
+        """
+        查询特征与指定学生模板的余弦相似度（按当前模板编码计算），学生不在库中或特征无效时返回None
+        """
+        query = self._parse_feature(feature)
+        if query is None:
+            return None
+        with self._lock:
+            row = self._rows.get(student_id)
+            if row is None:
+                return None
+            return float(self._storage.scores(self._matrix[row:row + 1], query)[0])
+
+    def _top_k(self, scores, rows, top_k):
+        """从候选行中取前top_k个结果（调用方需持有锁）"""
+        k = min(top_k, len(rows))
+        if k <= 0:
+            return []
+        if k < len(rows):
+            idx = np.argpartition(-scores, k - 1)[:k]
+        else:
+            idx = np.arange(len(rows))
+        idx = idx[np.argsort(-scores[idx])]
+        results = []
+        for i in idx:
+            row = int(rows[i])
+            score = float(scores[i])
+            info = self._infos[row] or {}
+            results.append({
+                "student_id": self._student_ids[row],
+                "name": info.get("name"),
+                "class_name": info.get("class_name"),
+                "score": score,
+                "similarity": (score + 1) / 2
+            })
+        return results
+
+    def identify(self, feature, threshold=DEFAULT_MATCH_THRESHOLD, class_names=None, fallback=True):
+        """
+        识别身份，最相似结果达到阈值时返回该学生，否则返回None
+
+        Args:
+            feature: 待识别特征
+            threshold: 识别阈值
+            class_names: 优先检索的班级分区（如当前时段有考勤规则的班级）
+            fallback: 分区内未匹配时是否回退到全库检索
+
+        Returns:
+            tuple: (匹配结果或None, 最相似结果或None)，结果中scope字段标明命中范围(class/global)
+        """
+        best = None
+        if class_names:
+            results = self.search(feature, top_k=1, class_names=class_names)
+            if results:
+                best = dict(results[0], scope="class")
+                if best["similarity"] >= threshold:
+                    return best, best
+            if not fallback:
+                return None, best
+        results = self.search(feature, top_k=1)
+        if results and (best is None or results[0]["similarity"] > best["similarity"]):
+            best = dict(results[0], scope="global")
+        if best is None:
+            return None, None
+        return (best if best["similarity"] >= threshold else None), best
+
+    def stats(self):
+        """特征库统计信息"""
+        with self._lock:
+            return {
+                "feature_type": self.feature_type,
+                "dim": self.dim,
+                "size": self._size,
+                "capacity": int(self._matrix.shape[0]),
+                "memory_bytes": int(self._matrix.nbytes) + self.codec.nbytes,
+                "encoding": self.codec.name,
+                "active_encoding": self._storage.name,
+                "bytes_per_template": int(self._matrix.itemsize * self._storage.width),
+                "shared": isinstance(self._matrix, np.memmap),
+                "index": self.index.kind if self.index is not None else "exact",
+                "partitions": len(self._partitions),
+                "store": self.store.stats() if self.store is not None else None
+            }
@@ -75,6 +75,17 @@ class DeepFaceAttendanceModel:
         except Exception as e:
             return {'success': False, 'message': f'特征提取失败: {str(e)}'}
 
+    def warmup(self, img):
+        """在合成帧上预热检测器与识别模型（构建计算图），不要求检出人脸"""
+        DeepFace.represent(
+            img_path=img,
+            model_name=self.model_name,
+            detector_backend=self.detector_backend,
+            enforce_detection=False,
+            align=True,
+            normalization="ArcFace"
+        )
+
     def compare_features(self, feature1, feature2, threshold=0.5):
         """
         比较两个人脸特征向量的相似度
@@ -135,10 +146,9 @@ class DeepFaceAttendanceModel:
                 "message": str(e)
             }
 
-# 实例化模型
-arc_face = DeepFaceAttendanceModel(detector_backend='mtcnn', model_name='ArcFace')
-
 if __name__ == "__main__":
+    # 仅在直接运行时实例化，导入本模块不加载模型
+    arc_face = DeepFaceAttendanceModel(detector_backend='mtcnn', model_name='ArcFace')
     image_path = "D:\\dasanxia\\content_s\\lab6\\back_end\\uploads\\1.jpg"
     liveness_result = arc_face.detect_liveness(image_path)
     print("活体检测结果:", liveness_result)
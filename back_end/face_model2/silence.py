@@ -1,3 +1,5 @@
+import os
+import inspect
 import cv2
 import numpy as np
 import torch
@@ -180,10 +182,20 @@ def MiniFASNetV2(embedding_size=128, conv6_kernel=(5, 5),
     return MiniFASNet(keep_dict['1.8M_'], embedding_size, conv6_kernel, 
                      drop_p, num_classes, img_channel)
 
+# ONNX模型导出目录与文件名（backend='onnx'）
+ONNX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx")
+ONNX_FILES = {"facenet": "facenet_vggface2.onnx", "minifasnet": "minifasnetv2_80x80.onnx"}
+
 class SilentFaceRecognitionModel:
     def __init__(self, 
                  liveness_model_path="D:\\dasanxia\\content_s\\lab6\\back_end\\face_model2\\anti_spoof_models\\2.7_80x80_MiniFASNetV2.pth", 
-                 device='cpu'):
+                 device='cpu', backend='torch', onnx_dir=None, intra_op_threads=None,
+                 quantization=None, calibration_dir=None, force_quantize=False):
+        """
+        backend='onnx'时FaceNet与MiniFASNetV2改用ONNX Runtime CPU会话推理（onnx_dir下缺少模型时先导出），
+        MTCNN检测仍使用PyTorch（多尺度金字塔+三级网络，逐帧输入尺寸不同，不做导出）
+        quantization为dynamic/static时改用INT8量化模型（需要backend='onnx'），static用calibration_dir下的图片校准
+        """
         self.device = torch.device(device)
         self.mtcnn = MTCNN(keep_all=True, device=self.device)
         self.facenet = InceptionResnetV1(pretrained='vggface2').eval().to(self.device)
@@ -194,6 +206,122 @@ class SilentFaceRecognitionModel:
             transforms.ToTensor(),
             transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
         ])
+        self.backend = backend
+        self.facenet_ort = None
+        self.liveness_ort = None
+        self.quantization = quantization
+        if quantization and backend != 'onnx':
+            raise ValueError("INT8量化模型需要backend='onnx'")
+        if backend == 'onnx':
+            self.load_onnx(onnx_dir or ONNX_DIR, intra_op_threads, quantization, calibration_dir, force_quantize)
+        elif backend != 'torch':
+            raise ValueError(f"不支持的推理后端: {backend}")
+
+    def export_onnx(self, output_dir=None):
+        """
+        导出FaceNet(InceptionResnetV1)和MiniFASNetV2为ONNX模型（batch维为动态）
+
+        Returns:
+            dict: {"facenet": 路径, "minifasnet": 路径}
+        """
+        output_dir = output_dir or ONNX_DIR
+        os.makedirs(output_dir, exist_ok=True)
+        # torch>=2.9默认使用dynamo导出器，其导出的图无法通过onnxruntime量化工具的形状推断，固定使用TorchScript导出器
+        options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        paths = {}
+        for name, model, size in (("facenet", self.facenet, 160), ("minifasnet", self.liveness_model, 80)):
+            path = os.path.join(output_dir, ONNX_FILES[name])
+            torch.onnx.export(
+                model,
+                torch.zeros(1, 3, size, size, device=self.device),
+                path,
+                input_names=["input"],
+                output_names=["output"],
+                dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+                opset_version=13,
+                do_constant_folding=True,
+                **options
+            )
+            paths[name] = path
+        return paths
+
+    def load_onnx(self, onnx_dir, intra_op_threads=None, quantization=None, calibration_dir=None, force_quantize=False):
+        """加载（必要时先导出、量化）ONNX模型并创建优化后的推理会话"""
+        from pipeline.onnx_runtime import OrtRunner
+        paths = {name: os.path.join(onnx_dir, filename) for name, filename in ONNX_FILES.items()}
+        if not all(os.path.exists(path) for path in paths.values()):
+            paths = self.export_onnx(onnx_dir)
+        if quantization:
+            paths = self.quantize_onnx(paths, quantization, calibration_dir, force_quantize)
+        self.facenet_ort = OrtRunner(paths["facenet"], intra_op_threads=intra_op_threads)
+        self.liveness_ort = OrtRunner(paths["minifasnet"], intra_op_threads=intra_op_threads)
+
+    def quantize_onnx(self, paths, mode, calibration_dir=None, force=False):
+        """
+        生成（或复用缓存的）INT8量化模型
+
+        Args:
+            paths: export_onnx返回的FP32模型路径
+            mode: dynamic/static
+            calibration_dir: static时的校准图片目录
+            force: 忽略缓存强制重新量化
+
+        Returns:
+            dict: {"facenet": 量化模型路径, "minifasnet": 量化模型路径}
+        """
+        from pipeline.quantization import ensure_quantized, load_calibration_frames
+        calibration = {}
+
+        def calibration_fn(name):
+            if not calibration:
+                if not calibration_dir:
+                    raise ValueError("静态量化需要指定校准图片目录")
+                calibration.update(self.calibration_inputs(load_calibration_frames(calibration_dir)))
+            if not calibration[name]:
+                raise ValueError(f"校准图片中未检测到可用于{name}校准的人脸: {calibration_dir}")
+            return calibration[name]
+
+        return {name: ensure_quantized(path, mode, lambda name=name: calibration_fn(name), force=force)
+                for name, path in paths.items()}
+
+    def calibration_inputs(self, frames):
+        """
+        按推理时相同的预处理把BGR图像转换为FaceNet/MiniFASNetV2的校准输入（用PyTorch的MTCNN检测人脸）
+
+        Returns:
+            dict: {"facenet": [(3,160,160)数组], "minifasnet": [(3,80,80)数组]}
+        """
+        inputs = {"facenet": [], "minifasnet": []}
+        for img in frames:
+            with torch.no_grad():
+                face_tensor = self.mtcnn(Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)))
+                boxes, _ = self.mtcnn.detect(img)
+            if face_tensor is not None:
+                face_tensor = face_tensor.unsqueeze(0) if len(face_tensor.shape) == 3 else face_tensor
+                inputs["facenet"].append(face_tensor[0].cpu().numpy())
+            if boxes is not None and len(boxes) > 0:
+                x1, y1, x2, y2 = map(int, boxes[0])
+                face_img = img[max(0, y1):y2, max(0, x1):x2]
+                if face_img.size > 0:
+                    inputs["minifasnet"].append(self.transform(face_img).numpy())
+        return inputs
+
+    def _facenet_embeddings(self, face_tensor):
+        """FaceNet推理，返回(N, 512)特征数组"""
+        if self.facenet_ort is not None:
+            return self.facenet_ort.run(face_tensor.cpu().numpy())[0].copy()
+        with torch.no_grad():
+            return self.facenet(face_tensor.to(self.device)).cpu().numpy()
+
+    def _liveness_probs(self, input_tensor):
+        """MiniFASNetV2推理，返回首个样本的softmax概率"""
+        if self.liveness_ort is not None:
+            logits = self.liveness_ort.run(input_tensor.cpu().numpy())[0]
+            exp = np.exp(logits[0] - logits[0].max())
+            return exp / exp.sum()
+        with torch.no_grad():
+            output = self.liveness_model(input_tensor.to(self.device))
+            return torch.softmax(output, dim=1)[0].cpu().numpy()
 
     def load_liveness_model(self, model_path):
         # 使用原始定义的工厂函数创建模型
@@ -215,8 +343,11 @@ class SilentFaceRecognitionModel:
         return model.eval().to(self.device)
 
     def detect_liveness(self, image_path):
+        return self.detect_liveness_from_numpy(cv2.imread(image_path))
+
+    def detect_liveness_from_numpy(self, img):
+        """对已解码的BGR图像进行活体检测"""
         try:
-            img = cv2.imread(image_path)
             if img is None:
                 # print(f"[DEBUG] 无法读取图片: {image_path}")
                 return {'success': False, 'is_live': False, 'message': '无法读取图片'}
@@ -234,15 +365,12 @@ class SilentFaceRecognitionModel:
             if face_img.size == 0:
                 # print("[DEBUG] 人脸区域为空")
                 return {'success': False, 'is_live': False, 'message': '人脸区域为空'}
-            input_tensor = self.transform(face_img).unsqueeze(0).to(self.device)
+            input_tensor = self.transform(face_img).unsqueeze(0)
             # print(f"[DEBUG] 输入张量shape: {input_tensor.shape}")
 
             # 执行推理
-            with torch.no_grad():
-                output = self.liveness_model(input_tensor)
-                # print(f"[DEBUG] 模型原始输出: {output}")
-                probs = torch.softmax(output, dim=1)[0].cpu().numpy()
-                # print(f"[DEBUG] softmax后概率: {probs}")
+            probs = self._liveness_probs(input_tensor)
+            # print(f"[DEBUG] softmax后概率: {probs}")
 
             is_live = probs[1] > 0.5
             return {
@@ -259,6 +387,18 @@ class SilentFaceRecognitionModel:
     def extract_feature(self, image_path):
         try:
             img = Image.open(image_path).convert('RGB')
+        except Exception as e:
+            return {'success': False, 'message': f'特征提取失败: {str(e)}'}
+        return self._extract_feature_from_pil(img)
+
+    def extract_feature_from_numpy(self, img):
+        """对已解码的BGR图像提取人脸特征"""
+        if img is None:
+            return {'success': False, 'message': '无法读取图片'}
+        return self._extract_feature_from_pil(Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)))
+
+    def _extract_feature_from_pil(self, img):
+        try:
             face_tensor = self.mtcnn(img)
             if face_tensor is None:
                 return {'success': False, 'message': '未检测到人脸'}
@@ -268,15 +408,20 @@ class SilentFaceRecognitionModel:
                 face_tensor = face_tensor.unsqueeze(0)
             # 如果已经是多张人脸，shape为[n, 3, 160, 160]，无需处理
 
-            face_tensor = face_tensor.to(self.device)
-            with torch.no_grad():
-                embedding = self.facenet(face_tensor)[0].cpu().numpy()
+            embedding = self._facenet_embeddings(face_tensor)[0]
                 
             return {'success': True, 'feature_data': embedding}
 
         except Exception as e:
             return {'success': False, 'message': f'特征提取失败: {str(e)}'}
 
+    def warmup(self, img):
+        """在合成帧上预热：MTCNN推理整帧，FaceNet与MiniFASNet以各自输入尺寸的零张量推理"""
+        with torch.no_grad():
+            self.mtcnn.detect(img)
+        self._facenet_embeddings(torch.zeros(1, 3, 160, 160))
+        self._liveness_probs(torch.zeros(1, 3, 80, 80))
+
     def compare_features(self, feature1, feature2, threshold=0.6):
         try:
             f1 = np.asarray(feature1, dtype=np.float32).ravel()
@@ -2,23 +2,94 @@
 import cv2
 import numpy as np
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 from .config import MODEL_DIR, FACE_MODEL_NAME, FACE_DET_THRESH, LIVENESS_THRESHOLD
 
 
 class FaceProcessor:
-    def __init__(self):
+    def __init__(self, intra_op_threads: Optional[int] = None, optimization: Optional[str] = None,
+                 quantization: Optional[str] = None, calibration_dir: Optional[str] = None, force_quantize: bool = False):
         """
         初始化人脸处理模型
         - 加载InsightFace模型用于人脸检测和特征提取
+        - 指定intra_op_threads或optimization时按该参数重建各模型的onnxruntime会话（FaceAnalysis不透传SessionOptions），
+          多个线程并发推理时限制每个会话的算子内线程数，避免线程超订
+        - 指定quantization时识别模型改用INT8量化模型（CPU推理），检测等其余模型不变
+        :param intra_op_threads: 每个会话的算子内线程数，None时使用onnxruntime默认值（物理核数）
+        :param optimization: 图优化级别 disable/basic/extended/all
+        :param quantization: 识别模型量化模式 dynamic/static，None时使用FP32模型
+        :param calibration_dir: static量化的校准图片目录
+        :param force_quantize: 忽略已缓存的量化模型，重新量化（更换校准集后使用）
         """
+        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
         self.face_app = FaceAnalysis(
             name=FACE_MODEL_NAME,
             root=str(MODEL_DIR),
-            providers=['CUDAExecutionProvider', 'CPUExecutionProvider']
+            providers=providers
         )
+        if intra_op_threads or optimization:
+            self._rebuild_sessions(providers, intra_op_threads, optimization or "all")
         self.face_app.prepare(ctx_id=0, det_thresh=FACE_DET_THRESH)
+        self.quantization = quantization
+        self.quantized_model_file = None
+        if quantization:
+            self._load_quantized_recognition(quantization, calibration_dir, force_quantize,
+                                             intra_op_threads, optimization or "all")
+
+    def _rebuild_sessions(self, providers: List[str], intra_op_threads: Optional[int], optimization: str) -> None:
+        """用调优后的SessionOptions为各模型重新创建推理会话（同一模型文件，输入输出不变）"""
+        import onnxruntime
+        from pipeline.onnx_runtime import make_session_options
+        for model in self.face_app.models.values():
+            options = make_session_options(intra_op_threads, 1, optimization)
+            model.session = onnxruntime.InferenceSession(model.model_file, sess_options=options, providers=providers)
+
+    def _load_quantized_recognition(self, mode: str, calibration_dir: Optional[str], force: bool,
+                                    intra_op_threads: Optional[int], optimization: str) -> None:
+        """
+        量化识别模型（结果缓存在models/quantized/<模型名>/下，不能放在FaceAnalysis扫描的模型目录中）并替换其推理会话，
+        输入输出名称与预处理参数不变
+        """
+        import onnxruntime
+        from pipeline.onnx_runtime import make_session_options
+        from pipeline.quantization import ensure_quantized, load_calibration_frames
+        rec_model = self.face_app.models["recognition"]
+
+        def calibration_fn():
+            if not calibration_dir:
+                raise ValueError("静态量化需要指定校准图片目录")
+            blobs = self.calibration_inputs(load_calibration_frames(calibration_dir))
+            if not blobs:
+                raise ValueError(f"校准图片中未检测到人脸: {calibration_dir}")
+            return blobs
+
+        self.quantized_model_file = ensure_quantized(rec_model.model_file, mode, calibration_fn,
+                                                     output_dir=str(MODEL_DIR / "quantized" / FACE_MODEL_NAME), force=force)
+        options = make_session_options(intra_op_threads, 1, optimization)
+        rec_model.session = onnxruntime.InferenceSession(self.quantized_model_file, sess_options=options,
+                                                         providers=['CPUExecutionProvider'])
+
+    def calibration_inputs(self, imgs: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        按识别模型推理时的预处理（检测、五点对齐、归一化）把BGR图像转换为校准输入，每张图取第一张人脸
+        :param imgs: BGR格式的图像数据列表
+        :return: (3, H, W)的float32数组列表
+        """
+        det_model = self.face_app.det_model
+        rec_model = self.face_app.models["recognition"]
+        blobs = []
+        for img in imgs:
+            bboxes, kpss = det_model.detect(img, max_num=0, metric="default")
+            if bboxes.shape[0] == 0 or kpss is None:
+                continue
+            crop = face_align.norm_crop(img, landmark=kpss[0], image_size=rec_model.input_size[0])
+            blob = cv2.dnn.blobFromImages([crop], 1.0 / rec_model.input_std, rec_model.input_size,
+                                          (rec_model.input_mean,) * 3, swapRB=True)
+            blobs.append(blob[0])
+        return blobs
 
     def detect_faces(self, image_path: str) -> Dict[str, Any]:
         """
@@ -29,20 +100,117 @@ class FaceProcessor:
         img = cv2.imread(image_path)
         if img is None:
             return {"success": False, "message": "无法读取图片文件"}
+        return self.detect_faces_from_numpy(img)
 
-        faces = self.face_app.get(img)
+    def _get_faces(self, img: np.ndarray, context=None, stage: str = "detect") -> List[Any]:
+        """
+        运行InsightFace检测+识别，提供单帧分析上下文时复用同一帧已有的Face对象
+        :param img: BGR格式的图像数据
+        :param context: pipeline.FrameContext，为None时直接检测
+        :param stage: 调用阶段名称，用于统计缓存命中
+        :return: Face对象列表
+        """
+        if context is None:
+            return self.face_app.get(img)
+        return context.get_or_compute("insightface_faces", stage, lambda: self.face_app.get(img))
+
+    def detect_faces_from_numpy(self, img: np.ndarray, context=None) -> Dict[str, Any]:
+        """
+        从numpy数组检测人脸并提取特征（用于视频流实时识别）
+        :param img: BGR格式的图像数据
+        :param context: 单帧分析上下文，提供时复用同一帧的检测结果
+        :return: 包含人脸信息和特征的字典
+        """
+        return self._faces_result(self._get_faces(img, context, stage="embedding"))
+
+    def detect_faces_batch(self, imgs: List[np.ndarray], contexts: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+        """
+        批量检测人脸并提取特征：逐张检测，识别模型对所有对齐人脸一次批量推理
+        返回结果与detect_faces_from_numpy逐张调用一致；单张图片检测或对齐失败只影响该图片的结果
+        :param imgs: BGR格式的图像数据列表
+        :param contexts: 与imgs一一对应的单帧分析上下文（可为None），检测结果以"insightface_faces"写入，
+                         与detect_faces_from_numpy/check_liveness_from_numpy共用
+        :return: 与输入一一对应的结果字典列表
+        """
+        rec_model = self.face_app.models["recognition"]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(imgs)
+        crops, owners = [], []
+        for i, img in enumerate(imgs):
+            if img is None:
+                results[i] = {"success": False, "message": "无法读取图片文件"}
+                continue
+            try:
+                faces = self._detect_for_batch(img)
+                if faces and faces[0].kps is None:
+                    results[i] = {"success": False, "message": "检测模型未输出人脸关键点，无法对齐人脸"}
+                    continue
+                if faces:
+                    crops.append(face_align.norm_crop(img, landmark=faces[0].kps, image_size=rec_model.input_size[0]))
+            except Exception as e:
+                results[i] = {"success": False, "message": f"人脸检测失败: {str(e)}"}
+                continue
+            owners.append((i, faces))
+        if crops:
+            embeddings = iter(rec_model.get_feat(crops))
+            for i, faces in owners:
+                if faces:
+                    faces[0].embedding = next(embeddings).flatten()
+        for i, faces in owners:
+            if contexts is not None and contexts[i] is not None:
+                contexts[i].put("insightface_faces", faces)
+            results[i] = self._faces_result(faces)
+        return results
+
+    def _detect_for_batch(self, img: np.ndarray) -> List[Any]:
+        """
+        与FaceAnalysis.get相同的检测与逐人脸模型（关键点、属性），但不运行识别模型（由detect_faces_batch批量推理），
+        且只处理第一张人脸（其余人脸只有检测框和5点关键点）
+        """
+        bboxes, kpss = self.face_app.det_model.detect(img, max_num=0, metric="default")
+        faces = [Face(bbox=bboxes[j, 0:4], kps=kpss[j] if kpss is not None else None, det_score=bboxes[j, 4])
+                 for j in range(bboxes.shape[0])]
+        if faces:
+            for taskname, model in self.face_app.models.items():
+                if taskname not in ("detection", "recognition"):
+                    model.get(img, faces[0])
+        return faces
+
+    def warmup(self, img: np.ndarray) -> None:
+        """
+        在合成帧上预热：检测模型推理整帧，其余模型（关键点、属性、识别）在画面中央的模拟人脸上推理，
+        不依赖合成帧能否检出人脸
+        :param img: BGR格式的图像数据
+        """
+        self.face_app.det_model.detect(img, max_num=0, metric="default")
+        height, width = img.shape[:2]
+        size = min(height, width) / 2.0
+        x0, y0 = (width - size) / 2.0, (height - size) / 2.0
+        kps = (face_align.arcface_dst / 112.0 * size + np.array([x0, y0])).astype(np.float32)
+        face = Face(bbox=np.array([x0, y0, x0 + size, y0 + size], dtype=np.float32), kps=kps, det_score=1.0)
+        for taskname, model in self.face_app.models.items():
+            if taskname != "detection":
+                model.get(img, face)
+
+    @classmethod
+    def _faces_result(cls, faces: List[Any]) -> Dict[str, Any]:
+        """将检测到的Face对象列表转换为接口返回的结果字典"""
         if len(faces) == 0:
             return {"success": False, "message": "未检测到人脸"}
 
         # 只处理第一张人脸（假设考勤场景单人）
-        face = faces[0]
-        # 修复landmark为None时报错
-        landmark = face.landmark.tolist() if face.landmark is not None else None
+        return cls._face_result(faces[0], len(faces))
+
+    @staticmethod
+    def _face_result(face: Any, face_count: int) -> Dict[str, Any]:
+        """将InsightFace的Face对象转换为接口返回的结果字典"""
+        # Face对象没有landmark字段（未知属性返回None）：依次取106点关键点、检测器输出的5点关键点
+        landmark = next((points for points in (face.landmark, face.landmark_2d_106, face.kps) if points is not None), None)
+        landmark = landmark.tolist() if landmark is not None else None
         # 特征向量转为list，便于后续处理
         feature = face.normed_embedding.tolist() if hasattr(face.normed_embedding, 'tolist') else face.normed_embedding
         return {
             "success": True,
-            "face_count": len(faces),
+            "face_count": face_count,
             "bbox": face.bbox.tolist(),  # 人脸框坐标
             "landmark": landmark,  # 人脸关键点
             "feature": feature,  # 归一化后的特征向量
@@ -77,9 +245,24 @@ class FaceProcessor:
             img = cv2.imread(image_path)
             if img is None:
                 return {"success": False, "message": "无法读取图片文件"}
-                
+            return self.check_liveness_from_numpy(img)
+        except Exception as e:
+            return {"success": False, "message": f"活体检测失败: {str(e)}"}
+
+    def check_liveness_from_numpy(self, img: np.ndarray, context=None) -> Dict[str, Any]:
+        """
+        从numpy数组进行活体检测
+        
+        Args:
+            img: BGR格式的图像数据
+            context: 单帧分析上下文，提供时复用同一帧的检测结果
+            
+        Returns:
+            包含检测结果和多维度指标的字典
+        """
+        try:
             # 1. 人脸检测与区域裁剪
-            faces = self.face_app.get(img)
+            faces = self._get_faces(img, context, stage="liveness")
             if len(faces) == 0:
                 return {"success": False, "message": "未检测到人脸"}
                 
@@ -178,12 +361,11 @@ class FaceProcessor:
             }
 
 
-# 全局实例化处理器
-face_processor = FaceProcessor()
-
 def main():
     import sys
     print("FaceProcessor 测试程序")
+    # 仅在直接运行时实例化，导入本模块不加载模型
+    face_processor = FaceProcessor()
     img1 = input("请输入第一张图片路径: ").strip()
     img2 = input("请输入第二张图片路径: ").strip()
 
@@ -10,6 +10,9 @@ import numpy as np
 import cv2
 import platform
 import logging
+from contextlib import ExitStack
+
+from .engine_pool import EngineHandlePool
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -116,7 +119,7 @@ class ArcFaceSDK:
     虹软ArcSoft人脸识别SDK Python封装类
     实现了SDK初始化、人脸检测、特征提取和活体检测等功能
     """
-    def __init__(self, app_id=None, sdk_key=None, lib_path=None):
+    def __init__(self, app_id=None, sdk_key=None, lib_path=None, pool_size=1):
         """
         初始化SDK
         
@@ -124,25 +127,31 @@ class ArcFaceSDK:
             app_id: SDK授权APP_ID
             sdk_key: SDK授权密钥
             lib_path: SDK库文件路径，默认自动查找
+            pool_size: 引擎句柄数量，决定可同时调用SDK的线程数
         """
         self.app_id = app_id or b'8QDRt1hher7yzUrXPeK26gfv8zkSqnvapc25NwKk9h7c'  # 
         self.sdk_key = sdk_key or b'6e6oU8h4Vo8uiNVqEppTY1Uxa6M3G92pZG5wDLUidj2u'  # 
-        self.handle = c_void_p()
+        self.handle = c_void_p()  # 句柄池中的第一个句柄，兼容单句柄用法
+        self.engines = None
+        self.pool_size = max(1, int(pool_size))
         self.mask = ASF_FACE_DETECT | ASF_FACERECOGNITION | ASF_LIVENESS
         self.lib = None
         self.active = False
+        self.liveness_rgb_threshold = 0.4
+        self.liveness_ir_threshold = 0.6
         
         # 确定库文件路径
         if lib_path:
             self.lib_path = lib_path
         else:
-            # 自动查找库文件
+            # 自动查找库文件（Linux版SDK为.so）
+            lib_name = 'libarcsoft_face_engine.dll' if platform.system() == 'Windows' else 'libarcsoft_face_engine.so'
             sdk_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            self.lib_path = os.path.join(sdk_path, 'libarcsoft_face_engine.dll')
+            self.lib_path = os.path.join(sdk_path, lib_name)
             
             # 如果找不到库文件，尝试从ArcSoft目录查找
             if not os.path.exists(self.lib_path):
-                arc_path = os.path.join(sdk_path, 'ArcSoft', 'lib', 'X64' if IS_64 else 'Win32', 'libarcsoft_face_engine.dll')
+                arc_path = os.path.join(sdk_path, 'ArcSoft', 'lib', 'X64' if IS_64 else 'Win32', lib_name)
                 if os.path.exists(arc_path):
                     self.lib_path = arc_path
                 
@@ -233,33 +242,66 @@ class ArcFaceSDK:
         return True
     
     def init_engine(self):
-        """初始化引擎"""
-        ret = self.ASFInitEngine(ASF_DETECT_MODE_IMAGE, ASF_OP_0_ONLY, 30, 5, self.mask, pointer(self.handle))
+        """初始化引擎句柄池（pool_size个引擎句柄）"""
+        self.engines = EngineHandlePool(self._create_engine_handle, self._release_engine_handle, self.pool_size)
+        if self.engines.size == 0:
+            logger.error("引擎初始化失败")
+            return False
+        self.handle = self.engines.handles[0]
+        logger.info(f"引擎初始化成功，句柄数: {self.engines.size}")
+        return True
+
+    def _create_engine_handle(self):
+        """初始化单个引擎句柄并设置活体阈值，失败时返回None"""
+        handle = c_void_p()
+        ret = self.ASFInitEngine(ASF_DETECT_MODE_IMAGE, ASF_OP_0_ONLY, 30, 5, self.mask, pointer(handle))
         if ret != MOK:
             logger.error(f"引擎初始化失败，错误码: {ret}")
-            return False
-            
-        logger.info("引擎初始化成功")
+            return None
         # 初始化后立即设置活体阈值
-        self.set_liveness_threshold(rgb=0.4, ir=0.6)
-        return True
-    
-    def set_liveness_threshold(self, rgb=0.4, ir=0.6):
+        self._apply_liveness_threshold(handle, self.liveness_rgb_threshold, self.liveness_ir_threshold)
+        return handle
+
+    def _release_engine_handle(self, handle):
+        ret = self.ASFUninitEngine(handle)
+        if ret != MOK:
+            logger.error(f"引擎释放失败，错误码: {ret}")
+
+    def _apply_liveness_threshold(self, handle, rgb, ir):
         threshold = ASF_LivenessThreshold()
         threshold.thresholdmodel_BGR = c_float(rgb)
         threshold.thresholdmodel_IR = c_float(ir)
-        ret = self.ASFSetLivenessParam(self.handle, pointer(threshold))
+        ret = self.ASFSetLivenessParam(handle, pointer(threshold))
         if ret != MOK:
             logger.error(f"设置活体阈值失败，错误码: {ret}")
             return False
+        return True
+
+    def set_liveness_threshold(self, rgb=0.4, ir=0.6):
+        """设置所有引擎句柄的活体阈值（借出全部句柄，等待正在进行的调用结束）"""
+        success = True
+        with ExitStack() as stack:
+            handles = [stack.enter_context(self.engines.checkout()) for _ in range(self.engines.size)]
+            for handle in handles:
+                success = self._apply_liveness_threshold(handle, rgb, ir) and success
+        if not success:
+            return False
         logger.info(f"设置活体阈值成功，RGB: {rgb}, IR: {ir}")
         self.liveness_rgb_threshold = rgb
         self.liveness_ir_threshold = ir
         return True
+
+    def release(self):
+        """释放全部引擎句柄"""
+        if self.engines is not None and not self.engines.closed:
+            self.engines.close()
+            self.handle = c_void_p()
+            logger.info("ArcFace引擎资源已释放")
     
     def get_version(self):
         """获取SDK版本信息"""
-        version_info = self.ASFGetVersion(self.handle)
+        with self.engines.checkout() as handle:
+            version_info = self.ASFGetVersion(handle)
         return {
             'version': version_info.Version.decode('utf-8') if version_info.Version else "",
             'build_date': version_info.BuildDate.decode('utf-8') if version_info.BuildDate else "",
@@ -308,50 +350,94 @@ class ArcFaceSDK:
             img_data.pi32Pitch[0] = width * 3
             img_data.ppu8Plane[0] = img.ctypes.data_as(POINTER(c_ubyte))
             multi_face_info = ASF_MultiFaceInfo()
-            ret = self.ASFDetectFaces(
-                self.handle, 
-                width, 
-                height, 
-                ASVL_PAF_RGB24_B8G8R8, 
-                img_data.ppu8Plane[0], 
-                pointer(multi_face_info)
-            )
-            if ret != MOK:
-                return {"success": False, "message": f"人脸检测失败，错误码: {ret}"}
-            face_count = multi_face_info.faceNum
-            if face_count <= 0:
-                return {"success": True, "face_count": 0, "message": "未检测到人脸", "faces": []}
-            faces = []
-            for i in range(face_count):
-                face_rect = multi_face_info.faceRect[i]
-                face_orient = multi_face_info.faceOrient[i] if multi_face_info.faceOrient else 0
-                face_id = multi_face_info.faceID[i] if multi_face_info.faceID else 0
-                face_info = {
-                    "rect": {
-                        "left": int(face_rect.left),
-                        "top": int(face_rect.top),
-                        "right": int(face_rect.right),
-                        "bottom": int(face_rect.bottom),
-                        "width": int(face_rect.right - face_rect.left),
-                        "height": int(face_rect.bottom - face_rect.top)
-                    },
-                    "orient": int(face_orient),
-                    "face_id": int(face_id)
-                }
-                if return_landmarks:
-                    face_info["landmarks"] = None  # 可扩展支持关键点
-                faces.append(face_info)
+            # 检测结果中的数组指向引擎内部缓冲区，需在归还句柄前读出
+            with self.engines.checkout() as handle:
+                ret = self.ASFDetectFaces(
+                    handle, 
+                    width, 
+                    height, 
+                    ASVL_PAF_RGB24_B8G8R8, 
+                    img_data.ppu8Plane[0], 
+                    pointer(multi_face_info)
+                )
+                if ret != MOK:
+                    return {"success": False, "message": f"人脸检测失败，错误码: {ret}"}
+                face_count = multi_face_info.faceNum
+                if face_count <= 0:
+                    return {"success": True, "face_count": 0, "message": "未检测到人脸", "faces": []}
+                faces = []
+                for i in range(face_count):
+                    face_rect = multi_face_info.faceRect[i]
+                    face_orient = multi_face_info.faceOrient[i] if multi_face_info.faceOrient else 0
+                    face_id = multi_face_info.faceID[i] if multi_face_info.faceID else 0
+                    face_info = {
+                        "rect": {
+                            "left": int(face_rect.left),
+                            "top": int(face_rect.top),
+                            "right": int(face_rect.right),
+                            "bottom": int(face_rect.bottom),
+                            "width": int(face_rect.right - face_rect.left),
+                            "height": int(face_rect.bottom - face_rect.top)
+                        },
+                        "orient": int(face_orient),
+                        "face_id": int(face_id)
+                    }
+                    if return_landmarks:
+                        face_info["landmarks"] = None  # 可扩展支持关键点
+                    faces.append(face_info)
             return {
                 "success": True,
                 "face_count": face_count,
                 "message": f"检测到{face_count}个人脸",
                 "faces": faces,
-                "raw_info": multi_face_info
+                "raw_info": self._build_multi_face_info(faces)
             }
         except Exception as e:
             logger.error(f"人脸检测异常: {str(e)}")
             return {"success": False, "message": f"人脸检测异常: {str(e)}"}
 
+    def _detect_faces_cached(self, img, context=None, stage="detect"):
+        """
+        人脸检测，提供单帧分析上下文时复用同一帧已有的检测结果
+        Args:
+            img: numpy格式的图像数据
+            context: pipeline.FrameContext，为None时直接检测
+            stage: 调用阶段名称，用于统计缓存命中
+        Returns:
+            dict: 人脸检测结果
+        """
+        if context is None:
+            return self.detect_faces_from_numpy(img)
+        return context.get_or_compute("arcsoft_detect", stage, lambda: self.detect_faces_from_numpy(img))
+
+    @staticmethod
+    def _build_multi_face_info(faces):
+        """
+        根据检测结果重建多人脸信息结构体
+        ASFDetectFaces返回的数组指针指向引擎内部缓冲区，该句柄下一次检测后即失效，
+        归还句柄后或复用检测结果时需使用Python侧持有内存的结构体
+        """
+        count = len(faces)
+        rects = (MRECT * count)()
+        orients = (c_int32 * count)()
+        face_ids = (c_int32 * count)()
+        for i, face in enumerate(faces):
+            rect = face["rect"]
+            rects[i].left = rect["left"]
+            rects[i].top = rect["top"]
+            rects[i].right = rect["right"]
+            rects[i].bottom = rect["bottom"]
+            orients[i] = face["orient"]
+            face_ids[i] = face.get("face_id", 0)
+        multi_face_info = ASF_MultiFaceInfo()
+        multi_face_info.faceRect = cast(rects, POINTER(MRECT))
+        multi_face_info.faceOrient = cast(orients, POINTER(c_int32))
+        multi_face_info.faceID = cast(face_ids, POINTER(c_int32))
+        multi_face_info.faceNum = count
+        # 保持数组引用，避免被回收
+        multi_face_info._buffers = (rects, orients, face_ids)
+        return multi_face_info
+
     def detect_liveness(self, image_path):
         """
         检测图像中的人脸活体
@@ -367,94 +453,22 @@ class ArcFaceSDK:
             img = cv2.imread(image_path)
             if img is None:
                 return {"success": False, "message": "无法读取图像"}
-                
-            # 检测人脸
-            face_result = self.detect_faces_from_numpy(img)
-            if not face_result["success"]:
-                return face_result
-                
-            if face_result["face_count"] == 0:
-                return {"success": False, "message": "未检测到人脸，无法进行活体检测"}
-            
-            # 获取图像信息
-            height, width = img.shape[:2]
-            
-            # 创建图像数据结构
-            img_data = ASF_ImageData()
-            img_data.u32PixelArrayFormat = ASVL_PAF_RGB24_B8G8R8
-            img_data.i32Width = width
-            img_data.i32Height = height
-            img_data.pi32Pitch[0] = width * 3
-            img_data.ppu8Plane[0] = img.ctypes.data_as(POINTER(c_ubyte))
-            
-            # 获取多人脸信息
-            multi_face_info = face_result["raw_info"]
-            
-            # 进行预处理，提取活体信息
-            ret = self.ASFProcess(
-                self.handle,
-                width,
-                height,
-                ASVL_PAF_RGB24_B8G8R8,
-                img_data.ppu8Plane[0],
-                pointer(multi_face_info),
-                ASF_LIVENESS
-            )
-            
-            if ret != MOK:
-                return {"success": False, "message": f"活体检测预处理失败，错误码: {ret}"}
-            
-            # 获取活体信息
-            liveness_info = ASF_LivenessInfo()
-            ret = self.ASFGetLivenessScore(self.handle, pointer(liveness_info))
-            
-            if ret != MOK:
-                return {"success": False, "message": f"获取活体检测结果失败，错误码: {ret}"}
-            
-            # 处理活体检测结果
-            liveness_count = liveness_info.num
-            if liveness_count <= 0:
-                return {"success": False, "message": "未获取到活体信息"}
-            
-            # 获取每个人脸的活体信息
-            liveness_list = []
-            
-            for i in range(liveness_count):
-                status = liveness_info.isLive[i]
-                is_live = int(status) == 1
-                liveness_list.append({
-                    "status_code": int(status),
-                    "is_live": is_live,
-                    "status": "真人" if is_live else f"非真人/异常({status})"
-                })
-            
-            # 总体结果判断
-            any_live = any(item["is_live"] for item in liveness_list)
-            
-            return {
-                "success": True,
-                "method": "arcsoft",
-                "is_live": any_live,
-                "message": "检测到真人" if any_live else "未检测到真人",
-                "liveness_count": liveness_count,
-                "liveness_list": liveness_list,
-                "faces": face_result["faces"]
-            }
-            
+            return self.detect_liveness_from_numpy(img)
         except Exception as e:
             logger.error(f"活体检测异常: {str(e)}")
             return {"success": False, "message": f"活体检测异常: {str(e)}"}
 
-    def detect_liveness_from_numpy(self, img):
+    def detect_liveness_from_numpy(self, img, context=None):
         """
         直接从numpy数组检测活体（用于视频流实时识别）
         Args:
             img: numpy格式的图像数据
+            context: 单帧分析上下文，提供时复用同一帧的人脸检测结果
         Returns:
             dict: 活体检测结果
         """
         try:
-            face_result = self.detect_faces_from_numpy(img)
+            face_result = self._detect_faces_cached(img, context, stage="liveness")
             if not face_result["success"]:
                 return face_result
             if face_result["face_count"] == 0:
@@ -466,34 +480,36 @@ class ArcFaceSDK:
             img_data.i32Height = height
             img_data.pi32Pitch[0] = width * 3
             img_data.ppu8Plane[0] = img.ctypes.data_as(POINTER(c_ubyte))
-            multi_face_info = face_result["raw_info"]
-            ret = self.ASFProcess(
-                self.handle,
-                width,
-                height,
-                ASVL_PAF_RGB24_B8G8R8,
-                img_data.ppu8Plane[0],
-                pointer(multi_face_info),
-                ASF_LIVENESS
-            )
-            if ret != MOK:
-                return {"success": False, "message": f"活体检测预处理失败，错误码: {ret}"}
-            liveness_info = ASF_LivenessInfo()
-            ret = self.ASFGetLivenessScore(self.handle, pointer(liveness_info))
-            if ret != MOK:
-                return {"success": False, "message": f"获取活体检测结果失败，错误码: {ret}"}
-            liveness_count = liveness_info.num
-            if liveness_count <= 0:
-                return {"success": False, "message": "未获取到活体信息"}
-            liveness_list = []
-            for i in range(liveness_count):
-                status = liveness_info.isLive[i]
-                is_live = int(status) == 1
-                liveness_list.append({
-                    "status_code": int(status),
-                    "is_live": is_live,
-                    "status": "真人" if is_live else f"非真人/异常({status})"
-                })
+            multi_face_info = self._build_multi_face_info(face_result["faces"])
+            # ASFProcess与ASFGetLivenessScore必须在同一句柄上连续调用
+            with self.engines.checkout() as handle:
+                ret = self.ASFProcess(
+                    handle,
+                    width,
+                    height,
+                    ASVL_PAF_RGB24_B8G8R8,
+                    img_data.ppu8Plane[0],
+                    pointer(multi_face_info),
+                    ASF_LIVENESS
+                )
+                if ret != MOK:
+                    return {"success": False, "message": f"活体检测预处理失败，错误码: {ret}"}
+                liveness_info = ASF_LivenessInfo()
+                ret = self.ASFGetLivenessScore(handle, pointer(liveness_info))
+                if ret != MOK:
+                    return {"success": False, "message": f"获取活体检测结果失败，错误码: {ret}"}
+                liveness_count = liveness_info.num
+                if liveness_count <= 0:
+                    return {"success": False, "message": "未获取到活体信息"}
+                liveness_list = []
+                for i in range(liveness_count):
+                    status = liveness_info.isLive[i]
+                    is_live = int(status) == 1
+                    liveness_list.append({
+                        "status_code": int(status),
+                        "is_live": is_live,
+                        "status": "真人" if is_live else f"非真人/异常({status})"
+                    })
             any_live = any(item["is_live"] for item in liveness_list)
             return {
                 "success": True,
@@ -523,81 +539,22 @@ class ArcFaceSDK:
             img = cv2.imread(image_path)
             if img is None:
                 return {"success": False, "message": "无法读取图像"}
-                
-            # 检测人脸
-            face_result = self.detect_faces_from_numpy(img)
-            if not face_result["success"]:
-                return face_result
-                
-            if face_result["face_count"] == 0:
-                return {"success": False, "message": "未检测到人脸，无法提取特征"}
-            
-            # 获取图像信息
-            height, width = img.shape[:2]
-            
-            # 创建图像数据结构
-            img_data = ASF_ImageData()
-            img_data.u32PixelArrayFormat = ASVL_PAF_RGB24_B8G8R8
-            img_data.i32Width = width
-            img_data.i32Height = height
-            img_data.pi32Pitch[0] = width * 3
-            img_data.ppu8Plane[0] = img.ctypes.data_as(POINTER(c_ubyte))
-            
-            # 获取单人脸信息（取第一个人脸）
-            face_info = face_result["faces"][0]
-            rect = face_info["rect"]
-            orient = face_info["orient"]
-            
-            # 创建单人脸结构
-            single_face_info = ASF_SingleFaceInfo()
-            single_face_info.faceRect.left = rect["left"]
-            single_face_info.faceRect.top = rect["top"]
-            single_face_info.faceRect.right = rect["right"]
-            single_face_info.faceRect.bottom = rect["bottom"]
-            single_face_info.faceOrient = orient
-            
-            # 创建特征结构
-            face_feature = ASF_FaceFeature()
-            
-            # 提取特征
-            ret = self.ASFFaceFeatureExtract(
-                self.handle,
-                width,
-                height,
-                ASVL_PAF_RGB24_B8G8R8,
-                img_data.ppu8Plane[0],
-                pointer(single_face_info),
-                pointer(face_feature)
-            )
-            
-            if ret != MOK:
-                return {"success": False, "message": f"特征提取失败，错误码: {ret}"}
-            
-            # 将特征数据转换为Python字节串
-            feature_size = face_feature.featureSize
-            feature_data = ctypes.string_at(face_feature.feature, feature_size)
-            
-            return {
-                "success": True,
-                "message": "特征提取成功",
-                "feature_size": feature_size,
-                "feature_data": feature_data
-            }
-            
+            return self.extract_feature_from_numpy(img)
         except Exception as e:
             logger.error(f"特征提取异常: {str(e)}")
             return {"success": False, "message": f"特征提取异常: {str(e)}"}
 
-    def extract_feature_from_numpy(self, img):
+    def extract_feature_from_numpy(self, img, context=None):
         """
         从numpy数组提取人脸特征（用于视频流实时识别）
         Args:
             img: numpy格式的图像数据
+            context: 单帧分析上下文，提供时复用同一帧的人脸检测结果
         Returns:
             dict: 特征提取结果
         """
         try:
-            face_result = self.detect_faces_from_numpy(img)
+            face_result = self._detect_faces_cached(img, context, stage="feature")
             if not face_result["success"]:
                 return face_result
             if face_result["face_count"] == 0:
@@ -609,6 +566,7 @@ class ArcFaceSDK:
             img_data.i32Height = height
             img_data.pi32Pitch[0] = width * 3
             img_data.ppu8Plane[0] = img.ctypes.data_as(POINTER(c_ubyte))
+            # 获取单人脸信息（取第一个人脸）
             face_info = face_result["faces"][0]
             rect = face_info["rect"]
             orient = face_info["orient"]
@@ -619,19 +577,21 @@ class ArcFaceSDK:
             single_face_info.faceRect.bottom = rect["bottom"]
             single_face_info.faceOrient = orient
             face_feature = ASF_FaceFeature()
-            ret = self.ASFFaceFeatureExtract(
-                self.handle,
-                width,
-                height,
-                ASVL_PAF_RGB24_B8G8R8,
-                img_data.ppu8Plane[0],
-                pointer(single_face_info),
-                pointer(face_feature)
-            )
-            if ret != MOK:
-                return {"success": False, "message": f"特征提取失败，错误码: {ret}"}
-            feature_size = face_feature.featureSize
-            feature_data = ctypes.string_at(face_feature.feature, feature_size)
+            with self.engines.checkout() as handle:
+                ret = self.ASFFaceFeatureExtract(
+                    handle,
+                    width,
+                    height,
+                    ASVL_PAF_RGB24_B8G8R8,
+                    img_data.ppu8Plane[0],
+                    pointer(single_face_info),
+                    pointer(face_feature)
+                )
+                if ret != MOK:
+                    return {"success": False, "message": f"特征提取失败，错误码: {ret}"}
+                # 特征数据位于引擎内部缓冲区，归还句柄前复制为Python字节串
+                feature_size = face_feature.featureSize
+                feature_data = ctypes.string_at(face_feature.feature, feature_size)
             return {
                 "success": True,
                 "message": "特征提取成功",
@@ -642,6 +602,16 @@ class ArcFaceSDK:
             logger.error(f"特征提取异常: {str(e)}")
             return {"success": False, "message": f"特征提取异常: {str(e)}"}
 
+    def warmup(self, img):
+        """
+        在合成帧上预热：执行一次人脸检测与活体检测，并尝试提取特征
+
+        Args:
+            img: BGR格式的图像数组
+        """
+        self.detect_liveness_from_numpy(img)
+        self.extract_feature_from_numpy(img)
+
     def compare_features(self, feature1, feature2):
         """
         比较两个人脸特征的相似度
@@ -667,12 +637,13 @@ class ArcFaceSDK:
             similarity = c_float(0.0)
             
             # 比对特征
-            ret = self.ASFFaceFeatureCompare(
-                self.handle,
-                pointer(face_feature1),
-                pointer(face_feature2),
-                pointer(similarity)
-            )
+            with self.engines.checkout() as handle:
+                ret = self.ASFFaceFeatureCompare(
+                    handle,
+                    pointer(face_feature1),
+                    pointer(face_feature2),
+                    pointer(similarity)
+                )
             
             if ret != MOK:
                 return {"success": False, "message": f"特征比对失败，错误码: {ret}"}
@@ -694,9 +665,8 @@ class ArcFaceSDK:
     
     def __del__(self):
         """释放资源"""
-        if hasattr(self, 'handle') and self.handle:
+        if getattr(self, 'engines', None) is not None:
             try:
-                self.ASFUninitEngine(self.handle)
-                logger.info("ArcFace引擎资源已释放")
+                self.release()
             except:
                 pass
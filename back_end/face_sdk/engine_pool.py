@@ -0,0 +1,123 @@
+"""
+虹软引擎句柄池
+SDK引擎句柄不能被多个线程同时使用，句柄池预先初始化N个引擎句柄，
+每次调用借出一个句柄、用完归还，实现多线程并发调用且互不干扰
+"""
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("ArcFaceSDK")
+
+
+class EnginePoolClosed(RuntimeError):
+    """句柄池已释放"""
+
+
+class EngineHandlePool:
+    """
+    引擎句柄池
+    句柄的创建与释放由调用方提供的函数完成（ASFInitEngine/ASFUninitEngine），
+    句柄池只负责借出/归还和关闭时的统一释放
+    """
+    def __init__(self, create_handle, release_handle, size=1):
+        """
+        Args:
+            create_handle: 无参函数，返回新初始化的引擎句柄，失败时返回None
+            release_handle: 释放单个句柄的函数
+            size: 句柄数量
+        """
+        self._release_handle = release_handle
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.handles = []
+        for _ in range(max(1, int(size))):
+            handle = create_handle()
+            if handle is None:
+                break
+            self.handles.append(handle)
+            self._idle.put(handle)
+        self.size = len(self.handles)
+
+        # 统计指标
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_ms = 0.0
+        self._max_wait_ms = 0.0
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """
+        借出一个空闲句柄，with块结束时自动归还
+
+        Args:
+            timeout: 等待空闲句柄的最长秒数，None表示一直等待
+
+        Raises:
+            EnginePoolClosed: 句柄池已释放
+            queue.Empty: 等待超时
+        """
+        if self._closed:
+            raise EnginePoolClosed("引擎句柄池已释放")
+        started = time.perf_counter()
+        try:
+            handle = self._idle.get_nowait()
+            waited = False
+        except queue.Empty:
+            handle = self._idle.get(timeout=timeout)
+            waited = True
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_ms += wait_ms
+                self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+        try:
+            yield handle
+        finally:
+            self._return(handle)
+
+    def _return(self, handle):
+        with self._lock:
+            closed = self._closed
+        if closed:
+            # 关闭期间被借出的句柄在归还时释放
+            self._release_handle(handle)
+        else:
+            self._idle.put(handle)
+
+    def close(self):
+        """释放全部空闲句柄，仍被借出的句柄在归还时释放"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        released = 0
+        while True:
+            try:
+                handle = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._release_handle(handle)
+            released += 1
+        logger.info(f"引擎句柄池已释放{released}/{self.size}个空闲句柄")
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "avg_wait_ms": round(self._wait_ms / self._waits, 2) if self._waits else 0.0,
+                "max_wait_ms": round(self._max_wait_ms, 2),
+                "closed": self._closed
+            }
@@ -0,0 +1,166 @@
+/*
+ * 虹软SDK桩库：实现ArcFaceSDK用到的ASF*接口，用于在没有真实SDK的Linux环境验证ctypes封装与引擎句柄池
+ *
+ * 编译: cc -shared -fPIC -O2 -o libarcsoft_face_engine.so arcsoft_stub.c
+ *
+ * 行为约定（结果只由图像内容决定，便于与单线程结果逐一比对）:
+ *   - 图像中心像素非0时检测到一张人脸，人脸框为图像中间1/2区域
+ *   - 中心像素 >= 128 判定为真人
+ *   - 特征为人脸区域按行采样的字节，比对相似度为相同字节所占比例
+ *   - 每个句柄带"使用中"标记，同一句柄被并发调用时返回错误码并计入冲突数
+ */
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+#define MOK 0
+#define MERR_STUB_BUSY 0x7001
+#define MERR_STUB_INVALID 0x7002
+#define FEATURE_SIZE 1032
+#define CALL_DELAY_US 200
+
+typedef struct { int32_t left, top, right, bottom; } MRECT;
+typedef struct { const char *Version; const char *BuildDate; const char *CopyRight; } ASF_VERSION;
+typedef struct { MRECT faceRect; int32_t faceOrient; } ASF_SingleFaceInfo;
+typedef struct { MRECT *faceRect; int32_t *faceOrient; int32_t faceNum; int32_t *faceID; } ASF_MultiFaceInfo;
+typedef struct { void *feature; int32_t featureSize; } ASF_FaceFeature;
+typedef struct { int32_t *isLive; int32_t num; } ASF_LivenessInfo;
+typedef struct { float thresholdmodel_BGR; float thresholdmodel_IR; } ASF_LivenessThreshold;
+
+typedef struct {
+    volatile int busy;
+    MRECT rect;
+    int32_t orient;
+    int32_t face_id;
+    int32_t live;
+    int32_t pending_live;
+    unsigned char feature[FEATURE_SIZE];
+} Engine;
+
+static volatile long g_conflicts = 0;
+static volatile long g_engines = 0;
+
+#define ENTER(engine) \
+    if (!(engine)) return MERR_STUB_INVALID; \
+    if (__sync_lock_test_and_set(&(engine)->busy, 1)) { __sync_fetch_and_add(&g_conflicts, 1); return MERR_STUB_BUSY; }
+#define LEAVE(engine) __sync_lock_release(&(engine)->busy)
+
+static unsigned char center_pixel(int32_t width, int32_t height, const unsigned char *data)
+{
+    return data[((size_t)(height / 2) * width + width / 2) * 3];
+}
+
+int ASFActivation(const char *app_id, const char *sdk_key)
+{
+    return (app_id && sdk_key) ? MOK : MERR_STUB_INVALID;
+}
+
+int ASFInitEngine(uint32_t mode, int32_t orient, int32_t scale, int32_t max_num, int32_t mask, void **handle)
+{
+    Engine *engine = (Engine *)calloc(1, sizeof(Engine));
+    if (!engine) return MERR_STUB_INVALID;
+    *handle = engine;
+    __sync_fetch_and_add(&g_engines, 1);
+    return MOK;
+}
+
+int ASFUninitEngine(void *handle)
+{
+    if (!handle) return MERR_STUB_INVALID;
+    free(handle);
+    __sync_fetch_and_sub(&g_engines, 1);
+    return MOK;
+}
+
+int ASFSetLivenessParam(void *handle, ASF_LivenessThreshold *threshold)
+{
+    return (handle && threshold) ? MOK : MERR_STUB_INVALID;
+}
+
+ASF_VERSION ASFGetVersion(void *handle)
+{
+    ASF_VERSION version = {"stub-1.0", "2024-01-01", "arcsoft stub"};
+    return version;
+}
+
+int ASFDetectFaces(void *handle, int32_t width, int32_t height, int32_t format, unsigned char *data,
+                   ASF_MultiFaceInfo *info)
+{
+    Engine *engine = (Engine *)handle;
+    ENTER(engine);
+    usleep(CALL_DELAY_US);
+    /* 与真实SDK一致：结果数组指向引擎内部缓冲区 */
+    info->faceNum = center_pixel(width, height, data) ? 1 : 0;
+    engine->rect.left = width / 4;
+    engine->rect.top = height / 4;
+    engine->rect.right = width * 3 / 4;
+    engine->rect.bottom = height * 3 / 4;
+    engine->orient = 1;
+    engine->face_id = 0;
+    info->faceRect = &engine->rect;
+    info->faceOrient = &engine->orient;
+    info->faceID = &engine->face_id;
+    LEAVE(engine);
+    return MOK;
+}
+
+int ASFProcess(void *handle, int32_t width, int32_t height, int32_t format, unsigned char *data,
+               ASF_MultiFaceInfo *info, int32_t mask)
+{
+    Engine *engine = (Engine *)handle;
+    ENTER(engine);
+    usleep(CALL_DELAY_US);
+    engine->pending_live = info->faceNum > 0 && center_pixel(width, height, data) >= 128;
+    LEAVE(engine);
+    return MOK;
+}
+
+int ASFGetLivenessScore(void *handle, ASF_LivenessInfo *info)
+{
+    Engine *engine = (Engine *)handle;
+    ENTER(engine);
+    engine->live = engine->pending_live;
+    info->isLive = &engine->live;
+    info->num = 1;
+    LEAVE(engine);
+    return MOK;
+}
+
+int ASFFaceFeatureExtract(void *handle, int32_t width, int32_t height, int32_t format, unsigned char *data,
+                          ASF_SingleFaceInfo *face, ASF_FaceFeature *feature)
+{
+    Engine *engine = (Engine *)handle;
+    ENTER(engine);
+    usleep(CALL_DELAY_US);
+    int32_t face_width = face->faceRect.right - face->faceRect.left;
+    int32_t face_height = face->faceRect.bottom - face->faceRect.top;
+    for (int i = 0; i < FEATURE_SIZE; i++) {
+        int32_t x = face->faceRect.left + (int32_t)((long)i * 7 % (face_width > 0 ? face_width : 1));
+        int32_t y = face->faceRect.top + (int32_t)((long)i * face_height / FEATURE_SIZE);
+        engine->feature[i] = data[((size_t)y * width + x) * 3];
+    }
+    feature->feature = engine->feature;
+    feature->featureSize = FEATURE_SIZE;
+    LEAVE(engine);
+    return MOK;
+}
+
+int ASFFaceFeatureCompare(void *handle, ASF_FaceFeature *feature1, ASF_FaceFeature *feature2, float *similarity)
+{
+    Engine *engine = (Engine *)handle;
+    ENTER(engine);
+    int size = feature1->featureSize < feature2->featureSize ? feature1->featureSize : feature2->featureSize;
+    int same = 0;
+    const unsigned char *a = (const unsigned char *)feature1->feature;
+    const unsigned char *b = (const unsigned char *)feature2->feature;
+    for (int i = 0; i < size; i++) same += a[i] == b[i];
+    *similarity = size > 0 ? (float)same / (float)size : 0.0f;
+    LEAVE(engine);
+    return MOK;
+}
+
+/* 桩库专用：统计同一句柄被并发调用的次数和尚未释放的引擎数 */
+long StubGetConflicts(void) { return g_conflicts; }
+long StubGetEngineCount(void) { return g_engines; }
+void StubResetConflicts(void) { g_conflicts = 0; }
@@ -0,0 +1,18 @@
+"""
+请求处理流水线模块
+包含单帧分析上下文等在各模型阶段之间共享中间结果的工具，特征提取微批处理，将阻塞调用移出事件循环的线程池，多进程模型工作池，批量注册等离线任务使用的多阶段线程流水线，按需加载模型的注册表，模型预热用的合成帧，ONNX Runtime CPU推理会话工具，以及ONNX模型INT8量化，实时识别的推理前帧门控、逐考勤机人脸跟踪与WebSocket帧流缓冲
+"""
+from .frame_context import FrameContext
+from .batching import EmbeddingBatcher
+from .executors import BoundedExecutor, ExecutorRegistry
+from .process_pool import ModelProcessPool
+from .stages import Stage, StagePipeline
+from .model_registry import ModelRegistry
+from .warmup import parse_frame_size, synthetic_face_frame
+from .onnx_runtime import OrtRunner, default_intra_op_threads, make_session_options
+from .quantization import QUANT_MODES, parse_quantization, quantize_model, ensure_quantized
+from .frame_gate import FrameGate
+from .tracking import KioskTracker, box_iou, largest_face_box
+from .streaming import LatestFrameSlot, StreamStats
+
+__all__ = ["FrameContext", "EmbeddingBatcher", "BoundedExecutor", "ExecutorRegistry", "ModelProcessPool", "Stage", "StagePipeline", "ModelRegistry", "parse_frame_size", "synthetic_face_frame", "OrtRunner", "default_intra_op_threads", "make_session_options", "QUANT_MODES", "parse_quantization", "quantize_model", "ensure_quantized", "FrameGate", "KioskTracker", "box_iou", "largest_face_box", "LatestFrameSlot", "StreamStats"]
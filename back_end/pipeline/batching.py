@@ -0,0 +1,156 @@
+"""
+InsightFace特征提取微批处理
+并发请求的图像先进入队列，由后台协程在max_wait_ms时间窗口内或凑满max_batch_size张后
+合并为一个批次，识别模型对该批次的所有对齐人脸一次推理，结果按请求分发
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    特征提取微批处理器
+    批次在线程池中运行，不阻塞事件循环；批处理失败时回退为逐张推理
+    """
+    def __init__(self, face_processor, max_batch_size=16, max_wait_ms=5.0, executor=None):
+        """
+        Args:
+            face_processor: FaceProcessor实例（需提供detect_faces_batch/detect_faces_from_numpy），
+                或返回该实例的无参函数（模型按需加载时在首个批次执行前才获取）
+            max_batch_size: 单批次最多图像数
+            max_wait_ms: 批次首个请求到达后最长等待时间（毫秒）
+            executor: 可选的BoundedExecutor（如InsightFace线程池），未指定时使用内部单线程执行器
+        """
+        self.face_processor = face_processor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = None
+        self._worker = None
+        self._pool = executor
+        self._executor = None if executor is not None else ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="embedding-batch")
+
+        # 统计指标
+        self._requests = 0
+        self._batches = 0
+        self._fallbacks = 0
+        self._max_queue_depth = 0
+        self._recent = deque(maxlen=200)  # (batch_size, wait_ms, infer_ms)
+
+    def _ensure_worker(self):
+        """在当前事件循环中惰性创建队列和后台协程"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def detect_faces(self, img, context=None):
+        """
+        提交一帧图像并等待所在批次完成
+
+        Args:
+            img: BGR格式的图像数组
+            context: 可选的FrameContext，同一帧已有InsightFace检测结果（"insightface_faces"）时直接复用，
+                否则批次推理后写入该结果，供同一帧的其他阶段复用
+
+        Returns:
+            与FaceProcessor.detect_faces_from_numpy相同的结果字典
+        """
+        if context is not None and context.get("insightface_faces") is not None:
+            return self._processor().detect_faces_from_numpy(img, context)
+
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((img, context, future, time.perf_counter()))
+        self._requests += 1
+        self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+
+        start = time.perf_counter()
+        result, batch_size = await future
+        if context is not None:
+            context.record("embedding", "insightface_faces", (time.perf_counter() - start) * 1000,
+                           batch_size=batch_size)
+        return result
+
+    async def _collect(self):
+        """取出一个批次：阻塞等待首个请求，之后在时间窗口内尽量凑满"""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            imgs = [item[0] for item in batch]
+            contexts = [item[1] for item in batch]
+            dispatched = time.perf_counter()
+            try:
+                if self._pool is not None:
+                    results = await self._pool.run(self._infer, imgs, contexts)
+                else:
+                    results = await loop.run_in_executor(self._executor, self._infer, imgs, contexts)
+            except Exception as e:
+                logger.error(f"批量特征提取异常: {str(e)}")
+                results = [{"success": False, "message": f"特征提取失败: {str(e)}"}] * len(batch)
+            infer_ms = (time.perf_counter() - dispatched) * 1000
+
+            self._batches += 1
+            wait_ms = sum(dispatched - item[3] for item in batch) / len(batch) * 1000
+            self._recent.append((len(batch), wait_ms, infer_ms))
+            for (_, _, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result((result, len(batch)))
+
+    def _processor(self):
+        if hasattr(self.face_processor, "detect_faces_batch"):
+            return self.face_processor
+        processor = self.face_processor()
+        if processor is None:
+            raise RuntimeError("InsightFace模型未启用或加载失败")
+        return processor
+
+    def _infer(self, imgs, contexts):
+        """执行器线程中运行：优先批量推理，失败时逐张回退（单张图片的失败由detect_faces_batch在该图片的结果中返回）"""
+        processor = self._processor()
+        try:
+            return processor.detect_faces_batch(imgs, contexts)
+        except Exception as e:
+            logger.error(f"批量推理失败，回退为逐张推理: {str(e)}")
+            self._fallbacks += 1
+            return [processor.detect_faces_from_numpy(img) for img in imgs]
+
+    def metrics(self):
+        """队列深度、批大小和等待/推理耗时统计"""
+        recent = list(self._recent)
+        count = len(recent)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self._max_queue_depth,
+            "requests": self._requests,
+            "batches": self._batches,
+            "fallbacks": self._fallbacks,
+            "avg_batch_size": round(sum(r[0] for r in recent) / count, 2) if count else 0.0,
+            "avg_wait_ms": round(sum(r[1] for r in recent) / count, 2) if count else 0.0,
+            "avg_infer_ms": round(sum(r[2] for r in recent) / count, 2) if count else 0.0
+        }
+
+    def shutdown(self):
+        if self._worker is not None:
+            self._worker.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
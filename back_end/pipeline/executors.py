@@ -0,0 +1,131 @@
+"""
+阻塞调用执行器
+按模型族（虹软SDK、InsightFace、静默活体、dlib）和数据库划分固定大小的线程池，
+接口协程通过await将阻塞调用移出事件循环，并统计各线程池的饱和度
+"""
+import time
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BoundedExecutor:
+    """
+    固定线程数的执行器
+    记录正在执行/排队中的任务数、排队等待时间和执行耗时，用于判断线程池是否饱和
+    """
+    def __init__(self, name, max_workers):
+        """
+        Args:
+            name: 线程池名称
+            max_workers: 最大线程数（非线程安全的模型应设为1）
+        """
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self._active = 0
+        self._pending = 0
+        self._peak_pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._wait_ms = 0.0
+        self._run_ms = 0.0
+
+    def _call(self, submitted_at, fn, args, kwargs):
+        started = time.perf_counter()
+        with self._lock:
+            self._pending -= 1
+            self._active += 1
+            self._wait_ms += (started - submitted_at) * 1000
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._run_ms += (time.perf_counter() - started) * 1000
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        在线程池中执行阻塞函数并等待结果
+
+        Args:
+            fn: 阻塞函数
+            *args, **kwargs: 传给fn的参数
+
+        Returns:
+            fn的返回值（异常原样抛出）
+        """
+        with self._lock:
+            self._pending += 1
+            self._submitted += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+        call = functools.partial(self._call, time.perf_counter(), fn, args, kwargs)
+        try:
+            future = self._executor.submit(call)
+        except RuntimeError:
+            # 线程池已关闭
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future):
+        """排队中的任务被取消（等待的协程被取消或线程池关闭）时_call不会执行，在这里归还排队计数"""
+        if future.cancelled():
+            with self._lock:
+                self._pending -= 1
+                self._cancelled += 1
+
+    def metrics(self):
+        with self._lock:
+            completed = self._completed
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "pending": self._pending,
+                "peak_pending": self._peak_pending,
+                "utilization": round(self._active / self.max_workers, 2),
+                "submitted": self._submitted,
+                "completed": completed,
+                "failed": self._failed,
+                "cancelled": self._cancelled,
+                "avg_wait_ms": round(self._wait_ms / completed, 2) if completed else 0.0,
+                "avg_run_ms": round(self._run_ms / completed, 2) if completed else 0.0
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class ExecutorRegistry:
+    """按名称管理多个BoundedExecutor"""
+    def __init__(self, sizes):
+        """
+        Args:
+            sizes: 线程池名称到线程数的映射，如 {"arcsoft": 1, "db": 4}
+        """
+        self._pools = {name: BoundedExecutor(name, size) for name, size in sizes.items()}
+
+    def get(self, name):
+        return self._pools[name]
+
+    async def run(self, name, fn, *args, **kwargs):
+        """在指定线程池中执行阻塞函数"""
+        return await self._pools[name].run(fn, *args, **kwargs)
+
+    def metrics(self):
+        return {name: pool.metrics() for name, pool in self._pools.items()}
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown()
@@ -0,0 +1,70 @@
+"""
+单帧分析上下文
+同一帧图像在活体检测、关键点、特征提取等阶段之间共享人脸检测结果，
+避免每个阶段重复检测，并记录各阶段是否命中缓存
+"""
+import time
+
+
+class FrameContext:
+    """
+    单帧分析上下文
+    以检测器名称为键缓存检测结果，例如：
+    - "arcsoft_detect": ArcFaceSDK.detect_faces_from_numpy 的结果（人脸框、角度、raw_info）
+    - "insightface_faces": FaceAnalysis.get 返回的 Face 对象列表
+    """
+    def __init__(self, img):
+        """
+        Args:
+            img: BGR格式的图像数组
+        """
+        self.img = img
+        self._cache = {}
+        self.stages = []
+
+    def get_or_compute(self, key, stage, compute):
+        """
+        获取缓存的检测结果，未命中时计算并缓存
+
+        Args:
+            key: 缓存键（检测器名称）
+            stage: 调用阶段名称，用于统计缓存命中情况
+            compute: 无参函数，未命中时调用
+
+        Returns:
+            缓存或新计算的结果
+        """
+        if key in self._cache:
+            self.stages.append({"stage": stage, "key": key, "cache_hit": True, "elapsed_ms": 0.0})
+            return self._cache[key]
+        start = time.perf_counter()
+        value = compute()
+        self.stages.append({
+            "stage": stage,
+            "key": key,
+            "cache_hit": False,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+        })
+        self._cache[key] = value
+        return value
+
+    def record(self, stage, key, elapsed_ms, cache_hit=False, **extra):
+        """记录由外部完成的阶段（如批处理推理），extra中的字段一并写入统计"""
+        item = {"stage": stage, "key": key, "cache_hit": cache_hit, "elapsed_ms": round(elapsed_ms, 2)}
+        item.update(extra)
+        self.stages.append(item)
+
+    def put(self, key, value):
+        """直接写入缓存（如上游已完成检测）"""
+        self._cache[key] = value
+
+    def get(self, key, default=None):
+        return self._cache.get(key, default)
+
+    def report(self):
+        """各阶段缓存命中情况，附加到接口返回中"""
+        return {
+            "stages": self.stages,
+            "cache_hits": sum(1 for item in self.stages if item["cache_hit"]),
+            "detections": sum(1 for item in self.stages if not item["cache_hit"])
+        }
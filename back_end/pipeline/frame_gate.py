@@ -0,0 +1,155 @@
+"""
+推理前的帧门控
+考勤机大部分时间画面静止或无人，逐帧执行人脸检测、活体检测和特征提取是浪费。
+每台考勤机保留上一次完整识别时画面的缩略灰度图（默认80x60），新帧先做同样的缩放并与之比较：
+- 平均绝对差低于duplicate_threshold：画面基本未变（duplicate），直接返回上一次的识别结果
+- 有差异但变化区域中最大的连通块小于人脸尺度（min_motion_area，占画面比例）：只有噪声、光照抖动或远处小物体移动（static），同样复用结果
+- 否则（有人脸尺度的运动）或距上一次完整识别超过max_skip_seconds时，才进入后续推理
+参考帧取上一次完整识别的画面而不是上一帧，缓慢的累积变化最终也会触发识别
+"""
+import time
+import threading
+
+import cv2
+import numpy as np
+
+
+class FrameGate:
+    """
+    按考勤机比较缩略图，决定每一帧是否需要进入推理
+    """
+
+    def __init__(self, size=(80, 60), duplicate_threshold=2.0, pixel_threshold=15, min_motion_area=0.01,
+                 max_skip_seconds=5.0, session_ttl=120.0):
+        """
+        Args:
+            size: 缩略图尺寸(宽, 高)
+            duplicate_threshold: 缩略图平均绝对差（灰度0~255）低于该值时视为重复帧
+            pixel_threshold: 像素灰度差超过该值时视为变化像素
+            min_motion_area: 人脸尺度运动的最小面积（最大变化连通块占画面的比例）
+            max_skip_seconds: 连续复用结果的最长时间（秒），超过后强制完整识别
+            session_ttl: 考勤机超过该时间（秒）没有上传帧时清除其参考帧
+        """
+        self.size = tuple(size)
+        self.duplicate_threshold = duplicate_threshold
+        self.pixel_threshold = pixel_threshold
+        self.min_motion_area = min_motion_area
+        self.max_skip_seconds = max_skip_seconds
+        self.session_ttl = session_ttl
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+        self._counters = {"frames": 0, "duplicate": 0, "static": 0, "first": 0, "motion": 0, "refresh": 0}
+
+    def thumbnail(self, img):
+        """缩放为灰度缩略图（先缩放再转灰度，开销与原图分辨率基本无关）"""
+        small = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def _largest_motion(self, diff):
+        """变化像素中最大连通块占画面的比例"""
+        mask = (diff > self.pixel_threshold).astype(np.uint8)
+        if not mask.any():
+            return 0.0
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        return float(stats[1:, cv2.CC_STAT_AREA].max()) / mask.size if count > 1 else 0.0
+
+    def check(self, client_id, img, key=None, now=None):
+        """
+        判断当前帧是否可以跳过推理
+
+        Args:
+            client_id: 考勤机标识
+            img: BGR图像
+            key: 请求参数（如学号、班级范围），与参考帧不同时不复用结果
+            now: 当前时间（time.monotonic），默认取当前时间
+
+        Returns:
+            dict: skip为True时cached为应返回的上一次结果；state为duplicate/static（跳过）或first/motion/refresh（需推理）；
+            diff为平均绝对差，motion_area为最大变化连通块比例，thumb供update使用
+        """
+        now = time.monotonic() if now is None else now
+        thumb = self.thumbnail(img)
+        with self._lock:
+            self._counters["frames"] += 1
+            self._purge(now)
+            state = self._clients.get(client_id)
+        decision = {"skip": False, "cached": None, "thumb": thumb, "diff": None, "motion_area": None}
+        if state is None or state["key"] != key or state["result"] is None:
+            decision["state"] = "first"
+        else:
+            diff = cv2.absdiff(thumb, state["thumb"])
+            decision["diff"] = round(float(diff.mean()), 2)
+            if now - state["processed_at"] >= self.max_skip_seconds:
+                decision["state"] = "refresh"
+            elif decision["diff"] < self.duplicate_threshold:
+                decision.update(state="duplicate", skip=True)
+            else:
+                decision["motion_area"] = round(self._largest_motion(diff), 4)
+                if decision["motion_area"] < self.min_motion_area:
+                    decision.update(state="static", skip=True)
+                else:
+                    decision["state"] = "motion"
+        with self._lock:
+            self._counters[decision["state"]] += 1
+            if state is not None:
+                state["last_seen"] = now
+                if decision["skip"]:
+                    state["skipped"] += 1
+                    decision["cached"] = state["result"]
+            decision["skipped"] = state["skipped"] if state is not None else 0
+        return decision
+
+    def update(self, client_id, decision, result, key=None, now=None):
+        """
+        完整识别后以当前帧为新的参考帧，并缓存识别结果
+
+        Args:
+            client_id: 考勤机标识
+            decision: check的返回
+            result: 接口返回结果
+            key: 请求参数，与check时相同
+        """
+        now = time.monotonic() if now is None else now
+        cached = {k: v for k, v in result.items() if k not in ("pipeline", "tracking", "gate", "stream")}
+        with self._lock:
+            state = self._clients.get(client_id)
+            skipped = state["skipped"] if state is not None else 0
+            self._clients[client_id] = {"thumb": decision["thumb"], "key": key, "result": cached,
+                                        "processed_at": now, "last_seen": now, "skipped": skipped}
+
+    def reset(self, client_id):
+        """清除考勤机的参考帧"""
+        with self._lock:
+            self._clients.pop(client_id, None)
+
+    @staticmethod
+    def describe(decision):
+        """门控信息，附加到接口返回中"""
+        return {key: decision[key] for key in ("state", "skipped", "diff", "motion_area")}
+
+    def _purge(self, now):
+        """清除长时间没有上传帧的考勤机（调用方需持有锁）"""
+        if now - self._last_purge < self.session_ttl / 4:
+            return
+        self._last_purge = now
+        for client_id in [k for k, s in self._clients.items() if now - s["last_seen"] > self.session_ttl]:
+            del self._clients[client_id]
+
+    def metrics(self):
+        """
+        Returns:
+            dict: 活跃考勤机数、各类帧计数，以及跳过推理的帧数和比例
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            active = len(self._clients)
+        skipped = counters["duplicate"] + counters["static"]
+        return {
+            "active_kiosks": active,
+            **counters,
+            "skipped": skipped,
+            "skip_ratio": round(skipped / counters["frames"], 4) if counters["frames"] else 0.0
+        }
@@ -0,0 +1,206 @@
+"""
+模型注册表
+各模型后端以工厂函数注册，首次使用时才导入依赖并创建实例；未启用的后端永不加载，
+加载失败会被记录并不再重试。每个后端记录加载耗时，用于启动耗时报告和运行指标；
+warm_up在合成帧上预先推理，记录预热状态和预热后的单次推理耗时，用于就绪检查
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    惰性加载的模型注册表
+    get(name)在首次调用时执行工厂函数（同一后端并发调用只加载一次），之后直接返回已创建的实例
+    """
+    def __init__(self, enabled=None):
+        """
+        Args:
+            enabled: 启用的后端名称列表，None表示启用全部已注册后端
+        """
+        self._enabled = None if enabled is None else set(enabled)
+        self._factories = {}
+        self._descriptions = {}
+        self._models = {}
+        self._errors = {}
+        self._load_ms = {}
+        self._warmups = {}
+        self._warm = {}
+        self._warm_errors = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory, description=None, warmup=None):
+        """
+        注册模型后端
+
+        Args:
+            name: 后端名称
+            factory: 无参工厂函数，返回模型实例（在函数内部导入重量级依赖）
+            description: 后端说明
+            warmup: 预热函数warmup(模型实例, 图像)，未指定时调用模型实例的warmup(图像)方法
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._descriptions[name] = description or name
+            self._warmups[name] = warmup
+            self._locks[name] = threading.Lock()
+
+    def check_enabled(self):
+        """返回启用列表中未注册的后端名称"""
+        if self._enabled is None:
+            return []
+        return sorted(self._enabled - set(self._factories))
+
+    def is_enabled(self, name):
+        return name in self._factories and (self._enabled is None or name in self._enabled)
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def enabled_backends(self):
+        return [name for name in self._factories if self.is_enabled(name)]
+
+    def get(self, name):
+        """
+        获取模型实例，未加载时同步加载（可能耗时数秒，应在线程池中调用）
+
+        Args:
+            name: 后端名称
+
+        Returns:
+            模型实例；后端未启用或加载失败时返回None
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if not self.is_enabled(name) or name in self._errors:
+            return None
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            if name in self._errors:
+                return None
+            started = time.perf_counter()
+            try:
+                model = self._factories[name]()
+            except Exception as e:
+                self._load_ms[name] = (time.perf_counter() - started) * 1000
+                self._errors[name] = str(e)
+                logger.error(f"{self._descriptions[name]}加载失败: {str(e)}")
+                return None
+            self._load_ms[name] = (time.perf_counter() - started) * 1000
+            self._models[name] = model
+            logger.info(f"{self._descriptions[name]}加载完成，耗时{self._load_ms[name]:.0f}ms")
+            return model
+
+    def is_warm(self, name):
+        return name in self._warm
+
+    def warm_up(self, name, frame, runs=3):
+        """
+        加载模型并在合成帧上连续推理runs次（阻塞调用，应在该模型的线程池中执行）
+        第一次推理承担一次性初始化开销，之后各次的最小耗时记为预热后的推理耗时
+
+        Args:
+            name: 后端名称
+            frame: BGR格式的合成帧
+            runs: 推理次数
+
+        Returns:
+            bool: 是否预热成功
+        """
+        model = self.get(name)
+        if model is None:
+            return False
+        warmup = self._warmups.get(name)
+        if warmup is None:
+            warmup = getattr(model, "warmup", None)
+            if warmup is None:
+                self._warm[name] = {"runs": 0}
+                return True
+        else:
+            warmup = lambda img, fn=warmup: fn(model, img)
+        timings = []
+        try:
+            for _ in range(max(1, int(runs))):
+                started = time.perf_counter()
+                warmup(frame)
+                timings.append((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            self._warm_errors[name] = str(e)
+            logger.error(f"{self._descriptions[name]}预热失败: {str(e)}")
+            return False
+        self._warm[name] = {
+            "runs": len(timings),
+            "first_ms": timings[0],
+            "warm_ms": min(timings[1:]) if len(timings) > 1 else timings[0]
+        }
+        return True
+
+    def readiness(self, warmup_status):
+        """
+        就绪判断：预热已完成（或未启用预热），且没有已启用的后端加载失败或预热失败
+
+        Args:
+            warmup_status: 预热状态，state为pending/warming/done/disabled，failed为预热失败的后端
+
+        Returns:
+            dict: ready是否就绪、failed失败的后端列表、message说明
+        """
+        failed = set(warmup_status.get("failed") or [])
+        failed.update(name for name in self.enabled_backends() if name in self._errors or name in self._warm_errors)
+        failed = sorted(failed)
+        ready = warmup_status["state"] in ("done", "disabled") and not failed
+        if ready:
+            message = "服务已就绪"
+        elif failed:
+            message = f"模型加载或预热失败: {', '.join(failed)}"
+        else:
+            message = "模型预热中"
+        return {"ready": ready, "failed": failed, "message": message}
+
+    def release(self):
+        """释放已加载模型持有的资源（提供release方法的模型，如虹软SDK引擎句柄）"""
+        for name, model in list(self._models.items()):
+            release = getattr(model, "release", None)
+            if callable(release):
+                try:
+                    release()
+                except Exception as e:
+                    logger.error(f"{self._descriptions[name]}释放异常: {str(e)}")
+
+    def report(self):
+        """各后端状态（disabled/pending/loaded/failed）、加载耗时与预热状态"""
+        backends = {}
+        for name in self._factories:
+            if not self.is_enabled(name):
+                state = "disabled"
+            elif name in self._models:
+                state = "loaded"
+            elif name in self._errors:
+                state = "failed"
+            else:
+                state = "pending"
+            entry = {"state": state, "description": self._descriptions[name]}
+            if name in self._load_ms:
+                entry["load_ms"] = round(self._load_ms[name], 1)
+            if name in self._errors:
+                entry["error"] = self._errors[name]
+            entry["warm"] = name in self._warm
+            if name in self._warm and self._warm[name]["runs"]:
+                entry["warmup_first_ms"] = round(self._warm[name]["first_ms"], 1)
+                entry["warm_latency_ms"] = round(self._warm[name]["warm_ms"], 1)
+            if name in self._warm_errors:
+                entry["warmup_error"] = self._warm_errors[name]
+            backends[name] = entry
+        return {
+            "enabled": self.enabled_backends(),
+            "loaded": [name for name in self._factories if name in self._models],
+            "warm": [name for name in self._factories if name in self._warm],
+            "total_load_ms": round(sum(self._load_ms.values()), 1),
+            "backends": backends
+        }
@@ -0,0 +1,130 @@
+"""
+ONNX Runtime CPU推理工具
+统一构造会话参数（图优化级别、算子内/算子间线程数、优化后模型缓存）；OrtRunner为单输入模型
+按线程复用IO绑定和输出缓冲区，逐帧推理时输入直接绑定numpy内存，输出写入预分配的数组
+"""
+import os
+import threading
+
+import numpy as np
+
+OPTIMIZATION_LEVELS = ("disable", "basic", "extended", "all")
+
+
+def default_intra_op_threads(workers=1):
+    """多个线程并发推理同一类模型时按线程数均分CPU核，避免算子线程超订"""
+    return max(1, (os.cpu_count() or 1) // max(1, int(workers)))
+
+
+def make_session_options(intra_op_threads=None, inter_op_threads=1, optimization="all", optimized_model_path=None):
+    """
+    构造CPU推理用的SessionOptions
+
+    Args:
+        intra_op_threads: 单个算子内的线程数，None/0时使用onnxruntime默认值（物理核数）
+        inter_op_threads: 算子间并行线程数（顺序执行模式下只用于控制流子图）
+        optimization: 图优化级别 disable/basic/extended/all
+        optimized_model_path: 指定时把图优化后的模型写入该路径，下次直接加载
+
+    Returns:
+        onnxruntime.SessionOptions
+    """
+    import onnxruntime as ort
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    }
+    if optimization not in levels:
+        raise ValueError(f"不支持的图优化级别: {optimization}，可选: {', '.join(OPTIMIZATION_LEVELS)}")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = levels[optimization]
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if intra_op_threads:
+        options.intra_op_num_threads = int(intra_op_threads)
+    if inter_op_threads:
+        options.inter_op_num_threads = int(inter_op_threads)
+    if optimized_model_path:
+        options.optimized_model_filepath = optimized_model_path
+    return options
+
+
+def optimized_path_for(model_path):
+    """图优化后模型的缓存路径：xxx.onnx -> xxx.opt.onnx"""
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.opt{ext or '.onnx'}"
+
+
+class OrtRunner:
+    """
+    单输入ONNX模型的CPU推理封装
+    首次加载时做全部图优化并缓存优化后的模型（缓存比原模型新时直接加载缓存，跳过优化）；
+    每个线程持有自己的IO绑定，同一batch大小的输出缓冲区只分配一次
+    """
+    def __init__(self, model_path, intra_op_threads=None, inter_op_threads=1, optimization="all", cache_optimized=True):
+        """
+        Args:
+            model_path: ONNX模型路径
+            intra_op_threads: 算子内线程数，None时使用onnxruntime默认值
+            inter_op_threads: 算子间线程数
+            optimization: 图优化级别 disable/basic/extended/all
+            cache_optimized: 是否缓存图优化后的模型（与本机CPU相关，不应拷贝到其他机器使用）
+        """
+        import onnxruntime as ort
+        self.model_path = model_path
+        cached = optimized_path_for(model_path)
+        if (cache_optimized and optimization != "disable" and os.path.exists(cached)
+                and os.path.getmtime(cached) >= os.path.getmtime(model_path)):
+            options = make_session_options(intra_op_threads, inter_op_threads, "disable")
+            path = cached
+        else:
+            options = make_session_options(intra_op_threads, inter_op_threads, optimization,
+                                           cached if cache_optimized and optimization != "disable" else None)
+            path = model_path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.outputs = [(output.name, output.shape) for output in self.session.get_outputs()]
+        self._local = threading.local()
+
+    def _output_buffers(self, batch):
+        """按batch大小分配（并缓存）输出数组；非batch维为动态时返回None，由onnxruntime分配"""
+        buffers = self._local.__dict__.setdefault("buffers", {})
+        if batch not in buffers:
+            shapes = [[batch] + list(shape[1:]) for _, shape in self.outputs]
+            if any(not isinstance(dim, int) for shape in shapes for dim in shape):
+                buffers[batch] = None
+            else:
+                buffers[batch] = [np.empty(shape, dtype=np.float32) for shape in shapes]
+        return buffers[batch]
+
+    def run(self, x):
+        """
+        推理
+
+        Args:
+            x: float32输入数组，第0维为batch
+
+        Returns:
+            list: 各输出数组。输出写入复用的缓冲区，下次同batch大小的推理会覆盖，需要保留时应拷贝
+        """
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        state = self._local.__dict__
+        binding = state.get("binding")
+        if binding is None:
+            binding = state["binding"] = self.session.io_binding()
+        binding.bind_cpu_input(self.input_name, x)
+        buffers = self._output_buffers(x.shape[0])
+        if state.get("bound_batch") != x.shape[0]:
+            binding.clear_binding_outputs()
+            for index, (name, _) in enumerate(self.outputs):
+                if buffers is None:
+                    binding.bind_output(name, "cpu")
+                else:
+                    buffer = buffers[index]
+                    binding.bind_output(name, "cpu", 0, np.float32, list(buffer.shape), buffer.ctypes.data)
+            state["bound_batch"] = x.shape[0] if buffers is not None else None
+        self.session.run_with_iobinding(binding)
+        if buffers is None:
+            return binding.copy_outputs_to_cpu()
+        return buffers
@@ -0,0 +1,290 @@
+"""
+多进程模型工作池
+每个工作进程独占一套ArcFaceSDK/FaceProcessor/SilentFaceRecognitionModel实例，绕开GIL和
+单个虹软引擎句柄的限制；解码后的图像通过multiprocessing.shared_memory槽位传递，
+进程间只传递槽位名称、形状等元数据，不对图像数组做pickle序列化
+"""
+import os
+import time
+import asyncio
+import logging
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 默认槽位大小：1920x1080 BGR图像
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+
+#------------------------ 工作进程侧 ------------------------#
+
+_worker_models = {}
+_worker_frames = {}
+_worker_warm = {}
+
+
+def _create_model(backend, options=None):
+    """在工作进程中创建模型实例，options为传给模型构造函数的额外参数"""
+    options = options or {}
+    if backend == "arcsoft":
+        from face_sdk.arc_face_sdk import ArcFaceSDK
+        return ArcFaceSDK(**options)
+    if backend == "insightface":
+        from face_model3.face_utils import FaceProcessor
+        return FaceProcessor(**options)
+    if backend == "silence":
+        from face_model2.silence import SilentFaceRecognitionModel
+        return SilentFaceRecognitionModel(device="cpu", **options)
+    raise ValueError(f"不支持的模型后端: {backend}")
+
+
+def _init_worker(backends, warmup_frame_size=None, model_options=None):
+    """工作进程初始化：创建本进程独占的模型实例，指定分辨率时在该分辨率的合成帧上预热"""
+    for backend in backends:
+        try:
+            _worker_models[backend] = _create_model(backend, (model_options or {}).get(backend))
+        except Exception as e:
+            logger.error(f"工作进程{os.getpid()}初始化{backend}模型异常: {str(e)}")
+    if warmup_frame_size is None:
+        return
+    from pipeline.warmup import synthetic_face_frame
+    frame = synthetic_face_frame(*warmup_frame_size)
+    for backend, model in _worker_models.items():
+        try:
+            timings = []
+            for _ in range(2):
+                started = time.perf_counter()
+                model.warmup(frame)
+                timings.append((time.perf_counter() - started) * 1000)
+            _worker_warm[backend] = {"warmup_first_ms": round(timings[0], 1), "warm_latency_ms": round(timings[1], 1)}
+        except Exception as e:
+            logger.error(f"工作进程{os.getpid()}预热{backend}模型异常: {str(e)}")
+
+
+def _attach_frame(frame_ref):
+    """根据元数据还原图像：共享内存槽位以零拷贝视图返回，超大图像直接随任务传递"""
+    if frame_ref is None:
+        return None
+    if frame_ref[0] == "array":
+        return frame_ref[1]
+    _, name, shape, dtype = frame_ref
+    block = _worker_frames.get(name)
+    if block is None:
+        try:
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python 3.13以下没有track参数；spawn子进程与父进程共用resource_tracker，重复登记不会误删
+            block = shared_memory.SharedMemory(name=name)
+        _worker_frames[name] = block
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _model(backend):
+    model = _worker_models.get(backend)
+    if model is None:
+        raise RuntimeError(f"工作进程{os.getpid()}未加载{backend}模型")
+    return model
+
+
+def _task_ping(img):
+    return {"success": True, "pid": os.getpid(), "backends": sorted(_worker_models), "warm": dict(_worker_warm),
+            "shape": list(img.shape) if img is not None else None,
+            "checksum": int(img.sum(dtype=np.uint64)) if img is not None else None}
+
+
+def _task_arcsoft_analyze(img, extract_feature=True, require_live=True):
+    """虹软活体检测+特征提取，同一进程内共享人脸检测结果"""
+    from pipeline.frame_context import FrameContext
+    arc_face = _model("arcsoft")
+    context = FrameContext(img)
+    liveness = arc_face.detect_liveness_from_numpy(img, context=context)
+    feature = None
+    if extract_feature and (not require_live or (liveness["success"] and liveness.get("is_live", False))):
+        feature = arc_face.extract_feature_from_numpy(img, context=context)
+    return {"liveness": liveness, "feature": feature, "stages": context.stages}
+
+
+def _task_arcsoft_detect(img):
+    """虹软人脸检测（实时识别跟踪），去掉不可序列化的ctypes结构体"""
+    result = _model("arcsoft").detect_faces_from_numpy(img)
+    result.pop("raw_info", None)
+    return result
+
+
+def _task_arcsoft_compare(img, feature1, feature2):
+    return _model("arcsoft").compare_features(feature1, feature2)
+
+
+def _task_insightface_detect(img):
+    return _model("insightface").detect_faces_from_numpy(img)
+
+
+def _task_silence_feature(img):
+    return _model("silence").extract_feature_from_numpy(img)
+
+
+_TASKS = {
+    "ping": _task_ping,
+    "arcsoft_analyze": _task_arcsoft_analyze,
+    "arcsoft_detect": _task_arcsoft_detect,
+    "arcsoft_compare": _task_arcsoft_compare,
+    "insightface_detect": _task_insightface_detect,
+    "silence_feature": _task_silence_feature
+}
+
+
+def _run_task(task, frame_ref, kwargs):
+    """工作进程入口"""
+    started = time.perf_counter()
+    result = _TASKS[task](_attach_frame(frame_ref), **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+#------------------------ 主进程侧 ------------------------#
+
+
+class ModelProcessPool:
+    """
+    多进程模型工作池
+    使用spawn方式启动工作进程（避免fork继承已初始化的ctypes/ONNX/torch状态），
+    图像写入预分配的共享内存槽位后只传递槽位元数据；槽位数限制同时在途的帧数
+    """
+    def __init__(self, num_workers, backends=("arcsoft", "insightface"), slot_count=None,
+                 slot_bytes=DEFAULT_SLOT_BYTES, warmup_frame_size=None, model_options=None):
+        """
+        Args:
+            num_workers: 工作进程数，通常等于CPU核数
+            backends: 每个工作进程加载的模型后端（arcsoft/insightface/silence）
+            slot_count: 共享内存槽位数，默认每进程2个
+            slot_bytes: 单个槽位字节数，超过该大小的图像退化为随任务序列化传递
+            warmup_frame_size: (宽, 高)，指定时各工作进程加载模型后在该分辨率的合成帧上预热
+            model_options: {后端: 构造参数}，如 {"insightface": {"intra_op_threads": 2}}
+        """
+        self.num_workers = max(1, int(num_workers))
+        self.backends = tuple(backends)
+        self.slot_bytes = int(slot_bytes)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.backends, warmup_frame_size, model_options)
+        )
+        self._slots = [shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+                       for _ in range(slot_count or self.num_workers * 2)]
+        self._free = list(range(len(self._slots)))
+        self._slot_available = None
+        self.warm = {}
+
+        # 统计指标
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._in_flight = 0
+        self._shm_frames = 0
+        self._pickled_frames = 0
+        self._slot_wait_ms = 0.0
+        self._run_ms = 0.0
+
+    async def start(self):
+        """预热：启动全部工作进程并完成模型加载（及合成帧预热），记录各进程的预热耗时"""
+        results = await asyncio.gather(*[self.run("ping") for _ in range(self.num_workers)])
+        self.warm = {result["pid"]: result["warm"] for result in results}
+        return sorted(self.warm)
+
+    async def _acquire_slot(self):
+        if self._slot_available is None:
+            self._slot_available = asyncio.Semaphore(len(self._slots))
+        started = time.perf_counter()
+        await self._slot_available.acquire()
+        self._slot_wait_ms += (time.perf_counter() - started) * 1000
+        return self._free.pop()
+
+    def _release_slot(self, index):
+        self._free.append(index)
+        self._slot_available.release()
+
+    async def run(self, task, img=None, **kwargs):
+        """
+        在工作进程中执行任务
+
+        Args:
+            task: 任务名称（ping/arcsoft_analyze/arcsoft_detect/arcsoft_compare/insightface_detect/silence_feature）
+            img: 可选的BGR图像数组，经共享内存传递
+            **kwargs: 任务参数
+
+        Returns:
+            任务结果（工作进程中抛出的异常原样抛出）
+        """
+        loop = asyncio.get_running_loop()
+        slot = None
+        if img is None:
+            frame_ref = None
+        elif img.nbytes <= self.slot_bytes:
+            slot = await self._acquire_slot()
+            block = self._slots[slot]
+            np.ndarray(img.shape, dtype=img.dtype, buffer=block.buf)[...] = img
+            frame_ref = ("shm", block.name, img.shape, img.dtype.str)
+            self._shm_frames += 1
+        else:
+            frame_ref = ("array", img)
+            self._pickled_frames += 1
+
+        self._submitted += 1
+        self._in_flight += 1
+        future = self._executor.submit(_run_task, task, frame_ref, kwargs)
+        # 槽位与在途计数只在工作进程执行结束（或任务在开始前被取消）后释放：等待的协程被取消时，
+        # 工作进程可能仍在读取共享内存，提前归还会让下一帧覆盖正在读取的图像
+        future.add_done_callback(lambda _: self._on_task_done(loop, slot))
+        try:
+            result, run_ms = await asyncio.wrap_future(future, loop=loop)
+            self._completed += 1
+            self._run_ms += run_ms
+            return result
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+
+    def _on_task_done(self, loop, slot):
+        """任务结束回调（在执行器的管理线程中调用），回到事件循环释放槽位"""
+        try:
+            loop.call_soon_threadsafe(self._finish_task, slot)
+        except RuntimeError:
+            # 事件循环已关闭（服务退出），槽位随共享内存一起释放
+            pass
+
+    def _finish_task(self, slot):
+        self._in_flight -= 1
+        if slot is not None:
+            self._release_slot(slot)
+
+    def metrics(self):
+        completed = self._completed
+        return {
+            "workers": self.num_workers,
+            "backends": list(self.backends),
+            "warm": self.warm,
+            "slots": len(self._slots),
+            "free_slots": len(self._free),
+            "in_flight": self._in_flight,
+            "submitted": self._submitted,
+            "completed": completed,
+            "failed": self._failed,
+            "shm_frames": self._shm_frames,
+            "pickled_frames": self._pickled_frames,
+            "avg_slot_wait_ms": round(self._slot_wait_ms / max(1, self._shm_frames), 2),
+            "avg_run_ms": round(self._run_ms / completed, 2) if completed else 0.0
+        }
+
+    def shutdown(self):
+        """关闭工作进程并释放共享内存"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for block in self._slots:
+            try:
+                block.close()
+                block.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,155 @@
+"""
+ONNX模型INT8量化
+- dynamic：只量化权重，激活值在推理时按batch动态计算量化参数，不需要校准数据
+- static：权重和激活值都量化（QDQ格式，激活uint8/权重int8按通道），激活值范围由校准集统计，
+  校准集用与打卡帧同类的图片（uploads目录）经各模型自己的预处理得到
+量化后的模型按源模型修改时间缓存，源模型更新后重新量化；更换校准集需要force=True
+"""
+import os
+import glob
+import tempfile
+
+import cv2
+import numpy as np
+
+QUANT_MODES = ("dynamic", "static")
+
+
+def parse_quantization(value):
+    """
+    解析"后端:模式"列表，如"insightface:static,silence"，省略模式时为dynamic
+
+    Returns:
+        dict: {后端名称: 量化模式}
+    """
+    result = {}
+    for item in str(value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        backend, _, mode = item.partition(":")
+        mode = mode.strip() or "dynamic"
+        if mode not in QUANT_MODES:
+            raise ValueError(f"不支持的量化模式: {mode}，可选: {', '.join(QUANT_MODES)}")
+        result[backend.strip()] = mode
+    return result
+
+
+def quantized_path_for(model_path, mode, output_dir=None):
+    """量化模型路径：xxx.onnx -> xxx.int8-<mode>.onnx，output_dir为None时与源模型同目录"""
+    root, ext = os.path.splitext(os.path.basename(model_path))
+    return os.path.join(output_dir or os.path.dirname(model_path), f"{root}.int8-{mode}{ext or '.onnx'}")
+
+
+def load_calibration_frames(image_dir, limit=100):
+    """
+    读取校准用的BGR图像（按文件名排序取前limit张）
+
+    Returns:
+        list: BGR图像数组列表
+    """
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")) + glob.glob(os.path.join(image_dir, "*.jpeg"))
+                   + glob.glob(os.path.join(image_dir, "*.png")))
+    frames = []
+    for path in paths[:limit]:
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is not None:
+            frames.append(img)
+    return frames
+
+
+class ArrayCalibrationReader:
+    """把预处理好的模型输入数组按单样本逐个提供给onnxruntime校准器"""
+    def __init__(self, input_name, samples):
+        self.input_name = input_name
+        self.samples = [np.ascontiguousarray(sample, dtype=np.float32) for sample in samples]
+        self._index = 0
+
+    def get_next(self):
+        if self._index >= len(self.samples):
+            return None
+        sample = self.samples[self._index]
+        self._index += 1
+        return {self.input_name: sample[np.newaxis] if sample.ndim == 3 else sample}
+
+    def rewind(self):
+        self._index = 0
+
+
+def quantize_model(model_path, output_path, mode="dynamic", calibration_inputs=None, per_channel=True):
+    """
+    量化ONNX模型
+
+    Args:
+        model_path: FP32模型路径
+        output_path: 量化模型输出路径
+        mode: dynamic/static
+        calibration_inputs: static时的校准输入数组列表（每项为单个样本或一个batch，已按模型要求预处理）
+        per_channel: 权重是否按输出通道量化（卷积网络精度明显更好）
+
+    Returns:
+        str: 量化模型路径
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_dynamic, quantize_static, QuantFormat, QuantType
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if mode not in QUANT_MODES:
+        raise ValueError(f"不支持的量化模式: {mode}，可选: {', '.join(QUANT_MODES)}")
+    if mode == "static" and not calibration_inputs:
+        raise ValueError("静态量化需要校准数据")
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    # 量化结果先写到输出目录中的临时文件，写完整个文件后再原子替换，避免并发加载读到写了一半的模型；
+    # 临时文件与输出文件必须在同一文件系统（系统临时目录可能是tmpfs或另一块磁盘，跨设备无法os.replace）
+    fd, tmp_output = tempfile.mkstemp(dir=output_dir, suffix=".onnx")
+    os.close(fd)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 量化前先做形状推断和图优化（折叠BN等），量化工具对推断出形状的节点处理更完整
+            prepared = os.path.join(tmp_dir, "prepared.onnx")
+            try:
+                quant_pre_process(model_path, prepared, skip_symbolic_shape=True)
+            except Exception:
+                prepared = model_path
+            if mode == "dynamic":
+                quantize_dynamic(prepared, tmp_output, per_channel=per_channel, weight_type=QuantType.QInt8)
+            else:
+                input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+                quantize_static(
+                    prepared, tmp_output, ArrayCalibrationReader(input_name, calibration_inputs),
+                    quant_format=QuantFormat.QDQ,
+                    per_channel=per_channel,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8
+                )
+        os.replace(tmp_output, output_path)
+    except BaseException:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        raise
+    return output_path
+
+
+def ensure_quantized(model_path, mode, calibration_fn=None, output_dir=None, force=False):
+    """
+    返回量化模型路径，缓存不存在、比源模型旧或force=True时重新量化
+
+    Args:
+        model_path: FP32模型路径
+        mode: dynamic/static
+        calibration_fn: static时调用以生成校准输入（只在需要重新量化时调用）
+        output_dir: 量化模型存放目录，None时与源模型同目录
+        force: 忽略缓存强制重新量化（更换校准集后使用）
+
+    Returns:
+        str: 量化模型路径
+    """
+    output_path = quantized_path_for(model_path, mode, output_dir)
+    if (not force and os.path.exists(output_path)
+            and os.path.getmtime(output_path) >= os.path.getmtime(model_path)):
+        return output_path
+    calibration_inputs = None
+    if mode == "static":
+        calibration_inputs = calibration_fn() if calibration_fn is not None else None
+    return quantize_model(model_path, output_path, mode, calibration_inputs)
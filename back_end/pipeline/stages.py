@@ -0,0 +1,169 @@
+"""
+多阶段线程流水线（用于批量注册等离线任务）
+每个阶段有独立的工作线程和批大小，阶段之间用有界队列衔接：下游处理不过来时上游阻塞，
+内存中同时存在的任务数有上限；各阶段并行处理不同任务，并统计吞吐量与忙碌程度
+"""
+import time
+import queue
+import threading
+
+# 输入结束标记
+_END = object()
+
+
+class Stage:
+    """
+    流水线阶段
+    fn处理单个任务（batch_size=1）或任务列表（batch_size>1），返回处理后的任务/任务列表，
+    返回None（或列表中的None）表示丢弃该任务；fn抛出异常时本批任务记为失败并交给on_error
+    """
+    def __init__(self, name, fn, workers=1, batch_size=1, max_wait_ms=50.0, queue_size=64):
+        """
+        Args:
+            name: 阶段名称
+            fn: 处理函数
+            workers: 工作线程数（非线程安全的模型应设为1）
+            batch_size: 每次最多处理的任务数
+            max_wait_ms: 攒批时等待更多任务的最长时间（毫秒）
+            queue_size: 本阶段输入队列容量
+        """
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+        self.inbox = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.outbox = None
+        self.on_error = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._running = 0
+        self._processed = 0
+        self._dropped = 0
+        self._failed = 0
+        self._batches = 0
+        self._busy = 0.0
+        self._first = None
+        self._last = None
+
+    def start(self, outbox, on_error=None):
+        self.outbox = outbox
+        self.on_error = on_error
+        self._running = self.workers
+        self._threads = [threading.Thread(target=self._loop, name=f"{self.name}-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _take(self):
+        """取一批任务；收到结束标记时返回(批, True)"""
+        item = self.inbox.get()
+        if item is _END:
+            return [], True
+        batch = [item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self.inbox.get(timeout=timeout) if timeout > 0 else self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if item is _END:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self):
+        while True:
+            batch, finished = self._take()
+            if batch:
+                self._process(batch)
+            if finished:
+                break
+        # 通知同阶段其他线程结束，最后一个线程把结束标记传给下游
+        self.inbox.put(_END)
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last and self.outbox is not None:
+            self.outbox.put(_END)
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        failed = None
+        try:
+            results = self.fn(batch) if self.batch_size > 1 else [self.fn(batch[0])]
+        except Exception as e:
+            results, failed = [], e
+        finished = time.perf_counter()
+        results = [item for item in (results or []) if item is not None]
+        with self._lock:
+            self._batches += 1
+            self._busy += finished - started
+            self._first = started if self._first is None else self._first
+            self._last = finished
+            if failed is not None:
+                self._failed += len(batch)
+            else:
+                self._processed += len(results)
+                self._dropped += len(batch) - len(results)
+        if failed is not None and self.on_error is not None:
+            self.on_error(self.name, batch, failed)
+        if self.outbox is not None:
+            for item in results:
+                self.outbox.put(item)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def metrics(self):
+        with self._lock:
+            elapsed = (self._last - self._first) if self._first is not None else 0.0
+            handled = self._processed + self._dropped + self._failed
+            return {
+                "workers": self.workers,
+                "processed": self._processed,
+                "dropped": self._dropped,
+                "failed": self._failed,
+                "avg_batch_size": round(handled / self._batches, 2) if self._batches else 0.0,
+                "items_per_sec": round(handled / elapsed, 2) if elapsed > 0 else 0.0,
+                "avg_ms_per_item": round(self._busy * 1000 / handled, 2) if handled else 0.0,
+                "utilization": round(self._busy / (elapsed * self.workers), 2) if elapsed > 0 else 0.0
+            }
+
+
+class StagePipeline:
+    """按顺序连接多个Stage，run(items)把任务依次送入第一阶段并等待全部阶段处理完"""
+    def __init__(self, stages, on_error=None):
+        """
+        Args:
+            stages: Stage列表，前一阶段的输出作为后一阶段的输入
+            on_error: on_error(阶段名称, 任务列表, 异常)，阶段处理函数抛出异常时调用
+        """
+        self.stages = list(stages)
+        self.on_error = on_error
+
+    def run(self, items):
+        """
+        Args:
+            items: 任务可迭代对象（可以是生成器，按需逐个送入）
+
+        Returns:
+            float: 总耗时（秒）
+        """
+        started = time.perf_counter()
+        for stage, downstream in zip(self.stages, self.stages[1:] + [None]):
+            stage.start(downstream.inbox if downstream is not None else None, self.on_error)
+        first = self.stages[0].inbox
+        try:
+            for item in items:
+                first.put(item)
+        finally:
+            first.put(_END)
+            for stage in self.stages:
+                stage.join()
+        return time.perf_counter() - started
+
+    def metrics(self):
+        return {stage.name: stage.metrics() for stage in self.stages}
@@ -0,0 +1,130 @@
+"""
+实时识别帧流
+考勤机通过WebSocket持续发送JPEG帧，识别速度跟不上帧率时只处理最新到达的一帧（latest-frame-wins），
+处理期间到达的旧帧被新帧覆盖丢弃而不在队列中积压，返回的结果总是对应最近的画面；
+同时统计每个连接的收帧/处理帧率、丢帧数和端到端延迟
+"""
+import time
+import asyncio
+from collections import deque
+
+import numpy as np
+
+
+class LatestFrameSlot:
+    """
+    单槽帧缓冲：新帧覆盖尚未被取走的旧帧
+    只在事件循环线程中使用，不需要加锁
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._event = asyncio.Event()
+        self._closed = False
+
+    def put(self, frame):
+        """
+        放入一帧
+
+        Returns:
+            bool: 是否覆盖了尚未处理的旧帧
+        """
+        replaced = self._frame is not None
+        self._frame = frame
+        self._event.set()
+        return replaced
+
+    async def get(self):
+        """
+        等待并取走最新一帧
+
+        Returns:
+            帧；缓冲已关闭时返回None
+        """
+        while self._frame is None:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+    def close(self):
+        """关闭缓冲，唤醒等待中的处理协程"""
+        self._closed = True
+        self._event.set()
+
+
+class StreamStats:
+    """单个帧流连接的计数与延迟统计"""
+
+    def __init__(self, window_seconds=5.0, latency_samples=200):
+        """
+        Args:
+            window_seconds: 计算帧率的滑动窗口（秒）
+            latency_samples: 计算延迟时保留的最近样本数
+        """
+        self.window_seconds = window_seconds
+        self.started_at = time.monotonic()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._received_times = deque()
+        self._processed_times = deque()
+        self._latencies = deque(maxlen=latency_samples)   # (排队耗时, 处理耗时, 总耗时) 毫秒
+
+    def on_received(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.received += 1
+        self._received_times.append(now)
+
+    def on_dropped(self):
+        self.dropped += 1
+
+    def on_failed(self):
+        self.failed += 1
+
+    def on_processed(self, received_at, started_at, finished_at):
+        """
+        Args:
+            received_at: 帧到达时间（time.monotonic）
+            started_at: 开始处理时间
+            finished_at: 处理完成时间
+        """
+        self.processed += 1
+        self._processed_times.append(finished_at)
+        self._latencies.append(((started_at - received_at) * 1000, (finished_at - started_at) * 1000,
+                                (finished_at - received_at) * 1000))
+
+    def _rate(self, times, now):
+        while times and now - times[0] > self.window_seconds:
+            times.popleft()
+        span = min(self.window_seconds, now - self.started_at)
+        return round(len(times) / span, 2) if span > 0 else 0.0
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: 收帧数、处理数、丢帧数、解码失败数，窗口内的收帧/处理帧率，最近样本的排队、处理与总延迟
+        """
+        now = time.monotonic()
+        latency = {}
+        if self._latencies:
+            samples = np.asarray(self._latencies)
+            latency = {
+                "queue_avg_ms": round(float(samples[:, 0].mean()), 2),
+                "process_avg_ms": round(float(samples[:, 1].mean()), 2),
+                "total_avg_ms": round(float(samples[:, 2].mean()), 2),
+                "total_p95_ms": round(float(np.percentile(samples[:, 2], 95)), 2)
+            }
+        return {
+            "uptime_s": round(now - self.started_at, 1),
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "receive_fps": self._rate(self._received_times, now),
+            "process_fps": self._rate(self._processed_times, now),
+            "latency": latency
+        }
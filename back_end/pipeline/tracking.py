@@ -0,0 +1,192 @@
+"""
+实时识别逐考勤机人脸跟踪
+前端每500ms上传一帧整图，同一台考勤机前的人通常会连续停留数秒，逐帧完整执行活体检测和特征提取是重复计算。
+每台考勤机（kiosk_id）维护一条人脸轨迹（人脸框、识别结果、置信度），后续帧只做人脸检测，
+按IoU把最大的人脸关联到轨迹上并直接复用轨迹的识别结果，仅在以下情况才重新执行完整流程：
+- 新轨迹：首次出现人脸、与轨迹人脸框的IoU低于阈值（换人或大幅移动），或请求参数（学号、班级范围）改变
+- 丢失后重现：连续超过max_missed帧未检测到人脸，轨迹被丢弃，再出现时按新轨迹处理
+- 复核：识别成功的轨迹每reverify_seconds秒复核一次（活体与身份），未识别成功的轨迹每retry_seconds秒重试
+"""
+import time
+import threading
+
+
+def box_iou(a, b):
+    """
+    两个人脸框(left, top, right, bottom)的交并比
+    """
+    inter_w = min(a[2], b[2]) - max(a[0], b[0])
+    inter_h = min(a[3], b[3]) - max(a[1], b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def largest_face_box(faces):
+    """
+    取检测结果中面积最大的人脸框
+
+    Args:
+        faces: 人脸检测结果列表，每项含rect(left/top/right/bottom)
+
+    Returns:
+        (left, top, right, bottom)，没有人脸时返回None
+    """
+    boxes = [(face["rect"]["left"], face["rect"]["top"], face["rect"]["right"], face["rect"]["bottom"])
+             for face in faces or []]
+    if not boxes:
+        return None
+    return max(boxes, key=lambda box: (box[2] - box[0]) * (box[3] - box[1]))
+
+
+class FaceTrack:
+    """一台考勤机当前的人脸轨迹"""
+
+    def __init__(self, box, key, now):
+        self.box = box
+        self.key = key              # 请求参数，改变时轨迹作废
+        self.result = None          # 最近一次完整识别的接口结果
+        self.created_at = now
+        self.last_seen = now
+        self.verified_at = now      # 最近一次发起完整识别的时间
+        self.missed = 0
+        self.frames = 1
+        self.embeds = 0
+
+    @property
+    def identified(self):
+        return bool(self.result and self.result.get("success"))
+
+
+class KioskTracker:
+    """
+    按考勤机维护人脸轨迹，决定每一帧是复用轨迹结果还是重新做完整识别
+    """
+
+    def __init__(self, iou_threshold=0.3, reverify_seconds=5.0, retry_seconds=1.0, max_missed=2, session_ttl=120.0):
+        """
+        Args:
+            iou_threshold: 人脸框与轨迹关联所需的最小IoU
+            reverify_seconds: 已识别轨迹的复核间隔（秒）
+            retry_seconds: 未识别轨迹（无匹配、活体未通过等）的重试间隔（秒）
+            max_missed: 允许连续未检测到人脸的帧数，超过后丢弃轨迹
+            session_ttl: 考勤机超过该时间（秒）没有上传帧时清除其轨迹
+        """
+        self.iou_threshold = iou_threshold
+        self.reverify_seconds = reverify_seconds
+        self.retry_seconds = retry_seconds
+        self.max_missed = max_missed
+        self.session_ttl = session_ttl
+        self._tracks = {}
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+        self._counters = {"frames": 0, "no_face": 0, "tracked": 0, "new": 0, "reverify": 0, "retry": 0, "lost": 0}
+
+    def associate(self, kiosk_id, box, key=None, now=None):
+        """
+        把当前帧检测到的人脸框关联到考勤机的轨迹
+
+        Args:
+            kiosk_id: 考勤机标识
+            box: 当前帧最大人脸框，未检测到人脸时为None
+            key: 请求参数（如学号、班级范围），与轨迹不同时重新识别
+            now: 当前时间（time.monotonic），默认取当前时间
+
+        Returns:
+            (轨迹, 原因)：原因为None表示直接复用轨迹结果，"new"/"reverify"/"retry"表示需要完整识别
+            并在完成后调用update；未检测到人脸时返回(None, "no_face")
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._counters["frames"] += 1
+            self._purge(now)
+            track = self._tracks.get(kiosk_id)
+            if box is None:
+                self._counters["no_face"] += 1
+                if track is not None:
+                    track.missed += 1
+                    track.last_seen = now
+                    if track.missed > self.max_missed:
+                        del self._tracks[kiosk_id]
+                        self._counters["lost"] += 1
+                return None, "no_face"
+
+            if track is None or track.key != key or box_iou(track.box, box) < self.iou_threshold:
+                track = FaceTrack(box, key, now)
+                self._tracks[kiosk_id] = track
+                reason = "new"
+            else:
+                track.box = box
+                track.missed = 0
+                track.frames += 1
+                track.last_seen = now
+                reason = None
+                if track.result is None:
+                    # 上一次完整识别尚未完成（同一考勤机的并发请求），本帧自行识别
+                    reason = "new"
+                elif now - track.verified_at >= (self.reverify_seconds if track.identified else self.retry_seconds):
+                    reason = "reverify" if track.identified else "retry"
+            if reason is None:
+                self._counters["tracked"] += 1
+            else:
+                # 发起识别时即更新复核时间，避免同一考勤机的并发帧重复识别
+                track.verified_at = now
+                self._counters[reason] += 1
+            return track, reason
+
+    def update(self, kiosk_id, track, result):
+        """
+        记录完整识别的结果（轨迹已被新轨迹替换时忽略）
+
+        Args:
+            kiosk_id: 考勤机标识
+            track: associate返回的轨迹
+            result: 接口返回结果
+        """
+        with self._lock:
+            if self._tracks.get(kiosk_id) is track:
+                track.result = {k: v for k, v in result.items() if k not in ("pipeline", "tracking")}
+                track.embeds += 1
+
+    def reset(self, kiosk_id):
+        """清除考勤机的轨迹"""
+        with self._lock:
+            self._tracks.pop(kiosk_id, None)
+
+    @staticmethod
+    def describe(track, reason, now=None):
+        """轨迹信息，附加到接口返回中"""
+        now = time.monotonic() if now is None else now
+        return {
+            "state": reason or "tracked",
+            "box": list(track.box),
+            "track_age_s": round(now - track.created_at, 2),
+            "frames": track.frames,
+            "embeds": track.embeds
+        }
+
+    def _purge(self, now):
+        """清除长时间没有上传帧的考勤机（调用方需持有锁）"""
+        if now - self._last_purge < self.session_ttl / 4:
+            return
+        self._last_purge = now
+        for kiosk_id in [k for k, t in self._tracks.items() if now - t.last_seen > self.session_ttl]:
+            del self._tracks[kiosk_id]
+
+    def metrics(self):
+        """
+        Returns:
+            dict: 活跃考勤机数、各类帧计数，以及需要完整识别的帧占有人脸帧的比例
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            active = len(self._tracks)
+        with_face = counters["frames"] - counters["no_face"]
+        full = counters["new"] + counters["reverify"] + counters["retry"]
+        return {
+            "active_kiosks": active,
+            **counters,
+            "full_pipeline_ratio": round(full / with_face, 4) if with_face else 0.0
+        }
@@ -0,0 +1,49 @@
+"""
+模型预热用合成帧
+首次推理会触发ONNX会话初始化、torch算子初始化和TensorFlow计算图构建等一次性开销，
+服务就绪前用与生产分辨率相同的合成帧把各模型跑一遍，避免由第一批打卡请求承担
+"""
+import cv2
+import numpy as np
+
+
+def parse_frame_size(value, default=(640, 480)):
+    """
+    解析"宽x高"格式的分辨率
+
+    Returns:
+        (宽, 高)
+    """
+    try:
+        width, height = (int(part) for part in str(value).lower().split("x"))
+    except ValueError:
+        return default
+    if width <= 0 or height <= 0:
+        return default
+    return width, height
+
+
+def synthetic_face_frame(width=640, height=480, seed=0):
+    """
+    生成合成帧：带噪声的背景上画一个居中的类人脸图案（肤色椭圆、眼睛、鼻子、嘴），
+    与摄像头画面分辨率、通道数一致。检测器不一定能检出该图案，各模型的预热函数不依赖检出结果
+
+    Args:
+        width: 宽度
+        height: 高度
+        seed: 随机种子
+
+    Returns:
+        BGR格式的uint8图像数组
+    """
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(60, 120, size=(height, width, 3), dtype=np.uint8)
+    cx, cy = width // 2, height // 2
+    size = max(8, min(width, height) // 3)
+    cv2.ellipse(frame, (cx, cy), (int(size * 0.8), size), 0, 0, 360, (140, 170, 210), -1)
+    eye_dx, eye_y = int(size * 0.35), cy - int(size * 0.25)
+    for x in (cx - eye_dx, cx + eye_dx):
+        cv2.ellipse(frame, (x, eye_y), (max(2, size // 7), max(1, size // 14)), 0, 0, 360, (40, 40, 40), -1)
+    cv2.line(frame, (cx, cy - size // 10), (cx, cy + size // 6), (110, 130, 170), max(1, size // 30))
+    cv2.ellipse(frame, (cx, cy + int(size * 0.45)), (size // 4, max(1, size // 12)), 0, 0, 360, (80, 80, 150), -1)
+    return cv2.GaussianBlur(frame, (5, 5), 0)
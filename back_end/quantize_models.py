@@ -0,0 +1,40 @@
+"""
+INT8量化模型预生成工具
+按MODEL_QUANTIZATION相同的方式量化InsightFace识别模型和静默活体方案的FaceNet/MiniFASNetV2，
+服务首次加载量化后端时会自动量化，本工具用于部署前预先生成（static量化需要逐张检测校准图片，耗时较长），
+以及更换校准集后用--force重新量化。量化前后的精度对比见 benchmarks/eval_quantized_tar.py
+
+用法:
+    python quantize_models.py --mode dynamic
+    python quantize_models.py --backends insightface --mode static --calibration-dir uploads --force
+"""
+import os
+import sys
+import argparse
+
+from pipeline.quantization import QUANT_MODES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成INT8量化模型")
+    parser.add_argument("--backends", nargs="+", default=["insightface", "silence"], choices=["insightface", "silence"])
+    parser.add_argument("--mode", default="dynamic", choices=QUANT_MODES)
+    parser.add_argument("--calibration-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads"),
+                        help="static量化的校准图片目录")
+    parser.add_argument("--force", action="store_true", help="忽略已缓存的量化模型，重新量化")
+    args = parser.parse_args(argv)
+
+    options = {"quantization": args.mode, "calibration_dir": args.calibration_dir, "force_quantize": args.force}
+    if "insightface" in args.backends:
+        from face_model3.face_utils import FaceProcessor
+        model = FaceProcessor(**options)
+        print(f"insightface: {model.quantized_model_file}")
+    if "silence" in args.backends:
+        from face_model2.silence import SilentFaceRecognitionModel
+        model = SilentFaceRecognitionModel(device="cpu", backend="onnx", **options)
+        print(f"silence: {model.facenet_ort.model_path}, {model.liveness_ort.model_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+按日考勤汇总(attendance_daily)重建工具
+汇总表在打卡时增量维护，首次升级时由数据库迁移自动回填；
+直接修改过考勤记录或怀疑汇总不一致时，用本工具按日期范围重建
+
+用法:
+    python rebuild_rollup.py                                  # 全量重建
+    python rebuild_rollup.py --start-date 2024-09-01 --end-date 2024-09-30
+    python rebuild_rollup.py --verify                         # 只校验，不修改
+"""
+import sys
+import argparse
+
+from database import AttendanceDB
+
+
+def verify(db, start_date=None, end_date=None):
+    """对比汇总表与考勤记录的实时统计，返回不一致的(日期, 学号, 状态, 汇总次数, 实际次数)列表"""
+    lower, upper = db._date_range_bounds(start_date, end_date)
+    conn = db.get_connection()
+    actual = {}
+    query = "SELECT substr(check_time, 1, 10) AS date, student_id, COALESCE(status, 'present') AS status, COUNT(*) AS count FROM attendance WHERE 1=1"
+    params = []
+    if lower:
+        query += " AND check_time >= ?"
+        params.append(lower)
+    if upper:
+        query += " AND check_time < ?"
+        params.append(upper)
+    for row in conn.execute(query + " GROUP BY 1, 2, 3", params):
+        actual[(row["date"], row["student_id"], row["status"])] = row["count"]
+
+    rollup = {}
+    query = "SELECT date, student_id, status, count FROM attendance_daily WHERE 1=1"
+    params = []
+    if start_date:
+        query += " AND date >= ?"
+        params.append(start_date)
+    if end_date:
+        query += " AND date <= ?"
+        params.append(end_date)
+    for row in conn.execute(query, params):
+        if row["count"]:
+            rollup[(row["date"], row["student_id"], row["status"])] = row["count"]
+    conn.close()
+
+    return [key + (rollup.get(key, 0), actual.get(key, 0))
+            for key in sorted(set(actual) | set(rollup)) if rollup.get(key, 0) != actual.get(key, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按日考勤汇总重建工具")
+    parser.add_argument("--db", help="数据库文件路径，默认为face_attendance.db")
+    parser.add_argument("--start-date", help="开始日期 YYYY-MM-DD")
+    parser.add_argument("--end-date", help="结束日期 YYYY-MM-DD")
+    parser.add_argument("--verify", action="store_true", help="只校验汇总与考勤记录是否一致")
+    args = parser.parse_args()
+    try:
+        AttendanceDB.validate_date_range(args.start_date, args.end_date)
+    except ValueError as e:
+        parser.error(str(e))
+
+    db = AttendanceDB(args.db)
+    if not args.verify:
+        result = db.rebuild_attendance_rollup(args.start_date, args.end_date)
+        print(result["message"])
+        if not result["success"]:
+            sys.exit(1)
+
+    mismatches = verify(db, args.start_date, args.end_date)
+    for date, student_id, status, rollup_count, actual_count in mismatches[:20]:
+        print(f"不一致: {date} {student_id} {status} 汇总={rollup_count} 实际={actual_count}")
+    print(f"校验完成，不一致 {len(mismatches)} 项")
+    db.close()
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
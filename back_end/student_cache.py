@@ -0,0 +1,150 @@
+"""
+学生信息与人脸模板缓存
+进程内LRU/TTL缓存，以学号为键缓存学生信息行和已解析的三种方案人脸特征，
+学生注册/删除时通过数据库变更监听器失效，避免每次打卡都查库并重复解析特征字节
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger("Database")
+
+# 各方案特征的解析方式：虹软特征需原样传给SDK，其余方案为float32向量
+TEMPLATE_DTYPES = {
+    "arcsoft": None,
+    "deepface": np.float32,
+    "silence": np.float32,
+}
+
+
+class _Entry:
+    __slots__ = ("row", "templates", "expire")
+
+    def __init__(self, row, expire):
+        self.row = row
+        self.templates = {}
+        self.expire = expire
+
+
+class StudentCache:
+    """
+    学生信息缓存
+    未命中时调用loader读取整行学生记录（含三种特征字段），特征按方案在首次使用时解析一次
+    """
+    def __init__(self, loader, feature_columns, max_entries=4096, ttl_seconds=600):
+        """
+        Args:
+            loader: loader(student_id)，返回学生记录字典，不存在时返回None
+            feature_columns: 特征方案到字段名的映射
+            max_entries: 最多缓存的学生数，超出时淘汰最久未使用的
+            ttl_seconds: 缓存有效期（秒），<=0表示不过期
+        """
+        self._loader = loader
+        self._feature_columns = feature_columns
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._versions = {}  # 学号 -> 失效次数，防止加载期间发生的失效被旧数据覆盖
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def _entry(self, student_id):
+        """获取缓存项，未命中或过期时加载；学生不存在时返回None（不缓存）"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None and (entry.expire is None or entry.expire > now):
+                self._entries.move_to_end(student_id)
+                self._hits += 1
+                return entry
+            if entry is not None:
+                del self._entries[student_id]
+                self._expired += 1
+            self._misses += 1
+            version = self._versions.get(student_id, 0)
+
+        row = self._loader(student_id)
+        if row is None:
+            return None
+        entry = _Entry(row, now + self.ttl_seconds if self.ttl_seconds and self.ttl_seconds > 0 else None)
+        with self._lock:
+            if self._versions.get(student_id, 0) != version:
+                # 加载期间学生信息已变更，本次结果不写入缓存
+                return entry
+            self._entries[student_id] = entry
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return entry
+
+    def get_row(self, student_id):
+        """
+        获取学生记录（浅拷贝，调用方修改不影响缓存）
+
+        Returns:
+            dict或None
+        """
+        entry = self._entry(student_id)
+        return dict(entry.row) if entry is not None else None
+
+    def get_template(self, student_id, feature_type):
+        """
+        获取已解析的人脸特征
+
+        Args:
+            student_id: 学生学号
+            feature_type: 特征方案（arcsoft/deepface/silence）
+
+        Returns:
+            虹软方案返回bytes，其余方案返回只读float32数组；未注册该方案特征时返回None
+        """
+        column = self._feature_columns[feature_type]
+        entry = self._entry(student_id)
+        if entry is None:
+            return None
+        template = entry.templates.get(feature_type)
+        if template is None:
+            raw = entry.row.get(column)
+            if not raw:
+                return None
+            dtype = TEMPLATE_DTYPES.get(feature_type)
+            template = bytes(raw) if dtype is None else np.frombuffer(raw, dtype=dtype)
+            entry.templates[feature_type] = template
+        return template
+
+    def invalidate(self, student_id):
+        with self._lock:
+            self._versions[student_id] = self._versions.get(student_id, 0) + 1
+            if self._entries.pop(student_id, None) is not None:
+                self._invalidations += 1
+
+    def on_student_changed(self, action, student_id, data=None):
+        """数据库学生变更回调：注册/更新/删除均使缓存失效，下次访问重新加载"""
+        self.invalidate(student_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "expired": self._expired,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations
+            }
@@ -0,0 +1,48 @@
+"""
+测试公共配置：把back_end加入导入路径（与benchmarks脚本相同，按back_end目录下的模块名导入），
+以及预置考勤记录的临时数据库
+"""
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AttendanceDB
+
+
+@pytest.fixture
+def attendance_db(tmp_path):
+    """
+    临时数据库：2个班6名学生，2024-09-01起20天内约300条考勤记录（含同一秒的多条记录，
+    状态和检测方式随机），按打卡时相同的方式在同一事务中更新按日汇总
+
+    Returns:
+        (AttendanceDB, 写入的考勤记录列表)
+    """
+    db = AttendanceDB(str(tmp_path / "attendance.db"))
+    students = [(f"2024{i:03d}", f"学生{i}", "一班" if i < 3 else "二班") for i in range(6)]
+    for student_id, name, class_name in students:
+        assert db.register_student(student_id, name, class_name=class_name)["success"]
+
+    rng = random.Random(0)
+    rows = []
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    for _ in range(300):
+        student_id = rng.choice(students)[0]
+        # 时间取整到10分钟，保证出现同一时间的多条记录（分页需按id区分）
+        check_time = f"2024-09-{rng.randint(1, 20):02d} {rng.randint(7, 18):02d}:{rng.choice(range(0, 60, 10)):02d}:00"
+        status = rng.choice(["present", "present", "late", "absent"])
+        method = rng.choice(["arcsoft", "insightface"])
+        cursor.execute("INSERT INTO attendance (student_id, check_time, status, detection_method) VALUES (?, ?, ?, ?)",
+                       (student_id, check_time, status, method))
+        db._increment_attendance_daily(cursor, student_id, check_time, status)
+        rows.append({"id": cursor.lastrowid, "student_id": student_id, "check_time": check_time,
+                     "status": status, "detection_method": method})
+    conn.commit()
+    conn.close()
+    yield db, rows
+    db.close()
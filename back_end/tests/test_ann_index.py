@@ -0,0 +1,158 @@
+"""
+ANN索引：增量新增/更新/删除（IVF删除与表尾交换）后位置索引一致、检索召回率、
+保存/加载往返，以及特征库按内容指纹决定复用磁盘索引还是重建；HNSW需安装hnswlib
+"""
+import numpy as np
+import pytest
+
+from face_gallery import FaceGallery, IVFIndex, HNSWIndex
+
+DIM = 64
+
+
+def clustered(n, clusters=20, noise=0.5, seed=0):
+    """聚类分布的特征（与真实人脸特征类似，ANN检索才有意义）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, DIM))
+    return (centers[rng.integers(0, clusters, n)] + noise * rng.normal(size=(n, DIM))).astype(np.float32)
+
+
+def normalized(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def recall_at_1(index, ids, vectors, queries):
+    truth = np.argmax(queries @ normalized(vectors).T, axis=1)
+    hits = sum(1 for q, t in zip(queries, truth) if index.search(q, top_k=1)[0][0] == ids[t])
+    return hits / len(queries)
+
+
+def assert_ivf_consistent(index):
+    """每个学号的(倒排表, 位置)与倒排表内容一致"""
+    assert len(index) == sum(index._list_sizes)
+    for item_id, (list_no, pos) in index._where.items():
+        assert pos < index._list_sizes[list_no]
+        assert index._list_ids[list_no][pos] == item_id
+    for list_no, ids in enumerate(index._list_ids):
+        assert len(ids) == index._list_sizes[list_no]
+
+
+@pytest.fixture(params=["ivf", "hnsw"])
+def make_index(request):
+    if request.param == "hnsw":
+        pytest.importorskip("hnswlib")
+        return lambda: HNSWIndex(dim=DIM)
+    return lambda: IVFIndex(dim=DIM, nlist=16, nprobe=4, min_train_size=256)
+
+
+def test_build_and_recall(make_index):
+    vectors = clustered(2000)
+    ids = [f"S{i:04d}" for i in range(2000)]
+    index = make_index()
+    index.build(ids, vectors)
+    assert len(index) == 2000 and "S0001" in index
+    queries = normalized(vectors[:200] + 0.2 * np.random.default_rng(1).normal(size=(200, DIM)).astype(np.float32))
+    assert recall_at_1(index, ids, vectors, queries) >= 0.95
+    results = index.search(vectors[5], top_k=5)
+    assert results[0] == ("S0005", pytest.approx(1.0, abs=1e-5))
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+
+def test_incremental_add_remove(make_index):
+    vectors = clustered(600, seed=2)
+    ids = [f"S{i:04d}" for i in range(600)]
+    index = make_index()
+    index.build(ids[:400], vectors[:400])
+    for item_id, vec in zip(ids[400:], vectors[400:]):
+        index.add(item_id, vec)
+    removed = set(ids[::3])
+    for item_id in removed:
+        assert index.remove(item_id)
+    assert not index.remove(ids[0])
+    # 更新已有学号的特征
+    index.add(ids[1], vectors[2])
+
+    if isinstance(index, IVFIndex):
+        assert_ivf_consistent(index)
+    kept = [i for i, item_id in enumerate(ids) if item_id not in removed]
+    assert len(index) == len(kept)
+    for i in kept[:50]:
+        if i in (1, 2):
+            continue
+        assert index.search(vectors[i], top_k=1)[0][0] == ids[i]
+    assert {hit[0] for hit in index.search(vectors[2], top_k=2)} == {ids[1], ids[2]}
+    assert all(hit[0] not in removed for q in vectors[:30] for hit in index.search(q, top_k=5))
+
+
+def test_ivf_untrained_is_exact():
+    vectors = clustered(100, seed=3)
+    index = IVFIndex(dim=DIM, min_train_size=1024)
+    index.build([str(i) for i in range(100)], vectors)
+    assert not index.is_trained and not index.needs_rebuild()
+    queries = clustered(20, seed=4)
+    assert recall_at_1(index, [str(i) for i in range(100)], vectors, normalized(queries)) == 1.0
+    for i in range(100, 1024):
+        index.add(str(i), clustered(1, seed=i)[0])
+    assert index.needs_rebuild()
+
+
+def test_save_load_round_trip(make_index, tmp_path):
+    vectors = clustered(500, seed=5)
+    ids = [f"S{i:04d}" for i in range(500)]
+    index = make_index()
+    index.build(ids, vectors)
+    index.remove(ids[7])
+    index.signature = "sig"
+    path = str(tmp_path / f"index.{index.kind}")
+    index.save(path)
+
+    loaded = type(index).load(path)
+    assert loaded.signature == "sig"
+    assert len(loaded) == len(index) and ids[7] not in loaded
+    if isinstance(loaded, IVFIndex):
+        assert_ivf_consistent(loaded)
+    for q in clustered(20, seed=6):
+        assert loaded.search(q, top_k=3) == index.search(q, top_k=3)
+
+
+def test_gallery_reuses_index_only_when_signature_matches(tmp_path, monkeypatch):
+    builds = []
+    original_build = IVFIndex.build
+
+    def counting_build(self, ids, vectors):
+        builds.append(len(ids))
+        return original_build(self, ids, vectors)
+
+    monkeypatch.setattr(IVFIndex, "build", counting_build)
+    vectors = normalized(clustered(300, seed=7))
+    ids = [f"S{i:04d}" for i in range(300)]
+    infos = [{"name": None, "class_name": "一班"} for _ in ids]
+    path = str(tmp_path / "gallery.ivf.npz")
+
+    def open_gallery(student_ids, matrix):
+        gallery = FaceGallery(dim=DIM, index=IVFIndex(dim=DIM, nlist=8, min_train_size=100), index_path=path)
+        gallery.load_vectors(list(student_ids), list(infos[:len(student_ids)]), list(matrix))
+        return gallery
+
+    first = open_gallery(ids, vectors)
+    assert builds == [300]
+    # 内容一致：直接加载磁盘索引
+    second = open_gallery(ids, vectors)
+    assert builds == [300]
+    assert second.search(vectors[3])[0]["student_id"] == "S0003"
+    # 内容变化（服务停止期间有注册）：指纹不一致，重建
+    changed = vectors.copy()
+    changed[0] = normalized(clustered(1, seed=8))[0]
+    open_gallery(ids, changed)
+    assert builds == [300, 300]
+    open_gallery(ids[:-1], vectors[:-1])
+    assert builds == [300, 300, 299]
+
+    # 增量修改后保存的索引与新内容的指纹一致
+    first.upsert("S9999", vectors[0], class_name="一班")
+    first.save_index()
+    reopened = FaceGallery(dim=DIM, index=IVFIndex(dim=DIM, nlist=8, min_train_size=100), index_path=path)
+    reopened.load_vectors(list(first._student_ids), [dict(info) for info in first._infos],
+                          list(first.matrix[:len(first)]))
+    assert builds == [300, 300, 299]
+    assert "S9999" in reopened.index
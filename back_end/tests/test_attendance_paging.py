@@ -0,0 +1,65 @@
+"""
+考勤记录游标分页与流式导出：逐页/逐批取出的记录应与一次查询的完整列表完全一致（顺序、无重复、无遗漏）
+"""
+import pytest
+
+FILTERS = [
+    {},
+    {"class_name": "一班"},
+    {"start_date": "2024-09-05", "end_date": "2024-09-12"},
+    {"student_id": "2024004", "detection_method": "insightface"},
+]
+
+
+def full_ids(db, **filters):
+    result = db.get_attendance_records(**filters)
+    assert result["success"]
+    return [record["id"] for record in result["data"]]
+
+
+def test_full_list_order(attendance_db):
+    db, rows = attendance_db
+    expected = [row["id"] for row in sorted(rows, key=lambda row: (row["check_time"], row["id"]), reverse=True)]
+    assert full_ids(db) == expected
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("limit", [1, 7, 50, 1000])
+def test_pages_concatenate_to_full_list(attendance_db, filters, limit):
+    db, _ = attendance_db
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = db.get_attendance_records_page(limit=limit, cursor=cursor, **filters)
+        assert page["success"]
+        assert len(page["data"]) <= limit
+        ids.extend(record["id"] for record in page["data"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    expected = full_ids(db, **filters)
+    assert ids == expected
+    assert pages == max(1, -(-len(expected) // limit))
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_stream_batches_concatenate_to_full_list(attendance_db, filters):
+    db, _ = attendance_db
+    batches = list(db.iter_attendance_records(batch_size=13, **filters))
+    assert all(0 < len(batch) <= 13 for batch in batches)
+    assert [record["id"] for batch in batches for record in batch] == full_ids(db, **filters)
+
+
+def test_stream_resumes_from_page_cursor(attendance_db):
+    db, _ = attendance_db
+    page = db.get_attendance_records_page(limit=25)
+    resumed = [record["id"] for batch in db.iter_attendance_records(cursor=page["next_cursor"]) for record in batch]
+    assert [record["id"] for record in page["data"]] + resumed == full_ids(db)
+
+
+def test_invalid_cursor(attendance_db):
+    db, _ = attendance_db
+    page = db.get_attendance_records_page(limit=10, cursor="not-a-cursor")
+    assert not page["success"] and "无效的分页游标" in page["message"]
+    with pytest.raises(ValueError):
+        next(db.iter_attendance_records(cursor="not-a-cursor"))
@@ -0,0 +1,72 @@
+"""
+按日汇总(attendance_daily)统计与考勤记录实时统计一致：增量维护、打卡写入和重建后都应与逐条计数相同
+"""
+import datetime
+from collections import Counter
+
+import pytest
+
+RANGES = [
+    ("2024-09-01", "2024-09-20"),
+    ("2024-09-05", "2024-09-05"),
+    ("2024-09-10", "2024-09-30"),
+    ("2024-08-01", "2024-08-31"),
+]
+
+
+def live_stats(rows, start_date, end_date, students):
+    """由考勤记录逐条计数，返回{学号: (正常, 迟到, 缺勤)}"""
+    counts = Counter((row["student_id"], row["status"]) for row in rows if start_date <= row["check_time"][:10] <= end_date)
+    return {student_id: tuple(counts[(student_id, status)] for status in ("present", "late", "absent"))
+            for student_id in students}
+
+
+def rollup_stats(db, start_date, end_date, class_name=None):
+    result = db.get_attendance_statistics(start_date, end_date, class_name)
+    assert result["success"]
+    return {row["student_id"]: (row["present_count"], row["late_count"], row["absent_count"])
+            for row in result["data"]["stats"]}, result["data"]["total"]
+
+
+def student_ids(db, class_name=None):
+    return [student["student_id"] for student in db.get_all_students(class_name)["data"]]
+
+
+@pytest.mark.parametrize("start_date,end_date", RANGES)
+@pytest.mark.parametrize("class_name", [None, "二班"])
+def test_rollup_matches_live_counts(attendance_db, start_date, end_date, class_name):
+    db, rows = attendance_db
+    students = student_ids(db, class_name)
+    stats, total = rollup_stats(db, start_date, end_date, class_name)
+    expected = live_stats(rows, start_date, end_date, students=students)
+    assert stats == expected
+    assert total["student_count"] == len(students)
+    assert total["total_present"] == sum(counts[0] for counts in expected.values())
+    assert total["total_late"] == sum(counts[1] for counts in expected.values())
+    assert total["total_absent"] == sum(counts[2] for counts in expected.values())
+
+
+def test_record_attendance_updates_rollup(attendance_db):
+    db, _ = attendance_db
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    before, _ = rollup_stats(db, today, today)
+    for status in ("present", "late", "late"):
+        assert db.record_attendance("2024001", detection_method="arcsoft", status=status)["success"]
+    after, _ = rollup_stats(db, today, today)
+    assert after["2024001"] == (before["2024001"][0] + 1, before["2024001"][1] + 2, before["2024001"][2])
+    assert {k: v for k, v in after.items() if k != "2024001"} == {k: v for k, v in before.items() if k != "2024001"}
+
+
+def test_rebuild_restores_tampered_rollup(attendance_db):
+    db, rows = attendance_db
+    conn = db.get_connection()
+    conn.execute("DELETE FROM attendance_daily WHERE date >= '2024-09-10'")
+    conn.execute("UPDATE attendance_daily SET count = count + 5 WHERE date = '2024-09-03'")
+    conn.commit()
+    conn.close()
+    students = student_ids(db)
+    assert rollup_stats(db, "2024-09-01", "2024-09-20")[0] != live_stats(rows, "2024-09-01", "2024-09-20", students=students)
+
+    assert db.rebuild_attendance_rollup("2024-09-03", "2024-09-30")["success"]
+    for start_date, end_date in RANGES:
+        assert rollup_stats(db, start_date, end_date)[0] == live_stats(rows, start_date, end_date, students=students)
@@ -0,0 +1,91 @@
+"""
+EmbeddingBatcher：同一帧的检测结果以"insightface_faces"写入FrameContext并在各阶段间复用，单张图片失败不影响同批次其他图片
+用不依赖模型权重的假FaceProcessor代替InsightFace
+"""
+import asyncio
+
+import numpy as np
+
+from pipeline import EmbeddingBatcher, FrameContext
+
+
+class FakeProcessor:
+    """按图像均值模拟检测：均值为0时未检测到人脸，均值为255时检测失败"""
+
+    def __init__(self):
+        self.batches = []
+        self.single_calls = 0
+
+    def _faces(self, img):
+        if img.mean() == 0:
+            return []
+        return [{"bbox": [0, 0, 10, 10], "feature": [float(img.mean())]}]
+
+    @staticmethod
+    def _result(faces):
+        if not faces:
+            return {"success": False, "message": "未检测到人脸"}
+        return {"success": True, "face_count": len(faces), "feature": faces[0]["feature"]}
+
+    def detect_faces_batch(self, imgs, contexts=None):
+        self.batches.append(len(imgs))
+        results = []
+        for i, img in enumerate(imgs):
+            if img.mean() == 255:
+                results.append({"success": False, "message": "人脸检测失败: 关键点缺失"})
+                continue
+            faces = self._faces(img)
+            if contexts is not None and contexts[i] is not None:
+                contexts[i].put("insightface_faces", faces)
+            results.append(self._result(faces))
+        return results
+
+    def detect_faces_from_numpy(self, img, context=None):
+        if context is None:
+            self.single_calls += 1
+            return self._result(self._faces(img))
+        return self._result(context.get_or_compute("insightface_faces", "embedding", lambda: self._faces(img)))
+
+
+def frame(value):
+    return np.full((4, 4, 3), value, dtype=np.uint8)
+
+
+def test_batch_results_are_per_image_and_cached_in_context():
+    processor = FakeProcessor()
+
+    async def run():
+        batcher = EmbeddingBatcher(processor, max_batch_size=8, max_wait_ms=20)
+        imgs = [frame(10), frame(0), frame(255), frame(20)]
+        contexts = [FrameContext(img) for img in imgs]
+        results = await asyncio.gather(*(batcher.detect_faces(img, context=ctx) for img, ctx in zip(imgs, contexts)))
+        batcher.shutdown()
+        return results, contexts
+
+    results, contexts = asyncio.run(run())
+    assert processor.batches == [4]
+    assert [r["success"] for r in results] == [True, False, False, True]
+    assert results[0]["feature"] == [10.0] and results[3]["feature"] == [20.0]
+    assert results[1]["message"] == "未检测到人脸"
+    assert contexts[0].get("insightface_faces") == [{"bbox": [0, 0, 10, 10], "feature": [10.0]}]
+    assert contexts[1].get("insightface_faces") == []
+    assert contexts[2].get("insightface_faces") is None
+    assert all(stage["key"] == "insightface_faces" for ctx in contexts for stage in ctx.stages)
+
+
+def test_cached_faces_skip_the_batch():
+    processor = FakeProcessor()
+
+    async def run():
+        batcher = EmbeddingBatcher(processor)
+        ctx = FrameContext(frame(30))
+        # 同一帧先由其他阶段（如活体检测）完成检测
+        ctx.get_or_compute("insightface_faces", "liveness", lambda: processor._faces(ctx.img))
+        result = await batcher.detect_faces(ctx.img, context=ctx)
+        batcher.shutdown()
+        return result, ctx
+
+    result, ctx = asyncio.run(run())
+    assert processor.batches == []
+    assert result["feature"] == [30.0]
+    assert ctx.report()["cache_hits"] == 1 and ctx.report()["detections"] == 1
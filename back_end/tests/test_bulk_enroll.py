@@ -0,0 +1,84 @@
+"""
+批量注册检查点续传：写库中断后重新执行只注册未完成的照片，照片被替换后重新注册
+用返回固定特征的假InsightFace模型代替真实模型
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+from bulk_enroll import BulkEnroller, EnrollCheckpoint
+from database import AttendanceDB
+
+N_PHOTOS = 10
+
+
+class FakeInsightFace:
+    """以图像均值生成512维特征，不依赖模型权重"""
+
+    def detect_faces_batch(self, imgs, contexts=None):
+        return [{"success": True, "feature": np.full(512, img.mean() / 255.0, dtype=np.float32)} for img in imgs]
+
+
+class InterruptedDB:
+    """前allowed次写库正常，之后模拟进程中断前的写库失败"""
+
+    def __init__(self, db, allowed):
+        self.db = db
+        self.allowed = allowed
+        self.calls = 0
+
+    def register_students_batch(self, students, user_password=None):
+        self.calls += 1
+        if self.calls > self.allowed:
+            return {"success": False, "message": "模拟写库中断"}
+        return self.db.register_students_batch(students, user_password=user_password)
+
+
+def write_photos(data_dir):
+    for i in range(N_PHOTOS):
+        cv2.imwrite(os.path.join(data_dir, f"2024{i:03d}-student{i}.jpg"), np.full((32, 30, 3), i * 20, dtype=np.uint8))
+    with open(os.path.join(data_dir, "no-student-id.jpg"), "wb") as f:
+        f.write(b"not an image")
+
+
+def enroll(db, data_dir, checkpoint_path):
+    enroller = BulkEnroller(db, {"insightface": FakeInsightFace()}, decode_workers=2, insightface_batch=4,
+                            chunk_size=3, checkpoint=EnrollCheckpoint(checkpoint_path))
+    return enroller.run(data_dir)
+
+
+def enrolled_ids(db):
+    return sorted(student["student_id"] for student in db.get_all_students()["data"])
+
+
+def test_resume_after_interrupted_write(tmp_path):
+    db = AttendanceDB(str(tmp_path / "enroll.db"))
+    data_dir = tmp_path / "photos"
+    data_dir.mkdir()
+    write_photos(str(data_dir))
+    checkpoint_path = str(tmp_path / "photos.enroll_checkpoint")
+
+    first = enroll(InterruptedDB(db, allowed=1), str(data_dir), checkpoint_path)
+    assert 1 <= first["enrolled"] < N_PHOTOS
+    assert len(EnrollCheckpoint(checkpoint_path)) == first["enrolled"]
+    assert len(enrolled_ids(db)) == first["enrolled"]
+
+    second = enroll(db, str(data_dir), checkpoint_path)
+    assert second["skipped"] == first["enrolled"]
+    assert second["enrolled"] == N_PHOTOS - first["enrolled"]
+    assert [failure["file"] for failure in second["failures"]] == ["no-student-id.jpg"]
+    assert enrolled_ids(db) == [f"2024{i:03d}" for i in range(N_PHOTOS)]
+
+    # 全部完成后再次执行不做任何写入；替换其中一张照片后只重新注册该照片
+    third = enroll(db, str(data_dir), checkpoint_path)
+    assert third["enrolled"] == 0 and third["skipped"] == N_PHOTOS
+    replaced = data_dir / "2024003-student3.jpg"
+    cv2.imwrite(str(replaced), np.full((40, 36, 3), 200, dtype=np.uint8))
+    os.utime(replaced, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    fourth = enroll(db, str(data_dir), checkpoint_path)
+    assert fourth["enrolled"] == 1 and fourth["skipped"] == N_PHOTOS - 1
+    feature = np.frombuffer(db.get_student("2024003")["data"]["face_feature_2"], dtype=np.float32)
+    assert np.allclose(feature, 200 / 255.0, atol=1e-3)
+    db.close()
@@ -0,0 +1,27 @@
+"""
+考勤查询日期范围参数：转换为check_time半开区间，格式无效时给出明确的ValueError
+"""
+import pytest
+
+from database import AttendanceDB
+
+
+def test_bounds_are_half_open():
+    assert AttendanceDB._date_range_bounds("2024-09-01", "2024-09-30") == ("2024-09-01 00:00:00", "2024-10-01 00:00:00")
+    assert AttendanceDB._date_range_bounds("2024-12-31", "2024-12-31") == ("2024-12-31 00:00:00", "2025-01-01 00:00:00")
+    assert AttendanceDB._date_range_bounds(None, "2024-02-28") == (None, "2024-02-29 00:00:00")
+    assert AttendanceDB._date_range_bounds("2024-02-01", None) == ("2024-02-01 00:00:00", None)
+    assert AttendanceDB._date_range_bounds() == (None, None)
+
+
+@pytest.mark.parametrize("start_date,end_date,message", [
+    ("2024-9-1x", None, "开始日期格式无效"),
+    (None, "2024-13-01", "结束日期格式无效"),
+    (None, "bad", "结束日期格式无效"),
+    ("2024-09-01", "2024/09/30", "结束日期格式无效"),
+])
+def test_malformed_dates_rejected(start_date, end_date, message):
+    with pytest.raises(ValueError, match=message):
+        AttendanceDB.validate_date_range(start_date, end_date)
+    with pytest.raises(ValueError, match=message):
+        AttendanceDB._date_range_bounds(start_date, end_date)
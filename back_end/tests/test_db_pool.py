@@ -0,0 +1,110 @@
+"""
+SQLite连接池：归还时回滚未提交事务并复用、空闲队列满时关闭多余连接、
+未调用close()的连接被回收时直接关闭且不破坏借出计数、新建连接时设置PRAGMA
+"""
+import gc
+import sqlite3
+
+import pytest
+
+from db_pool import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_idle=2)
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.commit()
+    conn.close()
+    yield pool
+    pool.close_all()
+
+
+def count_items(pool):
+    conn = pool.acquire()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_pragmas_applied(pool):
+    conn = pool.acquire()
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1      # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        # 行工厂为sqlite3.Row，可按列名取值
+        assert conn.execute("SELECT 1 AS one").fetchone()["one"] == 1
+    finally:
+        conn.close()
+
+
+def test_close_rolls_back_and_reuses(pool):
+    conn = pool.acquire()
+    raw = conn._conn
+    conn.execute("INSERT INTO items (name) VALUES ('未提交')")
+    assert conn.in_transaction
+    conn.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+    again = pool.acquire()
+    assert again._conn is raw
+    assert not again.in_transaction
+    again.close()
+    assert count_items(pool) == 0
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["created"] == 1 and stats["reused"] >= 2
+
+
+def test_surplus_connections_closed(pool):
+    conns = [pool.acquire() for _ in range(4)]
+    raws = [conn._conn for conn in conns]
+    assert pool.stats()["in_use"] == 4
+    for conn in conns:
+        conn.close()
+    stats = pool.stats()
+    assert stats["idle"] == 2 and stats["in_use"] == 0 and stats["created"] == 4
+    # 空闲队列已满时归还的连接被真正关闭
+    closed = 0
+    for raw in raws:
+        try:
+            raw.execute("SELECT 1")
+        except sqlite3.ProgrammingError:
+            closed += 1
+    assert closed == 2
+
+
+def test_unclosed_connection_discarded(pool):
+    conn = pool.acquire()
+    raw = conn._conn
+    conn.execute("INSERT INTO items (name) VALUES ('未提交')")
+    del conn
+    gc.collect()
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["discarded"] == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        raw.execute("SELECT 1")
+    # 被丢弃的连接不回到空闲队列，未提交的写入也没有生效
+    assert count_items(pool) == 0
+    assert pool.stats()["in_use"] == 0
+
+
+def test_closed_connection_not_discarded_again(pool):
+    conn = pool.acquire()
+    conn.close()
+    del conn
+    gc.collect()
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["discarded"] == 0
+
+
+def test_context_manager_commits(pool):
+    conn = pool.acquire()
+    with conn:
+        conn.execute("INSERT INTO items (name) VALUES ('已提交')")
+    conn.close()
+    assert count_items(pool) == 1
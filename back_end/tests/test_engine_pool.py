@@ -0,0 +1,195 @@
+"""
+虹软引擎句柄池：借出/归还、等待超时、借出期间关闭，以及用face_sdk/stub桩库（无需真实SDK）验证
+多线程经句柄池调用时结果与单线程一致、没有句柄冲突、release后不残留引擎句柄；没有C编译器时跳过桩库部分
+"""
+import os
+import queue
+import ctypes
+import shutil
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from face_sdk.arc_face_sdk import ArcFaceSDK, ASF_MultiFaceInfo, ASVL_PAF_RGB24_B8G8R8
+from face_sdk.engine_pool import EngineHandlePool, EnginePoolClosed
+
+STUB_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "face_sdk", "stub", "arcsoft_stub.c")
+
+
+class FakeHandles:
+    """记录创建与释放的句柄"""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.created = []
+        self.released = []
+
+    def create(self):
+        if self.limit is not None and len(self.created) >= self.limit:
+            return None
+        self.created.append(f"engine-{len(self.created)}")
+        return self.created[-1]
+
+    def release(self, handle):
+        self.released.append(handle)
+
+
+def test_checkout_and_return():
+    handles = FakeHandles()
+    pool = EngineHandlePool(handles.create, handles.release, size=2)
+    assert pool.size == 2
+    with pool.checkout() as first:
+        with pool.checkout() as second:
+            assert first != second
+            assert pool.metrics()["idle"] == 0
+        assert pool.metrics()["idle"] == 1
+    metrics = pool.metrics()
+    assert metrics["idle"] == 2 and metrics["checkouts"] == 2 and metrics["waits"] == 0
+    # 句柄在异常时同样归还
+    with pytest.raises(ValueError):
+        with pool.checkout():
+            raise ValueError("调用失败")
+    assert pool.metrics()["idle"] == 2
+
+
+def test_pool_size_limited_by_failed_init():
+    handles = FakeHandles(limit=1)
+    assert EngineHandlePool(handles.create, handles.release, size=4).size == 1
+
+
+def test_checkout_waits_and_times_out():
+    handles = FakeHandles()
+    pool = EngineHandlePool(handles.create, handles.release, size=1)
+    with pool.checkout():
+        with pytest.raises(queue.Empty):
+            with pool.checkout(timeout=0.05):
+                pass
+
+    acquired, released = threading.Event(), threading.Event()
+
+    def hold():
+        with pool.checkout():
+            acquired.set()
+            released.wait(1.0)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    assert acquired.wait(1.0)
+    threading.Timer(0.05, released.set).start()
+    with pool.checkout(timeout=1.0) as handle:
+        assert handle == "engine-0"
+    holder.join()
+    metrics = pool.metrics()
+    assert metrics["waits"] == 1 and metrics["max_wait_ms"] > 0
+
+
+def test_close_while_checked_out():
+    handles = FakeHandles()
+    pool = EngineHandlePool(handles.create, handles.release, size=2)
+    with pool.checkout() as busy:
+        pool.close()
+        # 空闲句柄立即释放，借出的句柄在归还时释放
+        assert handles.released == [h for h in handles.created if h != busy]
+        with pytest.raises(EnginePoolClosed):
+            with pool.checkout():
+                pass
+    assert sorted(handles.released) == sorted(handles.created)
+    pool.close()
+    assert len(handles.released) == 2 and pool.closed
+
+
+#------------------------ 桩库 ------------------------#
+
+@pytest.fixture(scope="module")
+def stub_lib(tmp_path_factory):
+    compiler = shutil.which("cc") or shutil.which("gcc")
+    if compiler is None or os.name == "nt":
+        pytest.skip("没有可用的C编译器")
+    lib_path = str(tmp_path_factory.mktemp("stub") / "libarcsoft_face_engine.so")
+    try:
+        subprocess.run([compiler, "-shared", "-fPIC", "-O2", "-o", lib_path, STUB_SOURCE],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        pytest.skip(f"桩库编译失败: {e}")
+    return lib_path
+
+
+def open_sdk(lib_path, pool_size):
+    sdk = ArcFaceSDK(lib_path=lib_path, pool_size=pool_size)
+    sdk.lib.StubGetConflicts.restype = ctypes.c_long
+    sdk.lib.StubGetEngineCount.restype = ctypes.c_long
+    return sdk
+
+
+def make_frames(count, seed=0):
+    """中心像素决定桩库的结果：无人脸 / 非真人 / 真人"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        img = rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+        img[120, 160, 0] = (0, 60, 200)[i % 3]
+        frames.append(img)
+    return frames
+
+
+def analyze(sdk, img, reference):
+    """单帧完整流程：活体检测 -> 特征提取 -> 与参考特征比对"""
+    liveness = sdk.detect_liveness_from_numpy(img)
+    feature = sdk.extract_feature_from_numpy(img)
+    similarity = None
+    if feature["success"]:
+        similarity = sdk.compare_features(feature["feature_data"], reference)["similarity"]
+    return (liveness.get("success"), liveness.get("is_live"), feature.get("success"),
+            feature.get("feature_data"), similarity)
+
+
+def test_stub_detects_unpooled_conflicts(stub_lib):
+    """桩库本身能检测到多线程同时使用同一句柄（保证下面的零冲突断言有意义）"""
+    sdk = open_sdk(stub_lib, 1)
+    frame = make_frames(3)[2]
+    data = frame.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte))
+    sdk.lib.StubResetConflicts()
+
+    def call(_):
+        for _ in range(20):
+            sdk.ASFDetectFaces(sdk.handle, 320, 240, ASVL_PAF_RGB24_B8G8R8, data, ctypes.pointer(ASF_MultiFaceInfo()))
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(call, range(8)))
+    assert sdk.lib.StubGetConflicts() > 0
+    sdk.release()
+
+
+@pytest.mark.parametrize("pool_size", [1, 4])
+def test_pooled_calls_match_single_thread(stub_lib, pool_size):
+    frames = make_frames(60)
+    single = open_sdk(stub_lib, 1)
+    reference = single.extract_feature_from_numpy(frames[2])["feature_data"]
+    expected = [analyze(single, img, reference) for img in frames]
+    single.release()
+
+    sdk = open_sdk(stub_lib, pool_size)
+    assert sdk.engines.size == pool_size
+    sdk.lib.StubResetConflicts()
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda img: analyze(sdk, img, reference), frames))
+    assert results == expected
+    assert sdk.lib.StubGetConflicts() == 0
+    lib = sdk.lib
+    sdk.release()
+    assert lib.StubGetEngineCount() == 0
+
+
+def test_release_while_checked_out(stub_lib):
+    sdk = open_sdk(stub_lib, 2)
+    lib = sdk.lib
+    assert lib.StubGetEngineCount() == 2
+    with sdk.engines.checkout():
+        sdk.release()
+        # 借出中的句柄在归还时释放
+        assert lib.StubGetEngineCount() == 1
+    assert lib.StubGetEngineCount() == 0
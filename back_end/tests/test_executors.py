@@ -0,0 +1,70 @@
+"""
+BoundedExecutor排队/执行计数：任务完成、失败或在排队中被取消后pending都应归零
+"""
+import asyncio
+import threading
+
+import pytest
+
+from pipeline import BoundedExecutor, ExecutorRegistry
+
+
+def test_pending_returns_to_zero_after_cancelling_queued_tasks():
+    executor = BoundedExecutor("test", 1)
+    release = threading.Event()
+
+    async def run():
+        blocker = asyncio.ensure_future(executor.run(release.wait, 5))
+        queued = [asyncio.ensure_future(executor.run(lambda i=i: i)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        assert executor.metrics()["active"] == 1
+        assert executor.metrics()["pending"] == 3
+        # 排队中的任务所在协程被取消（如客户端断开），_call不会执行
+        queued[0].cancel()
+        queued[1].cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await blocker is True
+        assert await queued[2] == 2
+        for task in queued[:2]:
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(run())
+    metrics = executor.metrics()
+    executor.shutdown()
+    assert metrics["pending"] == 0 and metrics["active"] == 0
+    assert metrics["submitted"] == 4
+    assert metrics["completed"] == 2
+    assert metrics["cancelled"] == 2
+    assert metrics["peak_pending"] == 3
+
+
+def test_failures_are_counted_and_raised():
+    executor = BoundedExecutor("test", 2)
+
+    def fail():
+        raise ValueError("boom")
+
+    async def run():
+        with pytest.raises(ValueError, match="boom"):
+            await executor.run(fail)
+        return await executor.run(sum, [1, 2, 3])
+
+    assert asyncio.run(run()) == 6
+    metrics = executor.metrics()
+    executor.shutdown()
+    assert metrics["pending"] == 0 and metrics["active"] == 0
+    assert metrics["completed"] == 2 and metrics["failed"] == 1 and metrics["cancelled"] == 0
+
+
+def test_submit_after_shutdown_releases_pending():
+    registry = ExecutorRegistry({"db": 1})
+    registry.shutdown()
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await registry.run("db", sum, [1])
+
+    asyncio.run(run())
+    assert registry.metrics()["db"]["pending"] == 0
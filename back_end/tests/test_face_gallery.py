@@ -0,0 +1,115 @@
+"""
+常驻内存人脸特征库：增量新增/更新/删除（删除与末行交换）后行号索引与矩阵内容一致，
+top-k检索与暴力计算一致，注册/删除学生时经数据库监听器保持同步
+"""
+import numpy as np
+import pytest
+
+from database import AttendanceDB
+from face_gallery import FaceGallery
+
+DIM = 512
+
+
+def random_features(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def assert_consistent(gallery, expected):
+    """行号索引、学号列表与矩阵内容与期望的 {学号: 特征} 一致"""
+    assert len(gallery) == len(expected)
+    assert sorted(gallery._student_ids) == sorted(expected)
+    for student_id, feature in expected.items():
+        row = gallery._rows[student_id]
+        assert gallery._student_ids[row] == student_id
+        np.testing.assert_allclose(gallery.matrix[row], normalized(feature), atol=1e-6)
+
+
+def test_upsert_and_remove_keep_rows_consistent():
+    gallery = FaceGallery(dim=DIM, initial_capacity=2)
+    features = random_features(20)
+    expected = {}
+    for i, feature in enumerate(features):
+        assert gallery.upsert(f"S{i:02d}", feature, name=f"学生{i}", class_name="一班")
+        expected[f"S{i:02d}"] = feature
+    assert gallery.stats()["capacity"] >= 20
+    assert_consistent(gallery, expected)
+
+    # 删除中间行、首行和末行：末行被交换到删除的位置
+    for student_id in ("S05", "S00", gallery._student_ids[-1], "S10"):
+        assert gallery.remove(student_id)
+        del expected[student_id]
+        assert_consistent(gallery, expected)
+    assert not gallery.remove("S05")
+
+    # 更新已有学生不新增行
+    updated = random_features(1, seed=1)[0]
+    assert gallery.upsert("S03", updated, name="学生3", class_name="一班")
+    expected["S03"] = updated
+    assert_consistent(gallery, expected)
+
+    assert not gallery.upsert("S99", np.ones(128, dtype=np.float32))
+    assert "S99" not in gallery
+
+
+def test_search_matches_brute_force():
+    gallery = FaceGallery(dim=DIM)
+    features = random_features(300)
+    for i, feature in enumerate(features):
+        gallery.upsert(f"S{i:03d}", feature, class_name="一班")
+    for i in range(0, 300, 7):
+        gallery.remove(f"S{i:03d}")
+    ids = [f"S{i:03d}" for i in range(300) if i % 7]
+    matrix = normalized(features[[i for i in range(300) if i % 7]])
+
+    for query in random_features(20, seed=2):
+        scores = matrix @ normalized(query)
+        order = np.argsort(-scores)[:5]
+        results = gallery.search(query, top_k=5)
+        assert [r["student_id"] for r in results] == [ids[i] for i in order]
+        np.testing.assert_allclose([r["score"] for r in results], scores[order], atol=1e-5)
+        assert results[0]["similarity"] == pytest.approx((results[0]["score"] + 1) / 2)
+
+    assert len(gallery.search(features[1], top_k=1000)) == len(ids)
+    assert gallery.search(np.ones(128, dtype=np.float32)) == []
+    assert FaceGallery(dim=DIM).search(features[0]) == []
+
+
+def test_db_listener_keeps_gallery_in_sync(tmp_path):
+    db = AttendanceDB(str(tmp_path / "gallery.db"))
+    try:
+        features = random_features(3, seed=3)
+        db.register_student("S1", "学生1", class_name="一班", face_feature_2=features[0].tobytes())
+        gallery = FaceGallery(dim=DIM)
+        assert gallery.load_from_db(db) == 1
+        gallery.attach(db)
+
+        db.register_student("S2", "学生2", class_name="二班", face_feature_2=features[1].tobytes())
+        assert gallery.search(features[1])[0]["student_id"] == "S2"
+
+        # 重新注册更新特征与班级
+        db.register_student("S1", "学生1", class_name="三班", face_feature_2=features[2].tobytes())
+        best = gallery.search(features[2])[0]
+        assert best["student_id"] == "S1" and best["class_name"] == "三班"
+        assert best["score"] == pytest.approx(1.0, abs=1e-5)
+
+        # 重新注册时没有该方案的特征：从特征库移除
+        db.register_student("S2", "学生2", class_name="二班")
+        assert "S2" not in gallery
+
+        db.delete_student("S1")
+        assert len(gallery) == 0
+
+        # 增量同步后的内容与重新全量加载一致
+        db.register_student("S3", "学生3", class_name="一班", face_feature_2=features[0].tobytes())
+        reloaded = FaceGallery(dim=DIM)
+        reloaded.load_from_db(db)
+        assert gallery._student_ids == reloaded._student_ids == ["S3"]
+        np.testing.assert_allclose(gallery.matrix[0], reloaded.matrix[0], atol=1e-6)
+    finally:
+        db.close()
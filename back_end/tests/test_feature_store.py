@@ -0,0 +1,187 @@
+"""
+磁盘特征存储往返：写入后重新打开的学号、姓名班级与归一化特征一致，
+float16存储在精度范围内一致，从数据库重建与直接从数据库加载的特征库检索结果一致
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from database import AttendanceDB
+from face_gallery import FaceGallery
+from face_gallery.feature_store import STALE_FILE_GRACE, FeatureStore, normalize_feature
+
+DIM = 512
+N_STUDENTS = 40
+
+
+def make_features(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, DIM)).astype(np.float32)
+
+
+def make_infos(n):
+    return [{"name": f"学生{i}", "class_name": "一班" if i % 2 else "二班"} for i in range(n)]
+
+
+@pytest.fixture
+def enrolled_db(tmp_path):
+    """注册了N_STUDENTS个学生deepface特征（另有一个维度异常的特征）的临时数据库"""
+    db = AttendanceDB(str(tmp_path / "store.db"))
+    features = make_features(N_STUDENTS)
+    infos = make_infos(N_STUDENTS)
+    students = [{"student_id": f"2025{i:04d}", "name": info["name"], "class_name": info["class_name"],
+                 "face_feature_2": features[i].tobytes()} for i, info in enumerate(infos)]
+    students.append({"student_id": "20259999", "name": "维度异常", "class_name": "一班",
+                     "face_feature_2": np.ones(128, dtype=np.float32).tobytes()})
+    assert db.register_students_batch(students)["success"]
+    yield db, features
+    db.close()
+
+
+@pytest.mark.parametrize("dtype, atol", [("float32", 0.0), ("float16", 1e-3)])
+def test_write_and_reopen_round_trip(tmp_path, dtype, atol):
+    features = make_features(N_STUDENTS)
+    normalized = np.vstack([normalize_feature(vec, DIM) for vec in features])
+    student_ids = [f"2025{i:04d}" for i in range(N_STUDENTS)]
+    infos = make_infos(N_STUDENTS)
+
+    path = str(tmp_path / "features.json")
+    FeatureStore(path, dim=DIM, dtype=dtype).write(student_ids, normalized, infos, db_fingerprint="fp")
+
+    store = FeatureStore(path, dim=DIM, dtype=dtype)
+    assert store.open()
+    assert store.student_ids == student_ids
+    assert store.infos == infos
+    assert store.db_fingerprint == "fp"
+    assert store.matrix.dtype == np.dtype(dtype)
+    assert isinstance(store.matrix, np.memmap)
+    np.testing.assert_allclose(np.asarray(store.matrix, dtype=np.float32), normalized, atol=atol)
+    np.testing.assert_allclose(np.asarray(store.get(student_ids[3]), dtype=np.float32), normalized[3], atol=atol)
+    assert store.get("不存在") is None
+    assert len(store) == N_STUDENTS and student_ids[0] in store
+    assert store.stats()["file_bytes"] == N_STUDENTS * DIM * np.dtype(dtype).itemsize
+
+
+def test_rewrite_replaces_data_file(tmp_path):
+    path = str(tmp_path / "features.json")
+    store = FeatureStore(path, dim=DIM)
+    store.write(["a"], make_features(1), make_infos(1))
+    assert store.open()
+    first = store.data_path
+
+    writer = FeatureStore(path, dim=DIM)
+    writer.write(["a", "b"], make_features(2, seed=1), make_infos(2))
+    assert store.changed()
+    assert store.refresh()
+    assert store.data_path != first
+    assert store.student_ids == ["a", "b"]
+    assert not store.refresh()
+
+
+def test_open_rejects_mismatched_config(tmp_path):
+    path = str(tmp_path / "features.json")
+    FeatureStore(path, dim=DIM).write(["a"], make_features(1), make_infos(1))
+    assert not FeatureStore(path, dim=DIM, dtype="float16").open()
+    assert not FeatureStore(path, dim=128).open()
+    assert not FeatureStore(str(tmp_path / "missing.json"), dim=DIM).open()
+
+
+def test_invalid_dtype_raises(tmp_path):
+    with pytest.raises(ValueError):
+        FeatureStore(str(tmp_path / "features.json"), dtype="int8")
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_rebuild_from_db_matches_db_gallery(tmp_path, enrolled_db, dtype):
+    db, features = enrolled_db
+    store = FeatureStore(str(tmp_path / "features.json"), dim=DIM, dtype=dtype)
+    assert store.sync_with_db(db)
+    assert store.rebuilds == 1
+    # 维度异常的特征被跳过
+    assert len(store) == N_STUDENTS and "20259999" not in store
+    # 指纹一致时直接打开，不再重建
+    assert store.sync_with_db(db)
+    assert store.rebuilds == 1
+
+    from_db = FaceGallery(dim=DIM)
+    assert from_db.load_from_db(db) == N_STUDENTS
+    from_store = FaceGallery(dim=DIM, store=store)
+    assert from_store.load_from_store() == N_STUDENTS
+    assert from_store._student_ids == from_db._student_ids
+    assert from_store._infos == from_db._infos
+
+    queries = features[:10] + np.random.default_rng(1).normal(scale=0.3, size=(10, DIM)).astype(np.float32)
+    for i, query in enumerate(queries):
+        expected = from_db.search(query, top_k=3)
+        actual = from_store.search(query, top_k=3)
+        assert [r["student_id"] for r in actual] == [r["student_id"] for r in expected]
+        assert actual[0]["student_id"] == f"2025{i:04d}"
+        np.testing.assert_allclose([r["score"] for r in actual], [r["score"] for r in expected], atol=2e-3)
+
+
+def test_sync_rebuilds_after_db_change(tmp_path, enrolled_db):
+    db, _ = enrolled_db
+    store = FeatureStore(str(tmp_path / "features.json"), dim=DIM)
+    assert store.sync_with_db(db)
+    assert db.register_student("20251000", "新生", class_name="一班",
+                               face_feature_2=make_features(1, seed=2)[0].tobytes())["success"]
+
+    reopened = FeatureStore(str(tmp_path / "features.json"), dim=DIM)
+    assert reopened.sync_with_db(db)
+    assert reopened.rebuilds == 1
+    assert "20251000" in reopened and len(reopened) == N_STUDENTS + 1
+
+
+def data_files(tmp_path):
+    return sorted(name for name in os.listdir(tmp_path) if name.endswith(".f32"))
+
+
+def test_interleaved_writes_keep_current_data_file(tmp_path, monkeypatch):
+    """两个进程同时重建：一方清理旧文件时不能删除另一方正在写入或清单刚指向的矩阵文件"""
+    path = str(tmp_path / "features.json")
+    writer_a = FeatureStore(path, dim=DIM)
+    writer_b = FeatureStore(path, dim=DIM)
+    features_a, features_b = make_features(2, seed=1), make_features(3, seed=2)
+    real_replace = os.replace
+    interleaved = []
+
+    def replace_after_a(src, dst):
+        # B的矩阵文件已写完、清单尚未替换时，A完成整次写入和清理
+        if dst == path and not interleaved:
+            interleaved.append(src)
+            writer_a.write(["a", "b"], features_a, make_infos(2))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", replace_after_a)
+    writer_b.write(["a", "b", "c"], features_b, make_infos(3))
+    monkeypatch.setattr(os, "replace", real_replace)
+    assert interleaved
+
+    reader = FeatureStore(path, dim=DIM)
+    assert reader.open()
+    assert reader.student_ids == ["a", "b", "c"]
+    np.testing.assert_allclose(np.asarray(reader.matrix), features_b)
+
+    # 宽限期过后A再清理：清单指向B的文件，只删除A自己写入的旧文件
+    old = time.time() - 2 * STALE_FILE_GRACE
+    for name in data_files(tmp_path):
+        os.utime(tmp_path / name, (old, old))
+    writer_a._remove_stale_files("不存在")
+    assert data_files(tmp_path) == [os.path.basename(reader.data_path)]
+    assert FeatureStore(path, dim=DIM).open()
+
+
+def test_stale_data_files_removed_after_grace(tmp_path):
+    path = str(tmp_path / "features.json")
+    store = FeatureStore(path, dim=DIM)
+    for seed in range(3):
+        store.write(["a"], make_features(1, seed=seed), make_infos(1))
+    assert len(data_files(tmp_path)) == 3
+
+    old = time.time() - 2 * STALE_FILE_GRACE
+    for name in data_files(tmp_path):
+        os.utime(tmp_path / name, (old, old))
+    current = store.write(["a"], make_features(1, seed=3), make_infos(1))
+    assert data_files(tmp_path) == [os.path.basename(current)]
@@ -0,0 +1,103 @@
+"""
+帧门控：重复帧与只有噪声/小范围变化的静止帧复用上一次结果，人脸尺度的运动、参数改变和超时才进入推理
+"""
+import numpy as np
+import pytest
+
+from pipeline.frame_gate import FrameGate
+
+RESULT = {"success": True, "student_id": "2024000", "pipeline": {"embed_ms": 10},
+          "tracking": {"state": "new"}, "gate": {"state": "first"}, "stream": {"received": 1}}
+
+
+def background(seed=0):
+    """带纹理的640x480 BGR画面"""
+    rng = np.random.default_rng(seed)
+    gray = np.kron(rng.integers(60, 200, size=(30, 40)), np.ones((16, 16))).astype(np.uint8)
+    return np.repeat(gray[:, :, None], 3, axis=2)
+
+
+def with_block(img, top, left, size, value=255):
+    out = img.copy()
+    out[top:top + size, left:left + size] = value
+    return out
+
+
+@pytest.fixture
+def gate():
+    gate = FrameGate()
+    decision = gate.check("k1", background(), now=0.0)
+    assert decision["state"] == "first" and not decision["skip"]
+    gate.update("k1", decision, RESULT, now=0.0)
+    return gate
+
+
+def test_first_frame_requires_inference():
+    gate = FrameGate()
+    decision = gate.check("k1", background(), now=0.0)
+    assert decision["state"] == "first"
+    assert decision["cached"] is None and decision["skipped"] == 0
+    # 没有update过的考勤机每帧都需要推理
+    assert gate.check("k1", background(), now=0.1)["state"] == "first"
+
+
+def test_duplicate_returns_cached_result(gate):
+    rng = np.random.default_rng(1)
+    noisy = np.clip(background().astype(np.int16) + rng.integers(-3, 4, size=(480, 640, 3)), 0, 255).astype(np.uint8)
+    decision = gate.check("k1", noisy, now=1.0)
+    assert decision["state"] == "duplicate" and decision["skip"]
+    assert decision["diff"] < gate.duplicate_threshold
+    assert decision["cached"] == {"success": True, "student_id": "2024000"}
+    assert decision["skipped"] == 1
+
+
+def test_small_change_is_static(gate):
+    # 整体亮度变化加一个远小于人脸的小物体：平均差超过重复阈值，但没有人脸尺度的变化区域
+    frame = with_block(background() + 4, 40, 40, 24)
+    decision = gate.check("k1", frame, now=1.0)
+    assert decision["diff"] >= gate.duplicate_threshold
+    assert decision["state"] == "static" and decision["skip"]
+    assert 0 < decision["motion_area"] < gate.min_motion_area
+    assert decision["cached"]["student_id"] == "2024000"
+
+
+def test_face_sized_motion_requires_inference(gate):
+    decision = gate.check("k1", with_block(background(), 160, 240, 160), now=1.0)
+    assert decision["state"] == "motion" and not decision["skip"]
+    assert decision["motion_area"] >= gate.min_motion_area
+    assert decision["cached"] is None
+
+
+def test_refresh_after_max_skip_seconds(gate):
+    assert gate.check("k1", background(), now=4.9)["state"] == "duplicate"
+    decision = gate.check("k1", background(), now=5.0)
+    assert decision["state"] == "refresh" and not decision["skip"]
+    gate.update("k1", decision, RESULT, now=5.0)
+    assert gate.check("k1", background(), now=6.0)["state"] == "duplicate"
+
+
+def test_reference_frame_is_last_inference(gate):
+    moved = with_block(background(), 160, 240, 160)
+    gate.update("k1", gate.check("k1", moved, now=1.0), RESULT, now=1.0)
+    assert gate.check("k1", moved, now=2.0)["state"] == "duplicate"
+    assert gate.check("k1", background(), now=2.5)["state"] == "motion"
+
+
+def test_key_change_and_reset(gate):
+    assert gate.check("k1", background(), key="一班", now=1.0)["state"] == "first"
+    assert gate.check("k2", background(), now=1.0)["state"] == "first"
+    gate.reset("k1")
+    assert gate.check("k1", background(), now=1.0)["state"] == "first"
+
+
+def test_describe_and_metrics(gate):
+    gate.check("k1", background(), now=1.0)
+    gate.check("k1", background(), now=1.5)
+    decision = gate.check("k1", with_block(background(), 160, 240, 160), now=2.0)
+    assert set(FrameGate.describe(decision)) == {"state", "skipped", "diff", "motion_area"}
+
+    metrics = gate.metrics()
+    assert metrics["frames"] == 4
+    assert (metrics["first"], metrics["duplicate"], metrics["motion"]) == (1, 2, 1)
+    assert metrics["skipped"] == 2 and metrics["skip_ratio"] == 0.5
+    assert metrics["active_kiosks"] == 1
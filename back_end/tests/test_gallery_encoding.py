@@ -0,0 +1,69 @@
+"""
+float16/乘积量化模板编码的1:N召回
+模板按40个簇生成（同簇不同人的余弦相似度约0.8，模拟相似人脸），查询为模板叠加噪声（与真实模板余弦约0.55）；
+float16应与float32的Top-1完全一致，PQ（m=64）的Rank-1不低于0.9
+"""
+import numpy as np
+import pytest
+
+from face_gallery import FaceGallery, IVFIndex
+
+DIM = 512
+N_TEMPLATES = 2000   # 超过PQCodec默认的min_train_size（1024），码本会被训练
+N_PROBES = 300
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((40, DIM)).astype(np.float32)
+    vectors = centers[rng.integers(0, 40, N_TEMPLATES)] + 0.5 * rng.standard_normal((N_TEMPLATES, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    truth = rng.choice(N_TEMPLATES, N_PROBES, replace=False)
+    probes = vectors[truth] + 1.5 * rng.standard_normal((N_PROBES, DIM)).astype(np.float32) / np.sqrt(DIM)
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+    student_ids = [f"S{i:05d}" for i in range(N_TEMPLATES)]
+    return student_ids, vectors, probes, truth
+
+
+def top1(encoding, dataset, **codec_options):
+    """
+    Returns:
+        (每个查询的Top-1学号, 特征库统计)
+    """
+    student_ids, vectors, probes, _ = dataset
+    gallery = FaceGallery(dim=DIM, encoding=encoding, codec_options=codec_options or None)
+    gallery.load_vectors(student_ids, [{"name": None, "class_name": None}] * len(student_ids), list(vectors))
+    return [gallery.search(probe, top_k=1)[0]["student_id"] for probe in probes], gallery.stats()
+
+
+def rank1(top, dataset):
+    student_ids, _, _, truth = dataset
+    return np.mean([hit == student_ids[row] for hit, row in zip(top, truth)])
+
+
+def test_float32_baseline(dataset):
+    top, stats = top1("float32", dataset)
+    assert stats["active_encoding"] == "float32"
+    assert rank1(top, dataset) == 1.0
+
+
+def test_float16_matches_float32(dataset):
+    baseline, baseline_stats = top1("float32", dataset)
+    top, stats = top1("float16", dataset)
+    assert stats["active_encoding"] == "float16"
+    assert stats["memory_bytes"] <= baseline_stats["memory_bytes"] / 2
+    assert top == baseline
+
+
+def test_pq_recall(dataset):
+    _, baseline_stats = top1("float32", dataset)
+    top, stats = top1("pq", dataset, m=64)
+    assert stats["active_encoding"] == "pq"
+    assert stats["memory_bytes"] <= baseline_stats["memory_bytes"] * 0.1
+    assert rank1(top, dataset) >= 0.9
+
+
+def test_compressed_encoding_rejected_with_ann_index():
+    with pytest.raises(ValueError):
+        FaceGallery(dim=DIM, index=IVFIndex(dim=DIM), encoding="float16")
@@ -0,0 +1,171 @@
+"""
+模型注册表：未启用的后端不调用工厂函数、并发get只加载一次、加载失败被记录且不重试、report给出各后端状态，
+以及就绪判断（/api/system/ready）：预热完成前、或有已启用的后端加载/预热失败时均为未就绪（返回503）
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import ModelRegistry
+
+
+class Factory:
+    """统计调用次数的工厂函数，可模拟加载耗时与加载失败"""
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return object()
+
+
+def test_disabled_backend_never_loaded():
+    factory = Factory()
+    models = ModelRegistry(enabled=["insightface"])
+    models.register("arcsoft", factory, "虹软SDK")
+    models.register("insightface", Factory(), "InsightFace")
+    assert not models.is_enabled("arcsoft")
+    assert models.get("arcsoft") is None
+    assert factory.calls == 0
+    assert models.enabled_backends() == ["insightface"]
+    assert models.get("unknown") is None
+
+
+def test_check_enabled_reports_unknown_backends():
+    models = ModelRegistry(enabled=["insightface", "typo"])
+    models.register("insightface", Factory())
+    assert models.check_enabled() == ["typo"]
+    assert ModelRegistry().check_enabled() == []
+
+
+def test_concurrent_get_loads_once():
+    factory = Factory(delay=0.05)
+    models = ModelRegistry()
+    models.register("insightface", factory)
+    with ThreadPoolExecutor(8) as executor:
+        instances = list(executor.map(lambda _: models.get("insightface"), range(16)))
+    assert factory.calls == 1
+    assert all(instance is instances[0] for instance in instances)
+    assert models.is_loaded("insightface")
+
+
+def test_failed_load_recorded_and_not_retried():
+    factory = Factory(error=RuntimeError("缺少模型文件"))
+    models = ModelRegistry()
+    models.register("silence", factory, "静默活体")
+    assert models.get("silence") is None
+    assert models.get("silence") is None
+    assert factory.calls == 1
+    assert not models.warm_up("silence", frame=None)
+    entry = models.report()["backends"]["silence"]
+    assert entry["state"] == "failed" and entry["error"] == "缺少模型文件"
+    assert "load_ms" in entry
+
+
+def test_report_states():
+    models = ModelRegistry(enabled=["arcsoft", "insightface", "silence"])
+    models.register("arcsoft", Factory(), "虹软SDK")
+    models.register("insightface", Factory(), "InsightFace")
+    models.register("silence", Factory(error=ValueError("加载失败")), "静默活体")
+    models.register("dlib", Factory(), "dlib")
+    models.get("insightface")
+    models.get("silence")
+
+    report = models.report()
+    states = {name: entry["state"] for name, entry in report["backends"].items()}
+    assert states == {"arcsoft": "pending", "insightface": "loaded", "silence": "failed", "dlib": "disabled"}
+    assert report["enabled"] == ["arcsoft", "insightface", "silence"]
+    assert report["loaded"] == ["insightface"]
+    assert report["warm"] == []
+    assert report["backends"]["insightface"]["description"] == "InsightFace"
+
+
+def test_warm_up_records_latency():
+    class Model:
+        def __init__(self):
+            self.frames = []
+
+        def warmup(self, img):
+            self.frames.append(img)
+
+    model = Model()
+    models = ModelRegistry()
+    models.register("insightface", lambda: model)
+    models.register("dlib", object)
+    assert models.warm_up("insightface", "frame", runs=3)
+    assert model.frames == ["frame"] * 3
+    # 没有预热方法的模型加载后即视为已预热
+    assert models.warm_up("dlib", "frame")
+
+    report = models.report()
+    assert report["warm"] == ["insightface", "dlib"]
+    entry = report["backends"]["insightface"]
+    assert entry["warm"] and entry["warm_latency_ms"] <= entry["warmup_first_ms"] + 1
+
+
+def warm_up_all(models, warmup_status):
+    """与app.warm_up_models相同的流程：逐个预热已启用的后端，记录预热失败的后端"""
+    warmup_status["state"] = "warming"
+    failed = [name for name in models.enabled_backends() if not models.warm_up(name, "frame")]
+    warmup_status.update({"state": "done", "failed": failed})
+
+
+def test_not_ready_until_warm_up_done():
+    models = ModelRegistry()
+    models.register("insightface", Factory())
+    warmup_status = {"state": "pending"}
+    readiness = models.readiness(warmup_status)
+    assert readiness == {"ready": False, "failed": [], "message": "模型预热中"}
+    warmup_status["state"] = "warming"
+    assert not models.readiness(warmup_status)["ready"]
+
+    warm_up_all(models, warmup_status)
+    readiness = models.readiness(warmup_status)
+    assert readiness["ready"] and readiness["failed"] == []
+    assert readiness["message"] == "服务已就绪"
+
+
+def test_failed_load_not_ready():
+    models = ModelRegistry(enabled=["insightface", "silence"])
+    models.register("insightface", Factory())
+    models.register("silence", Factory(error=RuntimeError("缺少模型文件")))
+    models.register("dlib", Factory(error=RuntimeError("未启用")))
+    warmup_status = {"state": "pending"}
+    warm_up_all(models, warmup_status)
+    assert warmup_status["failed"] == ["silence"]
+    readiness = models.readiness(warmup_status)
+    assert not readiness["ready"]
+    assert readiness["failed"] == ["silence"]
+    assert readiness["message"] == "模型加载或预热失败: silence"
+
+
+def test_failed_warm_up_not_ready():
+    class Model:
+        def warmup(self, img):
+            raise RuntimeError("推理异常")
+
+    models = ModelRegistry()
+    models.register("insightface", Model)
+    assert not models.warm_up("insightface", "frame")
+    assert models.report()["backends"]["insightface"]["warmup_error"] == "推理异常"
+    # 即使预热状态中没有记录（如预热任务之外的调用失败），也按注册表中的失败判定为未就绪
+    readiness = models.readiness({"state": "done", "failed": []})
+    assert not readiness["ready"] and readiness["failed"] == ["insightface"]
+
+
+def test_load_failure_with_warm_up_disabled():
+    models = ModelRegistry()
+    models.register("insightface", Factory(error=RuntimeError("缺少模型文件")))
+    # 未启用预热：首次使用前视为就绪，首次加载失败后为未就绪
+    assert models.readiness({"state": "disabled"})["ready"]
+    models.get("insightface")
+    readiness = models.readiness({"state": "disabled"})
+    assert not readiness["ready"] and readiness["failed"] == ["insightface"]
@@ -0,0 +1,62 @@
+"""
+FaceNet / MiniFASNetV2 导出ONNX后与PyTorch eager的数值一致性
+FaceNet使用随机初始化权重（导出一致性与权重取值无关，不需要下载vggface2预训练权重），
+MiniFASNetV2使用仓库内的权重；未安装torch/torchvision/facenet_pytorch/onnxruntime时跳过
+"""
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+pytest.importorskip("facenet_pytorch")
+pytest.importorskip("onnxruntime")
+
+from facenet_pytorch import InceptionResnetV1
+
+from face_model2.silence import SilentFaceRecognitionModel
+from pipeline.onnx_runtime import OrtRunner
+
+# 与benchmarks/check_onnx_parity.py相同的容差
+MIN_COSINE = 0.9999
+MAX_LOGIT_DIFF = 1e-3
+
+LIVENESS_MODEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "face_model2", "anti_spoof_models", "2.7_80x80_MiniFASNetV2.pth")
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    """跳过__init__（不加载MTCNN和预训练权重），只构造导出所需的两个模型"""
+    torch.manual_seed(0)
+    model = SilentFaceRecognitionModel.__new__(SilentFaceRecognitionModel)
+    model.device = torch.device("cpu")
+    model.facenet = InceptionResnetV1(pretrained=None).eval()
+    model.liveness_model = model.load_liveness_model(LIVENESS_MODEL)
+    paths = model.export_onnx(str(tmp_path_factory.mktemp("onnx")))
+    runners = {name: OrtRunner(path, cache_optimized=False) for name, path in paths.items()}
+    return model, runners
+
+
+@pytest.mark.parametrize("batch", [1, 4])
+def test_facenet_parity(exported, batch):
+    model, runners = exported
+    x = np.random.default_rng(batch).standard_normal((batch, 3, 160, 160)).astype(np.float32)
+    with torch.no_grad():
+        expected = model.facenet(torch.from_numpy(x)).numpy()
+    actual = runners["facenet"].run(x)[0]
+    assert actual.shape == expected.shape
+    sims = (expected * actual).sum(axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+    assert sims.min() >= MIN_COSINE
+
+
+@pytest.mark.parametrize("batch", [1, 4])
+def test_minifasnet_parity(exported, batch):
+    model, runners = exported
+    x = np.random.default_rng(batch).standard_normal((batch, 3, 80, 80)).astype(np.float32)
+    with torch.no_grad():
+        expected = model.liveness_model(torch.from_numpy(x)).numpy()
+    actual = runners["minifasnet"].run(x)[0]
+    assert actual.shape == expected.shape
+    assert np.abs(expected - actual).max() <= MAX_LOGIT_DIFF
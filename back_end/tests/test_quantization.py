@@ -0,0 +1,85 @@
+"""
+MiniFASNetV2 INT8量化模型与FP32模型的活体判断一致性
+用uploads下的打卡图片经MTCNN裁剪人脸，前一半用于static校准，后一半用于对比；
+未安装torch/torchvision/facenet_pytorch/onnxruntime时跳过
+"""
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+pytest.importorskip("facenet_pytorch")
+pytest.importorskip("onnxruntime")
+
+from facenet_pytorch import InceptionResnetV1, MTCNN
+from torchvision import transforms
+
+from face_model2.silence import SilentFaceRecognitionModel
+from pipeline.onnx_runtime import OrtRunner
+from pipeline.quantization import load_calibration_frames, quantize_model
+
+BACK_END_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIVENESS_MODEL = os.path.join(BACK_END_DIR, "face_model2", "anti_spoof_models", "2.7_80x80_MiniFASNetV2.pth")
+UPLOAD_DIR = os.path.join(BACK_END_DIR, "uploads")
+
+# 活体概率（softmax第1类）与FP32的最大允许差
+MAX_PROB_DIFF = 0.05
+
+
+def softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def liveness(tmp_path_factory):
+    """跳过__init__（FaceNet使用随机初始化权重，不下载预训练权重），导出ONNX模型并准备校准/对比输入"""
+    torch.manual_seed(0)
+    model = SilentFaceRecognitionModel.__new__(SilentFaceRecognitionModel)
+    model.device = torch.device("cpu")
+    model.mtcnn = MTCNN(keep_all=True, device=model.device)
+    model.facenet = InceptionResnetV1(pretrained=None).eval()
+    model.liveness_model = model.load_liveness_model(LIVENESS_MODEL)
+    model.transform = transforms.Compose([
+        transforms.ToPILImage(),
+        transforms.Resize((80, 80)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
+    ])
+    patches = model.calibration_inputs(load_calibration_frames(UPLOAD_DIR))["minifasnet"]
+    if len(patches) < 4:
+        pytest.skip("uploads中可用的人脸图片不足")
+    output_dir = str(tmp_path_factory.mktemp("onnx"))
+    path = model.export_onnx(output_dir)["minifasnet"]
+    half = len(patches) // 2
+    return path, patches[:half], np.stack(patches[half:]), output_dir
+
+
+@pytest.mark.parametrize("mode", ["dynamic", "static"])
+def test_quantized_liveness_agrees_with_fp32(liveness, mode):
+    path, calibration, samples, output_dir = liveness
+    quantized = quantize_model(path, os.path.join(output_dir, f"minifasnet.int8-{mode}.onnx"), mode, calibration)
+    fp32 = OrtRunner(path, cache_optimized=False)
+    int8 = OrtRunner(quantized, cache_optimized=False)
+    expected = softmax(np.concatenate([fp32.run(x[np.newaxis])[0].copy() for x in samples]))[:, 1]
+    actual = softmax(np.concatenate([int8.run(x[np.newaxis])[0].copy() for x in samples]))[:, 1]
+    assert np.abs(expected - actual).max() <= MAX_PROB_DIFF
+    assert ((expected > 0.5) == (actual > 0.5)).all()
+
+
+def test_quantize_with_temp_dir_on_another_filesystem(liveness, monkeypatch):
+    """系统临时目录与模型目录不在同一文件系统（tmpfs的/tmp、Windows下C盘临时目录）时仍能写出量化模型"""
+    path, _, _, output_dir = liveness
+    shm = "/dev/shm"
+    if not os.path.isdir(shm) or os.stat(shm).st_dev == os.stat(output_dir).st_dev:
+        pytest.skip("没有与输出目录不同文件系统的临时目录")
+    monkeypatch.setattr(tempfile, "tempdir", shm)
+    output_path = os.path.join(output_dir, "minifasnet.int8-cross.onnx")
+    assert quantize_model(path, output_path, "dynamic") == output_path
+    assert os.path.getsize(output_path) > 0
+    # 输出目录中不残留临时文件
+    assert not [name for name in os.listdir(output_dir) if name.startswith("tmp")]
@@ -0,0 +1,117 @@
+"""
+考勤热点查询执行计划：get_attendance_records/get_attendance_statistics实际使用的SQL走迁移创建的索引，
+不全表扫描考勤表，统计只读按日汇总表；按日汇总统计与原先按date(check_time) BETWEEN扫描考勤记录的结果一致
+"""
+import pytest
+
+START_DATE = "2024-09-05"
+END_DATE = "2024-09-15"
+
+# 原统计查询写法（直接扫描考勤记录），用于对比结果
+LEGACY_STATISTICS_QUERY = """
+SELECT s.student_id, s.name, s.class_name,
+       COUNT(CASE WHEN a.status = 'present' THEN 1 END) AS present_count,
+       COUNT(CASE WHEN a.status = 'late' THEN 1 END) AS late_count,
+       COUNT(CASE WHEN a.status = 'absent' THEN 1 END) AS absent_count
+FROM students s
+LEFT JOIN attendance a ON s.student_id = a.student_id
+                      AND date(a.check_time) BETWEEN ? AND ?
+GROUP BY s.student_id, s.name, s.class_name ORDER BY s.student_id
+"""
+
+# 日期区间两端内外的边界时间
+BOUNDARY_TIMES = ["2024-09-04 23:59:59", "2024-09-05 00:00:00", "2024-09-15 23:59:59", "2024-09-16 00:00:00"]
+
+
+@pytest.fixture
+def plan_db(attendance_db):
+    """
+    在预置数据上补充日期边界的考勤记录和其他班级的学生（班级数接近线上时按班级统计才会选择班级索引），
+    并与线上数据库一致地收集统计信息
+    """
+    db, _ = attendance_db
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO students (student_id, name, class_name) VALUES (?, ?, ?)",
+                       [(f"2025{i:03d}", f"学生{i}", f"{i % 20}班") for i in range(200)])
+    for i, check_time in enumerate(BOUNDARY_TIMES * 3):
+        student_id = f"2024{i % 6:03d}"
+        status = ("present", "late", "absent")[i % 3]
+        cursor.execute("INSERT INTO attendance (student_id, check_time, status, detection_method) VALUES (?, ?, ?, ?)",
+                       (student_id, check_time, status, "arcsoft"))
+        db._increment_attendance_daily(cursor, student_id, check_time, status)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return db
+
+
+def query_plan(db, query, params):
+    conn = db.get_connection()
+    plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+    conn.close()
+    return plan
+
+
+def assert_plan(plan, expected_index, forbid):
+    """执行计划使用了指定索引，且没有全表扫描等禁止的步骤（ORDER BY表示不允许临时排序）"""
+    assert any(expected_index in step for step in plan), plan
+    for step in plan:
+        assert not any(step.startswith(bad) for bad in forbid), plan
+        if "ORDER BY" in forbid:
+            assert "USE TEMP B-TREE FOR ORDER BY" not in step, plan
+
+
+RECORD_CASES = {
+    # 名称: (_attendance_records_query参数, 期望索引, 禁止的步骤)
+    "by_student": (dict(student_id="2024001", start_date=START_DATE, end_date=END_DATE),
+                   "idx_attendance_student_time", ("SCAN a", "ORDER BY")),
+    "by_date": (dict(start_date=START_DATE, end_date=END_DATE),
+                "idx_attendance_check_time", ("SCAN a", "ORDER BY")),
+    "by_method": (dict(start_date=START_DATE, end_date=END_DATE, detection_method="arcsoft"),
+                  "idx_attendance_method_time", ("SCAN a", "ORDER BY")),
+    "by_class": (dict(start_date=START_DATE, end_date=END_DATE, class_name="一班"),
+                 "idx_attendance_", ("SCAN a",)),
+    "keyset_next_page": (dict(start_date=START_DATE, end_date=END_DATE,
+                              after=(f"{END_DATE} 08:00:00", 1000), limit=100),
+                         "idx_attendance_check_time", ("SCAN a", "ORDER BY")),
+    "keyset_by_student": (dict(student_id="2024001", after=(f"{END_DATE} 08:00:00", 1000), limit=100),
+                          "idx_attendance_student_time", ("SCAN a", "ORDER BY")),
+}
+
+
+@pytest.mark.parametrize("case", sorted(RECORD_CASES))
+def test_attendance_record_queries_use_indexes(plan_db, case):
+    kwargs, index, forbid = RECORD_CASES[case]
+    query, params = plan_db._attendance_records_query(**kwargs)
+    assert_plan(query_plan(plan_db, query, params), index, forbid)
+
+
+def test_statistics_read_daily_rollup(plan_db):
+    # 统计只读按日汇总表，不访问考勤记录表
+    query, params = plan_db._attendance_statistics_query(START_DATE, END_DATE)
+    assert_plan(query_plan(plan_db, query, params), "idx_attendance_daily_student", ("SCAN d", "SCAN a", "SEARCH a"))
+    query, params = plan_db._attendance_statistics_query(START_DATE, END_DATE, "一班")
+    assert_plan(query_plan(plan_db, query, params), "idx_students_class_name",
+                ("SCAN d", "SCAN s", "SCAN a", "SEARCH a"))
+
+
+def test_special_dates_lookup_uses_index(plan_db):
+    plan = query_plan(plan_db, "SELECT * FROM special_dates WHERE date_value = ?", [START_DATE])
+    assert_plan(plan, "idx_special_dates_date", ("SCAN special_dates",))
+
+
+def test_statistics_match_legacy_date_scan(plan_db):
+    """check_time区间比较与原先的date(check_time) BETWEEN在0点和23:59:59边界上结果一致"""
+    conn = plan_db.get_connection()
+    legacy = [tuple(row) for row in conn.execute(LEGACY_STATISTICS_QUERY, (START_DATE, END_DATE))]
+    conn.close()
+    current = [tuple(row.values()) for row in plan_db.get_attendance_statistics(START_DATE, END_DATE)["data"]["stats"]]
+    assert current == legacy
+    assert sum(row[3] + row[4] + row[5] for row in legacy) > 0
+
+    # 记录查询的区间同样包含两端日期的0点和23:59:59，不包含区间外的边界记录
+    records = plan_db.get_attendance_records(start_date=START_DATE, end_date=END_DATE)["data"]
+    times = {str(record["check_time"]) for record in records}
+    assert {"2024-09-05 00:00:00", "2024-09-15 23:59:59"} <= times
+    assert not times & {"2024-09-04 23:59:59", "2024-09-16 00:00:00"}
@@ -0,0 +1,116 @@
+"""
+按班级分区识别：重新注册改变班级时分区随之迁移，分区内未命中时回退全库（scope=class时不回退），
+以及按考勤规则的时段、星期和节假日确定当前考勤中的班级
+"""
+import numpy as np
+import pytest
+
+from database import AttendanceDB
+from face_gallery import FaceGallery
+
+DIM = 512
+THRESHOLD = 0.8
+
+
+def features(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def gallery():
+    gallery = FaceGallery(dim=DIM)
+    vectors = features(6)
+    for i, vec in enumerate(vectors):
+        gallery.upsert(f"S{i}", vec, name=f"学生{i}", class_name="一班" if i < 3 else "二班")
+    return gallery, vectors
+
+
+def test_partition_follows_class_change(gallery):
+    gallery, vectors = gallery
+    assert gallery.partition_sizes() == {"一班": 3, "二班": 3}
+    assert gallery.search(vectors[0], class_names=["一班"])[0]["student_id"] == "S0"
+
+    gallery.upsert("S0", vectors[0], name="学生0", class_name="二班")
+    assert gallery.partition_sizes() == {"一班": 2, "二班": 4}
+    assert "S0" not in [r["student_id"] for r in gallery.search(vectors[0], top_k=10, class_names=["一班"])]
+    assert gallery.search(vectors[0], class_names=["二班"])[0]["student_id"] == "S0"
+
+    # 删除使末行交换位置后，分区的行号缓存仍然正确
+    gallery.remove("S1")
+    gallery.remove("S2")
+    assert gallery.partition_sizes() == {"二班": 4}
+    assert gallery.search(vectors[0], top_k=10, class_names=["一班"]) == []
+    for i in (0, 3, 4, 5):
+        assert gallery.search(vectors[i], class_names=["二班"])[0]["student_id"] == f"S{i}"
+
+
+def test_identify_in_class_partition(gallery):
+    gallery, vectors = gallery
+    match, best = gallery.identify(vectors[1], THRESHOLD, class_names=["一班"])
+    assert match["student_id"] == "S1" and match["scope"] == "class"
+    assert best is match
+
+
+def test_identify_falls_back_to_global(gallery):
+    gallery, vectors = gallery
+    # S4在二班，一班分区内未达到阈值，回退全库命中
+    match, best = gallery.identify(vectors[4], THRESHOLD, class_names=["一班"])
+    assert match["student_id"] == "S4" and match["scope"] == "global"
+    assert best is match
+
+
+def test_class_scope_does_not_fall_back(gallery):
+    gallery, vectors = gallery
+    match, best = gallery.identify(vectors[4], THRESHOLD, class_names=["一班"], fallback=False)
+    assert match is None
+    assert best["scope"] == "class" and best["class_name"] == "一班"
+    assert best["similarity"] < THRESHOLD
+
+
+def test_identify_without_match(gallery):
+    gallery, _ = gallery
+    stranger = features(1, seed=9)[0]
+    match, best = gallery.identify(stranger, THRESHOLD, class_names=["一班"])
+    assert match is None and best is not None and best["similarity"] < THRESHOLD
+    # 没有可用的班级分区时直接全库检索
+    match, best = gallery.identify(stranger, THRESHOLD, class_names=[])
+    assert match is None and best["scope"] == "global"
+    assert FaceGallery(dim=DIM).identify(stranger, THRESHOLD) == (None, None)
+
+
+@pytest.fixture
+def rules_db(tmp_path):
+    """一班周一至周五8:00-9:00，二班周六10:00-11:00，三班规则未激活；2024-10-01为节假日"""
+    db = AttendanceDB(str(tmp_path / "rules.db"))
+    for class_name, start, end, weekdays, active in [("一班", "08:00", "09:00", "1,2,3,4,5", 1),
+                                                     ("二班", "10:00", "11:00", "6", 1),
+                                                     ("三班", "08:00", "09:00", "1,2,3,4,5", 0)]:
+        class_id = db.create_class(class_name)["class_id"]
+        assert db.create_attendance_rule(class_id, start, end, weekdays=weekdays, is_active=active)["success"]
+    conn = db.get_connection()
+    conn.execute("INSERT INTO special_dates (date_value, type, description) VALUES ('2024-10-01', 'holiday', '国庆')")
+    conn.commit()
+    conn.close()
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize("check_time, expected", [
+    ("2024-09-02 08:30:00", ["一班"]),     # 周一，规则时段内
+    ("2024-09-02 07:30:00", ["一班"]),     # 开始前30分钟开放
+    ("2024-09-02 07:29:00", []),
+    ("2024-09-02 09:00:00", ["一班"]),
+    ("2024-09-02 09:01:00", []),
+    ("2024-09-07 10:15:00", ["二班"]),     # 周六只有二班
+    ("2024-09-07 08:30:00", []),
+    ("2024-10-01 08:30:00", []),           # 周二，但为节假日
+])
+def test_get_active_classes(rules_db, check_time, expected):
+    result = rules_db.get_active_classes(check_time)
+    assert result["success"]
+    assert result["data"] == expected
+
+
+def test_get_active_classes_lead_minutes(rules_db):
+    assert rules_db.get_active_classes("2024-09-02 07:45:00", lead_minutes=10)["data"] == []
+    assert rules_db.get_active_classes("2024-09-02 07:50:00", lead_minutes=10)["data"] == ["一班"]
@@ -0,0 +1,105 @@
+"""
+批量注册压缩包解析（清单、文件名、Windows GBK中文文件名）与批次内重复学号处理
+"""
+import io
+import zipfile
+
+import pytest
+
+from bulk_enroll import mark_duplicate_students, parse_register_archive
+
+
+def make_archive(files, gbk_names=False):
+    """files: {压缩包内路径: 内容}；gbk_names为True时模拟Windows压缩工具写入的GBK文件名（未标记UTF-8）"""
+    placeholders = {}
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for i, (name, data) in enumerate(files.items()):
+            if gbk_names:
+                # 先写入等长的ASCII占位名，再替换为GBK字节（zipfile写入非ASCII文件名时总是标记UTF-8）
+                raw = name.encode("gbk")
+                placeholder = f"{i:02d}".encode("ascii") * (len(raw) // 2) + b"_" * (len(raw) % 2)
+                placeholders[placeholder] = raw
+                name = placeholder.decode("ascii")
+            archive.writestr(name, data)
+    content = buffer.getvalue()
+    for placeholder, raw in placeholders.items():
+        content = content.replace(placeholder, raw)
+    return content
+
+
+def by_id(items):
+    return {item["student_id"]: item for item in items}
+
+
+def test_parse_by_filename():
+    items = parse_register_archive(make_archive({
+        "photos/2024001-张三.jpg": b"img1",
+        "photos/2024002-李四.PNG": b"img2",
+        "photos/readme.txt": b"text",
+        "__MACOSX/photos/._2024003-王五.jpg": b"meta",
+        "photos/无学号.jpg": b"img3"
+    }), default_class="一班")
+    assert len(items) == 3
+    parsed = by_id(items)
+    assert parsed["2024001"]["name"] == "张三" and parsed["2024001"]["image_bytes"] == b"img1"
+    assert parsed["2024002"]["filename"] == "2024002-李四.PNG"
+    assert all(item["class_name"] == "一班" for item in items)
+    # 文件名无法解析学号时保留条目，由特征提取阶段报告缺少学号
+    assert parsed[""]["name"] == "" and parsed[""]["filename"] == "无学号.jpg"
+
+
+def test_parse_gbk_filenames():
+    items = parse_register_archive(make_archive({"2024001-张三.jpg": b"img1", "照片/2024002-李四.jpg": b"img2"},
+                                                gbk_names=True))
+    parsed = by_id(items)
+    assert parsed["2024001"]["name"] == "张三"
+    assert parsed["2024002"]["name"] == "李四" and parsed["2024002"]["image_bytes"] == b"img2"
+
+
+def test_parse_manifest():
+    manifest = ("\ufeffstudent_id,name,class_name,image\n"
+                "2024001,张三,二班,a.jpg\n"
+                "2024002,李四,,b.jpg\n"
+                "2024003,王五,三班,missing.jpg\n")
+    items = parse_register_archive(make_archive({
+        "batch/manifest.csv": manifest.encode("utf-8"),
+        "batch/a.jpg": b"img1",
+        "batch/b.jpg": b"img2",
+        "batch/2024009-赵六.jpg": b"ignored"
+    }), default_class="一班")
+    assert [item["student_id"] for item in items] == ["2024001", "2024002", "2024003"]
+    parsed = by_id(items)
+    assert parsed["2024001"]["class_name"] == "二班" and parsed["2024001"]["image_bytes"] == b"img1"
+    assert parsed["2024002"]["class_name"] == "一班"
+    assert parsed["2024003"]["image_bytes"] is None
+
+
+def test_parse_limits_and_invalid_archive():
+    archive = make_archive({"2024001-张三.jpg": b"x" * 1000})
+    with pytest.raises(ValueError):
+        parse_register_archive(archive, max_bytes=999)
+    assert len(parse_register_archive(archive, max_bytes=1000)) == 1
+    with pytest.raises(zipfile.BadZipFile):
+        parse_register_archive(b"not a zip")
+
+
+def result(student_id, success):
+    item = {"student_id": student_id, "success": success, "message": "特征提取成功" if success else "未检测到人脸"}
+    if success:
+        item["student"] = {"student_id": student_id}
+    return item
+
+
+def test_duplicate_keeps_first_success():
+    results = mark_duplicate_students([result("1", True), result("1", True), result("2", True)])
+    assert [item["success"] for item in results] == [True, False, True]
+    assert results[1]["message"] == "批次内学号重复" and "student" not in results[1]
+
+
+def test_failed_duplicate_does_not_block_later_success():
+    results = mark_duplicate_students([result("1", False), result("1", True), result("1", True)])
+    assert [item["success"] for item in results] == [False, True, False]
+    assert results[0]["message"] == "未检测到人脸"
+    assert results[1]["student"] == {"student_id": "1"}
+    assert results[2]["message"] == "批次内学号重复"
@@ -0,0 +1,93 @@
+"""
+实时帧流：单槽缓冲只保留最新一帧，关闭后唤醒等待方；帧流统计的计数与延迟
+"""
+import asyncio
+
+import pytest
+
+from pipeline.streaming import LatestFrameSlot, StreamStats
+
+
+def test_latest_frame_wins():
+    async def run():
+        slot = LatestFrameSlot()
+        assert slot.put("frame-1") is False
+        assert slot.put("frame-2") is True
+        assert await slot.get() == "frame-2"
+        assert slot.put("frame-3") is False
+        return await slot.get()
+
+    assert asyncio.run(run()) == "frame-3"
+
+
+def test_get_waits_for_put():
+    async def run():
+        slot = LatestFrameSlot()
+        waiter = asyncio.create_task(slot.get())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        slot.put("frame")
+        return await asyncio.wait_for(waiter, 1.0)
+
+    assert asyncio.run(run()) == "frame"
+
+
+def test_close_wakes_waiter():
+    async def run():
+        slot = LatestFrameSlot()
+        waiter = asyncio.create_task(slot.get())
+        await asyncio.sleep(0)
+        slot.close()
+        first = await asyncio.wait_for(waiter, 1.0)
+        second = await slot.get()
+        return first, second
+
+    assert asyncio.run(run()) == (None, None)
+
+
+def test_close_delivers_pending_frame_first():
+    async def run():
+        slot = LatestFrameSlot()
+        slot.put("frame")
+        slot.close()
+        return await slot.get(), await slot.get()
+
+    assert asyncio.run(run()) == ("frame", None)
+
+
+def test_stream_stats_counts_and_latency():
+    stats = StreamStats()
+    for i in range(10):
+        stats.on_received()
+    stats.on_dropped()
+    stats.on_dropped()
+    stats.on_failed()
+    for i in range(7):
+        # 排队10ms，处理(20+i)ms
+        stats.on_processed(0.0, 0.010, 0.030 + i / 1000)
+
+    snapshot = stats.snapshot()
+    assert (snapshot["received"], snapshot["processed"], snapshot["dropped"], snapshot["failed"]) == (10, 7, 2, 1)
+    assert snapshot["receive_fps"] > 0
+    latency = snapshot["latency"]
+    assert latency["queue_avg_ms"] == pytest.approx(10.0)
+    assert latency["process_avg_ms"] == pytest.approx(23.0)
+    assert latency["total_avg_ms"] == pytest.approx(33.0)
+    assert 35.0 <= latency["total_p95_ms"] <= 36.0
+
+
+def test_stream_stats_window_and_samples():
+    stats = StreamStats(window_seconds=5.0, latency_samples=3)
+    stats.started_at -= 20.0
+    now = stats.started_at + 20.0
+    # 窗口外的帧不计入帧率
+    for t in (1.0, 2.0, 16.0, 17.0, 18.0, 19.0, 19.5):
+        stats.on_received(stats.started_at + t)
+    assert 0.9 <= stats.snapshot()["receive_fps"] <= 1.0
+    assert stats.received == 7
+
+    for total in (0.1, 0.2, 0.3, 0.4):
+        stats.on_processed(now, now, now + total)
+    # 只保留最近3个延迟样本
+    assert stats.snapshot()["latency"]["total_avg_ms"] == pytest.approx(300.0)
+    assert StreamStats().snapshot()["latency"] == {}
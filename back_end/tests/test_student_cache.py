@@ -0,0 +1,141 @@
+"""
+学生信息缓存：LRU淘汰、TTL过期、注册/删除学生时经监听器失效，
+以及加载期间发生失效时不把旧数据写入缓存
+"""
+import threading
+
+import numpy as np
+
+import student_cache
+from database import FEATURE_COLUMNS, AttendanceDB
+from student_cache import StudentCache
+
+
+class CountingLoader:
+    """按学号返回学生记录并统计加载次数"""
+
+    def __init__(self):
+        self.calls = {}
+        self.rows = {f"S{i}": {"student_id": f"S{i}", "name": f"学生{i}",
+                               "face_feature_2": np.full(4, i, dtype=np.float32).tobytes()} for i in range(10)}
+
+    def __call__(self, student_id):
+        self.calls[student_id] = self.calls.get(student_id, 0) + 1
+        row = self.rows.get(student_id)
+        return dict(row) if row is not None else None
+
+
+def test_hit_returns_copy_without_reloading():
+    loader = CountingLoader()
+    cache = StudentCache(loader, FEATURE_COLUMNS)
+    row = cache.get_row("S1")
+    row["name"] = "被调用方修改"
+    assert cache.get_row("S1")["name"] == "学生1"
+    assert loader.calls["S1"] == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_missing_student_is_not_cached():
+    loader = CountingLoader()
+    cache = StudentCache(loader, FEATURE_COLUMNS)
+    assert cache.get_row("不存在") is None
+    assert cache.get_row("不存在") is None
+    assert loader.calls["不存在"] == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_template_parsed_once():
+    loader = CountingLoader()
+    cache = StudentCache(loader, FEATURE_COLUMNS)
+    template = cache.get_template("S3", "deepface")
+    np.testing.assert_array_equal(template, np.full(4, 3, dtype=np.float32))
+    assert cache.get_template("S3", "deepface") is template
+    assert cache.get_template("S3", "silence") is None
+    assert loader.calls["S3"] == 1
+
+
+def test_lru_eviction():
+    loader = CountingLoader()
+    cache = StudentCache(loader, FEATURE_COLUMNS, max_entries=2)
+    cache.get_row("S1")
+    cache.get_row("S2")
+    cache.get_row("S1")     # S1变为最近使用
+    cache.get_row("S3")     # 淘汰最久未使用的S2
+    assert cache.stats()["evictions"] == 1
+    cache.get_row("S1")
+    assert loader.calls["S1"] == 1
+    cache.get_row("S2")
+    assert loader.calls["S2"] == 2
+    assert cache.stats()["entries"] == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(student_cache.time, "monotonic", lambda: now[0])
+    loader = CountingLoader()
+    cache = StudentCache(loader, FEATURE_COLUMNS, ttl_seconds=10)
+    cache.get_row("S1")
+    now[0] += 9.9
+    cache.get_row("S1")
+    assert loader.calls["S1"] == 1
+    now[0] += 0.2
+    cache.get_row("S1")
+    assert loader.calls["S1"] == 2
+    assert cache.stats()["expired"] == 1
+
+    # ttl<=0表示不过期
+    forever = StudentCache(loader, FEATURE_COLUMNS, ttl_seconds=0)
+    forever.get_row("S2")
+    now[0] += 1e6
+    forever.get_row("S2")
+    assert loader.calls["S2"] == 1
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    """加载过程中学生被更新：本次返回加载到的数据，但不写入缓存，下一次重新加载"""
+    loader = CountingLoader()
+    loading, invalidated = threading.Event(), threading.Event()
+
+    def slow_loader(student_id):
+        row = loader(student_id)
+        loading.set()
+        invalidated.wait(1.0)
+        return row
+
+    cache = StudentCache(slow_loader, FEATURE_COLUMNS)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(cache.get_row("S1")))
+    reader.start()
+    assert loading.wait(1.0)
+    loader.rows["S1"] = dict(loader.rows["S1"], name="改名后")
+    cache.on_student_changed("upsert", "S1")
+    invalidated.set()
+    reader.join()
+
+    assert results[0]["name"] == "学生1"
+    assert cache.stats()["entries"] == 0
+    assert cache.get_row("S1")["name"] == "改名后"
+    assert loader.calls["S1"] == 2
+
+
+def test_db_listeners_invalidate(tmp_path):
+    db = AttendanceDB(str(tmp_path / "cache.db"))
+    try:
+        cache = db.enable_student_cache(max_entries=16, ttl_seconds=600)
+        feature = np.ones(512, dtype=np.float32)
+        assert db.register_student("S1", "学生1", class_name="一班", face_feature_2=feature.tobytes())["success"]
+        assert db.get_student("S1")["data"]["name"] == "学生1"
+        np.testing.assert_array_equal(db.get_student_template("S1", "deepface")["feature"], feature)
+        assert cache.stats()["entries"] == 1
+
+        assert db.register_student("S1", "学生1改", class_name="二班", face_feature_2=(feature * 2).tobytes())["success"]
+        assert cache.stats()["invalidations"] == 1
+        assert db.get_student("S1")["data"]["name"] == "学生1改"
+        np.testing.assert_array_equal(db.get_student_template("S1", "deepface")["feature"], feature * 2)
+
+        assert db.delete_student("S1")["success"]
+        assert cache.stats()["invalidations"] == 2
+        assert not db.get_student("S1")["success"]
+    finally:
+        db.close()
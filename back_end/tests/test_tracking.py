@@ -0,0 +1,126 @@
+"""
+逐考勤机人脸跟踪：IoU关联复用结果，换人、参数改变、丢失后重现、到期复核时重新完整识别
+"""
+import pytest
+
+from pipeline.tracking import KioskTracker, box_iou, largest_face_box
+
+BOX = (100, 100, 200, 200)
+NEAR = (110, 105, 210, 205)
+FAR = (400, 100, 500, 200)
+OK = {"success": True, "student_id": "2024000", "pipeline": {"embed_ms": 10}, "tracking": {"state": "new"}}
+FAIL = {"success": False, "message": "未找到匹配的学生"}
+
+
+def test_box_iou():
+    assert box_iou(BOX, BOX) == pytest.approx(1.0)
+    assert box_iou(BOX, FAR) == 0.0
+    # 相交50x100，并集100x100*2-5000
+    assert box_iou(BOX, (150, 100, 250, 200)) == pytest.approx(5000 / 15000)
+    assert box_iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+
+
+def test_largest_face_box():
+    faces = [{"rect": {"left": 0, "top": 0, "right": 50, "bottom": 50}},
+             {"rect": {"left": 10, "top": 10, "right": 110, "bottom": 90}}]
+    assert largest_face_box(faces) == (10, 10, 110, 90)
+    assert largest_face_box([]) is None
+    assert largest_face_box(None) is None
+
+
+def test_track_reuse_and_reverify():
+    tracker = KioskTracker(reverify_seconds=5.0)
+    track, reason = tracker.associate("k1", BOX, now=0.0)
+    assert reason == "new"
+    tracker.update("k1", track, OK)
+    assert "pipeline" not in track.result and "tracking" not in track.result
+
+    same, reason = tracker.associate("k1", NEAR, now=1.0)
+    assert same is track and reason is None
+    assert track.box == NEAR and track.frames == 2
+    assert tracker.describe(track, reason, now=1.0)["state"] == "tracked"
+
+    _, reason = tracker.associate("k1", NEAR, now=5.0)
+    assert reason == "reverify"
+    # 发起复核后复核时间刷新，紧随的帧继续复用
+    _, reason = tracker.associate("k1", NEAR, now=5.5)
+    assert reason is None
+
+
+def test_unidentified_track_retries():
+    tracker = KioskTracker(retry_seconds=1.0, reverify_seconds=5.0)
+    track, _ = tracker.associate("k1", BOX, now=0.0)
+    tracker.update("k1", track, FAIL)
+    assert tracker.associate("k1", BOX, now=0.5)[1] is None
+    assert tracker.associate("k1", BOX, now=1.0)[1] == "retry"
+
+
+def test_pending_result_recognizes_again():
+    tracker = KioskTracker()
+    tracker.associate("k1", BOX, now=0.0)
+    # 上一帧的完整识别尚未调用update
+    assert tracker.associate("k1", BOX, now=0.1)[1] == "new"
+
+
+def test_new_track_on_low_iou_or_key_change():
+    tracker = KioskTracker()
+    track, _ = tracker.associate("k1", BOX, key="一班", now=0.0)
+    tracker.update("k1", track, OK)
+
+    moved, reason = tracker.associate("k1", FAR, key="一班", now=0.5)
+    assert reason == "new" and moved is not track
+    tracker.update("k1", moved, OK)
+
+    rekeyed, reason = tracker.associate("k1", FAR, key="二班", now=1.0)
+    assert reason == "new" and rekeyed is not moved
+
+
+def test_lost_after_max_missed():
+    tracker = KioskTracker(max_missed=2)
+    track, _ = tracker.associate("k1", BOX, now=0.0)
+    tracker.update("k1", track, OK)
+    for i in range(2):
+        assert tracker.associate("k1", None, now=0.1 * (i + 1)) == (None, "no_face")
+    # 未超过max_missed，人脸重现时仍复用轨迹
+    same, reason = tracker.associate("k1", BOX, now=0.3)
+    assert same is track and reason is None and track.missed == 0
+
+    for i in range(3):
+        tracker.associate("k1", None, now=0.4 + 0.1 * i)
+    assert tracker.metrics()["lost"] == 1
+    assert tracker.associate("k1", BOX, now=1.0)[1] == "new"
+
+
+def test_update_ignored_for_replaced_track():
+    tracker = KioskTracker()
+    old, _ = tracker.associate("k1", BOX, now=0.0)
+    new, _ = tracker.associate("k1", FAR, now=0.1)
+    tracker.update("k1", old, OK)
+    assert old.result is None and old.embeds == 0
+    assert new.result is None
+
+
+def test_kiosks_are_independent():
+    tracker = KioskTracker()
+    track, _ = tracker.associate("k1", BOX, now=0.0)
+    tracker.update("k1", track, OK)
+    assert tracker.associate("k2", BOX, now=0.1)[1] == "new"
+    assert tracker.associate("k1", BOX, now=0.2)[1] is None
+    tracker.reset("k1")
+    assert tracker.associate("k1", BOX, now=0.3)[1] == "new"
+
+
+def test_metrics():
+    tracker = KioskTracker()
+    track, _ = tracker.associate("k1", BOX, now=0.0)
+    tracker.update("k1", track, OK)
+    for i in range(3):
+        tracker.associate("k1", BOX, now=0.1 * (i + 1))
+    tracker.associate("k1", None, now=0.5)
+
+    metrics = tracker.metrics()
+    assert metrics["frames"] == 5
+    assert metrics["no_face"] == 1
+    assert metrics["new"] == 1 and metrics["tracked"] == 3
+    assert metrics["active_kiosks"] == 1
+    assert metrics["full_pipeline_ratio"] == 0.25
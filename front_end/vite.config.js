@@ -9,6 +9,7 @@ export default defineConfig({
       '/api': {
         target: 'http://127.0.0.1:8090', // FastAPI后端
         changeOrigin: true,
+        ws: true, // 转发实时识别WebSocket帧流
         rewrite: (path) => path, // 不重写
       }
     },